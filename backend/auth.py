@@ -1,26 +1,32 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, WebSocket, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
 import secrets
 import string
 import os
-from database import (
-    get_user_by_email, get_user_by_id, create_user, update_user,
-    create_backup_codes, verify_backup_code, get_user_backup_codes
-)
+from storage import Storage, get_storage
+from profiling import span
 
 # Security configurations
 JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'fallback-secret-key')
 JWT_ALGORITHM = os.environ.get('JWT_ALGORITHM', 'HS256')
 JWT_EXPIRY_HOURS = int(os.environ.get('JWT_EXPIRY_HOURS', '24'))
+# Browsers can't set a WebSocket's headers, and a ?token= ends up in access logs, so
+# the token is offered as the second of the subprotocols [WEBSOCKET_PROTOCOL, token]
+WEBSOCKET_PROTOCOL = 'bearer'
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
 
+# (token, user) already resolved for this context; batch sub-requests reuse it
+_authenticated: ContextVar[Optional[tuple]] = ContextVar('authenticated', default=None)
+
 # Pydantic models
 class UserCreate(BaseModel):
     name: str
@@ -84,10 +90,12 @@ class MFAVerifyRequest(BaseModel):
 
 # Password hashing
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    with span('bcrypt'):
+        return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    with span('bcrypt'):
+        return pwd_context.hash(password)
 
 # JWT token functions
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -121,17 +129,23 @@ def verify_token(token: str):
 
 # Authentication functions
 def authenticate_user(email: str, password: str):
-    user = get_user_by_email(email)
+    user = get_storage().get_user_by_email(email)
     if not user:
         return False
     if not verify_password(password, user['hashed_password']):
         return False
     return user
 
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    storage: Storage = Depends(get_storage)
+):
     token = credentials.credentials
+    authenticated = _authenticated.get()
+    if authenticated is not None and authenticated[0] == token:
+        return authenticated[1]
     token_data = verify_token(token)
-    user = get_user_by_id(token_data.user_id)
+    user = storage.get_user_by_id(token_data.user_id)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -140,11 +154,45 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
         )
     return user
 
+@contextmanager
+def authenticated_as(token: str, user: dict):
+    """Resolve `token` to `user` without a lookup for requests handled inside the block"""
+    reset = _authenticated.set((token, user))
+    try:
+        yield
+    finally:
+        _authenticated.reset(reset)
+
 def get_current_active_user(current_user: dict = Depends(get_current_user)):
     if not current_user.get('is_active', True):
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
+def get_websocket_user(websocket: WebSocket, storage: Storage) -> Optional[dict]:
+    """The active user of the token a WebSocket offers as a subprotocol (see
+    WEBSOCKET_PROTOCOL); None when it offers none or it is invalid"""
+    protocols = websocket.scope.get('subprotocols') or []
+    if len(protocols) != 2 or protocols[0] != WEBSOCKET_PROTOCOL:
+        return None
+    try:
+        token_data = verify_token(protocols[1])
+    except HTTPException:
+        return None
+    user = storage.get_user_by_id(token_data.user_id)
+    return user if user and user.get('is_active', True) else None
+
+def get_current_admin_user(current_user: dict = Depends(get_current_active_user)):
+    """Operators are listed by email in ADMIN_EMAILS (comma separated)"""
+    admin_emails = [
+        email.strip().lower() for email in os.environ.get('ADMIN_EMAILS', '').split(',') if email.strip()
+    ]
+    if current_user['email'].lower() not in admin_emails:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
+        )
+    return current_user
+
 # MFA functions
 def generate_backup_codes(count: int = 8) -> list[str]:
     """Generate backup codes for MFA"""
@@ -160,17 +208,18 @@ def create_user_backup_codes(user_id: str) -> list[str]:
     codes = generate_backup_codes()
     
     # Save to database
-    create_backup_codes(user_id, codes)
+    get_storage().create_backup_codes(user_id, codes)
     
     return codes
 
 def verify_backup_code_for_user(user_id: str, code: str) -> bool:
     """Verify a backup code"""
-    return verify_backup_code(user_id, code)
+    return get_storage().verify_backup_code(user_id, code)
 
 def enable_mfa_for_user(user_id: str) -> list[str]:
     """Enable MFA for a user and return backup codes"""
-    user = get_user_by_id(user_id)
+    storage = get_storage()
+    user = storage.get_user_by_id(user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -178,22 +227,23 @@ def enable_mfa_for_user(user_id: str) -> list[str]:
     codes = create_user_backup_codes(user_id)
     
     # Enable MFA
-    update_user(user_id, {'mfa_enabled': True})
+    storage.update_user(user_id, {'mfa_enabled': True})
     
     return codes
 
 def disable_mfa_for_user(user_id: str):
     """Disable MFA for a user"""
-    user = get_user_by_id(user_id)
+    storage = get_storage()
+    user = storage.get_user_by_id(user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
     # Disable MFA
-    update_user(user_id, {'mfa_enabled': False})
+    storage.update_user(user_id, {'mfa_enabled': False})
 
 def get_user_mfa_codes(user_id: str) -> list[dict]:
     """Get user's MFA backup codes"""
-    return get_user_backup_codes(user_id)
+    return get_storage().get_user_backup_codes(user_id)
 
 # User class for backwards compatibility
 class User:
@@ -0,0 +1 @@
+"""In-process performance tooling for the API (run from the backend directory)."""
@@ -0,0 +1,246 @@
+"""Compare a benchmark run against the stored baseline and fail on regressions.
+
+Baselines live in ``benchmarks/baselines/<storage>.json`` and are plain
+runner output. A route regresses when a latency percentile or throughput
+moves past its relative threshold *and* the shift is statistically
+significant (one-sided Mann-Whitney U on the raw samples), so single noisy
+outliers don't fail the gate::
+
+    python -m benchmarks.runner --storage memory --output bench-results.json
+    python -m benchmarks.compare bench-results.json --report bench-report.md
+
+Exit status is 1 when any route regressed. ``--update-baseline`` replaces
+the stored baseline with the current run.
+"""
+import argparse
+import json
+import math
+import os
+import shutil
+import sys
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+
+
+@dataclass
+class Thresholds:
+    """Relative change allowed before a metric counts as regressed"""
+    p50: float = 0.25
+    p95: float = 0.35
+    p99: float = 0.50
+    rps: float = 0.20
+    min_delta_ms: float = 1.0
+    alpha: float = 0.001
+
+
+@dataclass
+class RouteResult:
+    route: str
+    status: str
+    metrics: Dict[str, Tuple[float, float]] = field(default_factory=dict)
+    p_value: Optional[float] = None
+    reasons: List[str] = field(default_factory=list)
+
+
+def baseline_path(storage: str) -> str:
+    return os.path.join(BASELINE_DIR, f"{storage}.json")
+
+
+def load(path: str) -> Dict[str, Any]:
+    with open(path) as f:
+        return json.load(f)
+
+
+def _ranks(values: List[float]) -> Tuple[List[float], float]:
+    """Average ranks (1-based) plus the tie correction term sum(t^3 - t)"""
+    order = sorted(range(len(values)), key=values.__getitem__)
+    ranks = [0.0] * len(values)
+    ties = 0.0
+    i = 0
+    while i < len(order):
+        j = i
+        while j + 1 < len(order) and values[order[j + 1]] == values[order[i]]:
+            j += 1
+        for k in range(i, j + 1):
+            ranks[order[k]] = (i + j) / 2 + 1
+        t = j - i + 1
+        ties += t ** 3 - t
+        i = j + 1
+    return ranks, ties
+
+
+def mann_whitney_greater(current: List[float], baseline: List[float]) -> float:
+    """One-sided p-value that `current` tends to be larger than `baseline`.
+
+    Normal approximation with tie and continuity correction; fine for the
+    sample sizes the runner produces (tens to thousands per route).
+    """
+    n1, n2 = len(current), len(baseline)
+    if not n1 or not n2:
+        return 1.0
+    ranks, ties = _ranks(list(current) + list(baseline))
+    u = sum(ranks[:n1]) - n1 * (n1 + 1) / 2
+    n = n1 + n2
+    variance = n1 * n2 / 12 * ((n + 1) - ties / (n * (n - 1)))
+    if variance <= 0:
+        return 1.0
+    z = (u - n1 * n2 / 2 - 0.5) / math.sqrt(variance)
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def _relative(current: float, baseline: float) -> float:
+    if baseline == 0:
+        return 0.0 if current == 0 else math.inf
+    return (current - baseline) / baseline
+
+
+def compare_route(route: str, current: Dict[str, Any], baseline: Dict[str, Any],
+                  thresholds: Thresholds) -> RouteResult:
+    result = RouteResult(route=route, status='ok')
+    for metric in ('p50', 'p95', 'p99'):
+        result.metrics[metric] = (baseline[f"{metric}_ms"], current[f"{metric}_ms"])
+    result.metrics['rps'] = (baseline['rps'], current['rps'])
+
+    result.p_value = mann_whitney_greater(current.get('samples_ms', []), baseline.get('samples_ms', []))
+    significant = result.p_value < thresholds.alpha
+
+    for metric in ('p50', 'p95', 'p99'):
+        before, after = result.metrics[metric]
+        change = _relative(after, before)
+        if change > getattr(thresholds, metric) and after - before > thresholds.min_delta_ms and significant:
+            result.reasons.append(f"{metric} {before:.3f}ms -> {after:.3f}ms ({change:+.1%})")
+
+    # Throughput of sub-millisecond routes swings with scheduler noise alone
+    before, after = result.metrics['rps']
+    change = _relative(after, before)
+    p50_delta = result.metrics['p50'][1] - result.metrics['p50'][0]
+    if -change > thresholds.rps and p50_delta > thresholds.min_delta_ms and significant:
+        result.reasons.append(f"throughput {before:.1f} -> {after:.1f} req/s ({change:+.1%})")
+
+    if current.get('errors', 0) > baseline.get('errors', 0):
+        result.reasons.append(f"errors {baseline.get('errors', 0)} -> {current['errors']}")
+
+    before, after = result.metrics['p50']
+    if result.reasons:
+        result.status = 'regressed'
+    elif _relative(after, before) < -thresholds.p50 and mann_whitney_greater(
+            baseline.get('samples_ms', []), current.get('samples_ms', [])) < thresholds.alpha:
+        result.status = 'improved'
+    return result
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any],
+            thresholds: Thresholds) -> Tuple[List[RouteResult], List[str]]:
+    """Per-route results plus warnings about how comparable the runs are"""
+    warnings = []
+    for key in ('storage', 'concurrency', 'requests'):
+        if current['meta'].get(key) != baseline['meta'].get(key):
+            warnings.append(
+                f"{key} differs: baseline {baseline['meta'].get(key)!r}, current {current['meta'].get(key)!r}"
+            )
+    if current['meta'].get('dataset') != baseline['meta'].get('dataset'):
+        warnings.append("dataset differs from the baseline's")
+
+    results = []
+    for route in sorted(set(current['routes']) | set(baseline['routes'])):
+        if route not in baseline['routes']:
+            results.append(RouteResult(route=route, status='new'))
+        elif route not in current['routes']:
+            results.append(RouteResult(route=route, status='missing'))
+        else:
+            results.append(compare_route(route, current['routes'][route], baseline['routes'][route], thresholds))
+    return results, warnings
+
+
+def render_report(results: List[RouteResult], warnings: List[str], current: Dict[str, Any],
+                  baseline: Dict[str, Any], thresholds: Thresholds) -> str:
+    """Markdown diff report"""
+    regressed = [r for r in results if r.status == 'regressed']
+    lines = [
+        '# Benchmark comparison',
+        '',
+        f"- Storage: `{current['meta'].get('storage')}`",
+        f"- Baseline commit: `{baseline['meta'].get('commit')}`",
+        f"- Current commit: `{current['meta'].get('commit')}`",
+        f"- Thresholds: p50 +{thresholds.p50:.0%}, p95 +{thresholds.p95:.0%}, p99 +{thresholds.p99:.0%}, "
+        f"throughput -{thresholds.rps:.0%}, min delta {thresholds.min_delta_ms}ms, alpha {thresholds.alpha}",
+        f"- Result: **{'FAIL' if regressed else 'PASS'}** "
+        f"({len(regressed)} regressed, {sum(r.status == 'improved' for r in results)} improved, "
+        f"{len(results)} routes)",
+        '',
+    ]
+    if warnings:
+        lines += ['## Warnings', ''] + [f"- {w}" for w in warnings] + ['']
+    if regressed:
+        lines += ['## Regressions', '']
+        for r in regressed:
+            lines.append(f"- `{r.route}`: " + '; '.join(r.reasons))
+        lines.append('')
+
+    lines += [
+        '## Routes',
+        '',
+        '| Route | Status | p50 ms | p95 ms | p99 ms | req/s | p-value |',
+        '|---|---|---|---|---|---|---|',
+    ]
+    for r in results:
+        if not r.metrics:
+            lines.append(f"| `{r.route}` | {r.status} | | | | | |")
+            continue
+        cells = []
+        for metric in ('p50', 'p95', 'p99', 'rps'):
+            before, after = r.metrics[metric]
+            cells.append(f"{before:.2f} → {after:.2f} ({_relative(after, before):+.1%})")
+        lines.append(f"| `{r.route}` | {r.status} | " + ' | '.join(cells) + f" | {r.p_value:.3g} |")
+    return '\n'.join(lines) + '\n'
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('current', help='benchmark JSON written by benchmarks.runner')
+    parser.add_argument('--baseline', help='baseline JSON (default: baselines/<storage>.json)')
+    parser.add_argument('--report', help='write the markdown report here as well as stdout')
+    parser.add_argument('--update-baseline', action='store_true', help='store the current run as the baseline')
+    defaults = Thresholds()
+    for name in ('p50', 'p95', 'p99', 'rps'):
+        parser.add_argument(f"--{name}-threshold", type=float, default=getattr(defaults, name), dest=name,
+                            help=f"allowed relative {name} change (default {getattr(defaults, name)})")
+    parser.add_argument('--min-delta-ms', type=float, default=defaults.min_delta_ms,
+                        help='ignore latency changes smaller than this')
+    parser.add_argument('--alpha', type=float, default=defaults.alpha, help='significance level')
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    current = load(args.current)
+    path = args.baseline or baseline_path(current['meta']['storage'])
+
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copyfile(args.current, path)
+        print(f"Baseline updated: {path}")
+        return 0
+
+    if not os.path.exists(path):
+        print(f"No baseline at {path}; run with --update-baseline to create one", file=sys.stderr)
+        return 1
+
+    thresholds = Thresholds(p50=args.p50, p95=args.p95, p99=args.p99, rps=args.rps,
+                            min_delta_ms=args.min_delta_ms, alpha=args.alpha)
+    baseline = load(path)
+    results, warnings = compare(current, baseline, thresholds)
+    report = render_report(results, warnings, current, baseline, thresholds)
+
+    print(report)
+    if args.report:
+        with open(args.report, 'w') as f:
+            f.write(report)
+
+    return 1 if any(r.status == 'regressed' for r in results) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
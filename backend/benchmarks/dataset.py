@@ -0,0 +1,489 @@
+"""Deterministic synthetic dataset generator for scale testing.
+
+Builds workspaces with many members, deep page trees, block-heavy pages and
+large databases covering every property type the frontend renders (title,
+text, select, person, date, number, checkbox, formula). The same seed always
+yields the same ids, titles, content and timestamps::
+
+    python -m benchmarks.dataset --storage mongo --preset large --seed 7
+
+Records are streamed in batches and bulk inserted: ``insert_many`` on the
+collections in database.py for Mongo, Core ``INSERT`` executemany on the
+models in database_postgres.py for Postgres. The per-record create helpers
+are not used for bulk data because they assign random ids and timestamps and
+issue one round trip per record.
+"""
+import argparse
+import json
+import random
+import sys
+import time
+import uuid
+from dataclasses import dataclass, field, asdict, replace
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional
+
+import date_index
+
+DATASET_PASSWORD = "dataset-password"
+BASE_TIME = datetime(2024, 1, 1)
+
+WORDS = (
+    "project roadmap meeting notes design review sprint backlog release plan "
+    "customer feedback research interview metric goal launch budget hiring "
+    "onboarding retro incident postmortem draft final spec api schema query "
+    "index cache latency throughput deploy rollout migration kanban board task"
+).split()
+BLOCK_TYPES = ('paragraph', 'heading1', 'heading2', 'heading3', 'bulleted_list',
+               'numbered_list', 'checkbox', 'code', 'quote')
+SELECT_OPTIONS = {
+    'status': [('todo', 'To Do', 'red'), ('progress', 'In Progress', 'yellow'), ('done', 'Done', 'green')],
+    'priority': [('low', 'Low', 'blue'), ('medium', 'Medium', 'yellow'), ('high', 'High', 'red')],
+}
+
+
+@dataclass
+class DatasetSpec:
+    """Shape of the generated dataset; counts are per workspace unless noted"""
+    workspaces: int = 1
+    members: int = 50
+    pages: int = 2000
+    depth: int = 6
+    blocks: int = 20
+    heavy_pages: int = 2
+    heavy_blocks: int = 500
+    databases: int = 3
+    rows: int = 5000
+    seed: int = 42
+    batch_size: int = 1000
+
+
+PRESETS = {
+    'tiny': DatasetSpec(members=5, pages=50, depth=3, blocks=5, heavy_pages=1, heavy_blocks=50, databases=1, rows=200),
+    'small': DatasetSpec(),
+    'medium': DatasetSpec(members=500, pages=20000, depth=8, blocks=30, heavy_pages=5,
+                          heavy_blocks=2000, databases=4, rows=50000),
+    'large': DatasetSpec(members=5000, pages=100000, depth=10, blocks=40, heavy_pages=10,
+                         heavy_blocks=5000, databases=5, rows=200000),
+}
+
+
+@dataclass
+class DatasetSummary:
+    """What was written, plus handles the benchmark runner needs"""
+    spec: Dict[str, Any]
+    owner: Dict[str, Any]
+    workspace_ids: List[str] = field(default_factory=list)
+    page_ids: List[str] = field(default_factory=list)
+    database_ids: List[str] = field(default_factory=list)
+    row_id: Optional[str] = None
+    counts: Dict[str, int] = field(default_factory=dict)
+    elapsed_seconds: float = 0.0
+
+
+class Generator:
+    """Yields storage-shaped record dicts from a seeded RNG"""
+
+    def __init__(self, spec: DatasetSpec, hashed_password: str):
+        self.spec = spec
+        self.rng = random.Random(spec.seed)
+        self.hashed_password = hashed_password
+
+    def uid(self) -> str:
+        return str(uuid.UUID(int=self.rng.getrandbits(128), version=4))
+
+    def timestamp(self) -> datetime:
+        return BASE_TIME + timedelta(seconds=self.rng.randrange(365 * 24 * 3600))
+
+    def words(self, low: int, high: int) -> str:
+        return ' '.join(self.rng.choices(WORDS, k=self.rng.randint(low, high)))
+
+    def user(self, label: str) -> Dict[str, Any]:
+        return {
+            'id': self.uid(),
+            'name': label.replace('-', ' ').title(),
+            'email': f"{label}@dataset.local",
+            'hashed_password': self.hashed_password,
+            'avatar': None,
+            'color': '#%06x' % self.rng.randrange(0x1000000),
+            'is_active': True,
+            'is_verified': True,
+            'mfa_enabled': False,
+            'created_at': self.timestamp(),
+            'updated_at': None,
+        }
+
+    def workspace(self, index: int, owner: Dict[str, Any], members: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return {
+            'id': self.uid(),
+            'name': f"Workspace {index} {self.words(1, 3)}",
+            'icon': '📁',
+            'description': self.words(5, 15),
+            'owner_id': owner['id'],
+            'members': [{'user_id': owner['id'], 'role': 'owner'}]
+                       + [{'user_id': m['id'], 'role': 'member'} for m in members],
+            'settings': {},
+            'created_at': self.timestamp(),
+            'updated_at': None,
+        }
+
+    def blocks(self, count: int) -> List[Dict[str, Any]]:
+        return [
+            {'id': self.uid(), 'type': self.rng.choice(BLOCK_TYPES), 'content': self.words(3, 25)}
+            for _ in range(count)
+        ]
+
+    def level_sizes(self) -> List[int]:
+        """Split the page count over `depth` levels growing geometrically"""
+        pages, depth = self.spec.pages, max(1, min(self.spec.depth, self.spec.pages))
+        roots = max(1, min(pages // depth, 20))
+        low, high = 1.0, float(pages)
+        for _ in range(60):
+            ratio = (low + high) / 2
+            if sum(roots * ratio ** k for k in range(depth)) > pages:
+                high = ratio
+            else:
+                low = ratio
+        sizes = [max(1, int(roots * low ** k)) for k in range(depth)]
+        sizes[-1] += pages - sum(sizes)
+        return sizes
+
+    def pages(self, workspace_id: str, authors: List[str]) -> Iterator[Dict[str, Any]]:
+        """Pages level by level, so parents always precede children"""
+        heavy = set(self.rng.sample(range(self.spec.pages), min(self.spec.heavy_pages, self.spec.pages)))
+        previous: List[str] = []
+        index = 0
+        for size in self.level_sizes():
+            current = []
+            for _ in range(size):
+                page_id = self.uid()
+                current.append(page_id)
+                yield {
+                    'id': page_id,
+                    'title': self.words(1, 6).capitalize(),
+                    'icon': '📄',
+                    'content': self.blocks(self.spec.heavy_blocks if index in heavy else self.spec.blocks),
+                    'workspace_id': workspace_id,
+                    'parent_id': self.rng.choice(previous) if previous else None,
+                    'created_by': self.rng.choice(authors),
+                    'permissions': [],
+                    'is_deleted': False,
+                    'deleted_at': None,
+                    'deleted_by': None,
+                    'created_at': self.timestamp(),
+                    'updated_at': None,
+                }
+                index += 1
+            previous = current
+
+    def database(self, workspace_id: str, owner_id: str, index: int) -> Dict[str, Any]:
+        properties = {
+            'title': {'id': 'title', 'name': 'Name', 'type': 'title'},
+            'notes': {'id': 'notes', 'name': 'Notes', 'type': 'text'},
+            'assignee': {'id': 'assignee', 'name': 'Assignee', 'type': 'person'},
+            'dueDate': {'id': 'dueDate', 'name': 'Due Date', 'type': 'date'},
+            'estimate': {'id': 'estimate', 'name': 'Estimate', 'type': 'number'},
+            'progress': {'id': 'progress', 'name': 'Progress', 'type': 'number', 'format': 'percent'},
+            'archived': {'id': 'archived', 'name': 'Archived', 'type': 'checkbox'},
+            'daysLeft': {'id': 'daysLeft', 'name': 'Days Until Due', 'type': 'formula',
+                         'formula': 'dateBetween(prop("Due Date"), now(), "days")'},
+            'effort': {'id': 'effort', 'name': 'Effort', 'type': 'formula',
+                       'formula': 'round(prop("Estimate") * prop("Progress") / 100)'},
+        }
+        for prop_id, options in SELECT_OPTIONS.items():
+            properties[prop_id] = {
+                'id': prop_id, 'name': prop_id.title(), 'type': 'select',
+                'options': [{'id': o, 'name': n, 'color': c} for o, n, c in options]
+            }
+        return {
+            'id': self.uid(),
+            'name': f"Database {index} {self.words(1, 2)}",
+            'workspace_id': workspace_id,
+            'created_by': owner_id,
+            'properties': properties,
+            'views': [
+                {'id': 'table', 'name': 'All', 'type': 'table', 'isDefault': True, 'filter': {}, 'sort': []},
+                {'id': 'board', 'name': 'Board', 'type': 'kanban', 'groupBy': 'status'},
+            ],
+            'is_deleted': False,
+            'deleted_at': None,
+            'deleted_by': None,
+            'created_at': self.timestamp(),
+            'updated_at': None,
+        }
+
+    def rows(self, database_id: str, people: List[str]) -> Iterator[Dict[str, Any]]:
+        for _ in range(self.spec.rows):
+            created_at = self.timestamp()
+            yield {
+                'id': self.uid(),
+                'database_id': database_id,
+                'properties': {
+                    'title': self.words(2, 6).capitalize(),
+                    'notes': self.words(0, 12),
+                    'status': self.rng.choice(SELECT_OPTIONS['status'])[0],
+                    'priority': self.rng.choice(SELECT_OPTIONS['priority'])[0],
+                    'assignee': self.rng.choice(people),
+                    'dueDate': (created_at + timedelta(days=self.rng.randint(-30, 90))).date().isoformat(),
+                    'estimate': self.rng.randint(1, 40),
+                    'progress': self.rng.randint(0, 100),
+                    'archived': self.rng.random() < 0.1,
+                },
+                'created_at': created_at.isoformat(),
+                'updated_at': None,
+            }
+
+
+def batched(records: Iterator[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    batch: List[Dict[str, Any]] = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class MemoryWriter:
+    """Writes straight into a MemoryStorage's tables"""
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    def users(self, batch):
+        for user in batch:
+            self.storage.users[user['id']] = user
+
+    def workspaces(self, batch):
+        for workspace in batch:
+            self.storage.workspaces[workspace['id']] = workspace
+
+    def pages(self, batch):
+        for page in batch:
+            self.storage.pages[page['id']] = page
+
+    def databases(self, batch):
+        for database in batch:
+            self.storage.databases[database['id']] = {**database, 'rows': []}
+
+    def rows(self, batch):
+        for row in batch:
+            row = dict(row)
+            self.storage.databases[row.pop('database_id')]['rows'].append(row)
+
+    def close(self):
+        pass
+
+
+class MongoWriter:
+    """Bulk inserts into the collections defined in database.py"""
+
+    def __init__(self):
+        import database
+        self.db = database
+
+    def _insert(self, collection, batch):
+        collection.insert_many([dict(doc) for doc in batch], ordered=False)
+
+    def users(self, batch):
+        self._insert(self.db.users_collection, batch)
+
+    def workspaces(self, batch):
+        self._insert(self.db.workspaces_collection, batch)
+
+    def pages(self, batch):
+        self._insert(self.db.pages_collection, batch)
+
+    def databases(self, batch):
+        self._insert(self.db.databases_collection, batch)
+
+    def rows(self, batch):
+        self._insert(self.db.database_rows_collection, [
+            {**row, 'dates': date_index.entries(row['properties'])} for row in batch
+        ])
+
+    def close(self):
+        pass
+
+
+class PostgresWriter:
+    """Bulk inserts through Core executemany on the database_postgres.py tables"""
+
+    def __init__(self):
+        import database_postgres as models
+        self.models = models
+        models.create_tables()
+        self.session = models.SessionLocal()
+
+    def _uuid(self, value):
+        return uuid.UUID(value) if value else None
+
+    def _insert(self, table, values):
+        from sqlalchemy import insert
+        if values:
+            self.session.execute(insert(table), values)
+            self.session.commit()
+
+    def users(self, batch):
+        self._insert(self.models.User.__table__, [
+            {**{k: v for k, v in user.items()}, 'id': self._uuid(user['id']), 'updated_at': user['created_at']}
+            for user in batch
+        ])
+
+    def workspaces(self, batch):
+        self._insert(self.models.Workspace.__table__, [
+            {
+                'id': self._uuid(ws['id']), 'name': ws['name'][:100], 'icon': ws['icon'],
+                'description': ws['description'], 'owner_id': self._uuid(ws['owner_id']),
+                'settings': json.dumps(ws['settings']), 'created_at': ws['created_at'],
+                'updated_at': ws['created_at'],
+            }
+            for ws in batch
+        ])
+        self._insert(self.models.workspace_members, [
+            {'workspace_id': self._uuid(ws['id']), 'user_id': self._uuid(m['user_id']), 'role': m['role']}
+            for ws in batch for m in ws['members']
+        ])
+
+    def pages(self, batch):
+        self._insert(self.models.Page.__table__, [
+            {
+                'id': self._uuid(page['id']), 'title': page['title'][:200], 'icon': page['icon'],
+                'parent_id': self._uuid(page['parent_id']), 'workspace_id': self._uuid(page['workspace_id']),
+                'content': json.dumps(page['content']), 'created_by': self._uuid(page['created_by']),
+                'created_at': page['created_at'], 'updated_at': page['created_at'], 'is_deleted': False,
+            }
+            for page in batch
+        ])
+
+    def databases(self, batch):
+        self._insert(self.models.Database.__table__, [
+            {
+                'id': self._uuid(db['id']), 'name': db['name'][:100],
+                'workspace_id': self._uuid(db['workspace_id']), 'created_by': self._uuid(db['created_by']),
+                'properties': json.dumps(db['properties']), 'views': json.dumps(db['views']),
+                'created_at': db['created_at'], 'updated_at': db['created_at'], 'is_deleted': False,
+            }
+            for db in batch
+        ])
+
+    def rows(self, batch):
+        self._insert(self.models.DatabaseRow.__table__, [
+            {
+                'id': self._uuid(row['id']), 'database_id': self._uuid(row['database_id']),
+                'properties': json.dumps(row['properties']),
+                'created_at': datetime.fromisoformat(row['created_at']),
+                'updated_at': datetime.fromisoformat(row['created_at']),
+            }
+            for row in batch
+        ])
+        self._insert(self.models.DatabaseRowDate.__table__, [
+            {'row_id': self._uuid(row['id']), 'database_id': self._uuid(row['database_id']), **entry}
+            for row in batch for entry in date_index.entries(row['properties'])
+        ])
+
+    def close(self):
+        self.session.close()
+
+
+def writer_for(storage):
+    """Pick the bulk writer matching a storage instance"""
+    if storage.name == 'memory':
+        return MemoryWriter(storage)
+    if storage.name == 'mongo':
+        return MongoWriter()
+    if storage.name == 'postgres':
+        return PostgresWriter()
+    raise ValueError(f"No bulk writer for storage '{storage.name}'")
+
+
+def generate(storage, spec: DatasetSpec, hashed_password: Optional[str] = None) -> DatasetSummary:
+    """Generate `spec` into `storage` and return a summary"""
+    if hashed_password is None:
+        from auth import get_password_hash
+        hashed_password = get_password_hash(DATASET_PASSWORD)
+
+    started = time.perf_counter()
+    gen = Generator(spec, hashed_password)
+    writer = writer_for(storage)
+    counts = {'users': 0, 'workspaces': 0, 'pages': 0, 'databases': 0, 'rows': 0}
+
+    def write(kind, records):
+        for batch in batched(records, spec.batch_size):
+            getattr(writer, kind)(batch)
+            counts[kind] += len(batch)
+
+    owner = gen.user('owner')
+    write('users', iter([owner]))
+    summary = DatasetSummary(spec=asdict(spec), owner=owner)
+
+    try:
+        for w in range(spec.workspaces):
+            members = [gen.user(f"member-{w}-{n}") for n in range(spec.members)]
+            write('users', iter(members))
+            workspace = gen.workspace(w, owner, members)
+            write('workspaces', iter([workspace]))
+            summary.workspace_ids.append(workspace['id'])
+
+            authors = [owner['id']] + [m['id'] for m in members[:50]]
+            for batch in batched(gen.pages(workspace['id'], authors), spec.batch_size):
+                writer.pages(batch)
+                counts['pages'] += len(batch)
+                if len(summary.page_ids) < 100:
+                    summary.page_ids.extend(page['id'] for page in batch[:100 - len(summary.page_ids)])
+
+            people = [owner['id']] + [m['id'] for m in members]
+            for d in range(spec.databases):
+                database = gen.database(workspace['id'], owner['id'], d)
+                write('databases', iter([database]))
+                summary.database_ids.append(database['id'])
+                for batch in batched(gen.rows(database['id'], people), spec.batch_size):
+                    writer.rows(batch)
+                    counts['rows'] += len(batch)
+                    summary.row_id = summary.row_id or batch[0]['id']
+    finally:
+        writer.close()
+
+    summary.counts = counts
+    summary.elapsed_seconds = round(time.perf_counter() - started, 3)
+    return summary
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--storage', default='memory', choices=['memory', 'mongo', 'postgres'])
+    parser.add_argument('--preset', default='small', choices=sorted(PRESETS))
+    parser.add_argument('--seed', type=int, help='RNG seed (overrides the preset)')
+    for name in ('workspaces', 'members', 'pages', 'depth', 'blocks', 'heavy_pages',
+                 'heavy_blocks', 'databases', 'rows', 'batch_size'):
+        parser.add_argument(f"--{name.replace('_', '-')}", type=int, dest=name,
+                            help=f"override the preset's {name.replace('_', ' ')}")
+    return parser.parse_args(argv)
+
+
+def spec_from_args(args) -> DatasetSpec:
+    overrides = {
+        name: value for name, value in vars(args).items()
+        if name in DatasetSpec.__dataclass_fields__ and value is not None
+    }
+    return replace(PRESETS[args.preset], **overrides)
+
+
+def main(argv=None):
+    from storage import create_storage
+
+    args = parse_args(argv)
+    summary = generate(create_storage(args.storage), spec_from_args(args))
+    print(json.dumps({
+        'storage': args.storage,
+        'spec': summary.spec,
+        'counts': summary.counts,
+        'elapsed_seconds': summary.elapsed_seconds,
+        'owner_email': summary.owner['email'],
+        'password': DATASET_PASSWORD,
+    }, indent=2), file=sys.stdout)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,548 @@
+"""Benchmark every API route in-process.
+
+Drives the FastAPI ``app`` through httpx's ASGI transport against a seeded
+storage backend and records latency percentiles and throughput per route::
+
+    python -m benchmarks.runner --storage memory --concurrency 8 --requests 200 \
+        --output bench-results.json
+
+Results are JSON so runs can be compared across commits.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+import uuid
+from dataclasses import dataclass, replace
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+from fastapi.routing import APIRoute
+
+from storage import Storage, create_storage, set_storage
+
+BENCH_PASSWORD = "bench-password"
+# Options of the seeded database's Status select (as in benchmarks.dataset), which the board scenarios group by
+BENCH_STATUSES = ("todo", "progress", "done")
+# Due dates of the seeded rows start here, and the calendar scenario shows a month of them
+BENCH_DATE = datetime(2024, 1, 1)
+
+
+@dataclass
+class BenchContext:
+    """Seeded records shared by all scenarios"""
+    storage: Storage
+    hashed_password: str
+    user: Dict[str, Any]
+    token: str
+    workspace_id: str
+    page_id: str
+    database_id: str
+    row_id: str
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.token}"}
+
+    def new_user(self, **overrides) -> Dict[str, Any]:
+        """Create a throwaway user for scenarios that consume per-user state"""
+        from auth import create_access_token
+        user = self.storage.create_user({
+            'name': 'Bench User',
+            'email': f"bench-{uuid.uuid4().hex}@example.com",
+            'hashed_password': self.hashed_password,
+            'is_active': True,
+            'is_verified': True,
+            **overrides
+        })
+        user['token'] = create_access_token(data={"sub": user['id']})
+        return user
+
+    def new_page(self, **overrides) -> Dict[str, Any]:
+        return self.storage.create_page({
+            'title': 'Bench page',
+            'icon': '📄',
+            'workspace_id': self.workspace_id,
+            'parent_id': None,
+            'created_by': self.user['id'],
+            'content': [],
+            'permissions': [],
+            'is_deleted': False,
+            **overrides
+        })
+
+
+@dataclass
+class Scenario:
+    """One route; ``build`` returns untimed per-request path params and httpx kwargs.
+
+    ``variant`` tells apart several scenarios for the same route (e.g. query options).
+    """
+    method: str
+    path: str
+    build: Optional[Callable[[BenchContext, int], Dict[str, Any]]] = None
+    variant: Optional[str] = None
+
+    @property
+    def route(self) -> str:
+        return f"{self.method} {self.path}"
+
+    @property
+    def name(self) -> str:
+        return f"{self.route} [{self.variant}]" if self.variant else self.route
+
+    def request(self, ctx: BenchContext, i: int) -> Dict[str, Any]:
+        spec = self.build(ctx, i) if self.build else {}
+        path_params = {
+            'workspace_id': ctx.workspace_id,
+            'page_id': ctx.page_id,
+            'database_id': ctx.database_id,
+            'row_id': ctx.row_id,
+            'user_id': ctx.user['id'],
+            **spec.pop('path', {})
+        }
+        spec.setdefault('headers', ctx.headers)
+        return {'method': self.method, 'url': self.path.format(**path_params), **spec}
+
+
+def _as_user(user: Dict[str, Any], **spec) -> Dict[str, Any]:
+    return {'headers': {"Authorization": f"Bearer {user['token']}"}, **spec}
+
+
+def _mfa_user(ctx: BenchContext, i: int) -> Dict[str, Any]:
+    user = ctx.new_user(mfa_enabled=True)
+    ctx.storage.create_backup_codes(user['id'], ['BENCH001'])
+    return _as_user(user, json={'backup_code': 'BENCH001'})
+
+
+def _deleted_page(ctx: BenchContext, i: int) -> Dict[str, Any]:
+    page = ctx.new_page()
+    ctx.storage.delete_page(page['id'], ctx.user['id'])
+    return {'path': {'item_id': page['id']}, 'params': {'item_type': 'page'}}
+
+
+def _new_member(ctx: BenchContext, i: int) -> Dict[str, Any]:
+    return {'path': {'user_id': ctx.new_user()['id']}}
+
+
+def _existing_member(ctx: BenchContext, i: int) -> Dict[str, Any]:
+    user = ctx.new_user()
+    workspace = ctx.storage.get_workspace_by_id(ctx.workspace_id)
+    members = workspace['members'] + [{'user_id': user['id'], 'role': 'member'}]
+    ctx.storage.update_workspace(ctx.workspace_id, {'members': members})
+    return {'path': {'user_id': user['id']}}
+
+
+def _granted_permission(ctx: BenchContext, i: int) -> Dict[str, Any]:
+    user = ctx.new_user()
+    page = ctx.new_page(permissions=[{'user_id': user['id'], 'permission': 'viewer'}])
+    return {'path': {'page_id': page['id'], 'user_id': user['id']}}
+
+
+def _block_move(ctx: BenchContext, i: int) -> Dict[str, Any]:
+    """Move a block of the seeded page after another, whichever blocks the page has by then"""
+    block_ids = [block['id'] for block in ctx.storage.get_page_by_id(ctx.page_id)['content']]
+    block_id, after_id = block_ids[i % len(block_ids)], block_ids[(i + 3) % len(block_ids)]
+    return {'path': {'block_id': block_id}, 'json': {'after_id': after_id} if after_id != block_id else {}}
+
+
+def _new_row(ctx: BenchContext, i: int) -> Dict[str, Any]:
+    row = ctx.storage.create_database_row(ctx.database_id, {'properties': {'Name': f'Row {i}'}})
+    return {'path': {'row_id': row['id']}}
+
+
+def _row_edits(ctx: BenchContext, i: int, atomic: bool = False) -> Dict[str, Any]:
+    """A burst of row edits like DatabaseTable sends, as one batch"""
+    return {'json': {'atomic': atomic, 'operations': [
+        {'method': 'PUT', 'path': f"/databases/{ctx.database_id}/rows/{ctx.row_id}",
+         'body': {'properties': {'Name': f'Row {i}.{n}'}}}
+        for n in range(10)
+    ]}}
+
+
+def _migration_database(ctx: BenchContext, i: int, migration: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """A small database of its own, with a schema migration record when one is given"""
+    import schema_migration
+    database = ctx.storage.create_database({
+        'name': f'Migrated {i}', 'workspace_id': ctx.workspace_id, 'created_by': ctx.user['id'],
+        'properties': {'Name': {'type': 'text', 'name': 'Name'}, 'Points': {'type': 'text', 'name': 'Points'}},
+        'views': [], 'rows': [], 'is_deleted': False
+    })
+    for n in range(20):
+        ctx.storage.create_database_row(database['id'], {'properties': {'Name': f'Row {n}', 'Points': str(n)}})
+    if migration is not None:
+        record = schema_migration.new_record([{'op': 'delete', 'property': 'Points'}], 20)
+        ctx.storage.set_database_schema_migration(database['id'], {**record, **migration}, None)
+    return {'path': {'database_id': database['id']}}
+
+
+SCENARIOS: List[Scenario] = [
+    Scenario("GET", "/api/health"),
+    Scenario("GET", "/api/"),
+    Scenario("GET", "/api/test"),
+    Scenario("POST", "/api/auth/register", lambda ctx, i: {
+        'json': {'name': 'Bench', 'email': f"register-{uuid.uuid4().hex}@example.com", 'password': BENCH_PASSWORD}
+    }),
+    Scenario("POST", "/api/auth/login", lambda ctx, i: {
+        'json': {'email': ctx.user['email'], 'password': BENCH_PASSWORD}
+    }),
+    Scenario("GET", "/api/auth/me"),
+    Scenario("POST", "/api/auth/mfa/setup", lambda ctx, i: _as_user(ctx.new_user())),
+    Scenario("POST", "/api/auth/mfa/verify", _mfa_user),
+    Scenario("POST", "/api/auth/mfa/disable", lambda ctx, i: _as_user(ctx.new_user(mfa_enabled=True))),
+    Scenario("GET", "/api/auth/rate-limit-status"),
+    Scenario("GET", "/api/users/"),
+    Scenario("GET", "/api/users/{user_id}"),
+    Scenario("PUT", "/api/users/me", lambda ctx, i: {'json': {'name': f'Bench User {i}'}}),
+    Scenario("POST", "/api/users/change-password", lambda ctx, i: _as_user(
+        ctx.new_user(), json={'current_password': BENCH_PASSWORD, 'new_password': BENCH_PASSWORD}
+    )),
+    Scenario("GET", "/api/workspaces/"),
+    Scenario("GET", "/api/workspaces/{workspace_id}"),
+    Scenario("POST", "/api/workspaces/", lambda ctx, i: {'json': {'name': f'Workspace {i}'}}),
+    Scenario("PUT", "/api/workspaces/{workspace_id}", lambda ctx, i: {'json': {'name': f'Workspace {i}'}}),
+    Scenario("DELETE", "/api/workspaces/{workspace_id}", lambda ctx, i: {'path': {
+        'workspace_id': ctx.storage.create_workspace({
+            'name': 'Doomed', 'icon': '📁', 'owner_id': ctx.user['id'],
+            'members': [{'user_id': ctx.user['id'], 'role': 'owner'}], 'settings': {}
+        })['id']
+    }}),
+    Scenario("POST", "/api/workspaces/{workspace_id}/members/{user_id}", _new_member),
+    Scenario("DELETE", "/api/workspaces/{workspace_id}/members/{user_id}", _existing_member),
+    Scenario("GET", "/api/pages/", lambda ctx, i: {'params': {'workspace_id': ctx.workspace_id}}),
+    Scenario("GET", "/api/pages/", lambda ctx, i: {'params': {
+        'workspace_id': ctx.workspace_id, 'fields': 'id,title,icon,parent_id'
+    }}, variant='fields'),
+    Scenario("GET", "/api/pages/{page_id}"),
+    Scenario("POST", "/api/pages/", lambda ctx, i: {'json': {'title': f'Page {i}', 'workspace_id': ctx.workspace_id}}),
+    Scenario("PUT", "/api/pages/{page_id}", lambda ctx, i: {
+        'json': {'content': [{'id': str(n), 'type': 'text', 'content': f'Block {n}'} for n in range(20)]}
+    }),
+    Scenario("POST", "/api/pages/{page_id}/blocks/{block_id}/move", _block_move),
+    Scenario("DELETE", "/api/pages/{page_id}", lambda ctx, i: {'path': {'page_id': ctx.new_page()['id']}}),
+    Scenario("POST", "/api/pages/{page_id}/permissions/{user_id}", lambda ctx, i: {
+        'path': {'page_id': ctx.new_page()['id'], 'user_id': ctx.new_user()['id']},
+        'params': {'permission': 'editor'}
+    }),
+    Scenario("DELETE", "/api/pages/{page_id}/permissions/{user_id}", _granted_permission),
+    Scenario("GET", "/api/databases/", lambda ctx, i: {'params': {'workspace_id': ctx.workspace_id}}),
+    Scenario("GET", "/api/databases/", lambda ctx, i: {'params': {
+        'workspace_id': ctx.workspace_id, 'fields': 'id,name'
+    }}, variant='fields'),
+    Scenario("GET", "/api/databases/{database_id}"),
+    Scenario("POST", "/api/databases/", lambda ctx, i: {
+        'json': {'name': f'Database {i}', 'workspace_id': ctx.workspace_id, 'properties': {'Name': {'type': 'text'}}}
+    }),
+    Scenario("PUT", "/api/databases/{database_id}", lambda ctx, i: {'json': {'name': f'Database {i}'}}),
+    Scenario("DELETE", "/api/databases/{database_id}", lambda ctx, i: {'path': {
+        'database_id': ctx.storage.create_database({
+            'name': 'Doomed', 'workspace_id': ctx.workspace_id, 'created_by': ctx.user['id'],
+            'properties': {}, 'views': [], 'rows': [], 'is_deleted': False
+        })['id']
+    }}),
+    Scenario("POST", "/api/databases/{database_id}/schema-migration", lambda ctx, i: {
+        **_migration_database(ctx, i),
+        'json': {'operations': [
+            {'op': 'rename', 'property': 'Name', 'to': 'Title', 'name': 'Title'},
+            {'op': 'change_type', 'property': 'Points', 'type': 'number'}
+        ]}
+    }),
+    Scenario("GET", "/api/databases/{database_id}/schema-migration", lambda ctx, i: _migration_database(
+        ctx, i, {'status': 'done', 'processed': 20, 'finished_at': datetime.utcnow().isoformat()}
+    )),
+    Scenario("POST", "/api/databases/{database_id}/schema-migration/resume", lambda ctx, i: _migration_database(
+        ctx, i, {'status': 'failed', 'error': 'Interrupted'}
+    )),
+    Scenario("GET", "/api/databases/{database_id}/rows"),
+    Scenario("GET", "/api/databases/{database_id}/rows", lambda ctx, i: {'params': {
+        'filter': 'Score:gte:100', 'sort': ['-Score', 'Name']
+    }}, variant='query'),
+    Scenario("GET", "/api/databases/{database_id}/aggregate", lambda ctx, i: {'params': {
+        'aggregate': ['count', 'sum:Points', 'avg:Points', 'max:Points']
+    }}),
+    Scenario("GET", "/api/databases/{database_id}/aggregate", lambda ctx, i: {'params': {
+        'group_by': 'Score', 'aggregate': ['count', 'sum:Points'], 'filter': 'Points:gte:100'
+    }}, variant='formula'),
+    Scenario("GET", "/api/databases/{database_id}/board", lambda ctx, i: {'params': {'group_by': 'Status'}}),
+    Scenario("GET", "/api/databases/{database_id}/calendar", lambda ctx, i: {'params': {
+        'date_by': 'Due Date', 'start': '2024-02-01', 'end': '2024-02-29'
+    }}),
+    Scenario("POST", "/api/databases/{database_id}/rows/{row_id}/move", lambda ctx, i: {
+        'json': {'group_by': 'Status', 'group': BENCH_STATUSES[i % len(BENCH_STATUSES)]}
+    }),
+    Scenario("POST", "/api/databases/{database_id}/rows/{row_id}/move", lambda ctx, i: {'json': {}}, variant='table'),
+    Scenario("POST", "/api/databases/{database_id}/rows", lambda ctx, i: {
+        'json': {'database_id': ctx.database_id, 'properties': {'Name': f'Row {i}'}}
+    }),
+    Scenario("PUT", "/api/databases/{database_id}/rows/{row_id}", lambda ctx, i: {
+        'json': {'properties': {'Name': f'Row {i}'}}
+    }),
+    Scenario("DELETE", "/api/databases/{database_id}/rows/{row_id}", _new_row),
+    Scenario("GET", "/api/trash/"),
+    Scenario("POST", "/api/trash/{item_id}/restore", _deleted_page),
+    Scenario("DELETE", "/api/trash/{item_id}", _deleted_page),
+    Scenario("POST", "/api/trash/empty", lambda ctx, i: {'params': {'workspace_id': ctx.workspace_id}}),
+    Scenario("GET", "/api/bootstrap/"),
+    Scenario("POST", "/api/batch/", _row_edits),
+    Scenario("POST", "/api/batch/", lambda ctx, i: _row_edits(ctx, i, atomic=True), variant='atomic'),
+    Scenario("GET", "/metrics"),
+    Scenario("GET", "/api/ready"),
+    Scenario("GET", "/api/admin/slow-queries"),
+    Scenario("DELETE", "/api/admin/slow-queries"),
+]
+
+
+def seed(storage: Storage, pages: int = 200, rows: int = 500) -> BenchContext:
+    """Seed one user, workspace, page tree and database for the scenarios"""
+    from auth import get_password_hash, create_access_token
+
+    hashed_password = get_password_hash(BENCH_PASSWORD)
+    user = storage.create_user({
+        'name': 'Bench Owner',
+        'email': f"owner-{uuid.uuid4().hex}@example.com",
+        'hashed_password': hashed_password,
+        'is_active': True,
+        'is_verified': True
+    })
+    workspace = storage.create_workspace({
+        'name': 'Bench Workspace',
+        'icon': '📁',
+        'description': None,
+        'owner_id': user['id'],
+        'members': [{'user_id': user['id'], 'role': 'owner'}],
+        'settings': {}
+    })
+    page_ids: List[str] = []
+    for n in range(pages):
+        page = storage.create_page({
+            'title': f'Page {n}',
+            'icon': '📄',
+            'workspace_id': workspace['id'],
+            'parent_id': page_ids[(n - 1) // 4] if n else None,
+            'created_by': user['id'],
+            'content': [{'id': str(b), 'type': 'text', 'content': f'Block {b}'} for b in range(10)],
+            'permissions': [],
+            'is_deleted': False
+        })
+        page_ids.append(page['id'])
+    database = storage.create_database({
+        'name': 'Bench Database',
+        'workspace_id': workspace['id'],
+        'created_by': user['id'],
+        'properties': {
+            'Name': {'type': 'text'}, 'Points': {'type': 'number'},
+            'Score': {'type': 'formula', 'name': 'Score', 'formula': 'round(prop("Points") / 5) * 10'},
+            'Status': {'type': 'select', 'name': 'Status', 'options': [
+                {'id': status, 'name': status.title()} for status in BENCH_STATUSES
+            ]},
+            'Due Date': {'type': 'date', 'name': 'Due Date'},
+        },
+        'views': [{'type': 'table'}],
+        'rows': [],
+        'is_deleted': False
+    })
+    row_id = None
+    for n in range(rows):
+        row_id = storage.create_database_row(database['id'], {'properties': {
+            'Name': f'Row {n}', 'Points': n, 'Status': BENCH_STATUSES[n % len(BENCH_STATUSES)],
+            'Due Date': (BENCH_DATE + timedelta(days=n % 120)).date().isoformat()
+        }})['id']
+
+    return BenchContext(
+        storage=storage,
+        hashed_password=hashed_password,
+        user=user,
+        token=create_access_token(data={"sub": user['id']}),
+        workspace_id=workspace['id'],
+        page_id=page_ids[0],
+        database_id=database['id'],
+        row_id=row_id
+    )
+
+
+def seed_dataset(storage: Storage, preset: str, seed: Optional[int] = None) -> BenchContext:
+    """Seed a synthetic dataset preset (see benchmarks.dataset) for the scenarios"""
+    from auth import get_password_hash, create_access_token
+    from benchmarks.dataset import PRESETS, generate
+
+    spec = PRESETS[preset] if seed is None else replace(PRESETS[preset], seed=seed)
+    hashed_password = get_password_hash(BENCH_PASSWORD)
+    summary = generate(storage, spec, hashed_password=hashed_password)
+    user = storage.get_user_by_id(summary.owner['id'])
+
+    return BenchContext(
+        storage=storage,
+        hashed_password=hashed_password,
+        user=user,
+        token=create_access_token(data={"sub": user['id']}),
+        workspace_id=summary.workspace_ids[0],
+        page_id=summary.page_ids[0],
+        database_id=summary.database_ids[0],
+        row_id=summary.row_id
+    )
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Linear-interpolated percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = (len(sorted_values) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
+
+
+def summarize(latencies: List[float], statuses: Dict[int, int], elapsed: float,
+              sizes: Optional[List[int]] = None) -> Dict[str, Any]:
+    ordered = sorted(latencies)
+    errors = sum(count for code, count in statuses.items() if code >= 400)
+    return {
+        'count': len(ordered),
+        'mean_bytes': round(sum(sizes) / len(sizes)) if sizes else 0,
+        'errors': errors,
+        'statuses': {str(code): count for code, count in sorted(statuses.items())},
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 3) if ordered else 0.0,
+        'p50_ms': round(percentile(ordered, 50) * 1000, 3),
+        'p95_ms': round(percentile(ordered, 95) * 1000, 3),
+        'p99_ms': round(percentile(ordered, 99) * 1000, 3),
+        'max_ms': round(ordered[-1] * 1000, 3) if ordered else 0.0,
+        'rps': round(len(ordered) / elapsed, 2) if elapsed else 0.0,
+        'samples_ms': [round(value * 1000, 3) for value in latencies],
+    }
+
+
+async def run_scenario(client: httpx.AsyncClient, ctx: BenchContext, scenario: Scenario,
+                       requests: int, concurrency: int, warmup: int) -> Dict[str, Any]:
+    for i in range(warmup):
+        await client.request(**scenario.request(ctx, -1 - i))
+
+    # Requests are prepared up front so setup work stays out of the timings
+    prepared = [scenario.request(ctx, i) for i in range(requests)]
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    sizes: List[int] = []
+    queue = iter(prepared)
+
+    async def worker():
+        for spec in queue:
+            started = time.perf_counter()
+            response = await client.request(**spec)
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            sizes.append(len(response.content))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, statuses, time.perf_counter() - started, sizes)
+
+
+def uncovered_routes(app, scenarios: List[Scenario]) -> List[str]:
+    """Routes registered on the app that no scenario exercises"""
+    covered = {scenario.route for scenario in scenarios}
+    routes = {
+        f"{method} {route.path}"
+        for route in app.routes if isinstance(route, APIRoute)
+        for method in route.methods
+    }
+    return sorted(routes - covered)
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args) -> Dict[str, Any]:
+    os.environ['STORAGE_BACKEND'] = args.storage
+    storage = create_storage(args.storage)
+    set_storage(storage)
+
+    # Overrides .env; a profiling log line per request would skew timings
+    os.environ['PROFILE_SAMPLE_RATE'] = str(args.profile_sample_rate)
+    from server import app
+    from lifecycle import warm_up
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    # ASGITransport doesn't run the lifespan; warm pools (and migrate, if AUTO_MIGRATE) here
+    await warm_up()
+
+    if args.preset:
+        ctx = seed_dataset(storage, args.preset, args.seed)
+    else:
+        ctx = seed(storage, pages=args.pages, rows=args.rows)
+    # Admin routes run as the seeded owner
+    os.environ['ADMIN_EMAILS'] = ctx.user['email']
+    selected = [s for s in SCENARIOS if not args.route or any(f in s.name for f in args.route)]
+
+    results: Dict[str, Any] = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for scenario in selected:
+            results[scenario.name] = await run_scenario(
+                client, ctx, scenario, args.requests, args.concurrency, args.warmup
+            )
+            print(f"{scenario.name:<60} p50 {results[scenario.name]['p50_ms']:>9.3f}ms  "
+                  f"p99 {results[scenario.name]['p99_ms']:>9.3f}ms  "
+                  f"{results[scenario.name]['rps']:>9.1f} req/s", file=sys.stderr)
+
+    return {
+        'meta': {
+            'commit': git_commit(),
+            'storage': args.storage,
+            'concurrency': args.concurrency,
+            'requests': args.requests,
+            'warmup': args.warmup,
+            'dataset': (
+                {'preset': args.preset, 'seed': args.seed} if args.preset
+                else {'pages': args.pages, 'rows': args.rows}
+            ),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': datetime.utcnow().isoformat(),
+            'uncovered_routes': uncovered_routes(app, SCENARIOS),
+        },
+        'routes': results,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--storage', default='memory', choices=['memory', 'mongo', 'postgres'],
+                        help='storage backend to seed and benchmark (mongo/postgres write to the configured database)')
+    parser.add_argument('--concurrency', type=int, default=8, help='concurrent in-flight requests per route')
+    parser.add_argument('--requests', type=int, default=200, help='timed requests per route')
+    parser.add_argument('--warmup', type=int, default=5, help='untimed requests per route before measuring')
+    parser.add_argument('--pages', type=int, default=200, help='pages to seed')
+    parser.add_argument('--rows', type=int, default=500, help='database rows to seed')
+    parser.add_argument('--preset', help='seed a benchmarks.dataset preset (tiny/small/medium/large) instead')
+    parser.add_argument('--seed', type=int, help='RNG seed for --preset')
+    parser.add_argument('--profile-sample-rate', type=float, default=0.0,
+                        help='fraction of requests to profile (see profiling.py)')
+    parser.add_argument('--route', action='append', help='only run routes whose name contains this text (repeatable)')
+    parser.add_argument('--output', help='write JSON results here instead of stdout')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    result = asyncio.run(run(args))
+    payload = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(payload + '\n')
+    else:
+        print(payload)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""Measure cold-start time: module import breakdown plus app startup.
+
+Runs a fresh interpreter with ``-X importtime`` that imports ``server`` and
+drives the app's lifespan until the storage reports ready, then prints the
+slowest modules and per-package totals::
+
+    python -m benchmarks.startup --storage mongo --top 25
+    python -m benchmarks.startup --output startup.json
+
+Self time is time spent in a module's own body; cumulative time includes
+everything it imported first.
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from typing import Any, Dict, List
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Executed in the child interpreter; prints phase timings as JSON on stdout
+CHILD_SCRIPT = """
+import asyncio, json, time
+started = time.perf_counter()
+import server
+imported = time.perf_counter()
+
+async def boot():
+    from lifecycle import readiness
+    async with server.app.router.lifespan_context(server.app):
+        serving = time.perf_counter()
+        deadline = serving + {timeout}
+        while not readiness.ready and time.perf_counter() < deadline:
+            await asyncio.sleep(0.005)
+        return serving, time.perf_counter() if readiness.ready else None
+
+serving, ready = asyncio.run(boot())
+print(json.dumps({{
+    'import_ms': (imported - started) * 1000,
+    'serving_ms': (serving - started) * 1000,
+    'ready_ms': (ready - started) * 1000 if ready else None,
+}}))
+"""
+
+IMPORT_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def parse_importtime(stderr: str) -> List[Dict[str, Any]]:
+    modules = []
+    for line in stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules.append({
+                'module': name,
+                'self_ms': int(self_us) / 1000,
+                'cumulative_ms': int(cumulative_us) / 1000,
+                'depth': len(indent) // 2,
+            })
+    return modules
+
+
+def package_totals(modules: List[Dict[str, Any]]) -> Dict[str, float]:
+    """Self time summed per top-level package"""
+    totals: Dict[str, float] = {}
+    for module in modules:
+        package = module['module'].split('.')[0]
+        totals[package] = totals.get(package, 0.0) + module['self_ms']
+    return dict(sorted(totals.items(), key=lambda item: item[1], reverse=True))
+
+
+def measure(storage: str, timeout: float) -> Dict[str, Any]:
+    env = {**os.environ, 'STORAGE_BACKEND': storage, 'PROFILE_SAMPLE_RATE': '0'}
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', CHILD_SCRIPT.format(timeout=timeout)],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Startup failed:\n{result.stderr[-4000:]}")
+    modules = parse_importtime(result.stderr)
+    return {
+        'storage': storage,
+        'phases': json.loads(result.stdout.strip().splitlines()[-1]),
+        'modules': modules,
+        'packages': package_totals(modules),
+    }
+
+
+def render(report: Dict[str, Any], top: int) -> str:
+    phases = report['phases']
+    ready = f"{phases['ready_ms']:.1f}ms" if phases['ready_ms'] is not None else 'not ready (timed out)'
+    lines = [
+        f"Storage: {report['storage']}",
+        f"Import server: {phases['import_ms']:.1f}ms   serving: {phases['serving_ms']:.1f}ms   ready: {ready}",
+        '',
+        f"{'package':<30} {'self ms':>10}",
+    ]
+    for package, total in list(report['packages'].items())[:top]:
+        lines.append(f"{package:<30} {total:>10.1f}")
+    lines += ['', f"{'module':<50} {'self ms':>10} {'cumul ms':>10}"]
+    for module in sorted(report['modules'], key=lambda m: m['cumulative_ms'], reverse=True)[:top]:
+        lines.append(f"{module['module']:<50} {module['self_ms']:>10.1f} {module['cumulative_ms']:>10.1f}")
+    return '\n'.join(lines)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--storage', default=os.environ.get('STORAGE_BACKEND', 'memory'),
+                        choices=['memory', 'mongo', 'postgres'])
+    parser.add_argument('--top', type=int, default=25, help='rows to show per table')
+    parser.add_argument('--timeout', type=float, default=10.0, help='seconds to wait for readiness')
+    parser.add_argument('--output', help='also write the full report as JSON')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = measure(args.storage, args.timeout)
+    print(render(report, args.top))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,317 @@
+"""Live editing of pages over WebSockets: block operations, cursors and presence.
+
+Editors of a page connect to ``/api/pages/{id}/live``, offering the
+subprotocols ``["bearer", <access token>]`` (see auth.WEBSOCKET_PROTOCOL).
+Each frame the client sends is one JSON message:
+
+- ``{"type": "op", "op": {...}}``: a block operation, relayed as it is to
+  the page's other editors
+- ``{"type": "cursor", "block_id": ..., "position": ...}``: where the
+  editor's cursor is; ``block_id`` null when it leaves the page's blocks
+
+Each frame the server sends is a JSON list of messages: ``presence`` (who is
+there, on connecting), ``join`` and ``leave``, ``op`` and ``cursors`` (the
+latest cursor of each editor that moved, null once it left). Messages from
+editors carry their ``connection_id``, since one person may have several
+tabs open. The REST routes that write pages send ``op``, ``saved`` and
+``deleted`` messages too, so editors see changes made outside the socket;
+``deleted`` is the last message, after which the connection is closed. Messages
+go through the page's pub/sub channel (see pubsub), so editors connected
+to different workers see each other.
+
+``/api/databases/{id}/live`` and ``/api/workspaces/{id}/live`` are feeds of
+the events published on those channels (rows, schema, pages and members
+changed); clients only listen to them. Page and database connections are
+closed with 1008 once the user is removed from the workspace or it is
+deleted, on whichever worker they are.
+
+Cursors move far more often than anything else changes, so they are
+coalesced: each connection keeps only the latest cursor of every other
+editor and sends them at most every ``COLLAB_CURSOR_INTERVAL_MS``, along
+with whatever else is queued. Other messages are sent as soon as the
+connection is free, batched with those queued while it was busy.
+
+Operations can't be dropped without editors falling out of step, so a
+client that doesn't keep up is disconnected instead: when more than
+``COLLAB_SEND_QUEUE_LIMIT`` messages are waiting for it, or when a frame
+takes longer than ``COLLAB_SEND_TIMEOUT_MS`` to send, it is closed with
+1013 (try again later) and reloads the page when it reconnects. Slow
+clients cost the hub a bounded queue each, never a stalled broadcast.
+"""
+import asyncio
+import json
+import os
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi import WebSocket, status
+
+from metrics import COLLAB_CONNECTIONS, COLLAB_DISCONNECTS, COLLAB_MESSAGES
+from pubsub import get_broker, page_channel
+
+CURSOR_INTERVAL = float(os.environ.get('COLLAB_CURSOR_INTERVAL_MS', '50')) / 1000
+SEND_QUEUE_LIMIT = int(os.environ.get('COLLAB_SEND_QUEUE_LIMIT', '500'))
+SEND_TIMEOUT = float(os.environ.get('COLLAB_SEND_TIMEOUT_MS', '5000')) / 1000
+MAX_MESSAGE_BYTES = 64 * 1024
+# What other editors see of a user
+USER_FIELDS = ('id', 'name', 'avatar', 'color')
+
+
+class Connection:
+    """One editor's socket and the messages waiting to be sent to it"""
+
+    def __init__(self, websocket: WebSocket, user: Dict[str, Any]):
+        self.id = uuid.uuid4().hex
+        self.websocket = websocket
+        self.user = {field: user.get(field) for field in USER_FIELDS}
+        self._pending: List[Dict[str, Any]] = []
+        # Latest cursor by connection id, replaced as the editors move
+        self._cursors: Dict[str, Optional[Dict[str, Any]]] = {}
+        self._cursors_sent = 0.0
+        # Set by anything to send, and by messages that shouldn't wait for the cursor interval
+        self._wake = asyncio.Event()
+        self._urgent = asyncio.Event()
+        self.close_code: Optional[int] = None
+        self.close_reason = ''
+
+    def send(self, message: Dict[str, Any]):
+        """Queue a message; a client too far behind is disconnected"""
+        if self.close_code is not None:
+            return
+        if len(self._pending) >= SEND_QUEUE_LIMIT:
+            self.close(status.WS_1013_TRY_AGAIN_LATER, "Too far behind; reload the page", 'backlog')
+            return
+        self._pending.append(message)
+        self._urgent.set()
+        self._wake.set()
+
+    def send_cursor(self, connection_id: str, cursor: Optional[Dict[str, Any]]):
+        """Queue another editor's cursor, replacing the one queued before"""
+        if self.close_code is None:
+            self._cursors[connection_id] = cursor
+            self._wake.set()
+
+    def close(self, code: int, reason: str, cause: str):
+        if self.close_code is None:
+            self.close_code, self.close_reason = code, reason
+            COLLAB_DISCONNECTS.labels(reason=cause).inc()
+            self._urgent.set()
+            self._wake.set()
+
+    def _take(self) -> List[Dict[str, Any]]:
+        frame, self._pending = self._pending, []
+        if self._cursors:
+            frame.append({'type': 'cursors', 'cursors': self._cursors})
+            self._cursors = {}
+            self._cursors_sent = asyncio.get_running_loop().time()
+        return frame
+
+    async def run_sender(self):
+        """Send queued messages until the connection is closed, then close the socket"""
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            delay = self._cursors_sent + CURSOR_INTERVAL - loop.time()
+            if self.close_code is None and not self._pending and delay > 0:
+                # Only cursors: let them coalesce, unless something else comes up meanwhile
+                self._urgent.clear()
+                try:
+                    await asyncio.wait_for(self._urgent.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+            # What is queued still goes out on a normal close, but not to a client being dropped
+            if self.close_code not in (None, status.WS_1000_NORMAL_CLOSURE):
+                break
+            self._urgent.clear()
+            frame = self._take()
+            if frame:
+                try:
+                    await asyncio.wait_for(self.websocket.send_text(json.dumps(frame, default=str)), SEND_TIMEOUT)
+                except asyncio.TimeoutError:
+                    self.close(status.WS_1013_TRY_AGAIN_LATER, "Too slow to keep up; reload the page", 'slow')
+                except Exception:
+                    # The client went away; the receiving side notices and leaves
+                    return
+            if self.close_code is not None:
+                break
+        try:
+            await self.websocket.close(code=self.close_code, reason=self.close_reason)
+        except Exception:
+            pass
+
+
+async def _receive_until_closed(connection: Connection, handle: Callable[[Optional[str]], None]):
+    """Pass the client's messages to `handle` until either side closes, then stop the sender"""
+    sender = asyncio.create_task(connection.run_sender())
+    try:
+        while connection.close_code is None:
+            received = await connection.websocket.receive()
+            if received['type'] == 'websocket.disconnect':
+                break
+            handle(received.get('text'))
+    finally:
+        if connection.close_code is None:
+            sender.cancel()
+        await asyncio.gather(sender, return_exceptions=True)
+
+
+async def follow(channel: str, connection: Connection, ends: Callable[[Dict[str, Any]], bool] = lambda message: False):
+    """Send an accepted connection the messages published on `channel` until it
+    closes, or until a message for which `ends` is true has been sent"""
+    def deliver(message: Dict[str, Any]):
+        connection.send(message)
+        if ends(message):
+            connection.close(status.WS_1000_NORMAL_CLOSURE, "The feed has ended", 'ended')
+
+    unsubscribe = await get_broker().subscribe(channel, deliver)
+    try:
+        # The client only listens; whatever it sends is ignored
+        await _receive_until_closed(connection, lambda text: None)
+    finally:
+        unsubscribe()
+
+
+def loses_access(user_id: str) -> Callable[[Dict[str, Any]], bool]:
+    """Whether a message of a workspace's channel ends the user's access to it:
+    the workspace deleted, or the user removed from it"""
+    return lambda message: (
+        message['type'] == 'workspace' and message['action'] == 'deleted'
+        or message['type'] == 'member' and message['action'] == 'removed' and message['member_id'] == user_id
+    )
+
+
+async def close_when(channel: str, connection: Connection,
+                     revokes: Callable[[Dict[str, Any]], bool]) -> Callable[[], None]:
+    """Close a connection with 1008 once a message for which `revokes` is true
+    is published on `channel`; returns the function unsubscribing"""
+    def check(message: Dict[str, Any]):
+        if revokes(message):
+            connection.close(status.WS_1008_POLICY_VIOLATION, "Access to the workspace was removed", 'revoked')
+
+    return await get_broker().subscribe(channel, check)
+
+
+class CollaborationHub:
+    """The editors of each page connected to this process.
+
+    Messages go through the page's pub/sub channel, so they reach editors
+    connected to other workers too. An editor joining on another worker
+    only knows who is connected there, so each editor here answers its
+    `join` with a `here`, which its new peer sees as a join.
+    """
+
+    def __init__(self):
+        self.pages: Dict[str, Dict[str, Connection]] = {}
+        # Latest cursor of each editor here by connection id, shown to editors joining
+        self.cursors: Dict[str, Dict[str, Dict[str, Any]]] = {}
+
+    def editors(self, page_id: str) -> List[Dict[str, Any]]:
+        return [
+            {'connection_id': connection.id, 'user': connection.user}
+            for connection in self.pages.get(page_id, {}).values()
+        ]
+
+    def publish(self, page_id: str, message: Dict[str, Any], coalesce: Optional[str] = None):
+        """Send a message to the page's editors on every worker, but not to the
+        editor whose `connection_id` it carries"""
+        get_broker().publish(page_channel(page_id), message, coalesce)
+
+    def _deliver(self, page_id: str, connection: Connection, message: Dict[str, Any]):
+        sender = message.get('connection_id')
+        if sender == connection.id:
+            return
+        kind = message['type']
+        if kind == 'cursor':
+            connection.send_cursor(sender, message['cursor'])
+        elif kind == 'here':
+            if message['to'] == connection.id:
+                connection.send({'type': 'join', 'connection_id': sender, 'user': message['user']})
+                if message['cursor'] is not None:
+                    connection.send_cursor(sender, message['cursor'])
+        else:
+            if kind == 'leave':
+                connection.send_cursor(sender, None)
+            elif kind == 'join' and sender not in self.pages.get(page_id, {}):
+                self.publish(page_id, {
+                    'type': 'here', 'connection_id': connection.id, 'user': connection.user,
+                    'cursor': self.cursors.get(page_id, {}).get(connection.id), 'to': sender
+                })
+            connection.send(message)
+            if kind == 'deleted':
+                connection.close(status.WS_1000_NORMAL_CLOSURE, "The page was deleted", 'ended')
+
+    async def join(self, page_id: str, connection: Connection) -> Callable[[], None]:
+        """Add an editor to the page; returns the function unsubscribing it"""
+        unsubscribe = await get_broker().subscribe(
+            page_channel(page_id), lambda message: self._deliver(page_id, connection, message)
+        )
+        connection.send({
+            'type': 'presence',
+            'connection_id': connection.id,
+            'editors': self.editors(page_id),
+            'cursors': dict(self.cursors.get(page_id, {})),
+        })
+        self.pages.setdefault(page_id, {})[connection.id] = connection
+        COLLAB_CONNECTIONS.inc()
+        self.publish(page_id, {'type': 'join', 'connection_id': connection.id, 'user': connection.user})
+        return unsubscribe
+
+    def leave(self, page_id: str, connection: Connection):
+        connections = self.pages.get(page_id, {})
+        if connections.pop(connection.id, None) is None:
+            return
+        COLLAB_CONNECTIONS.dec()
+        self.cursors.get(page_id, {}).pop(connection.id, None)
+        if not connections:
+            self.pages.pop(page_id, None)
+            self.cursors.pop(page_id, None)
+        self.publish(page_id, {'type': 'leave', 'connection_id': connection.id})
+
+    def move_cursor(self, page_id: str, connection: Connection, block_id: Optional[str], position: Any):
+        cursors = self.cursors.setdefault(page_id, {})
+        if block_id is None:
+            cursor = None
+            cursors.pop(connection.id, None)
+        else:
+            cursor = {'user_id': connection.user['id'], 'block_id': block_id, 'position': position}
+            cursors[connection.id] = cursor
+        self.publish(page_id, {'type': 'cursor', 'connection_id': connection.id, 'cursor': cursor},
+                     coalesce=f"cursor:{connection.id}")
+
+    def _handle(self, page_id: str, connection: Connection, text: Optional[str]):
+        if text is None:
+            connection.close(status.WS_1003_UNSUPPORTED_DATA, "Messages are JSON text", 'invalid')
+            return
+        if len(text) > MAX_MESSAGE_BYTES:
+            connection.close(status.WS_1009_MESSAGE_TOO_BIG, "Message too big", 'too_big')
+            return
+        try:
+            message = json.loads(text)
+        except ValueError:
+            message = None
+        kind = message.get('type') if isinstance(message, dict) else None
+        if kind == 'op' and isinstance(message.get('op'), dict):
+            self.publish(page_id, {
+                'type': 'op', 'connection_id': connection.id, 'user_id': connection.user['id'], 'op': message['op']
+            })
+        elif kind == 'cursor':
+            block_id = message.get('block_id')
+            self.move_cursor(page_id, connection, block_id if isinstance(block_id, str) else None,
+                             message.get('position'))
+        else:
+            connection.close(status.WS_1003_UNSUPPORTED_DATA, "Unknown message", 'invalid')
+            return
+        COLLAB_MESSAGES.labels(type=kind).inc()
+
+    async def serve(self, page_id: str, connection: Connection):
+        """Relay an accepted connection's messages until it closes"""
+        unsubscribe = await self.join(page_id, connection)
+        try:
+            await _receive_until_closed(connection, lambda text: self._handle(page_id, connection, text))
+        finally:
+            unsubscribe()
+            self.leave(page_id, connection)
+
+
+hub = CollaborationHub()
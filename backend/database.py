@@ -1,13 +1,21 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, ReplaceOne, ReturnDocument, UpdateOne, monitoring
 from pymongo.collection import Collection
 from pymongo.database import Database
 from datetime import datetime, timedelta
 import uuid
 import os
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from pathlib import Path
 from dotenv import load_dotenv
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 from pydantic import BaseModel, Field
+
+import profiling
+import metrics
+import date_index
+import order_keys
+import slow_queries
 from bson import ObjectId
 from datetime import datetime
 
@@ -16,7 +24,64 @@ load_dotenv(ROOT_DIR / '.env')
 
 # Database configuration
 MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017/notion_clone')
-client = MongoClient(MONGO_URL)
+
+# Driver events feeding profiling, metrics and the slow-query log
+class CommandMonitor(monitoring.CommandListener):
+    def started(self, event):
+        slow_queries.mongo_command_tracker.started(event)
+
+    def succeeded(self, event):
+        self._finished(event)
+
+    def failed(self, event):
+        self._finished(event)
+
+    def _finished(self, event):
+        profiling.record('db', event.duration_micros / 1_000_000)
+        slow_queries.mongo_command_tracker.finished(event)
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    def connection_checked_out(self, event):
+        metrics.connection_checked_out('pymongo')
+
+    def connection_checked_in(self, event):
+        metrics.connection_checked_in('pymongo')
+
+    # Remaining pool events are not tracked
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        pass
+
+# connect=False: no sockets or monitor threads until first use, so importing
+# is instant and safe before gunicorn forks workers
+client = MongoClient(
+    MONGO_URL,
+    connect=False,
+    event_listeners=[CommandMonitor(), PoolMonitor()]
+)
 db = client.get_default_database()
 
 # Helper function to convert ObjectId to string
@@ -136,6 +201,7 @@ login_attempts_collection = db.login_attempts
 workspaces_collection = db.workspaces
 pages_collection = db.pages
 databases_collection = db.databases
+database_rows_collection = db.database_rows
 
 # Helper functions for database operations
 def get_user_by_email(email: str) -> Optional[Dict[str, Any]]:
@@ -148,6 +214,12 @@ def get_user_by_id(user_id: str) -> Optional[Dict[str, Any]]:
     user = users_collection.find_one({"id": user_id})
     return serialize_doc(user)
 
+def get_users_by_ids(user_ids: List[str]) -> List[Dict[str, Any]]:
+    """Get the users with these IDs in one query"""
+    if not user_ids:
+        return []
+    return [serialize_doc(user) for user in users_collection.find({"id": {"$in": list(set(user_ids))}})]
+
 def create_user(user_data: Dict[str, Any]) -> Dict[str, Any]:
     """Create a new user"""
     user_data['id'] = str(uuid.uuid4())
@@ -202,7 +274,14 @@ def delete_workspace(workspace_id: str) -> bool:
     result = workspaces_collection.delete_one({"id": workspace_id})
     return result.deleted_count > 0
 
-def get_workspace_pages(workspace_id: str, parent_id: Optional[str] = None) -> List[Dict[str, Any]]:
+def _projection(fields: Optional[List[str]]) -> Optional[Dict[str, int]]:
+    """Mongo projection returning only 'id' and `fields` (everything when None)"""
+    if fields is None:
+        return None
+    return {"_id": 0, "id": 1, **{field: 1 for field in fields}}
+
+def get_workspace_pages(workspace_id: str, parent_id: Optional[str] = None,
+                        fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
     """Get pages in workspace"""
     query = {"workspace_id": workspace_id, "is_deleted": False}
     if parent_id:
@@ -210,7 +289,15 @@ def get_workspace_pages(workspace_id: str, parent_id: Optional[str] = None) -> L
     else:
         query["parent_id"] = None
     
-    pages = pages_collection.find(query)
+    pages = pages_collection.find(query, _projection(fields)).sort("created_at", 1)
+    return [serialize_doc(page) for page in pages]
+
+def get_workspace_page_tree(workspace_id: str, fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """Get every live page in workspace, grouped by parent (the order of workspace_parent_live)"""
+    pages = pages_collection.find(
+        {"workspace_id": workspace_id, "is_deleted": False},
+        _projection(fields)
+    ).sort([("parent_id", 1), ("created_at", 1)])
     return [serialize_doc(page) for page in pages]
 
 def get_page_by_id(page_id: str) -> Optional[Dict[str, Any]]:
@@ -220,6 +307,7 @@ def get_page_by_id(page_id: str) -> Optional[Dict[str, Any]]:
 
 def create_page(page_data: Dict[str, Any]) -> Dict[str, Any]:
     """Create a new page"""
+    page_data['content'] = order_keys.assign_keys(page_data.get('content') or [])
     page_data['id'] = str(uuid.uuid4())
     page_data['created_at'] = datetime.utcnow()
     result = pages_collection.insert_one(page_data)
@@ -228,6 +316,8 @@ def create_page(page_data: Dict[str, Any]) -> Dict[str, Any]:
 
 def update_page(page_id: str, update_data: Dict[str, Any]) -> bool:
     """Update page data"""
+    if update_data.get('content') is not None:
+        update_data['content'] = order_keys.assign_keys(update_data['content'])
     update_data['updated_at'] = datetime.utcnow()
     result = pages_collection.update_one(
         {"id": page_id},
@@ -235,6 +325,21 @@ def update_page(page_id: str, update_data: Dict[str, Any]) -> bool:
     )
     return result.modified_count > 0
 
+def set_page_block_orders(page_id: str, orders: Dict[str, Tuple[Optional[str], str]]) -> int:
+    """Compare-and-set block order keys, then re-sort the content array by key, in one round trip"""
+    if not orders:
+        return 0
+    updates = [
+        UpdateOne(
+            {"id": page_id, "content": {"$elemMatch": {"id": block_id, "order": expected}}},
+            {"$set": {"content.$.order": order, "updated_at": datetime.utcnow()}}
+        )
+        for block_id, (expected, order) in orders.items()
+    ]
+    updates.append(UpdateOne({"id": page_id}, {"$push": {"content": {"$each": [], "$sort": {"order": 1}}}}))
+    result = pages_collection.bulk_write(updates)
+    return result.matched_count - 1 if result.matched_count else 0
+
 def delete_page(page_id: str, user_id: str) -> bool:
     """Soft delete a page"""
     result = pages_collection.update_one(
@@ -248,36 +353,106 @@ def delete_page(page_id: str, user_id: str) -> bool:
     )
     return result.modified_count > 0
 
-def get_workspace_databases(workspace_id: str) -> List[Dict[str, Any]]:
+# Row fields left out of row dicts: the date index is for queries only
+ROW_PROJECTION = {"_id": 0, "database_id": 0, "dates": 0}
+
+def _attach_rows(databases: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Attach rows from the rows collection to serialized databases"""
+    if not databases:
+        return databases
+    rows_by_database: Dict[str, List[Dict[str, Any]]] = {database['id']: [] for database in databases}
+    rows = database_rows_collection.find(
+        {"database_id": {"$in": list(rows_by_database)}},
+        {"_id": 0, "dates": 0}
+    ).sort([("order", 1), ("id", 1)])
+    for row in rows:
+        rows_by_database[row.pop('database_id')].append(serialize_doc(row))
+    for database in databases:
+        database['rows'] = rows_by_database[database['id']]
+    return databases
+
+def _replace_rows(database_id: str, rows: List[Dict[str, Any]]):
+    """Replace every row of a database"""
+    database_rows_collection.delete_many({"database_id": database_id})
+    documents = [
+        {
+            'id': row.get('id') or str(uuid.uuid4()),
+            'database_id': database_id,
+            'properties': row.get('properties', {}),
+            'order': row['order'],
+            'dates': date_index.entries(row.get('properties')),
+            'created_at': row.get('created_at') or datetime.utcnow().isoformat(),
+            'updated_at': row.get('updated_at'),
+            **({'computed': row['computed']} if row.get('computed') else {})
+        }
+        for row in order_keys.assign_keys(rows)
+    ]
+    if documents:
+        database_rows_collection.insert_many(documents)
+
+def get_workspace_databases(workspace_id: str, fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
     """Get databases in workspace"""
     databases = databases_collection.find({
         "workspace_id": workspace_id, 
         "is_deleted": False
-    })
-    return [serialize_doc(db) for db in databases]
+    }, _projection(fields)).sort("created_at", 1)
+    databases = [serialize_doc(db) for db in databases]
+    if fields is not None and 'rows' not in fields:
+        return databases
+    return _attach_rows(databases)
 
-def get_database_by_id(database_id: str) -> Optional[Dict[str, Any]]:
+def get_database_by_id(database_id: str, fields: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
     """Get database by ID"""
-    database = databases_collection.find_one({"id": database_id})
-    return serialize_doc(database)
+    database = databases_collection.find_one({"id": database_id}, _projection(fields))
+    if database is None:
+        return None
+    database = serialize_doc(database)
+    if fields is not None and 'rows' not in fields:
+        return database
+    return _attach_rows([database])[0]
 
 def create_database(database_data: Dict[str, Any]) -> Dict[str, Any]:
     """Create a new database"""
+    rows = database_data.pop('rows', [])
     database_data['id'] = str(uuid.uuid4())
     database_data['created_at'] = datetime.utcnow()
     result = databases_collection.insert_one(database_data)
     database_data['_id'] = result.inserted_id
-    return serialize_doc(database_data)
+    _replace_rows(database_data['id'], rows)
+    return _attach_rows([serialize_doc(database_data)])[0]
 
 def update_database(database_id: str, update_data: Dict[str, Any]) -> bool:
     """Update database data"""
+    rows = update_data.pop('rows', None)
     update_data['updated_at'] = datetime.utcnow()
     result = databases_collection.update_one(
         {"id": database_id},
         {"$set": update_data}
     )
+    if rows is not None and result.matched_count:
+        _replace_rows(database_id, rows)
     return result.modified_count > 0
 
+def set_database_schema_migration(database_id: str, migration: Dict[str, Any], expected_lease: Optional[str],
+                                  properties: Optional[Dict[str, Any]] = None) -> bool:
+    """Replace a database's schema migration record if its lease is still the expected one"""
+    update: Dict[str, Any] = {"schema_migration": migration}
+    if properties is not None:
+        update.update({"properties": properties, "updated_at": datetime.utcnow()})
+    # A null lease also matches a missing record
+    result = databases_collection.update_one(
+        {"id": database_id, "schema_migration.lease": expected_lease},
+        {"$set": update}
+    )
+    return result.matched_count > 0
+
+def get_migrating_database_ids() -> List[str]:
+    """Ids of databases with a running schema migration"""
+    return [
+        database['id'] for database in
+        databases_collection.find({"schema_migration.status": "running"}, {"_id": 0, "id": 1})
+    ]
+
 def delete_database(database_id: str, user_id: str) -> bool:
     """Soft delete a database"""
     result = databases_collection.update_one(
@@ -291,6 +466,322 @@ def delete_database(database_id: str, user_id: str) -> bool:
     )
     return result.modified_count > 0
 
+def get_database_rows(database_id: str) -> List[Dict[str, Any]]:
+    """Get rows of a database"""
+    rows = database_rows_collection.find(
+        {"database_id": database_id},
+        ROW_PROJECTION
+    ).sort([("order", 1), ("id", 1)])
+    return [serialize_doc(row) for row in rows]
+
+def get_database_rows_by_id(database_id: str, row_ids: List[str]) -> List[Dict[str, Any]]:
+    """Get rows of a database by id"""
+    rows = database_rows_collection.find(
+        {"database_id": database_id, "id": {"$in": list(row_ids)}},
+        ROW_PROJECTION
+    )
+    return [serialize_doc(row) for row in rows]
+
+def get_database_rows_batch(database_id: str, after_id: Optional[str], limit: int) -> List[Dict[str, Any]]:
+    """Rows by id after `after_id`"""
+    query: Dict[str, Any] = {"database_id": database_id}
+    if after_id is not None:
+        query["id"] = {"$gt": after_id}
+    rows = database_rows_collection.find(query, ROW_PROJECTION).sort("id", 1).limit(limit)
+    return [serialize_doc(row) for row in rows]
+
+def get_database_rows_page(database_id: str, conditions, after, limit: int) -> Optional[List[Dict[str, Any]]]:
+    """Rows matching storage.RowConditions in (order, id) order, after an (order, id) cursor"""
+    if any('.' in condition.key or condition.key.startswith('$') for condition in conditions):
+        return None
+    query: Dict[str, Any] = {"database_id": database_id}
+    if conditions:
+        query["$expr"] = {"$and": [_property_condition(condition) for condition in conditions]}
+    if after is not None:
+        order, row_id = after
+        query["$or"] = [{"order": {"$gt": order}}, {"order": order, "id": {"$gt": row_id}}]
+    rows = database_rows_collection.find(query, ROW_PROJECTION).sort(
+        [("order", 1), ("id", 1)]
+    ).limit(limit)
+    return [serialize_doc(row) for row in rows]
+
+def get_database_rows_in_range(database_id: str, key: str, start: datetime, end: datetime) -> List[Dict[str, Any]]:
+    """Rows whose `key` interval overlaps [start, end], through the dates index"""
+    # A descending sort on the multikey span orders rows by their longest
+    # interval of any key, so the first one bounds this key's longest span
+    longest = database_rows_collection.find_one(
+        {"database_id": database_id, "dates.key": key}, {"dates.span": 1}, sort=[("dates.span", -1)]
+    )
+    if longest is None:
+        return []
+    earliest = start - timedelta(milliseconds=max(entry['span'] for entry in longest['dates']))
+    rows = database_rows_collection.find({
+        "database_id": database_id,
+        "dates": {"$elemMatch": {"key": key, "start": {"$gte": earliest, "$lte": end}, "end": {"$gte": start}}}
+    }, {"_id": 0, "database_id": 0})
+    starts = {}
+    found = []
+    for row in rows:
+        starts[row['id']] = next(entry['start'] for entry in row.pop('dates') if entry['key'] == key)
+        found.append(serialize_doc(row))
+    found.sort(key=lambda row: (starts[row['id']], row.get('order') or '', row['id']))
+    return found
+
+def _last_order_key(database_id: str) -> Optional[str]:
+    last = database_rows_collection.find_one(
+        {"database_id": database_id}, {"order": 1}, sort=[("order", -1)]
+    )
+    return last.get('order') if last else None
+
+def create_database_row(database_id: str, row_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Append a row to a database"""
+    result = databases_collection.update_one(
+        {"id": database_id},
+        {"$set": {"updated_at": datetime.utcnow()}}
+    )
+    if result.matched_count == 0:
+        return None
+    row = {
+        'id': row_data.get('id') or str(uuid.uuid4()),
+        'database_id': database_id,
+        'properties': row_data.get('properties', {}),
+        'order': row_data.get('order'),
+        'dates': date_index.entries(row_data.get('properties')),
+        'created_at': datetime.utcnow().isoformat(),
+        'updated_at': None
+    }
+    if not order_keys.is_valid(row['order']):
+        row['order'] = order_keys.key_between(_last_order_key(database_id), None)
+    if row_data.get('computed'):
+        row['computed'] = row_data['computed']
+    database_rows_collection.insert_one(row)
+    return {key: value for key, value in row.items() if key not in ('_id', 'database_id', 'dates')}
+
+def _computed_update(computed: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """$set or $unset of a row's cached formula values"""
+    if computed:
+        return {"$set": {"computed": computed}}
+    return {"$unset": {"computed": ""}}
+
+def update_database_row(database_id: str, row_id: str, properties: Dict[str, Any],
+                        computed: Optional[Dict[str, Any]] = None,
+                        order: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Replace a row's properties, cached formula values and order key in place"""
+    update = _computed_update(computed)
+    update.setdefault("$set", {}).update({
+        "properties": properties,
+        "dates": date_index.entries(properties),
+        "updated_at": datetime.utcnow().isoformat()
+    })
+    if order is not None:
+        update["$set"]["order"] = order
+    row = database_rows_collection.find_one_and_update(
+        {"database_id": database_id, "id": row_id},
+        update,
+        projection=ROW_PROJECTION,
+        return_document=ReturnDocument.AFTER
+    )
+    return serialize_doc(row)
+
+def set_database_rows_computed(database_id: str, computed: Dict[str, Dict[str, Any]]) -> int:
+    """Replace the cached formula values of rows, in one bulk write"""
+    if not computed:
+        return 0
+    result = database_rows_collection.bulk_write([
+        UpdateOne({"database_id": database_id, "id": row_id}, _computed_update(values))
+        for row_id, values in computed.items()
+    ], ordered=False)
+    return result.matched_count
+
+def set_database_rows_order(database_id: str, orders: Dict[str, Tuple[Optional[str], str]]) -> int:
+    """Compare-and-set row order keys, in one bulk write"""
+    if not orders:
+        return 0
+    result = database_rows_collection.bulk_write([
+        UpdateOne({"database_id": database_id, "id": row_id, "order": expected}, {"$set": {"order": order}})
+        for row_id, (expected, order) in orders.items()
+    ], ordered=False)
+    return result.matched_count
+
+def link_database_rows(database_id: str, key: str, row_ids: List[str], linked_id: str, linked: bool) -> int:
+    """$addToSet or $pull a row id in a relation value, after making values that aren't arrays empty ones"""
+    if not row_ids:
+        return 0
+    field = f"properties.{key}"
+    match = {"database_id": database_id, "id": {"$in": list(row_ids)}}
+    database_rows_collection.update_many(
+        {**match, field: {"$exists": True, "$not": {"$type": "array"}}}, {"$set": {field: []}}
+    )
+    update = {"$addToSet": {field: linked_id}} if linked else {"$pull": {field: linked_id}}
+    return database_rows_collection.update_many(match, update).matched_count
+
+def set_database_rows_properties(database_id: str, values: Dict[str, Dict[str, Any]],
+                                 computed: Optional[Dict[str, Dict[str, Any]]] = None) -> int:
+    """$set some properties of rows, and their cached formula values, in one bulk write"""
+    if not values:
+        return 0
+    requests = []
+    for row_id, row_values in values.items():
+        update = _computed_update(computed[row_id]) if computed is not None and row_id in computed else {}
+        update.setdefault("$set", {}).update({f"properties.{key}": value for key, value in row_values.items()})
+        requests.append(UpdateOne({"database_id": database_id, "id": row_id}, update))
+    return database_rows_collection.bulk_write(requests, ordered=False).matched_count
+
+def rewrite_database_rows(database_id: str, rewrites) -> int:
+    """Set and unset properties of rows not written since they were read (storage.RowRewrites).
+
+    Date entries of the changed keys are pulled in the same bulk write, and
+    those of their new values pushed in a second one, onto the rows that
+    have none for those keys.
+    """
+    if not rewrites:
+        return 0
+    requests, date_requests = [], []
+    for row_id, rewrite in rewrites.items():
+        changed = [*rewrite.values, *rewrite.removed]
+        update: Dict[str, Any] = {"$pull": {"dates": {"key": {"$in": changed}}}}
+        if rewrite.values:
+            update["$set"] = {f"properties.{key}": value for key, value in rewrite.values.items()}
+        if rewrite.removed:
+            update["$unset"] = {f"properties.{key}": "" for key in rewrite.removed}
+        requests.append(UpdateOne({"database_id": database_id, "id": row_id, "updated_at": rewrite.updated_at}, update))
+        dates = date_index.entries(rewrite.values)
+        if dates:
+            date_requests.append(UpdateOne(
+                {"database_id": database_id, "id": row_id, "dates.key": {"$nin": [entry['key'] for entry in dates]},
+                 **{f"properties.{entry['key']}": rewrite.values[entry['key']] for entry in dates}},
+                {"$push": {"dates": {"$each": dates}}}
+            ))
+    result = database_rows_collection.bulk_write(requests, ordered=False)
+    if date_requests:
+        database_rows_collection.bulk_write(date_requests, ordered=False)
+    return result.matched_count
+
+# RowAggregation comparisons; null compares below numbers, so each also requires a value
+_COMPARISONS = {'eq': '$eq', 'gt': '$gt', 'gte': '$gte', 'lt': '$lt', 'lte': '$lte'}
+
+def _property_value(key: str, kind: str) -> Dict[str, Any]:
+    """Expression for a row property as a number or text, null when empty"""
+    field = f"$properties.{key}"
+    if kind == 'number':
+        return {"$convert": {"input": field, "to": "double", "onError": None, "onNull": None}}
+    return {"$cond": [{"$in": [{"$ifNull": [field, None]}, [None, "", []]]}, None, field]}
+
+def _property_condition(condition) -> Dict[str, Any]:
+    value = _property_value(condition.key, condition.kind)
+    if condition.op == 'empty':
+        return {"$eq": [value, None]}
+    if condition.op == 'not_empty':
+        return {"$ne": [value, None]}
+    if condition.op == 'in':
+        return {"$in": [value, list(condition.value)]}
+    if condition.op == 'not_in':
+        return {"$eq": [{"$in": [value, list(condition.value)]}, False]}
+    if condition.op == 'ne':
+        return {"$ne": [value, condition.value]}
+    return {"$and": [{"$ne": [value, None]}, {_COMPARISONS[condition.op]: [value, condition.value]}]}
+
+def _property_accumulator(aggregate) -> Dict[str, Any]:
+    if aggregate.key is None:
+        return {"$sum": 1}
+    value = _property_value(aggregate.key, aggregate.kind)
+    if aggregate.op == 'count':
+        return {"$sum": {"$cond": [{"$eq": [value, None]}, 0, 1]}}
+    if aggregate.op == 'distinct':
+        return {"$addToSet": value}
+    return {f"${aggregate.op}": value}
+
+def aggregate_database_rows(database_id: str, aggregation) -> Optional[Dict[str, Any]]:
+    """Grouped summaries of a database's rows (a storage.RowAggregation), computed in one pipeline"""
+    keys = [aggregation.group_by, *(a.key for a in aggregation.aggregates), *(c.key for c in aggregation.conditions)]
+    if any(key and ('.' in key or key.startswith('$')) for key in keys):
+        return None
+    match: Dict[str, Any] = {"database_id": database_id}
+    if aggregation.conditions:
+        match["$expr"] = {"$and": [_property_condition(condition) for condition in aggregation.conditions]}
+    accumulators = {"count": {"$sum": 1}}
+    project: Dict[str, Any] = {"_id": 1, "count": 1}
+    for index, aggregate in enumerate(aggregation.aggregates):
+        accumulators[f"a{index}"] = _property_accumulator(aggregate)
+        project[f"a{index}"] = (
+            {"$size": {"$filter": {"input": f"$a{index}", "cond": {"$ne": ["$$this", None]}}}}
+            if aggregate.op == 'distinct' else 1
+        )
+    facets = {"total": [{"$group": {"_id": None, **accumulators}}, {"$project": project}]}
+    if aggregation.group_by is not None:
+        group_value = _property_value(aggregation.group_by, aggregation.group_kind)
+        facets["groups"] = [{"$group": {"_id": group_value, **accumulators}}, {"$project": project}]
+    result = next(database_rows_collection.aggregate([{"$match": match}, {"$facet": facets}]))
+
+    def summary(document: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'count': document.get('count', 0),
+            'aggregates': {
+                aggregate.name: document.get(f"a{index}", 0 if aggregate.op in ('count', 'distinct', 'sum') else None)
+                for index, aggregate in enumerate(aggregation.aggregates)
+            }
+        }
+
+    total = result['total'][0] if result['total'] else {}
+    return {
+        'groups': [{'value': document['_id'], **summary(document)} for document in result.get('groups', [])],
+        'total': summary(total)
+    }
+
+def delete_database_row(database_id: str, row_id: str) -> bool:
+    """Delete a row from a database"""
+    result = database_rows_collection.delete_one({"database_id": database_id, "id": row_id})
+    return result.deleted_count > 0
+
+def migrate_embedded_rows() -> int:
+    """Move rows still embedded in database documents into the rows collection.
+
+    Rows are upserted by id, and rows without one get an id derived from
+    their database and position, so a run interrupted before the embedded
+    rows are removed can simply be run again.
+    """
+    moved = 0
+    for database in databases_collection.find({"rows.0": {"$exists": True}}, {"id": 1, "rows": 1}):
+        documents = [
+            {**row, 'id': row.get('id') or str(uuid.uuid5(uuid.NAMESPACE_URL, f"{database['id']}/rows/{index}")),
+             'database_id': database['id']}
+            for index, row in enumerate(database['rows'])
+        ]
+        database_rows_collection.bulk_write([
+            ReplaceOne({"id": document['id']}, document, upsert=True) for document in documents
+        ], ordered=False)
+        databases_collection.update_one({"_id": database['_id']}, {"$unset": {"rows": ""}})
+        moved += len(documents)
+    return moved
+
+def backfill_row_order() -> int:
+    """Give rows created before order keys existed keys after their database's others, in insertion order"""
+    keyless = {"$or": [{"order": {"$exists": False}}, {"order": None}]}
+    updated = 0
+    for database_id in database_rows_collection.distinct("database_id", keyless):
+        rows = list(database_rows_collection.find(
+            {"database_id": database_id, **keyless}, {"_id": 1}
+        ).sort("_id", 1))
+        keys = order_keys.keys_after(_last_order_key(database_id), len(rows))
+        result = database_rows_collection.bulk_write([
+            UpdateOne({"_id": row['_id']}, {"$set": {"order": key}}) for row, key in zip(rows, keys)
+        ], ordered=False)
+        updated += result.modified_count
+    return updated
+
+def backfill_row_dates() -> int:
+    """Index the date values of rows written before the dates index existed"""
+    updated = 0
+    rows = database_rows_collection.find({"dates": {"$exists": False}}, {"_id": 1, "properties": 1})
+    while True:
+        batch = [
+            UpdateOne({"_id": row['_id']}, {"$set": {"dates": date_index.entries(row.get('properties'))}})
+            for row in islice(rows, 1000)
+        ]
+        if not batch:
+            return updated
+        updated += database_rows_collection.bulk_write(batch, ordered=False).modified_count
+
 def get_trash_items(workspace_ids: List[str]) -> List[Dict[str, Any]]:
     """Get deleted items from workspaces"""
     trash_items = []
@@ -299,7 +790,7 @@ def get_trash_items(workspace_ids: List[str]) -> List[Dict[str, Any]]:
     deleted_pages = pages_collection.find({
         "workspace_id": {"$in": workspace_ids},
         "is_deleted": True
-    })
+    }).sort("deleted_at", -1)
     
     for page in deleted_pages:
         page_data = serialize_doc(page)
@@ -310,7 +801,7 @@ def get_trash_items(workspace_ids: List[str]) -> List[Dict[str, Any]]:
     deleted_databases = databases_collection.find({
         "workspace_id": {"$in": workspace_ids},
         "is_deleted": True
-    })
+    }).sort("deleted_at", -1)
     
     for database in deleted_databases:
         db_data = serialize_doc(database)
@@ -339,6 +830,8 @@ def permanently_delete_item(item_id: str, item_type: str) -> bool:
     collection = pages_collection if item_type == 'page' else databases_collection
     
     result = collection.delete_one({"id": item_id, "is_deleted": True})
+    if result.deleted_count and item_type != 'page':
+        database_rows_collection.delete_many({"database_id": item_id})
     return result.deleted_count > 0
 
 def empty_trash(workspace_ids: List[str]) -> int:
@@ -352,7 +845,12 @@ def empty_trash(workspace_ids: List[str]) -> int:
     })
     deleted_count += result.deleted_count
     
-    # Delete databases
+    # Delete databases and their rows
+    deleted_database_ids = databases_collection.distinct("id", {
+        "workspace_id": {"$in": workspace_ids},
+        "is_deleted": True
+    })
+    database_rows_collection.delete_many({"database_id": {"$in": deleted_database_ids}})
     result = databases_collection.delete_many({
         "workspace_id": {"$in": workspace_ids},
         "is_deleted": True
@@ -425,37 +923,149 @@ def get_recent_login_attempts(ip_address: str, minutes: int = 30) -> List[Dict[s
     return [serialize_doc(attempt) for attempt in attempts]
 
 # Index creation for better performance
+LIVE = {"is_deleted": False}
+TRASHED = {"is_deleted": True}
+
+# (collection, keys, options). Keys follow equality, sort, range order of the
+# queries above; partial indexes on is_deleted keep trash out of the hot path
+# and the trash index small.
+INDEXES = [
+    (users_collection, [("email", 1)], {"unique": True}),
+    (users_collection, [("id", 1)], {"unique": True}),
+
+    (workspaces_collection, [("id", 1)], {"unique": True}),
+    (workspaces_collection, [("owner_id", 1)], {}),
+    (workspaces_collection, [("members.user_id", 1)], {}),
+
+    (pages_collection, [("id", 1)], {"unique": True}),
+    # get_workspace_pages: workspace_id, parent_id (null for roots), is_deleted=false, by created_at
+    (pages_collection, [("workspace_id", 1), ("parent_id", 1), ("created_at", 1)],
+     {"name": "workspace_parent_live", "partialFilterExpression": LIVE}),
+    # get_trash_items / empty_trash: workspace_id $in, is_deleted=true, newest first
+    (pages_collection, [("workspace_id", 1), ("deleted_at", -1)],
+     {"name": "workspace_trash", "partialFilterExpression": TRASHED}),
+
+    (databases_collection, [("id", 1)], {"unique": True}),
+    (databases_collection, [("workspace_id", 1), ("created_at", 1)],
+     {"name": "workspace_live", "partialFilterExpression": LIVE}),
+    (databases_collection, [("workspace_id", 1), ("deleted_at", -1)],
+     {"name": "workspace_trash", "partialFilterExpression": TRASHED}),
+
+    (database_rows_collection, [("id", 1)], {"unique": True}),
+    # get_database_rows_batch walks a database's rows by id
+    (database_rows_collection, [("database_id", 1), ("id", 1)], {"name": "database_row_id"}),
+    # Rows are read in order key order: get_database_rows, get_database_rows_page
+    # (board columns) and the last key for appends
+    (database_rows_collection, [("database_id", 1), ("order", 1), ("id", 1)], {"name": "database_order"}),
+    # get_database_rows_in_range: a range on dates.start per date property,
+    # bounded by the longest span, found through the second index
+    (database_rows_collection, [("database_id", 1), ("dates.key", 1), ("dates.start", 1)],
+     {"name": "database_date_start"}),
+    (database_rows_collection, [("database_id", 1), ("dates.key", 1), ("dates.span", -1)],
+     {"name": "database_date_span"}),
+
+    (mfa_backup_codes_collection, [("user_id", 1), ("code", 1)], {}),
+
+    (login_attempts_collection, [("ip_address", 1), ("attempted_at", 1)], {}),
+]
+
+# Single-field indexes replaced by the compound ones above
+LEGACY_INDEXES = [
+    (pages_collection, ["workspace_id_1", "parent_id_1", "created_by_1", "is_deleted_1"]),
+    (databases_collection, ["workspace_id_1", "created_by_1", "is_deleted_1"]),
+    (database_rows_collection, ["database_id_1", "database_id_1__id_1"]),
+    (mfa_backup_codes_collection, ["user_id_1", "code_1"]),
+    (login_attempts_collection, ["ip_address_1", "attempted_at_1"]),
+]
+
 def create_indexes():
-    """Create database indexes"""
-    # User indexes
-    users_collection.create_index("email", unique=True)
-    users_collection.create_index("id", unique=True)
-    
-    # Workspace indexes
-    workspaces_collection.create_index("id", unique=True)
-    workspaces_collection.create_index("owner_id")
-    workspaces_collection.create_index("members.user_id")
-    
-    # Page indexes
-    pages_collection.create_index("id", unique=True)
-    pages_collection.create_index("workspace_id")
-    pages_collection.create_index("parent_id")
-    pages_collection.create_index("created_by")
-    pages_collection.create_index("is_deleted")
-    
-    # Database indexes
-    databases_collection.create_index("id", unique=True)
-    databases_collection.create_index("workspace_id")
-    databases_collection.create_index("created_by")
-    databases_collection.create_index("is_deleted")
-    
-    # MFA backup codes indexes
-    mfa_backup_codes_collection.create_index("user_id")
-    mfa_backup_codes_collection.create_index("code")
-    
-    # Login attempts indexes
-    login_attempts_collection.create_index("ip_address")
-    login_attempts_collection.create_index("attempted_at")
+    """Create database indexes, then drop the ones they replace"""
+    for collection, keys, options in INDEXES:
+        collection.create_index(keys, **options)
+    for collection, names in LEGACY_INDEXES:
+        existing = collection.index_information()
+        for name in names:
+            if name in existing:
+                collection.drop_index(name)
+
+# Hot queries whose plans are checked at startup: (name, collection, filter, sort).
+# Values are placeholders; the planner picks indexes from the query shape.
+HOT_QUERIES = [
+    ("get_workspace_pages", pages_collection,
+     {"workspace_id": "", "is_deleted": False, "parent_id": None}, [("created_at", 1)]),
+    ("get_workspace_pages (children)", pages_collection,
+     {"workspace_id": "", "is_deleted": False, "parent_id": ""}, [("created_at", 1)]),
+    ("get_workspace_page_tree", pages_collection,
+     {"workspace_id": "", "is_deleted": False}, [("parent_id", 1), ("created_at", 1)]),
+    ("get_trash_items (pages)", pages_collection,
+     {"workspace_id": {"$in": [""]}, "is_deleted": True}, [("deleted_at", -1)]),
+    ("get_workspace_databases", databases_collection,
+     {"workspace_id": "", "is_deleted": False}, [("created_at", 1)]),
+    ("get_trash_items (databases)", databases_collection,
+     {"workspace_id": {"$in": [""]}, "is_deleted": True}, [("deleted_at", -1)]),
+    ("get_database_rows", database_rows_collection, {"database_id": ""}, [("order", 1), ("id", 1)]),
+    ("get_database_rows_page", database_rows_collection, {"database_id": ""}, [("order", 1), ("id", 1)]),
+    ("get_database_rows_batch", database_rows_collection, {"database_id": "", "id": {"$gt": ""}}, [("id", 1)]),
+    ("get_database_rows_in_range", database_rows_collection, {"database_id": "", "dates": {"$elemMatch": {
+        "key": "", "start": {"$gte": datetime.utcnow(), "$lte": datetime.utcnow()}, "end": {"$gte": datetime.utcnow()}
+    }}}, None),
+    ("get_user_workspaces", workspaces_collection,
+     {"$or": [{"owner_id": ""}, {"members.user_id": ""}]}, None),
+    ("get_recent_login_attempts", login_attempts_collection,
+     {"ip_address": "", "attempted_at": {"$gte": datetime.utcnow()}}, None),
+    ("verify_backup_code", mfa_backup_codes_collection, {"user_id": "", "code": "", "used": False}, None),
+]
+
+def _plan_stages(plan: Any) -> List[str]:
+    """Every stage name in an explain plan (classic or SBE layout)"""
+    stages = []
+    if isinstance(plan, dict):
+        if isinstance(plan.get('stage'), str):
+            stages.append(plan['stage'])
+        for value in plan.values():
+            stages.extend(_plan_stages(value))
+    elif isinstance(plan, list):
+        for item in plan:
+            stages.extend(_plan_stages(item))
+    return stages
+
+def check_query_plans() -> List[str]:
+    """Explain the hot queries; one warning per COLLSCAN or in-memory SORT"""
+    warnings = []
+    for name, collection, query, sort in HOT_QUERIES:
+        cursor = collection.find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        try:
+            winning_plan = cursor.explain()['queryPlanner']['winningPlan']
+        except Exception as exc:
+            warnings.append(f"{name}: could not explain ({exc})")
+            continue
+        stages = _plan_stages(winning_plan)
+        if 'COLLSCAN' in stages:
+            warnings.append(f"{name}: collection scan on '{collection.name}'")
+        if 'SORT' in stages:
+            warnings.append(f"{name}: in-memory sort on '{collection.name}'")
+    return warnings
+
+def connect(warm_connections: int = 4):
+    """Ping the server and open `warm_connections` pooled connections"""
+    with ThreadPoolExecutor(max_workers=warm_connections) as executor:
+        list(executor.map(lambda _: client.admin.command('ping'), range(warm_connections)))
+
+def ping() -> bool:
+    try:
+        client.admin.command('ping')
+        return True
+    except Exception:
+        return False
+
+def close():
+    client.close()
 
-# Create indexes on startup
-create_indexes()
\ No newline at end of file
+def migrate():
+    """Create indexes, move legacy embedded rows, give rows order keys and index their dates (idempotent)"""
+    create_indexes()
+    migrate_embedded_rows()
+    backfill_row_order()
+    backfill_row_dates()
\ No newline at end of file
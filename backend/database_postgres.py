@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, String, DateTime, Boolean, Text, Integer, ForeignKey, Table
+from sqlalchemy import create_engine, Column, String, DateTime, Boolean, Text, Integer, BigInteger, ForeignKey, Table, Index, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session, relationship
 from sqlalchemy.dialects.postgresql import UUID
@@ -8,13 +8,28 @@ import os
 from pathlib import Path
 from dotenv import load_dotenv
 
+import profiling
+import metrics
+import slow_queries
+
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # Database configuration
 DATABASE_URL = os.environ.get('DATABASE_URL')
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+engine = None
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False)
+
+def get_engine():
+    """Create the engine on first use and bind SessionLocal to it"""
+    global engine
+    if engine is None:
+        engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+        profiling.instrument_engine(engine)
+        metrics.instrument_engine(engine)
+        slow_queries.instrument_engine(engine)
+        SessionLocal.configure(bind=engine)
+    return engine
 Base = declarative_base()
 
 # Association table for workspace members
@@ -23,7 +38,9 @@ workspace_members = Table(
     Base.metadata,
     Column('workspace_id', UUID(as_uuid=True), ForeignKey('workspaces.id'), primary_key=True),
     Column('user_id', UUID(as_uuid=True), ForeignKey('users.id'), primary_key=True),
-    Column('role', String(50), default='member')
+    Column('role', String(50), default='member'),
+    # The primary key serves workspace_id lookups; this one serves "workspaces of a user"
+    Index('ix_workspace_members_user_id', 'user_id')
 )
 
 # Association table for page permissions
@@ -32,7 +49,8 @@ page_permissions = Table(
     Base.metadata,
     Column('page_id', UUID(as_uuid=True), ForeignKey('pages.id'), primary_key=True),
     Column('user_id', UUID(as_uuid=True), ForeignKey('users.id'), primary_key=True),
-    Column('permission', String(50), default='viewer')
+    Column('permission', String(50), default='viewer'),
+    Index('ix_page_permissions_user_id', 'user_id')
 )
 
 class User(Base):
@@ -60,6 +78,9 @@ class User(Base):
 
 class MFABackupCode(Base):
     __tablename__ = "mfa_backup_codes"
+    __table_args__ = (
+        Index('ix_mfa_backup_codes_user_id', 'user_id'),
+    )
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey('users.id'), nullable=False)
@@ -73,10 +94,14 @@ class MFABackupCode(Base):
 
 class LoginAttempt(Base):
     __tablename__ = "login_attempts"
+    __table_args__ = (
+        Index('ix_login_attempts_ip_attempted_at', 'ip_address', 'attempted_at'),
+    )
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey('users.id'), nullable=True)
     ip_address = Column(String(45), nullable=False)
+    user_email = Column(String(255))
     user_agent = Column(String(500))
     success = Column(Boolean, default=False)
     attempted_at = Column(DateTime, default=datetime.utcnow)
@@ -86,10 +111,14 @@ class LoginAttempt(Base):
 
 class Workspace(Base):
     __tablename__ = "workspaces"
+    __table_args__ = (
+        Index('ix_workspaces_owner_id', 'owner_id'),
+    )
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     name = Column(String(100), nullable=False)
     icon = Column(String(10), default='📁')
+    description = Column(Text)
     owner_id = Column(UUID(as_uuid=True), ForeignKey('users.id'), nullable=False)
     settings = Column(Text)  # JSON string
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -103,6 +132,14 @@ class Workspace(Base):
 
 class Page(Base):
     __tablename__ = "pages"
+    __table_args__ = (
+        # Page tree listing: live pages of a workspace under a parent, oldest first
+        Index('ix_pages_workspace_parent_live', 'workspace_id', 'parent_id', 'created_at',
+              postgresql_where=text('is_deleted = false')),
+        # Trash is a small slice of the table, so it gets its own partial index
+        Index('ix_pages_workspace_trash', 'workspace_id', postgresql_where=text('is_deleted = true')),
+        Index('ix_pages_parent_id', 'parent_id', postgresql_where=text('parent_id IS NOT NULL')),
+    )
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     title = Column(String(200), nullable=False)
@@ -129,12 +166,18 @@ class Page(Base):
 
 class Database(Base):
     __tablename__ = "databases"
+    __table_args__ = (
+        Index('ix_databases_workspace_live', 'workspace_id', 'created_at',
+              postgresql_where=text('is_deleted = false')),
+        Index('ix_databases_workspace_trash', 'workspace_id', postgresql_where=text('is_deleted = true')),
+    )
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     name = Column(String(100), nullable=False)
     workspace_id = Column(UUID(as_uuid=True), ForeignKey('workspaces.id'), nullable=False)
     properties = Column(Text)  # JSON string
     views = Column(Text)  # JSON string
+    schema_migration = Column(Text, nullable=True)  # JSON string, see schema_migration
     created_by = Column(UUID(as_uuid=True), ForeignKey('users.id'), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -151,18 +194,43 @@ class Database(Base):
 
 class DatabaseRow(Base):
     __tablename__ = "database_rows"
+    __table_args__ = (
+        Index('ix_database_rows_database_created', 'database_id', 'created_at'),
+        Index('ix_database_rows_database_order', 'database_id', 'order', 'id'),
+        # Schema migrations walk a database's rows by id
+        Index('ix_database_rows_database_id', 'database_id', 'id'),
+    )
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     database_id = Column(UUID(as_uuid=True), ForeignKey('databases.id'), nullable=False)
     properties = Column(Text)  # JSON string
+    computed = Column(Text)  # JSON string of cached formula values, NULL when none
+    order = Column(String)  # order_keys key
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
     database = relationship("Database", back_populates="rows")
 
+class DatabaseRowDate(Base):
+    """A row's date value as an interval (see date_index); the calendar's index"""
+    __tablename__ = "database_row_dates"
+    __table_args__ = (
+        # Calendar windows: a range on start, bounded below by the longest span
+        Index('ix_database_row_dates_start', 'database_id', 'key', 'start'),
+        Index('ix_database_row_dates_span', 'database_id', 'key', 'span'),
+    )
+    
+    row_id = Column(UUID(as_uuid=True), ForeignKey('database_rows.id'), primary_key=True)
+    key = Column(String, primary_key=True)
+    database_id = Column(UUID(as_uuid=True), ForeignKey('databases.id'), nullable=False)
+    start = Column(DateTime, nullable=False)
+    end = Column(DateTime, nullable=False)
+    span = Column(BigInteger, nullable=False)  # milliseconds
+
 # Dependency to get database session
 def get_db():
+    get_engine()
     db = SessionLocal()
     try:
         yield db
@@ -171,4 +239,59 @@ def get_db():
 
 # Create tables
 def create_tables():
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    """Create the tables of the models. An empty database gets the latest schema
+    and is stamped at the latest revision, so run_migrations() leaves it as it is."""
+    from alembic import command
+    from sqlalchemy import inspect
+    empty = not inspect(get_engine()).get_table_names()
+    Base.metadata.create_all(bind=get_engine())
+    if empty:
+        command.stamp(alembic_config(), 'head')
+
+# Schema migrations (Alembic scripts live in migrations/)
+BASELINE_REVISION = '0001'
+
+def alembic_config():
+    from alembic.config import Config
+    config = Config(str(ROOT_DIR / 'alembic.ini'))
+    config.set_main_option('script_location', str(ROOT_DIR / 'migrations'))
+    # Leave the app's logging alone when migrating in-process
+    config.attributes['configure_logger'] = False
+    return config
+
+def run_migrations():
+    """Upgrade the schema to the latest revision.
+
+    Databases created with create_tables() before migrations existed have the
+    tables but no version row, so they are stamped at the baseline first.
+    """
+    from alembic import command
+    from sqlalchemy import inspect
+    config = alembic_config()
+    tables = inspect(get_engine()).get_table_names()
+    if 'users' in tables and 'alembic_version' not in tables:
+        command.stamp(config, BASELINE_REVISION)
+    command.upgrade(config, 'head')
+
+# Connection lifecycle
+def connect(warm_connections: int = 4):
+    """Open `warm_connections` pooled connections so first requests skip the handshake"""
+    connections = [get_engine().connect() for _ in range(warm_connections)]
+    try:
+        for connection in connections:
+            connection.exec_driver_sql("SELECT 1")
+    finally:
+        for connection in connections:
+            connection.close()
+
+def ping() -> bool:
+    try:
+        with get_engine().connect() as connection:
+            connection.exec_driver_sql("SELECT 1")
+        return True
+    except Exception:
+        return False
+
+def close():
+    if engine is not None:
+        engine.dispose()
\ No newline at end of file
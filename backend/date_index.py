@@ -0,0 +1,87 @@
+"""Date intervals of row properties, for calendar views.
+
+A property value that reads as a date (an ISO date or datetime string, or a
+``{start, end}`` range) is an interval with both ends included: a date
+without a time of day covers the whole day, and a range without an end is
+its start. Datetimes are naive UTC to the millisecond, as Mongo stores them.
+
+Storage backends keep each row's intervals as (key, start, end, span)
+entries indexed by start and by span. A row overlaps a window when it starts
+before the window ends and ends after it starts; since no entry is longer
+than the property's longest span, only entries starting at most that long
+before the window can, which bounds the index scan on start at both ends.
+"""
+import re
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+ISO_DATE = re.compile(r'\d{4}-\d{2}-\d{2}')
+# The last instant of a day, at Mongo's precision
+DAY_END = timedelta(days=1, milliseconds=-1)
+
+Interval = Tuple[datetime, datetime]
+
+
+def _bound(value: Any, end: bool) -> Optional[datetime]:
+    """An ISO date or datetime as naive UTC; a bare date is its first instant, or its last when `end`"""
+    if not isinstance(value, str) or not ISO_DATE.match(value):
+        return None
+    try:
+        if len(value) == 10:
+            parsed = datetime.combine(date.fromisoformat(value), datetime.min.time())
+            return parsed + DAY_END if end else parsed
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed.replace(microsecond=parsed.microsecond // 1000 * 1000)
+
+
+def interval(value: Any) -> Optional[Interval]:
+    """(start, end) of a row value, None when it isn't a date"""
+    if isinstance(value, dict):
+        start_value, end_value = value.get('start'), value.get('end') or value.get('start')
+    else:
+        start_value = end_value = value
+    start, end = _bound(start_value, False), _bound(end_value, True)
+    if start is None:
+        return None
+    if end is None or end < start:
+        end = _bound(start_value, True)
+    return start, end
+
+
+def span(entry: Interval) -> int:
+    """Length of an interval in milliseconds"""
+    start, end = entry
+    return (end - start) // timedelta(milliseconds=1)
+
+
+def entries(properties: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """The date intervals of a row's properties, as stored in the index.
+
+    Every value reading as a date is kept, whatever its property's type, so
+    a property changed to a date needs no reindexing; only date properties
+    are queried.
+    """
+    found = []
+    for key, value in (properties or {}).items():
+        entry = interval(value)
+        if entry is not None:
+            found.append({'key': key, 'start': entry[0], 'end': entry[1], 'span': span(entry)})
+    return found
+
+
+def window(start: str, end: str) -> Interval:
+    """The (start, end) of a calendar window from ISO dates or datetimes; raises ValueError"""
+    first, last = _bound(start, False), _bound(end, True)
+    if first is None or last is None:
+        raise ValueError("start and end must be ISO dates or datetimes")
+    if last < first:
+        raise ValueError("end must not be before start")
+    return first, last
+
+
+def overlaps(entry: Optional[Interval], bounds: Interval) -> bool:
+    return entry is not None and entry[0] <= bounds[1] and entry[1] >= bounds[0]
@@ -0,0 +1,62 @@
+"""Server-side formula properties.
+
+A database property ``{"type": "formula", "formula": "<expression>"}`` is
+computed by the backend: expressions are compiled once per schema
+(compiler.py) and evaluated over whole columns with NumPy (functions.py),
+then returned with the rows. query.py filters and sorts rows by any
+property, formulas included. cache.py keeps each row's formula values
+cached next to its properties and recomputes only what an edit affects.
+aggregate.py groups and summarises rows when the database can't.
+"""
+from typing import Any, Dict
+
+from .parser import FormulaError, parse, rename_props
+from .compiler import Program, program_for
+from .query import FILTER_OPERATORS, property_key, query_rows
+from .cache import RowUpdate, edit_row, refresh_rows
+from .aggregate import AGGREGATE_OPERATORS, aggregate_rows, parse_aggregation
+
+
+def validate(properties) -> None:
+    """Raise FormulaError for the first formula property that doesn't compile"""
+    program = program_for(properties)
+    for key, error in program.errors.items():
+        name = program.properties[key].name
+        raise FormulaError(f'Formula "{name}": {error}')
+
+
+def rename_references(old: Dict[str, Any], new: Dict[str, Any], key: str, to: str) -> Dict[str, Any]:
+    """`new`, the schema `old` with property `key` renamed to key `to`, a new
+    name or both, with the prop() references of its formulas following the rename.
+
+    A reference by the old name gets the new name, one by the old key the new
+    key. Raises FormulaError when that would read another property.
+    """
+    old_names = program_for(old).names
+    new_names = program_for(new).names
+    old_name = old[key].get('name') or key
+    new_name = new[to].get('name') or to
+    updated = dict(new)
+    for formula_key, prop in new.items():
+        if not isinstance(prop, dict) or prop.get('type') != 'formula':
+            continue
+        try:
+            parse(prop.get('formula') or '')
+        except FormulaError:
+            continue
+
+        def rename(name: str) -> str:
+            if old_names.get(name) != key:
+                return name
+            renamed = new_name if name == old_name else to
+            if new_names.get(renamed) != to:
+                raise FormulaError(
+                    f'Formula "{prop.get("name") or formula_key}": prop("{name}") would read another property '
+                    f'once renamed to "{renamed}"'
+                )
+            return renamed
+
+        formula = rename_props(prop['formula'], rename)
+        if formula != prop['formula']:
+            updated[formula_key] = {**prop, 'formula': formula}
+    return updated
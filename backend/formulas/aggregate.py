@@ -0,0 +1,161 @@
+"""Group rows and summarise them: counts, sums, averages, min/max, distinct counts.
+
+This computes what Storage.aggregate_database_rows computes in the database,
+for the aggregations a backend can't push down: formulas, contains or date
+filters, multi-valued group properties (a row with several options counts
+in each of their groups). Property values are read the way
+storage.RowAggregation defines, so either path gives the same summaries.
+"""
+import json
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from .compiler import Frame, Program
+from .parser import FormulaError
+from .query import RowFilter, _mask, property_key, parse_filter
+from .values import NUMBER, to_json
+
+AGGREGATE_OPERATORS = ('count', 'distinct', 'sum', 'avg', 'min', 'max')
+# Operators reading a property as a number
+NUMBER_OPERATORS = ('sum', 'avg', 'min', 'max')
+EMPTY_VALUES = (None, '', [])
+
+
+class Aggregate(NamedTuple):
+    # The text asked for, e.g. 'sum:Points', which keys the result
+    name: str
+    op: str
+    # None for the row count
+    key: Optional[str]
+
+
+class Aggregation(NamedTuple):
+    group_by: Optional[str]
+    aggregates: Tuple[Aggregate, ...]
+    filters: Tuple[RowFilter, ...]
+
+
+def value_kind(program: Program, key: str) -> str:
+    """'number' or 'text', how an aggregation reads the property"""
+    return 'number' if program.types[key] == NUMBER else 'text'
+
+
+def parse_aggregate(program: Program, text: str) -> Aggregate:
+    """`count` (rows) or `op:property`; op is count (non-empty values), distinct, sum, avg, min or max"""
+    op, _, name = text.partition(':')
+    if op not in AGGREGATE_OPERATORS:
+        raise FormulaError(f"Aggregate {text!r}: operator must be one of {', '.join(AGGREGATE_OPERATORS)}")
+    if not name:
+        if op != 'count':
+            raise FormulaError(f"Aggregate {text!r}: {op} needs a property, e.g. {op}:Name")
+        return Aggregate(text, op, None)
+    key = property_key(program, name)
+    if op in NUMBER_OPERATORS and value_kind(program, key) != 'number':
+        raise FormulaError(f"Aggregate {text!r}: {op} needs a number property")
+    return Aggregate(text, op, key)
+
+
+def parse_aggregation(program: Program, group_by: Optional[str], aggregates: List[str],
+                      filters: List[str] = ()) -> Aggregation:
+    return Aggregation(
+        property_key(program, group_by) if group_by else None,
+        tuple(parse_aggregate(program, text) for text in aggregates),
+        tuple(parse_filter(program, text) for text in filters),
+    )
+
+
+def _hashable(value: Any) -> Any:
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, sort_keys=True, default=str)
+    return value
+
+
+def _values(program: Program, frame: Frame, key: str) -> np.ndarray:
+    """A property as floats (NaN when empty) or as an object array of values (None when empty)"""
+    if value_kind(program, key) == 'number':
+        return frame.get(key)
+    if key in frame.cached:
+        raw = frame.cached[key]
+    elif key in frame.columns:
+        raw = to_json(frame.columns[key], program.types[key])
+    else:
+        raw = [(row.get('properties') or {}).get(key) for row in frame.rows]
+    values = np.empty(len(raw), dtype=object)
+    values[:] = [None if value in EMPTY_VALUES else value for value in raw]
+    return values
+
+
+def _group(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray, List[Any]]:
+    """(row index, group code) pairs and the value of each group; list values put a row in several groups"""
+    codes: Dict[Any, int] = {}
+    pair_rows, pair_codes = [], []
+    for row, value in enumerate(values.tolist()):
+        if isinstance(value, float) and np.isnan(value):
+            value = None
+        items = [item for item in value if item not in EMPTY_VALUES] if isinstance(value, list) else [value]
+        for item in items or [None]:
+            pair_rows.append(row)
+            pair_codes.append(codes.setdefault(_hashable(item), len(codes)))
+    return np.array(pair_rows, dtype=int), np.array(pair_codes, dtype=int), list(codes)
+
+
+def _summaries(aggregates: Tuple[Aggregate, ...], columns: Dict[str, np.ndarray],
+               rows: np.ndarray, codes: np.ndarray, groups: int) -> List[Dict[str, Any]]:
+    counts = np.bincount(codes, minlength=groups)
+    results: Dict[str, np.ndarray] = {}
+    for aggregate in aggregates:
+        if aggregate.key is None:
+            results[aggregate.name] = counts.astype(float)
+            continue
+        values = columns[aggregate.key][rows]
+        numeric = values.dtype != object
+        present = ~np.isnan(values) if numeric else np.array([value is not None for value in values], dtype=bool)
+        present_codes = codes[present]
+        if aggregate.op == 'count':
+            result = np.bincount(present_codes, minlength=groups).astype(float)
+        elif aggregate.op == 'distinct':
+            distinct = {(code, _hashable(value)) for code, value in zip(present_codes.tolist(), values[present].tolist())}
+            result = np.bincount([code for code, _ in distinct], minlength=groups).astype(float)
+        elif aggregate.op in ('sum', 'avg'):
+            result = np.bincount(present_codes, weights=values[present], minlength=groups)
+            if aggregate.op == 'avg':
+                with np.errstate(all='ignore'):
+                    result = result / np.bincount(present_codes, minlength=groups)
+        else:
+            extreme = np.full(groups, np.inf if aggregate.op == 'min' else -np.inf)
+            (np.minimum if aggregate.op == 'min' else np.maximum).at(extreme, present_codes, values[present])
+            result = np.where(np.isinf(extreme), np.nan, extreme)
+        results[aggregate.name] = result
+    return [
+        {
+            'count': int(counts[group]),
+            'aggregates': {
+                name: None if np.isnan(result[group]) else float(result[group]) for name, result in results.items()
+            }
+        }
+        for group in range(groups)
+    ]
+
+
+def aggregate_rows(program: Program, rows: List[Dict[str, Any]], aggregation: Aggregation) -> Dict[str, Any]:
+    """Summaries of `rows`, shaped like Storage.aggregate_database_rows"""
+    frame = program.frame(rows)
+    if aggregation.filters:
+        mask = np.ones(frame.n, dtype=bool)
+        with np.errstate(all='ignore'):
+            for row_filter in aggregation.filters:
+                mask &= _mask(frame, row_filter)
+        frame = frame.subset(np.flatnonzero(mask))
+    columns = {
+        aggregate.key: _values(program, frame, aggregate.key)
+        for aggregate in aggregation.aggregates if aggregate.key is not None
+    }
+    everything = np.arange(frame.n)
+    total = _summaries(aggregation.aggregates, columns, everything, np.zeros(frame.n, dtype=int), 1)[0]
+    groups = []
+    if aggregation.group_by is not None:
+        pair_rows, pair_codes, values = _group(_values(program, frame, aggregation.group_by))
+        summaries = _summaries(aggregation.aggregates, columns, pair_rows, pair_codes, len(values))
+        groups = [{'value': value, **summary} for value, summary in zip(values, summaries)]
+    return {'groups': groups, 'total': total}
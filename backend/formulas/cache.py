@@ -0,0 +1,60 @@
+"""Formula values cached on rows, kept up to date as rows and schemas change.
+
+Each row stores ``computed = {formula key: [fingerprint, value]}`` next to
+its properties. Reads use an entry while its fingerprint matches the
+formula's (Program.fingerprints), so editing a formula or the type of a
+property it reads invalidates exactly the entries that depend on it.
+Editing a row drops the entries of the formulas that read the changed
+properties, directly or through other formulas, and recomputes only those.
+Volatile formulas (now(), today()) are never cached.
+"""
+from typing import Any, Dict, List, NamedTuple, Set
+
+from .compiler import CACHE_FIELD, Frame, Program, program_for
+
+
+class RowUpdate(NamedTuple):
+    # Properties to store: the row's own, formula keys dropped
+    properties: Dict[str, Any]
+    # Cache to store alongside them
+    computed: Dict[str, Any]
+    # Every formula value, volatile ones included, for the response
+    values: Dict[str, Any]
+
+
+def changed_properties(before: Dict[str, Any], after: Dict[str, Any]) -> Set[str]:
+    """Keys whose values differ between two versions of a row's properties"""
+    return {key for key in before.keys() | after.keys() if before.get(key) != after.get(key)}
+
+
+def _inputs(program: Program, properties: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        key: value for key, value in (properties or {}).items()
+        if key not in program.formulas and key not in program.errors
+    }
+
+
+def _updates(program: Program, frame: Frame) -> List[RowUpdate]:
+    results = program.results(frame)
+    updates = []
+    for index, row in enumerate(frame.rows):
+        values = {key: column[index] for key, column in results.items()}
+        computed = {key: [fingerprint, values[key]] for key, fingerprint in program.fingerprints.items()}
+        updates.append(RowUpdate(_inputs(program, row.get('properties')), computed, values))
+    return updates
+
+
+def refresh_rows(properties: Dict[str, Any], rows: List[Dict[str, Any]]) -> List[RowUpdate]:
+    """Bring the caches of `rows` up to date with the schema `properties`, computing only stale entries"""
+    program = program_for(properties)
+    return _updates(program, program.frame(rows))
+
+
+def edit_row(properties: Dict[str, Any], row: Dict[str, Any], new_properties: Dict[str, Any]) -> RowUpdate:
+    """Replace a row's properties, recomputing the formulas that read what changed"""
+    program = program_for(properties)
+    new_properties = _inputs(program, new_properties)
+    affected = program.affected(changed_properties(_inputs(program, row.get('properties')), new_properties))
+    cached = {key: entry for key, entry in (row.get(CACHE_FIELD) or {}).items() if key not in affected}
+    frame = program.frame([{'properties': new_properties, CACHE_FIELD: cached}])
+    return _updates(program, frame)[0]
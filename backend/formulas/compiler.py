@@ -0,0 +1,364 @@
+"""Compile the formula properties of a database schema.
+
+Each expression is parsed and type-checked once, against the property
+types of the schema, into a closure that evaluates it over whole columns.
+A Program holds every formula of one schema in dependency order (formulas
+may read other formulas) and is cached by the schema's signature, so
+requests for the same database reuse it.
+
+Rows may carry cached values (see cache.py). Each formula has a fingerprint
+of its definition and of everything it reads, so a cached value is used
+only while the formula and its inputs' definitions are unchanged, and
+`Program.dependents` says which formulas a property edit reaches.
+"""
+import hashlib
+import json
+import logging
+from functools import lru_cache
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+import numpy as np
+
+from .functions import FUNCTIONS, LITERAL_CHECKS, OPERATORS, SAME, UNARY_OPERATORS
+from .parser import BinaryOp, Call, FormulaError, Literal, Prop, UnaryOp, parse
+from .values import (
+    ANY, BOOLEAN, NUMBER, PROPERTY_TYPES, TEXT, can_cast, cast, column, full, to_json,
+)
+
+logger = logging.getLogger(__name__)
+
+PROGRAM_CACHE_SIZE = 256
+# Property types whose row values are option ids, read by their option names
+OPTION_TYPES = ('select', 'multi_select', 'status')
+# Row field holding cached formula values: {formula key: [fingerprint, value]}
+CACHE_FIELD = 'computed'
+
+
+class Property(NamedTuple):
+    key: str
+    name: str
+    type: str
+    formula: Optional[str]
+    options: Tuple[Tuple[str, str], ...]
+
+
+def _option_names(value: Any, names: Dict[str, str]) -> Any:
+    if isinstance(value, list):
+        return [_option_names(item, names) for item in value]
+    return names.get(value, value) if isinstance(value, str) else value
+
+
+class Frame:
+    """The columns of one evaluation: property values converted on first use, plus formula results"""
+
+    def __init__(self, program: 'Program', rows: List[Dict[str, Any]]):
+        self.program = program
+        self.rows = rows
+        self.n = len(rows)
+        self.columns: Dict[str, np.ndarray] = {}
+        # JSON values of formulas read whole from the rows' caches, converted to columns on first use
+        self.cached: Dict[str, List[Any]] = {}
+        # Cells evaluated rather than read from the rows' caches, per formula
+        self.recomputed: Dict[str, int] = {}
+
+    def subset(self, indices: np.ndarray) -> 'Frame':
+        """A frame of some of the rows, sharing the columns converted so far"""
+        positions = indices.tolist()
+        frame = Frame(self.program, [self.rows[index] for index in positions])
+        frame.columns = {key: values[indices] for key, values in self.columns.items()}
+        frame.cached = {key: [values[index] for index in positions] for key, values in self.cached.items()}
+        return frame
+
+    def get(self, key: str) -> np.ndarray:
+        if key not in self.columns:
+            if key in self.cached:
+                self.columns[key] = column(self.cached[key], self.program.types[key])
+                return self.columns[key]
+            prop = self.program.properties[key]
+            raw = [(row.get('properties') or {}).get(key) for row in self.rows]
+            if prop.options:
+                names = dict(prop.options)
+                raw = [_option_names(value, names) for value in raw]
+            self.columns[key] = column(raw, self.program.types[key])
+        return self.columns[key]
+
+
+class Compiled(NamedTuple):
+    type: str
+    evaluate: Callable[[Frame], np.ndarray]
+    # Property keys read directly
+    dependencies: FrozenSet[str]
+    volatile: bool
+    # The one-element value of expressions that don't read any property
+    constant: Optional[np.ndarray] = None
+
+
+def _constant(value: np.ndarray, type_: str) -> Compiled:
+    return Compiled(type_, lambda frame: np.broadcast_to(value, frame.n), frozenset(), False, value)
+
+
+class Formula(NamedTuple):
+    key: str
+    expression: str
+    type: str
+    evaluate: Callable[[Frame], np.ndarray]
+    dependencies: FrozenSet[str]
+    volatile: bool
+
+
+def _literal_type(value: Any) -> str:
+    if isinstance(value, bool):
+        return BOOLEAN
+    if isinstance(value, float):
+        return NUMBER
+    return TEXT
+
+
+def _common_type(types: List[str]) -> str:
+    distinct = set(types)
+    if len(distinct) == 1:
+        return distinct.pop()
+    if distinct == {NUMBER, BOOLEAN}:
+        return NUMBER
+    return TEXT
+
+
+def compile_expression(node, resolve: Callable[[str], Tuple[str, str, bool]]) -> Compiled:
+    """Compile a parsed expression; `resolve` maps a prop() name to (key, type, volatile)"""
+    if isinstance(node, Literal):
+        type_ = _literal_type(node.value)
+        return _constant(full(1, node.value, type_), type_)
+    if isinstance(node, Prop):
+        key, type_, volatile = resolve(node.name)
+        return Compiled(type_, lambda frame: frame.get(key), frozenset([key]), volatile)
+    if isinstance(node, UnaryOp):
+        return _call(UNARY_OPERATORS[node.op], [compile_expression(node.operand, resolve)], node.op)
+    if isinstance(node, BinaryOp):
+        args = [compile_expression(node.left, resolve), compile_expression(node.right, resolve)]
+        name = OPERATORS[node.op]
+        if node.op == '+' and TEXT in (args[0].type, args[1].type):
+            name = 'concat'
+        return _call(name, args, node.op)
+    if isinstance(node, Call):
+        if node.name not in FUNCTIONS:
+            raise FormulaError(f"Unknown function {node.name}()")
+        if node.name in LITERAL_CHECKS:
+            index, check = LITERAL_CHECKS[node.name]
+            if index < len(node.args) and isinstance(node.args[index], Literal):
+                check(node.args[index].value)
+        return _call(node.name, [compile_expression(arg, resolve) for arg in node.args], f"{node.name}()")
+    raise FormulaError(f"Unexpected {node!r}")
+
+
+def _call(name: str, args: List[Compiled], label: str) -> Compiled:
+    function = FUNCTIONS[name]
+    params = function.params
+    if len(args) < function.min_args or (not function.variadic and len(args) > len(params)):
+        expected = f"at least {function.min_args}" if function.variadic else (
+            str(len(params)) if function.min_args == len(params) else f"{function.min_args} to {len(params)}"
+        )
+        raise FormulaError(f"{label} takes {expected} arguments, got {len(args)}")
+    if function.variadic:
+        params = params + (params[-1],) * (len(args) - len(params))
+
+    same = _common_type([arg.type for arg, param in zip(args, params) if param == SAME])
+    targets = []
+    for position, (arg, param) in enumerate(zip(args, params), start=1):
+        target = same if param == SAME else arg.type if param == ANY else param
+        if not can_cast(arg.type, target):
+            raise FormulaError(f"{label} expects {target} for argument {position}, got {arg.type}")
+        targets.append(target)
+    returns = same if function.returns == SAME else function.returns
+    impl = function.impl
+
+    # Constant arguments are converted once here rather than on every evaluation
+    constants = [
+        cast(arg.constant, arg.type, target) if arg.constant is not None else None
+        for arg, target in zip(args, targets)
+    ]
+    if args and not function.volatile and all(constant is not None for constant in constants):
+        with np.errstate(all='ignore'):
+            return _constant(impl(*constants), returns)
+    evaluators = [
+        (_constant(constant, target).evaluate, target, target) if constant is not None else (arg.evaluate, arg.type, target)
+        for arg, target, constant in zip(args, targets, constants)
+    ]
+
+    def evaluate(frame: Frame) -> np.ndarray:
+        if not evaluators:
+            return impl(frame.n)
+        return impl(*[cast(evaluate_arg(frame), type_, target) for evaluate_arg, type_, target in evaluators])
+
+    return Compiled(
+        returns, evaluate,
+        frozenset().union(*(arg.dependencies for arg in args)),
+        function.volatile or any(arg.volatile for arg in args)
+    )
+
+
+class Program:
+    """Every formula of one schema, compiled and ordered so dependencies come first"""
+
+    def __init__(self, properties: Tuple[Property, ...]):
+        self.properties: Dict[str, Property] = {prop.key: prop for prop in properties}
+        self.names: Dict[str, str] = {}
+        for prop in properties:
+            self.names.setdefault(prop.name, prop.key)
+        for prop in properties:
+            self.names.setdefault(prop.key, prop.key)
+        self.types: Dict[str, str] = {
+            prop.key: PROPERTY_TYPES.get(prop.type, TEXT) for prop in properties if prop.type != 'formula'
+        }
+        self.formulas: Dict[str, Formula] = {}
+        self.errors: Dict[str, str] = {}
+        # Formulas whose values may be cached; volatile ones are not
+        self.fingerprints: Dict[str, str] = {}
+        for prop in properties:
+            if prop.type == 'formula':
+                self._compile(prop.key, [])
+        # Property key -> formulas reading it, directly or through other formulas
+        self.dependents: Dict[str, FrozenSet[str]] = {}
+        readers: Dict[str, Set[str]] = {}
+        for key, formula in self.formulas.items():
+            for dependency in formula.dependencies:
+                readers.setdefault(dependency, set()).add(key)
+        for key in readers:
+            reached, pending = set(), [key]
+            while pending:
+                for reader in readers.get(pending.pop(), ()):
+                    if reader not in reached:
+                        reached.add(reader)
+                        pending.append(reader)
+            self.dependents[key] = frozenset(reached)
+
+    def _compile(self, key: str, stack: List[str]):
+        if key in self.formulas or key in self.errors:
+            return
+        if key in stack:
+            cycle = ' -> '.join(self.properties[k].name for k in stack[stack.index(key):] + [key])
+            raise FormulaError(f"Formulas reference each other in a cycle: {cycle}")
+        prop = self.properties[key]
+
+        def resolve(name: str) -> Tuple[str, str, bool]:
+            ref = self.names.get(name)
+            if ref is None:
+                raise FormulaError(f'Unknown property "{name}"')
+            if self.properties[ref].type == 'formula':
+                self._compile(ref, stack)
+                if ref in self.errors:
+                    raise FormulaError(f'prop("{name}"): {self.errors[ref]}')
+                return ref, self.formulas[ref].type, self.formulas[ref].volatile
+            return ref, self.types[ref], False
+
+        stack.append(key)
+        try:
+            compiled = compile_expression(parse(prop.formula or ''), resolve)
+            self.formulas[key] = Formula(
+                key, prop.formula, compiled.type, compiled.evaluate, compiled.dependencies, compiled.volatile
+            )
+            self.types[key] = compiled.type
+            if not compiled.volatile:
+                self.fingerprints[key] = self._fingerprint(prop, compiled)
+        except FormulaError as exc:
+            self.errors[key] = str(exc)
+            self.types[key] = TEXT
+        finally:
+            stack.pop()
+
+    def _fingerprint(self, prop: Property, compiled: Compiled) -> str:
+        # A plain property's name can change without changing what the formula reads
+        inputs = [
+            self.fingerprints[key] if key in self.formulas else [key, self.properties[key].type, self.properties[key].options]
+            for key in sorted(compiled.dependencies)
+        ]
+        definition = json.dumps([prop.formula, compiled.type, inputs], sort_keys=True)
+        return hashlib.sha1(definition.encode()).hexdigest()[:16]
+
+    def affected(self, keys: Iterable[str]) -> Set[str]:
+        """Formulas whose values change when the properties `keys` change"""
+        return set().union(*(self.dependents.get(key, ()) for key in keys))
+
+    def _evaluate(self, frame: Frame, formula: Formula) -> np.ndarray:
+        try:
+            return formula.evaluate(frame)
+        except Exception as exc:
+            logger.warning("Formula %s failed: %s", formula.key, exc)
+            return full(frame.n, None, formula.type)
+
+    def _read(self, frame: Frame, formula: Formula):
+        """Store a formula's values in the frame, taking them from the rows' caches where fresh
+        and evaluating only the rows whose entry is missing or stale"""
+        fingerprint = self.fingerprints.get(formula.key)
+        if fingerprint is None:
+            frame.recomputed[formula.key] = frame.n
+            frame.columns[formula.key] = self._evaluate(frame, formula)
+            return
+        cached, stale = [], []
+        for index, row in enumerate(frame.rows):
+            # entries are [fingerprint, value]
+            entry = (row.get(CACHE_FIELD) or {}).get(formula.key)
+            if entry and entry[0] == fingerprint:
+                cached.append(entry[1])
+            else:
+                cached.append(None)
+                stale.append(index)
+        frame.recomputed[formula.key] = len(stale)
+        if not stale:
+            frame.cached[formula.key] = cached
+        elif len(stale) == frame.n:
+            frame.columns[formula.key] = self._evaluate(frame, formula)
+        else:
+            values = column(cached, formula.type)
+            values[stale] = self._evaluate(frame.subset(np.array(stale)), formula)
+            frame.columns[formula.key] = values
+
+    def frame(self, rows: List[Dict[str, Any]]) -> Frame:
+        """Evaluate every formula over `rows`, reusing fresh cached values; results stay in the frame's columns"""
+        frame = Frame(self, rows)
+        for key in self.errors:
+            frame.columns[key] = full(frame.n, None, TEXT)
+        if not rows:
+            for key, formula in self.formulas.items():
+                frame.columns[key] = full(0, None, formula.type)
+            return frame
+        with np.errstate(all='ignore'):
+            for formula in self.formulas.values():
+                self._read(frame, formula)
+        return frame
+
+    def results(self, frame: Frame) -> Dict[str, List[Any]]:
+        """JSON values of every formula, errored ones included as empty"""
+        return {
+            key: frame.cached[key] if key in frame.cached else to_json(frame.columns[key], self.types[key])
+            for key in [*self.formulas, *self.errors]
+        }
+
+    def evaluate(self, rows: List[Dict[str, Any]]) -> Dict[str, List[Any]]:
+        """Formula values per property key, one per row"""
+        return self.results(self.frame(rows))
+
+
+def _signature(properties: Dict[str, Any]) -> Tuple[Property, ...]:
+    signature = []
+    for key, prop in sorted(properties.items()):
+        if not isinstance(prop, dict):
+            continue
+        options = tuple(
+            (option['id'], option.get('name', option['id']))
+            for option in prop.get('options') or [] if isinstance(option, dict) and 'id' in option
+        ) if prop.get('type') in OPTION_TYPES else ()
+        signature.append(Property(
+            key, prop.get('name') or key, prop.get('type') or 'text',
+            prop.get('formula') if prop.get('type') == 'formula' else None, options
+        ))
+    return tuple(signature)
+
+
+@lru_cache(maxsize=PROGRAM_CACHE_SIZE)
+def _program(signature: Tuple[Property, ...]) -> Program:
+    return Program(signature)
+
+
+def program_for(properties: Dict[str, Any]) -> Program:
+    """The compiled program of a database's properties, cached per schema"""
+    return _program(_signature(properties or {}))
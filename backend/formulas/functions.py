@@ -0,0 +1,412 @@
+"""The function library, each function working on whole columns.
+
+Number, boolean and date functions are NumPy array operations; text
+functions map over the column since there is no vectorised str type worth
+the conversion. Empty numbers and dates (NaN/NaT) propagate through
+arithmetic; empty text reads as "".
+"""
+import math
+import operator
+from datetime import datetime
+from functools import lru_cache
+from typing import Callable, Dict, NamedTuple, Tuple, Union
+
+import numpy as np
+
+from .parser import FormulaError
+from .values import (
+    ANY, BOOLEAN, DATE, DATE_DTYPE, NAT, NUMBER, TEXT, cast, full, map_distinct, text_array,
+)
+
+# Arguments typed SAME are cast to one common type, which is also the result type when returns is SAME
+SAME = 'same'
+
+
+class Function(NamedTuple):
+    params: Tuple[str, ...]
+    returns: str
+    impl: Callable[..., np.ndarray]
+    min_args: int
+    # The last parameter repeats
+    variadic: bool = False
+    # Reads the clock: results can't be cached
+    volatile: bool = False
+
+
+FUNCTIONS: Dict[str, Function] = {}
+
+
+def function(name: str, params: Tuple[str, ...], returns: str, min_args: Union[int, None] = None,
+             variadic: bool = False, volatile: bool = False):
+    def register(impl):
+        FUNCTIONS[name] = Function(
+            params, returns, impl, len(params) if min_args is None else min_args, variadic, volatile
+        )
+        return impl
+    return register
+
+
+def kind(values: np.ndarray) -> str:
+    """The formula type of a column, from its dtype"""
+    if values.dtype == bool:
+        return BOOLEAN
+    if values.dtype.kind == 'f':
+        return NUMBER
+    if values.dtype.kind == 'M':
+        return DATE
+    return TEXT
+
+
+def texts(values: np.ndarray):
+    return ['' if value is None else value for value in values]
+
+
+def is_empty(values: np.ndarray) -> np.ndarray:
+    type_ = kind(values)
+    if type_ == NUMBER:
+        return np.isnan(values)
+    if type_ == DATE:
+        return np.isnat(values)
+    if type_ == BOOLEAN:
+        return ~values
+    return np.array([value is None or value == '' for value in values], dtype=bool)
+
+
+# Math
+
+function('add', (NUMBER, NUMBER), NUMBER)(np.add)
+function('subtract', (NUMBER, NUMBER), NUMBER)(np.subtract)
+function('multiply', (NUMBER, NUMBER), NUMBER)(np.multiply)
+function('mod', (NUMBER, NUMBER), NUMBER)(np.fmod)
+function('pow', (NUMBER, NUMBER), NUMBER)(np.power)
+function('unaryMinus', (NUMBER,), NUMBER)(np.negative)
+function('abs', (NUMBER,), NUMBER)(np.abs)
+function('sqrt', (NUMBER,), NUMBER)(np.sqrt)
+function('ceil', (NUMBER,), NUMBER)(np.ceil)
+function('floor', (NUMBER,), NUMBER)(np.floor)
+function('sign', (NUMBER,), NUMBER)(np.sign)
+
+
+@function('divide', (NUMBER, NUMBER), NUMBER)
+def divide(left, right):
+    # x / 0 is empty rather than Infinity
+    return np.where(right == 0, np.nan, left / np.where(right == 0, 1, right))
+
+
+@function('round', (NUMBER, NUMBER), NUMBER, min_args=1)
+def round_(values, places=None):
+    # Halves round up like JS Math.round, not to even like np.round
+    scale = 10.0 ** (0 if places is None else np.trunc(places))
+    return np.floor(values * scale + 0.5) / scale
+
+
+@function('max', (NUMBER,), NUMBER, min_args=1, variadic=True)
+def max_(*columns):
+    return np.fmax.reduce(columns) if len(columns) > 1 else columns[0]
+
+
+@function('min', (NUMBER,), NUMBER, min_args=1, variadic=True)
+def min_(*columns):
+    return np.fmin.reduce(columns) if len(columns) > 1 else columns[0]
+
+
+@function('toNumber', (ANY,), NUMBER)
+def to_number(values):
+    if kind(values) == DATE:
+        # milliseconds since the epoch, as Notion does
+        return np.where(np.isnat(values), np.nan, values.astype('int64').astype(float))
+    return cast(values, kind(values), NUMBER)
+
+
+# Text
+
+@function('concat', (TEXT,), TEXT, min_args=1, variadic=True)
+def concat(*columns):
+    return text_array([''.join(parts) for parts in zip(*(texts(values) for values in columns))])
+
+
+@function('length', (TEXT,), NUMBER)
+def length(values):
+    return np.array([len(value) for value in texts(values)], dtype=float)
+
+
+@function('upper', (TEXT,), TEXT)
+def upper(values):
+    return text_array([value.upper() for value in texts(values)])
+
+
+@function('lower', (TEXT,), TEXT)
+def lower(values):
+    return text_array([value.lower() for value in texts(values)])
+
+
+@function('substring', (TEXT, NUMBER, NUMBER), TEXT, min_args=2)
+def substring(values, start, end=None):
+    def one(text, start, end):
+        # JS String.prototype.substring: clamped to the text, swapped if start > end
+        size = len(text)
+        start = 0 if math.isnan(start) else min(max(int(start), 0), size)
+        end = size if end is None or math.isnan(end) else min(max(int(end), 0), size)
+        return text[min(start, end):max(start, end)]
+    ends = end.tolist() if end is not None else [None] * len(values)
+    return text_array([one(*args) for args in zip(texts(values), start.tolist(), ends)])
+
+
+@function('contains', (TEXT, TEXT), BOOLEAN)
+def contains(values, search):
+    return np.array([needle in text for text, needle in zip(texts(values), texts(search))], dtype=bool)
+
+
+@function('replaceAll', (TEXT, TEXT, TEXT), TEXT)
+def replace_all(values, old, new):
+    return text_array([
+        text.replace(needle, replacement) if needle else text
+        for text, needle, replacement in zip(texts(values), texts(old), texts(new))
+    ])
+
+
+@function('format', (ANY,), TEXT)
+def format_(values):
+    return cast(values, kind(values), TEXT)
+
+
+# Dates
+
+DATE_UNITS = {
+    'milliseconds': 'ms', 'seconds': 's', 'minutes': 'm', 'hours': 'h', 'days': 'D', 'weeks': 'W',
+}
+MONTH_UNITS = {'months': 1, 'quarters': 3, 'years': 12}
+
+
+def check_unit(name: str) -> str:
+    unit = name.lower()
+    if not unit.endswith('s'):
+        unit += 's'
+    if unit not in DATE_UNITS and unit not in MONTH_UNITS:
+        raise FormulaError(
+            f"Unknown date unit {name!r}, expected one of {', '.join([*DATE_UNITS, *MONTH_UNITS])}"
+        )
+    return unit
+
+
+def _unit_of(units: np.ndarray) -> str:
+    distinct = set(units.tolist())
+    if len(distinct) != 1:
+        raise FormulaError("The date unit must be the same for every row")
+    return check_unit(distinct.pop() or '')
+
+
+def _month_start(dates: np.ndarray) -> np.ndarray:
+    return dates.astype('datetime64[M]').astype(DATE_DTYPE)
+
+
+def _add_months(dates: np.ndarray, months: np.ndarray) -> np.ndarray:
+    """Calendar month arithmetic; days past the end of the target month clamp to its last day"""
+    month = dates.astype('datetime64[M]')
+    offset = dates - month.astype(DATE_DTYPE)
+    whole = np.where(np.isnan(months), 0, np.trunc(months)).astype('int64')
+    target = month + whole.astype('timedelta64[M]')
+    target_start = target.astype(DATE_DTYPE)
+    last_day = (target + np.timedelta64(1, 'M')).astype(DATE_DTYPE) - np.timedelta64(1, 'D')
+    day = offset.astype('timedelta64[D]')
+    clamped = np.minimum(target_start + day.astype('timedelta64[ms]'), last_day)
+    result = clamped + (offset - day)
+    return np.where(np.isnan(months) | np.isnat(dates), NAT, result)
+
+
+@function('dateAdd', (DATE, NUMBER, TEXT), DATE)
+def date_add(dates, amounts, units):
+    unit = _unit_of(units)
+    if unit in MONTH_UNITS:
+        return _add_months(dates, amounts * MONTH_UNITS[unit])
+    step = np.timedelta64(1, DATE_UNITS[unit]).astype('timedelta64[ms]').astype('int64')
+    shift = np.where(np.isnan(amounts), 0, np.trunc(amounts) * step).astype('int64').astype('timedelta64[ms]')
+    return np.where(np.isnan(amounts), NAT, dates + shift)
+
+
+@function('dateSubtract', (DATE, NUMBER, TEXT), DATE)
+def date_subtract(dates, amounts, units):
+    return date_add(dates, -amounts, units)
+
+
+@function('dateBetween', (DATE, DATE, TEXT), NUMBER)
+def date_between(later, earlier, units):
+    """Whole units from `earlier` to `later`, truncated toward zero"""
+    unit = _unit_of(units)
+    missing = np.isnat(later) | np.isnat(earlier)
+    if unit in MONTH_UNITS:
+        months = (later.astype('datetime64[M]') - earlier.astype('datetime64[M]')).astype('int64')
+        # Not a whole month yet when the day/time within the month hasn't been reached
+        later_offset = later - _month_start(later)
+        earlier_offset = earlier - _month_start(earlier)
+        months = months - ((months > 0) & (later_offset < earlier_offset)) + ((months < 0) & (later_offset > earlier_offset))
+        result = np.trunc(months / MONTH_UNITS[unit])
+    else:
+        step = np.timedelta64(1, DATE_UNITS[unit]).astype('timedelta64[ms]').astype('int64')
+        result = np.trunc((later - earlier).astype('int64') / step)
+    return np.where(missing, np.nan, result)
+
+
+@function('now', (), DATE, volatile=True)
+def now(n):
+    return full(n, datetime.utcnow(), DATE)
+
+
+@function('today', (), DATE, volatile=True)
+def today(n):
+    return full(n, datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0), DATE)
+
+
+@function('year', (DATE,), NUMBER)
+def year(dates):
+    return np.where(np.isnat(dates), np.nan, dates.astype('datetime64[Y]').astype('int64') + 1970.0)
+
+
+@function('month', (DATE,), NUMBER)
+def month(dates):
+    return np.where(np.isnat(dates), np.nan, dates.astype('datetime64[M]').astype('int64') % 12 + 1.0)
+
+
+@function('day', (DATE,), NUMBER)
+def day(dates):
+    days = (dates - _month_start(dates)).astype('timedelta64[D]').astype('int64')
+    return np.where(np.isnat(dates), np.nan, days + 1.0)
+
+
+@function('hour', (DATE,), NUMBER)
+def hour(dates):
+    hours = (dates - dates.astype('datetime64[D]')).astype('timedelta64[h]').astype('int64')
+    return np.where(np.isnat(dates), np.nan, hours.astype(float))
+
+
+# moment.js tokens used by Notion formats, longest first
+_DATE_TOKENS = [
+    ('YYYY', '%Y'), ('YY', '%y'), ('MMMM', '%B'), ('MMM', '%b'), ('MM', '%m'), ('M', '{month}'),
+    ('DD', '%d'), ('Do', '{ordinal}'), ('D', '{day}'), ('dddd', '%A'), ('ddd', '%a'),
+    ('HH', '%H'), ('H', '{hour}'), ('hh', '%I'), ('h', '{hour12}'), ('mm', '%M'), ('ss', '%S'), ('A', '%p'),
+]
+
+
+@lru_cache(maxsize=64)
+def _strftime_pattern(pattern: str) -> str:
+    result = []
+    index = 0
+    while index < len(pattern):
+        for token, replacement in _DATE_TOKENS:
+            if pattern.startswith(token, index):
+                result.append(replacement)
+                index += len(token)
+                break
+        else:
+            char = pattern[index]
+            result.append({'%': '%%', '{': '{{', '}': '}}'}.get(char, char))
+            index += 1
+    return ''.join(result)
+
+
+def _ordinal(day: int) -> str:
+    suffix = 'th' if 10 <= day % 100 <= 20 else {1: 'st', 2: 'nd', 3: 'rd'}.get(day % 10, 'th')
+    return f"{day}{suffix}"
+
+
+@function('formatDate', (DATE, TEXT), TEXT)
+def format_date_(dates, patterns):
+    def one(value, pattern):
+        if np.isnat(value):
+            return None
+        moment = value.astype(datetime)
+        return moment.strftime(_strftime_pattern(pattern)).format(
+            month=moment.month, day=moment.day, ordinal=_ordinal(moment.day),
+            hour=moment.hour, hour12=moment.hour % 12 or 12,
+        )
+    distinct_patterns = set(texts(patterns))
+    if len(distinct_patterns) == 1:
+        pattern = distinct_patterns.pop()
+        return map_distinct(lambda value: one(value, pattern), dates)
+    return text_array([one(value, pattern) for value, pattern in zip(dates, texts(patterns))])
+
+
+# Logic
+
+@function('if', (BOOLEAN, SAME, SAME), SAME)
+def if_(condition, then, otherwise):
+    return np.where(condition, then, otherwise)
+
+
+@function('and', (BOOLEAN,), BOOLEAN, min_args=2, variadic=True)
+def and_(*columns):
+    return np.logical_and.reduce(columns)
+
+
+@function('or', (BOOLEAN,), BOOLEAN, min_args=2, variadic=True)
+def or_(*columns):
+    return np.logical_or.reduce(columns)
+
+
+function('not', (BOOLEAN,), BOOLEAN)(np.logical_not)
+
+
+@function('empty', (ANY,), BOOLEAN)
+def empty(values):
+    return is_empty(values)
+
+
+def _compare(array_op, text_op):
+    def compare(left, right):
+        if kind(left) == TEXT:
+            return np.array([text_op(a, b) for a, b in zip(texts(left), texts(right))], dtype=bool)
+        if kind(left) == BOOLEAN:
+            return array_op(left, right)
+        # Comparisons with an empty value are false, except that empty equals empty
+        left_empty, right_empty = is_empty(left), is_empty(right)
+        result = array_op(left, right) & ~(left_empty | right_empty)
+        if array_op is np.equal:
+            result |= left_empty & right_empty
+        return result
+    return compare
+
+
+function('equal', (SAME, SAME), BOOLEAN)(_compare(np.equal, operator.eq))
+function('larger', (SAME, SAME), BOOLEAN)(_compare(np.greater, operator.gt))
+function('largerEq', (SAME, SAME), BOOLEAN)(_compare(np.greater_equal, operator.ge))
+function('smaller', (SAME, SAME), BOOLEAN)(_compare(np.less, operator.lt))
+function('smallerEq', (SAME, SAME), BOOLEAN)(_compare(np.less_equal, operator.le))
+
+
+@function('unequal', (SAME, SAME), BOOLEAN)
+def unequal(left, right):
+    return ~FUNCTIONS['equal'].impl(left, right)
+
+
+# Aggregates over the whole column, the same value on every row
+
+@function('sum', (NUMBER,), NUMBER)
+def sum_(values):
+    return np.full(len(values), np.nansum(values) if len(values) else 0.0)
+
+
+@function('average', (NUMBER,), NUMBER)
+def average(values):
+    present = values[~np.isnan(values)]
+    return np.full(len(values), present.mean() if len(present) else np.nan)
+
+
+@function('count', (ANY,), NUMBER)
+def count(values):
+    return np.full(len(values), float(np.count_nonzero(~is_empty(values))))
+
+
+# Literal arguments checked when compiling: function -> (argument index, check)
+LITERAL_CHECKS = {
+    'dateAdd': (2, check_unit),
+    'dateSubtract': (2, check_unit),
+    'dateBetween': (2, check_unit),
+}
+
+# Operators, by the function they compile to; '+' with text becomes concat
+OPERATORS = {
+    '+': 'add', '-': 'subtract', '*': 'multiply', '/': 'divide', '%': 'mod', '^': 'pow',
+    '==': 'equal', '!=': 'unequal', '<': 'smaller', '<=': 'smallerEq', '>': 'larger', '>=': 'largerEq',
+    'and': 'and', 'or': 'or',
+}
+UNARY_OPERATORS = {'-': 'unaryMinus', 'not': 'not'}
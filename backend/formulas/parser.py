@@ -0,0 +1,233 @@
+"""Tokenizer and recursive-descent parser for formula expressions.
+
+The language is the one FormulaEditor.js offers::
+
+    if(prop("Status") == "Done", "✅", "⏳")
+    round(prop("Completed") / prop("Total") * 100)
+    dateBetween(prop("Due Date"), now(), "days") > 0 and not prop("Archived")
+
+Precedence, lowest first: ``or``/``||``; ``and``/``&&``; ``not``/``!``;
+comparisons (``==``/``=``, ``!=``, ``<``, ``<=``, ``>``, ``>=``); ``+``/``-``;
+``*``/``/``/``%``; unary minus; ``^`` (right associative). ``and(...)`` and
+``or(...)`` at the start of an operand are the function forms, which take
+any number of arguments.
+"""
+import re
+from typing import Any, Callable, List, NamedTuple, Tuple
+
+
+class FormulaError(ValueError):
+    """An expression that does not parse, type-check or resolve against the schema"""
+
+
+class Literal(NamedTuple):
+    value: Any
+
+
+class Prop(NamedTuple):
+    name: str
+
+
+class Call(NamedTuple):
+    name: str
+    args: Tuple[Any, ...]
+
+
+class BinaryOp(NamedTuple):
+    op: str
+    left: Any
+    right: Any
+
+
+class UnaryOp(NamedTuple):
+    op: str
+    operand: Any
+
+
+_TOKEN = re.compile(r'''
+    \s*(?:
+        (?P<number>\d+(?:\.\d*)?|\.\d+)
+      | (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+      | (?P<name>[A-Za-z_][A-Za-z0-9_]*)
+      | (?P<op>==|!=|<=|>=|&&|\|\||[-+*/%^<>=!(),])
+    )''', re.VERBOSE)
+_ESCAPE = re.compile(r'\\(.)')
+
+COMPARISONS = {'==': '==', '=': '==', '!=': '!=', '<': '<', '<=': '<=', '>': '>', '>=': '>='}
+KEYWORDS = {'true': True, 'false': False}
+# Word operators also written as functions, e.g. and(a, b, c)
+CALL_OPERATORS = ('and', 'or')
+
+
+class Token(NamedTuple):
+    kind: str
+    value: Any
+    position: int
+
+
+def tokenize(expression: str) -> List[Token]:
+    tokens = []
+    position = 0
+    while position < len(expression):
+        match = _TOKEN.match(expression, position)
+        if not match:
+            if expression[position:].isspace():
+                break
+            raise FormulaError(f"Unexpected character {expression[position:].lstrip()[0]!r} at {position}")
+        kind = match.lastgroup
+        text = match.group(kind)
+        start = match.start(kind)
+        if kind == 'number':
+            tokens.append(Token(kind, float(text), start))
+        elif kind == 'string':
+            tokens.append(Token(kind, _ESCAPE.sub(r'\1', text[1:-1]), start))
+        elif kind == 'name' and text in ('and', 'or', 'not'):
+            tokens.append(Token('op', text, start))
+        else:
+            tokens.append(Token(kind, text, start))
+        position = match.end()
+    tokens.append(Token('end', None, len(expression)))
+    return tokens
+
+
+class _Parser:
+    def __init__(self, expression: str):
+        self.tokens = tokenize(expression)
+        self.index = 0
+
+    @property
+    def token(self) -> Token:
+        return self.tokens[self.index]
+
+    def accept(self, *ops: str) -> bool:
+        if self.token.kind == 'op' and self.token.value in ops:
+            self.index += 1
+            return True
+        return False
+
+    def expect(self, op: str):
+        if not self.accept(op):
+            raise FormulaError(f"Expected '{op}' at {self.token.position}")
+
+    def parse(self):
+        if self.token.kind == 'end':
+            raise FormulaError("Empty formula")
+        node = self.or_expr()
+        if self.token.kind != 'end':
+            raise FormulaError(f"Unexpected {self.token.value!r} at {self.token.position}")
+        return node
+
+    def or_expr(self):
+        node = self.and_expr()
+        while self.accept('or', '||'):
+            node = BinaryOp('or', node, self.and_expr())
+        return node
+
+    def and_expr(self):
+        node = self.not_expr()
+        while self.accept('and', '&&'):
+            node = BinaryOp('and', node, self.not_expr())
+        return node
+
+    def not_expr(self):
+        if self.accept('not', '!'):
+            return UnaryOp('not', self.not_expr())
+        return self.comparison()
+
+    def comparison(self):
+        node = self.additive()
+        if self.token.kind == 'op' and self.token.value in COMPARISONS:
+            op = COMPARISONS[self.token.value]
+            self.index += 1
+            node = BinaryOp(op, node, self.additive())
+        return node
+
+    def additive(self):
+        node = self.term()
+        while self.token.kind == 'op' and self.token.value in ('+', '-'):
+            op = self.token.value
+            self.index += 1
+            node = BinaryOp(op, node, self.term())
+        return node
+
+    def term(self):
+        node = self.unary()
+        while self.token.kind == 'op' and self.token.value in ('*', '/', '%'):
+            op = self.token.value
+            self.index += 1
+            node = BinaryOp(op, node, self.unary())
+        return node
+
+    def unary(self):
+        if self.accept('-'):
+            return UnaryOp('-', self.unary())
+        if self.accept('+'):
+            return self.unary()
+        return self.power()
+
+    def power(self):
+        node = self.atom()
+        if self.accept('^'):
+            node = BinaryOp('^', node, self.unary())
+        return node
+
+    def atom(self):
+        token = self.token
+        if token.kind in ('number', 'string'):
+            self.index += 1
+            return Literal(token.value)
+        # and(...) and or(...) are the function forms of the operators
+        if token.kind == 'op' and token.value in CALL_OPERATORS:
+            following = self.tokens[self.index + 1]
+            call_form = following.kind == 'op' and following.value == '('
+        else:
+            call_form = False
+        if token.kind == 'name' or call_form:
+            self.index += 1
+            if token.value in KEYWORDS:
+                return Literal(KEYWORDS[token.value])
+            if not self.accept('('):
+                raise FormulaError(f"Expected '(' after {token.value} at {self.token.position}")
+            args = []
+            if not self.accept(')'):
+                args.append(self.or_expr())
+                while self.accept(','):
+                    args.append(self.or_expr())
+                self.expect(')')
+            if token.value == 'prop':
+                if len(args) != 1 or not isinstance(args[0], Literal) or not isinstance(args[0].value, str):
+                    raise FormulaError(f'prop() takes a property name, e.g. prop("Name"), at {token.position}')
+                return Prop(args[0].value)
+            return Call(token.value, tuple(args))
+        if self.accept('('):
+            node = self.or_expr()
+            self.expect(')')
+            return node
+        if token.kind == 'end':
+            raise FormulaError("Unexpected end of formula")
+        raise FormulaError(f"Unexpected {token.value!r} at {token.position}")
+
+
+def parse(expression: str):
+    """Parse an expression into a tree of Literal/Prop/Call/BinaryOp/UnaryOp nodes"""
+    return _Parser(expression).parse()
+
+
+def _quote(text: str) -> str:
+    return '"' + text.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def rename_props(expression: str, rename: Callable[[str], str]) -> str:
+    """`expression` with the name in each prop("name") replaced by rename(name), the rest kept as written"""
+    tokens = tokenize(expression)
+    parts, position = [], 0
+    for index in range(len(tokens) - 3):
+        name, open_paren, string, close_paren = tokens[index:index + 4]
+        if (name.kind, name.value, open_paren.kind, open_paren.value, string.kind, close_paren.kind,
+                close_paren.value) != ('name', 'prop', 'op', '(', 'string', 'op', ')'):
+            continue
+        renamed = rename(string.value)
+        if renamed != string.value:
+            parts += [expression[position:string.position], _quote(renamed)]
+            position = _TOKEN.match(expression, string.position).end()
+    return ''.join(parts) + expression[position:]
@@ -0,0 +1,135 @@
+"""Filter and sort database rows by any property, formulas included.
+
+Conditions and sort keys are evaluated on the same typed columns as the
+formulas, so `?filter=Progress:gte:50` compares numbers, dates compare as
+dates and select properties by option name.
+"""
+from typing import Any, Dict, List, NamedTuple
+
+import numpy as np
+
+from .compiler import CACHE_FIELD, Frame, Program, program_for
+from .functions import FUNCTIONS, is_empty, kind, texts
+from .parser import FormulaError
+from .values import DATE, NUMBER, TEXT, cast, column
+
+# op -> function comparing the column with the value
+COMPARISONS = {
+    'eq': 'equal', 'ne': 'unequal', 'gt': 'larger', 'gte': 'largerEq', 'lt': 'smaller', 'lte': 'smallerEq',
+}
+FILTER_OPERATORS = (*COMPARISONS, 'contains', 'not_contains', 'empty', 'not_empty')
+
+
+class RowFilter(NamedTuple):
+    key: str
+    op: str
+    value: Any
+
+
+class RowSort(NamedTuple):
+    key: str
+    descending: bool
+
+
+def property_key(program: Program, name: str) -> str:
+    """The key of a property given by key or name"""
+    key = program.names.get(name)
+    if key is None:
+        raise FormulaError(f'Unknown property "{name}"')
+    return key
+
+
+def parse_filter(program: Program, text: str) -> RowFilter:
+    """`property:op:value`, or `property:empty` / `property:not_empty`; property is a key or name"""
+    name, _, rest = text.partition(':')
+    op, _, value = rest.partition(':')
+    if op not in FILTER_OPERATORS:
+        raise FormulaError(f"Filter {text!r}: operator must be one of {', '.join(FILTER_OPERATORS)}")
+    key = property_key(program, name)
+    if op in ('empty', 'not_empty'):
+        return RowFilter(key, op, None)
+    type_ = program.types[key]
+    if op in ('contains', 'not_contains') or type_ == TEXT:
+        return RowFilter(key, op, value)
+    parsed = column([value], type_)
+    if type_ in (NUMBER, DATE) and is_empty(parsed)[0]:
+        raise FormulaError(f"Filter {text!r}: {value!r} is not a {type_}")
+    return RowFilter(key, op, parsed[0])
+
+
+def parse_sort(program: Program, text: str) -> RowSort:
+    """`property` ascending or `-property` descending"""
+    descending = text.startswith('-')
+    return RowSort(property_key(program, text[1:] if descending else text), descending)
+
+
+def _mask(frame: Frame, row_filter: RowFilter) -> np.ndarray:
+    values = frame.get(row_filter.key)
+    if row_filter.op in ('empty', 'not_empty'):
+        empty = is_empty(values)
+        return empty if row_filter.op == 'empty' else ~empty
+    if row_filter.op in ('contains', 'not_contains'):
+        needle = str(row_filter.value).lower()
+        found = np.array([needle in text.lower() for text in texts(cast(values, kind(values), TEXT))], dtype=bool)
+        return found if row_filter.op == 'contains' else ~found
+    if values.dtype == object:
+        other = np.empty(frame.n, dtype=object)
+        other[:] = [row_filter.value] * frame.n
+    else:
+        other = np.full(frame.n, row_filter.value, dtype=values.dtype)
+    return FUNCTIONS[COMPARISONS[row_filter.op]].impl(values, other)
+
+
+def _sort_keys(values: np.ndarray, descending: bool) -> List[np.ndarray]:
+    """lexsort keys, most significant first; empty values sort last either way"""
+    empty = is_empty(values) if values.dtype != bool else np.zeros(len(values), dtype=bool)
+    if values.dtype == object:
+        lowered = np.array([text.lower() for text in texts(values)], dtype=str)
+        order = np.unique(lowered, return_inverse=True)[1].astype(float)
+    elif values.dtype.kind == 'M':
+        order = np.where(empty, 0, values.astype('int64')).astype(float)
+    else:
+        order = np.where(empty, 0, values.astype(float))
+    return [empty, -order if descending else order]
+
+
+def query_rows(properties: Dict[str, Any], rows: List[Dict[str, Any]],
+               filters: List[str] = (), sorts: List[str] = ()) -> List[Dict[str, Any]]:
+    """Rows with formula values filled in (from their caches where fresh), filtered and sorted.
+
+    `filters` and `sorts` are in the parse_filter/parse_sort syntax; sorts
+    are applied in order of significance and ties keep row order.
+    """
+    program = program_for(properties)
+    row_filters = [parse_filter(program, text) for text in filters]
+    row_sorts = [parse_sort(program, text) for text in sorts]
+    frame = program.frame(rows)
+
+    indices = np.arange(frame.n)
+    if row_filters:
+        mask = np.ones(frame.n, dtype=bool)
+        with np.errstate(all='ignore'):
+            for row_filter in row_filters:
+                mask &= _mask(frame, row_filter)
+        indices = indices[mask]
+    if row_sorts:
+        keys = [
+            key for row_sort in row_sorts
+            for key in _sort_keys(frame.get(row_sort.key)[indices], row_sort.descending)
+        ]
+        # lexsort sorts by the last key first
+        indices = indices[np.lexsort(keys[::-1])]
+
+    results = program.results(frame)
+    keys = list(results)
+    values_by_row = list(zip(*results.values())) if keys else [()] * frame.n
+    output = []
+    for index in indices.tolist():
+        row = rows[index].copy()
+        row.pop(CACHE_FIELD, None)
+        properties = dict(row.get('properties') or {})
+        properties.update(zip(keys, values_by_row[index]))
+        row['properties'] = properties
+        output.append(row)
+    return output
+
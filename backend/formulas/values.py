@@ -0,0 +1,204 @@
+"""Typed columns: conversions between row values and NumPy arrays.
+
+Every value in a formula has one of four types, each held as a whole
+column:
+
+- ``number``: float64, NaN when empty
+- ``boolean``: bool (empty is False)
+- ``date``: datetime64[ms] in UTC, NaT when empty
+- ``text``: object array of str, None when empty
+"""
+import math
+import warnings
+from datetime import datetime, timezone
+from typing import Any, Iterable, List
+
+import numpy as np
+
+from .parser import FormulaError
+
+NUMBER = 'number'
+TEXT = 'text'
+BOOLEAN = 'boolean'
+DATE = 'date'
+ANY = 'any'
+
+# Formula type of each database property type; anything else reads as text
+PROPERTY_TYPES = {
+    'number': NUMBER,
+    'checkbox': BOOLEAN,
+    'date': DATE,
+    'created_time': DATE,
+    'last_edited_time': DATE,
+    'rollup': NUMBER,
+}
+
+DATE_DTYPE = 'datetime64[ms]'
+NAT = np.datetime64('NaT', 'ms')
+# Integral floats up to this size are returned as ints, like JSON numbers from JS
+MAX_SAFE_INTEGER = 2 ** 53
+
+
+def _number(value: Any) -> float:
+    if value is None or value == '':
+        return np.nan
+    if isinstance(value, bool):
+        return float(value)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _text(value: Any) -> Any:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return value
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (list, tuple)):
+        return ', '.join(item for item in (_text(item) for item in value) if item)
+    if isinstance(value, dict):
+        # select options and people are stored as objects in some clients
+        return _text(value.get('name', value.get('id')))
+    if isinstance(value, float):
+        return format_number(value) if math.isfinite(value) else None
+    return str(value)
+
+
+def _boolean(value: Any) -> bool:
+    if isinstance(value, str):
+        return value.lower() in ('true', '1', 'yes', '__yes__')
+    return bool(value)
+
+
+def parse_date(value: Any):
+    """A row value as a naive UTC datetime, or None"""
+    if isinstance(value, dict):
+        # date ranges are stored as {start, end}
+        value = value.get('start')
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        try:
+            parsed = datetime.fromisoformat(str(value))
+        except ValueError:
+            return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def column(values: Iterable[Any], type_: str) -> np.ndarray:
+    """A column of raw row values converted to `type_`"""
+    values = list(values)
+    if type_ == NUMBER:
+        return np.array([_number(value) for value in values], dtype=float)
+    if type_ == BOOLEAN:
+        return np.array([_boolean(value) for value in values], dtype=bool)
+    if type_ == DATE:
+        strings = ['' if value is None else value for value in values]
+        if all(isinstance(value, str) for value in strings):
+            # NumPy parses plain ISO strings in C; offsets and 'Z' warn, and take the slow path
+            try:
+                with warnings.catch_warnings():
+                    warnings.simplefilter('error')
+                    return np.array(strings, dtype=DATE_DTYPE)
+            except (ValueError, UserWarning):
+                pass
+        return np.array([parse_date(value) or NAT for value in values], dtype=DATE_DTYPE)
+    result = np.empty(len(values), dtype=object)
+    result[:] = [_text(value) for value in values]
+    return result
+
+
+def full(n: int, value: Any, type_: str) -> np.ndarray:
+    """A column repeating one value"""
+    if type_ == TEXT:
+        result = np.empty(n, dtype=object)
+        result[:] = [value] * n
+        return result
+    return column([value], type_).repeat(n)
+
+
+def text_array(values: List[Any]) -> np.ndarray:
+    result = np.empty(len(values), dtype=object)
+    result[:] = values
+    return result
+
+
+def map_distinct(fn, values: np.ndarray) -> np.ndarray:
+    """fn of each value of a number or date column, calling it once per distinct value"""
+    distinct, inverse = np.unique(values, return_inverse=True)
+    return text_array([fn(value) for value in distinct])[inverse.reshape(-1)]
+
+
+def format_number(value: float) -> str:
+    """A finite number as JS would print it: no trailing .0 on integers"""
+    if value == int(value) and abs(value) < MAX_SAFE_INTEGER:
+        return str(int(value))
+    return repr(value)
+
+
+# Conversions applied to arguments without asking; anything else is a type error
+IMPLICIT_CASTS = {(NUMBER, TEXT), (BOOLEAN, TEXT), (DATE, TEXT), (BOOLEAN, NUMBER), (TEXT, DATE)}
+
+
+def can_cast(from_type: str, to_type: str) -> bool:
+    return from_type == to_type or to_type == ANY or (from_type, to_type) in IMPLICIT_CASTS
+
+
+def cast(values: np.ndarray, from_type: str, to_type: str) -> np.ndarray:
+    """Convert a column between types; raises FormulaError when there is no conversion"""
+    if from_type == to_type or to_type == ANY:
+        return values
+    if to_type == TEXT:
+        if from_type == NUMBER:
+            return map_distinct(lambda value: format_number(value) if math.isfinite(value) else None, values)
+        if from_type == BOOLEAN:
+            return text_array(['true' if value else 'false' for value in values])
+        if from_type == DATE:
+            return map_distinct(format_date, values)
+    if to_type == NUMBER:
+        if from_type == BOOLEAN:
+            return values.astype(float)
+        if from_type == TEXT:
+            return column(values, NUMBER)
+    if to_type == BOOLEAN:
+        if from_type == NUMBER:
+            return (values != 0) & ~np.isnan(values)
+        if from_type == TEXT:
+            return np.array([bool(value) for value in values], dtype=bool)
+        if from_type == DATE:
+            return ~np.isnat(values)
+    if to_type == DATE and from_type == TEXT:
+        return column(values, DATE)
+    raise FormulaError(f"Expected {to_type}, got {from_type}")
+
+
+def format_date(value: np.datetime64) -> Any:
+    """ISO 8601; dates without a time of day as YYYY-MM-DD"""
+    if np.isnat(value):
+        return None
+    if value == value.astype('datetime64[D]'):
+        return str(value.astype('datetime64[D]'))
+    return str(value.astype('datetime64[s]')) if value == value.astype('datetime64[s]') else str(value)
+
+
+def to_json(values: np.ndarray, type_: str) -> List[Any]:
+    """A column as JSON-ready row values"""
+    if type_ == NUMBER:
+        finite = np.isfinite(values)
+        integral = finite & (np.trunc(values) == values) & (np.abs(values) < MAX_SAFE_INTEGER)
+        result = np.empty(len(values), dtype=object)
+        result[finite] = values[finite].tolist()
+        result[integral] = values[integral].astype('int64').tolist()
+        return result.tolist()
+    if type_ == BOOLEAN:
+        return values.tolist()
+    if type_ == DATE:
+        return map_distinct(format_date, values).tolist()
+    return list(values)
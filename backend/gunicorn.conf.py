@@ -0,0 +1,37 @@
+"""Gunicorn settings, picked up automatically when gunicorn runs from backend/."""
+import os
+import shutil
+import sys
+
+# Workers write metrics to this directory so /metrics can aggregate them
+# (prometheus_client multiprocess mode). Must be set before workers start.
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/mindnotes-metrics')
+
+# Import the app once in the master and fork warm workers from it; set
+# GUNICORN_PRELOAD=false to import per worker (e.g. for --reload)
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'true').lower() == 'true'
+
+
+def on_starting(server):
+    # Metric files from a previous run would be aggregated as if still live
+    path = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+
+
+def when_ready(server):
+    if preload_app:
+        from lifecycle import preload
+        preload()
+
+
+def post_fork(server, worker):
+    # Pooled SQL connections must never be shared across processes
+    database_postgres = sys.modules.get('database_postgres')
+    if database_postgres is not None and database_postgres.engine is not None:
+        database_postgres.engine.dispose(close=False)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
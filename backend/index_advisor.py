@@ -0,0 +1,467 @@
+"""Index advisor: checks observed query shapes against existing indexes.
+
+Each observed query is reduced to an *access*: the table or collection, the
+columns it matches by equality, the columns it sorts by and the ones it
+ranges over. Boolean literals (``is_deleted = false``) are kept apart as
+filters, since they are better served by a partial index than by a key
+column. An index serves an access when its leading columns follow the
+equality, sort, range order and its partial predicate (if any) is implied
+by the query's filters.
+
+Observed shapes come from, in order of preference:
+
+* a JSON dump of ``GET /api/admin/slow-queries`` (``--input``); run a worker
+  with ``SLOW_QUERY_MS=0`` to capture every shape rather than the slow ones
+* ``pg_stat_statements`` on PostgreSQL
+* the database profiler (``system.profile``) on MongoDB
+
+Run it with ``python manage.py advise-indexes``.
+"""
+import json
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Filter values that a slow-log shape or pg_stat_statements has replaced
+UNKNOWN = '?'
+
+
+class Access:
+    """How one query shape reads one table or collection"""
+
+    def __init__(self, kind: str, table: str):
+        self.kind = kind  # 'sql' or 'mongo'
+        self.table = table
+        self.equality: List[str] = []
+        self.order: List[str] = []
+        self.range: List[str] = []
+        self.filters: Dict[str, Any] = {}  # column -> boolean/null literal
+        self.count = 0
+        self.total_ms = 0.0
+        self.example: Optional[str] = None
+
+    def add_equality(self, column: str, value: Any = UNKNOWN):
+        if _is_flag(value):
+            self.filters[column] = value
+        elif column not in self.equality:
+            self.equality.append(column)
+
+    def add_range(self, column: str):
+        if column not in self.range and column not in self.equality:
+            self.range.append(column)
+
+    def add_order(self, column: str):
+        if column not in self.order:
+            self.order.append(column)
+
+    @property
+    def key(self) -> Tuple:
+        return (self.kind, self.table, tuple(sorted(self.equality)), tuple(self.order),
+                tuple(sorted(self.range)), tuple(sorted((k, repr(v)) for k, v in self.filters.items())))
+
+    def is_selective(self) -> bool:
+        return bool(self.equality or self.range or self.order or self.filters)
+
+    def describe(self) -> str:
+        parts = []
+        if self.equality:
+            parts.append('eq(' + ', '.join(self.equality) + ')')
+        if self.filters:
+            parts.append('filter(' + ', '.join(f"{k}={_literal(v)}" for k, v in self.filters.items()) + ')')
+        if self.order:
+            parts.append('sort(' + ', '.join(self.order) + ')')
+        if self.range:
+            parts.append('range(' + ', '.join(self.range) + ')')
+        return ' '.join(parts)
+
+
+class IndexInfo:
+    def __init__(self, name: str, columns: List[str], filters: Optional[Dict[str, Any]] = None,
+                 not_null: Iterable[str] = ()):
+        self.name = name
+        self.columns = columns
+        self.filters = filters or {}  # partial index predicate: column -> literal
+        self.not_null = set(not_null)  # partial index predicate: column IS NOT NULL
+
+    def describe(self) -> str:
+        where = [f"{k}={_literal(v)}" for k, v in self.filters.items()] + [f"{c} not null" for c in self.not_null]
+        return f"{self.name}({', '.join(self.columns)})" + (f" where {' and '.join(where)}" if where else '')
+
+
+def _is_flag(value: Any) -> bool:
+    return value is True or value is False or value is None
+
+
+def _literal(value: Any) -> str:
+    return 'null' if value is None else str(value).lower()
+
+
+# Matching
+
+def applies(index: IndexInfo, access: Access) -> bool:
+    """Whether the partial predicate of `index` is implied by the query"""
+    for column, value in index.filters.items():
+        if column in access.filters:
+            if access.filters[column] != value:
+                return False
+        elif column not in access.equality:
+            return False
+        # else: equality on a placeholder, which may or may not match; assume it does
+    for column in index.not_null:
+        if column not in access.equality and column not in access.range:
+            return False
+    return True
+
+
+def usable_prefix(index: IndexInfo, access: Access) -> List[str]:
+    """Leading index columns the query can use: equality, then sort, then one range"""
+    columns = index.columns
+    position = 0
+    equality = set(access.equality) | set(access.filters)
+    while position < len(columns) and columns[position] in equality:
+        position += 1
+    for column in access.order:
+        if position < len(columns) and columns[position] == column:
+            position += 1
+        else:
+            break
+    if position < len(columns) and columns[position] in access.range:
+        position += 1
+    return columns[:position]
+
+
+def evaluate(access: Access, indexes: List[IndexInfo]) -> Dict[str, Any]:
+    best, best_prefix = None, []
+    for index in indexes:
+        if not applies(index, access):
+            continue
+        prefix = usable_prefix(index, access)
+        if len(prefix) > len(best_prefix) or (best is None and prefix):
+            best, best_prefix = index, prefix
+
+    # Columns pinned by the partial predicate need no key column
+    used = set(best_prefix) | set(best.filters if best else {})
+    sorted_by_index = all(column in used for column in access.order)
+    if best is None:
+        status = 'missing'
+    elif all(column in used for column in access.equality + list(access.filters)) and sorted_by_index:
+        status = 'ok'
+    else:
+        status = 'partial'
+    return {
+        'status': status,
+        'kind': access.kind,
+        'table': access.table,
+        'access': access.describe(),
+        'count': access.count,
+        'total_ms': round(access.total_ms, 3),
+        'index': best.describe() if best else None,
+        'unsorted': bool(access.order) and not sorted_by_index,
+        'suggestion': suggest(access) if status != 'ok' else None,
+        'example': access.example,
+    }
+
+
+def suggest(access: Access) -> str:
+    # Booleans go in the partial predicate; null matches stay key columns so one
+    # index serves both `parent_id IS NULL` and `parent_id = ?`
+    nullable = [column for column, value in access.filters.items() if value is None]
+    flags = {column: value for column, value in access.filters.items() if value is not None}
+    columns = access.equality + nullable + [c for c in access.order if c not in access.equality] + access.range[:1]
+    if not columns:
+        columns, flags = list(flags), {}
+    name = f"ix_{access.table}_{'_'.join(columns)}"
+    if access.kind == 'sql':
+        where = ' AND '.join(f"{column} = {_literal(value)}" for column, value in flags.items())
+        return (f"CREATE INDEX CONCURRENTLY {name} ON {access.table} ({', '.join(columns)})"
+                + (f" WHERE {where}" if where else ''))
+    keys = ', '.join(f"{column}: 1" for column in columns)
+    options = f", {{partialFilterExpression: {json.dumps(flags)}}}" if flags else ''
+    return f"db.{access.table}.createIndex({{{keys}}}{options})"
+
+
+def advise(accesses: Iterable[Access], indexes: Dict[str, List[IndexInfo]]) -> List[Dict[str, Any]]:
+    """Evaluate accesses against the indexes of their tables, worst first"""
+    findings = [evaluate(access, indexes.get(access.table, [])) for access in accesses if access.is_selective()]
+    rank = {'missing': 0, 'partial': 1, 'ok': 2}
+    return sorted(findings, key=lambda finding: (rank[finding['status']], -finding['total_ms']))
+
+
+def merge(accesses: Iterable[Access]) -> List[Access]:
+    """Combine accesses with the same shape, adding up their counts"""
+    merged: Dict[Tuple, Access] = {}
+    for access in accesses:
+        existing = merged.get(access.key)
+        if existing is None:
+            merged[access.key] = access
+        else:
+            existing.count += access.count
+            existing.total_ms += access.total_ms
+    return list(merged.values())
+
+
+# SQL
+
+_CLAUSE_END = re.compile(r'\b(ORDER BY|GROUP BY|LIMIT|OFFSET|FOR UPDATE|RETURNING)\b', re.IGNORECASE)
+_TABLE = re.compile(r'\b(?:FROM|JOIN|UPDATE|INTO)\s+"?(\w+)"?', re.IGNORECASE)
+_COLUMN = r'"?(\w+)"?\."?(\w+)"?'
+_COMPARISON = re.compile(
+    _COLUMN + r'\s*(=|>=|<=|<>|!=|<|>|\bIN\b|\bIS NOT NULL\b|\bIS NULL\b|\bBETWEEN\b)\s*(' + _COLUMN + r'|\S+)?',
+    re.IGNORECASE
+)
+_ORDER_BY = re.compile(r'\bORDER BY\s+(.+?)(?:\bLIMIT\b|\bOFFSET\b|\bFOR UPDATE\b|$)', re.IGNORECASE)
+_SQL_LITERALS = {'true': True, 'false': False}
+_OR = re.compile(r'\bOR\b', re.IGNORECASE)
+
+
+def sql_accesses(statement: str) -> List[Access]:
+    """One access per table the statement filters or sorts on"""
+    accesses: Dict[str, Access] = {}
+
+    def access_for(table: str) -> Access:
+        if table not in accesses:
+            accesses[table] = Access('sql', table)
+        return accesses[table]
+
+    for table in _TABLE.findall(statement):
+        access_for(table)
+    for match in _COMPARISON.finditer(statement):
+        table, column, operator, rhs, rhs_table, rhs_column = match.groups()
+        operator = operator.upper()
+        if table not in accesses:
+            continue
+        if rhs_table and rhs_table in accesses:
+            # Join condition: each side may be looked up by the other
+            access_for(table).add_equality(column)
+            access_for(rhs_table).add_equality(rhs_column)
+        elif operator in ('=', 'IN'):
+            literal = (rhs or '').rstrip(')').lower()
+            access_for(table).add_equality(column, _SQL_LITERALS.get(literal, UNKNOWN))
+        elif operator == 'IS NULL':
+            access_for(table).add_equality(column, None)
+        elif operator in ('>', '>=', '<', '<=', 'BETWEEN'):
+            access_for(table).add_range(column)
+    order_by = _ORDER_BY.search(statement)
+    if order_by:
+        for term in order_by.group(1).split(','):
+            column = re.match(r'\s*' + _COLUMN, term)
+            if column and column.group(1) in accesses:
+                access_for(column.group(1)).add_order(column.group(2))
+    if _OR.search(statement):
+        # Each branch of an OR needs its own index; approximate that with one access per column
+        return [branch for access in accesses.values() for branch in _split_or(access)]
+    return list(accesses.values())
+
+
+def _split_or(access: Access) -> List[Access]:
+    if len(access.equality) < 2:
+        return [access]
+    branches = []
+    for column in access.equality:
+        branch = Access(access.kind, access.table)
+        branch.add_equality(column)
+        branch.filters = dict(access.filters)
+        branches.append(branch)
+    return branches
+
+
+def _parse_sql_predicate(predicate: Optional[str]) -> Tuple[Dict[str, Any], List[str]]:
+    """Partial index predicate as (column -> literal, columns IS NOT NULL)"""
+    filters: Dict[str, Any] = {}
+    not_null = []
+    for clause in re.split(r'\bAND\b', predicate or '', flags=re.IGNORECASE):
+        clause = clause.strip().strip('()').strip()
+        equals = re.match(r'"?(\w+)"?\s*=\s*(\w+)', clause)
+        if equals and equals.group(2).lower() in _SQL_LITERALS:
+            filters[equals.group(1)] = _SQL_LITERALS[equals.group(2).lower()]
+        elif re.match(r'"?(\w+)"?\s+IS NOT NULL', clause, re.IGNORECASE):
+            not_null.append(re.match(r'"?(\w+)"?', clause).group(1))
+        elif re.match(r'"?(\w+)"?\s+IS NULL', clause, re.IGNORECASE):
+            filters[re.match(r'"?(\w+)"?', clause).group(1)] = None
+    return filters, not_null
+
+
+def sql_indexes(engine) -> Dict[str, List[IndexInfo]]:
+    from sqlalchemy import inspect
+    inspector = inspect(engine)
+    indexes: Dict[str, List[IndexInfo]] = {}
+    for table in inspector.get_table_names():
+        found = []
+        primary_key = inspector.get_pk_constraint(table).get('constrained_columns') or []
+        if primary_key:
+            found.append(IndexInfo(f"{table}_pkey", primary_key))
+        for constraint in inspector.get_unique_constraints(table):
+            found.append(IndexInfo(constraint['name'] or f"{table}_unique", constraint['column_names']))
+        for index in inspector.get_indexes(table):
+            predicate = index.get('dialect_options', {}).get('postgresql_where')
+            filters, not_null = _parse_sql_predicate(str(predicate) if predicate is not None else None)
+            found.append(IndexInfo(index['name'], [c for c in index['column_names'] if c], filters, not_null))
+        indexes[table] = found
+    return indexes
+
+
+def pg_stat_statements(engine, limit: int) -> List[Access]:
+    """Most expensive statements recorded by pg_stat_statements"""
+    from sqlalchemy import text
+    accesses = []
+    with engine.connect() as connection:
+        for total_column in ('total_exec_time', 'total_time'):  # renamed in PostgreSQL 13
+            try:
+                rows = connection.execute(text(
+                    f"SELECT query, calls, {total_column} FROM pg_stat_statements "
+                    "WHERE query ~* '^\\s*(SELECT|UPDATE|DELETE)' "
+                    f"ORDER BY {total_column} DESC LIMIT :limit"
+                ), {'limit': limit}).fetchall()
+                break
+            except Exception:
+                connection.rollback()
+        else:
+            raise RuntimeError(
+                "pg_stat_statements is not available; enable it or pass --input with a slow-query dump"
+            )
+    for query, calls, total_ms in rows:
+        for access in sql_accesses(query):
+            access.count, access.total_ms, access.example = calls, float(total_ms), query
+            accesses.append(access)
+    return accesses
+
+
+# Mongo
+
+_RANGE_OPERATORS = {'$gt', '$gte', '$lt', '$lte'}
+_EQUALITY_OPERATORS = {'$eq', '$in'}
+
+
+def _add_mongo_filter(access: Access, query: Any):
+    if not isinstance(query, dict):
+        return
+    for field, condition in query.items():
+        if field in ('$and', '$or', '$nor'):
+            for clause in condition if isinstance(condition, list) else [condition]:
+                _add_mongo_filter(access, clause)
+        elif field.startswith('$'):
+            continue
+        elif isinstance(condition, dict) and any(key.startswith('$') for key in condition):
+            if _EQUALITY_OPERATORS & set(condition):
+                value = condition.get('$eq', UNKNOWN)
+                access.add_equality(field, value if _is_flag(value) else UNKNOWN)
+            elif _RANGE_OPERATORS & set(condition):
+                access.add_range(field)
+        else:
+            access.add_equality(field, condition if _is_flag(condition) else UNKNOWN)
+
+
+def mongo_access(command_name: str, collection: str, command: Dict[str, Any]) -> Access:
+    """Access of a find/count/aggregate/update/delete command (raw or normalized)"""
+    access = Access('mongo', collection)
+    if command_name == 'aggregate':
+        for stage in command.get('pipeline') or []:
+            if '$match' in stage:
+                _add_mongo_filter(access, stage['$match'])
+            elif '$sort' in stage:
+                for field in stage['$sort']:
+                    access.add_order(field)
+            else:
+                break
+    else:
+        _add_mongo_filter(access, command.get('filter') or command.get('query'))
+        for statement in (command.get('updates') or []) + (command.get('deletes') or []):
+            _add_mongo_filter(access, statement.get('q'))
+        for field in command.get('sort') or {}:
+            access.add_order(field)
+    return access
+
+
+def mongo_shape_access(shape: str) -> Access:
+    """Access of a slow_queries.mongo_shape() string"""
+    parsed = json.loads(shape)
+    return mongo_access(parsed.get('op'), parsed.get('collection'), parsed)
+
+
+def mongo_indexes(database) -> Dict[str, List[IndexInfo]]:
+    indexes: Dict[str, List[IndexInfo]] = {}
+    for collection in database.list_collection_names():
+        found = []
+        for name, info in database[collection].index_information().items():
+            partial = info.get('partialFilterExpression') or {}
+            filters = {field: value for field, value in partial.items() if _is_flag(value)}
+            not_null = [
+                field for field, value in partial.items()
+                if isinstance(value, dict) and (value.get('$exists') is True or value.get('$type'))
+            ]
+            found.append(IndexInfo(name, [field for field, _ in info['key']], filters, not_null))
+        indexes[collection] = found
+    return indexes
+
+
+def mongo_profile(database, limit: int) -> List[Access]:
+    """Most expensive operations captured by the database profiler"""
+    if database.command('profile', -1).get('was', 0) == 0 and database.system.profile.estimated_document_count() == 0:
+        raise RuntimeError(
+            "The Mongo profiler is off; run db.setProfilingLevel(1) or pass --input with a slow-query dump"
+        )
+    accesses = []
+    operations = database.system.profile.find(
+        {'op': {'$in': ['query', 'command', 'update', 'remove']}}
+    ).sort('millis', -1).limit(limit)
+    for operation in operations:
+        command = operation.get('command') or {}
+        if not command:
+            continue
+        command_name = next(iter(command))
+        access = mongo_access(command_name, operation.get('ns', '').split('.', 1)[-1], command)
+        access.count, access.total_ms = 1, float(operation.get('millis', 0))
+        access.example = json.dumps(command, default=str)[:500]
+        accesses.append(access)
+    return accesses
+
+
+# Entry points
+
+def load_slow_query_dump(path: str) -> List[Access]:
+    """Accesses from a saved GET /api/admin/slow-queries response"""
+    with open(path) as f:
+        data = json.load(f)
+    accesses = []
+    for entry in data.get('queries', []) if isinstance(data, dict) else data:
+        if entry['kind'] == 'mongo':
+            found = [mongo_shape_access(entry['shape'])]
+        else:
+            found = sql_accesses(entry['shape'])
+        for access in found:
+            access.count, access.total_ms, access.example = entry.get('count', 1), entry.get('total_ms', 0.0), entry['shape']
+            accesses.append(access)
+    return accesses
+
+
+def run(storage_name: str, input_path: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+    """Advise on the configured storage backend's indexes"""
+    if storage_name == 'postgres':
+        import database_postgres
+        engine = database_postgres.get_engine()
+        indexes = sql_indexes(engine)
+        accesses = load_slow_query_dump(input_path) if input_path else pg_stat_statements(engine, limit)
+        accesses = [access for access in accesses if access.kind == 'sql']
+    elif storage_name == 'mongo':
+        import database
+        indexes = mongo_indexes(database.db)
+        accesses = load_slow_query_dump(input_path) if input_path else mongo_profile(database.db, limit)
+        accesses = [access for access in accesses if access.kind == 'mongo']
+    else:
+        raise RuntimeError(f"Storage '{storage_name}' has no indexes to advise on")
+    return advise(merge(accesses), indexes)
+
+
+def render(findings: List[Dict[str, Any]]) -> str:
+    if not findings:
+        return "No selective query shapes observed"
+    lines = []
+    for finding in findings:
+        lines.append(
+            f"[{finding['status']:<7}] {finding['table']}: {finding['access']}"
+            f"   ({finding['count']} calls, {finding['total_ms']:.1f}ms total)"
+        )
+        lines.append(f"          index: {finding['index'] or 'none'}"
+                     + ('   (sorts in memory)' if finding['unsorted'] else ''))
+        if finding['suggestion']:
+            lines.append(f"          try:   {finding['suggestion']}")
+    return '\n'.join(lines)
@@ -0,0 +1,128 @@
+"""Worker startup and shutdown.
+
+Nothing touches the network at import time. When a worker starts, the
+lifespan handler begins serving at once and warms the storage connection
+pools in the background, retrying with backoff if the database is
+unreachable. ``/api/ready`` returns 503 until the pools are warm, while
+``/api/health`` only reports that the process is alive.
+
+Index builds and data migrations run out of band with
+``python manage.py migrate``. Setting ``AUTO_MIGRATE=true`` also runs them
+in the background once the pools are warm, which is handy in development.
+The pub/sub broker relaying live events between workers (see pubsub) starts
+with the worker and reconnects on its own when Redis is unreachable.
+
+Schema migrations left running by a stopped worker are then resumed (see
+schema_migration). After that the hot queries are explained and any that
+would scan a whole collection or sort in memory are logged as warnings
+(``QUERY_PLAN_CHECK=false`` turns this off).
+"""
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+import schema_migration
+from pubsub import get_broker
+from storage import get_storage
+from loop_monitor import watchdog
+
+logger = logging.getLogger("lifecycle")
+
+WARM_CONNECTIONS = int(os.environ.get('WARM_CONNECTIONS', '4'))
+QUERY_PLAN_CHECK = os.environ.get('QUERY_PLAN_CHECK', 'true').lower() == 'true'
+MAX_RETRY_DELAY = 30.0
+
+
+class Readiness:
+    def __init__(self):
+        self.ready = False
+        self.warmed_at: Optional[str] = None
+        self.last_error: Optional[str] = None
+        self.migrated_at: Optional[str] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'status': 'ready' if self.ready else 'starting',
+            'storage': get_storage().name,
+            'warmed_at': self.warmed_at,
+            'migrated_at': self.migrated_at,
+            'last_error': self.last_error,
+        }
+
+
+readiness = Readiness()
+
+
+async def warm_up():
+    """Connect and warm the storage pools, retrying until it works"""
+    storage = get_storage()
+    delay = 1.0
+    while True:
+        try:
+            await run_in_threadpool(storage.connect, WARM_CONNECTIONS)
+            break
+        except Exception as exc:
+            readiness.last_error = str(exc)
+            logger.warning(f"Storage '{storage.name}' not reachable, retrying in {delay:.0f}s: {exc}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MAX_RETRY_DELAY)
+
+    readiness.ready = True
+    readiness.last_error = None
+    readiness.warmed_at = datetime.utcnow().isoformat()
+    logger.info(f"Storage '{storage.name}' ready")
+
+    if os.environ.get('AUTO_MIGRATE', 'false').lower() == 'true':
+        try:
+            await run_in_threadpool(storage.migrate)
+            readiness.migrated_at = datetime.utcnow().isoformat()
+        except Exception as exc:
+            logger.exception(f"Background migration failed: {exc}")
+
+    try:
+        resumed = await run_in_threadpool(schema_migration.resume_all, storage)
+        if resumed:
+            logger.info(f"Resuming {resumed} schema migration(s)")
+    except Exception as exc:
+        logger.warning(f"Could not resume schema migrations: {exc}")
+
+    if QUERY_PLAN_CHECK:
+        try:
+            for warning in await run_in_threadpool(storage.check_query_plans):
+                logger.warning(f"Query plan check: {warning}")
+        except Exception as exc:
+            logger.warning(f"Query plan check failed: {exc}")
+
+
+def preload():
+    """Import what workers need before gunicorn forks them (preload_app).
+
+    Creates driver objects but no connections: the Mongo client is built
+    with connect=False and the SQLAlchemy engine connects lazily, so nothing
+    is shared across the fork.
+    """
+    from rate_limiter import get_redis_client
+    get_storage()
+    get_redis_client()
+    get_broker()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    watchdog.start()
+    broker = get_broker()
+    await broker.start()
+    warm_up_task = asyncio.create_task(warm_up())
+    try:
+        yield
+    finally:
+        warm_up_task.cancel()
+        await broker.stop()
+        watchdog.stop()
+        readiness.ready = False
+        await run_in_threadpool(get_storage().close)
@@ -0,0 +1,108 @@
+"""Event-loop blocking watchdog.
+
+A heartbeat callback on the loop reschedules itself every ``interval`` and
+reports how late it ran (event-loop lag). A daemon thread checks the last
+heartbeat; once the loop has been stuck longer than
+``LOOP_BLOCK_THRESHOLD_MS`` it snapshots the loop thread's stack, which
+shows the synchronous call blocking the loop and the coroutine that made
+it. When the heartbeat finally runs, the stretch is counted in metrics and
+logged with that stack.
+
+Cost is one timer callback and one thread wakeup per interval, cheap
+enough to leave on in production.
+"""
+import asyncio
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from pathlib import Path
+from typing import Optional
+
+from metrics import EVENT_LOOP_BLOCKS, EVENT_LOOP_BLOCKED_SECONDS, EVENT_LOOP_LAG
+
+logger = logging.getLogger("loop_monitor")
+
+LOOP_BLOCK_THRESHOLD_MS = float(os.environ.get('LOOP_BLOCK_THRESHOLD_MS', '100'))
+APP_DIR = str(Path(__file__).parent)
+MAX_STACK_FRAMES = 30
+# Middleware frames sit on every request's stack, so they never explain a block
+INSTRUMENTATION_FILES = {'profiling.py', 'metrics.py', 'loop_monitor.py'}
+
+
+class LoopWatchdog:
+    def __init__(self, threshold_ms: float = LOOP_BLOCK_THRESHOLD_MS, interval: float = 0.05):
+        self.threshold = threshold_ms / 1000
+        self.interval = interval
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.loop_thread_id: Optional[int] = None
+        self.last_beat = 0.0
+        self.beat = 0
+        self.captured = None  # (beat, stack, culprit, task name) for the current stretch
+        self.stopped = threading.Event()
+
+    def start(self):
+        """Start watching the running loop; call from inside it"""
+        self.stopped.clear()
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread_id = threading.get_ident()
+        self.last_beat = time.monotonic()
+        self.loop.call_later(self.interval, self._heartbeat, self.last_beat + self.interval)
+        threading.Thread(target=self._watch, name='loop-watchdog', daemon=True).start()
+
+    def stop(self):
+        """Stop the thread and the heartbeat (it stops rescheduling itself)"""
+        self.stopped.set()
+
+    def _heartbeat(self, scheduled: float):
+        now = time.monotonic()
+        lag = max(0.0, now - scheduled)
+        EVENT_LOOP_LAG.observe(lag)
+
+        if lag >= self.threshold:
+            captured = self.captured
+            stack, culprit, task_name = captured[1:] if captured and captured[0] == self.beat else (None, None, None)
+            EVENT_LOOP_BLOCKS.labels(culprit=culprit or 'unknown').inc()
+            EVENT_LOOP_BLOCKED_SECONDS.observe(lag)
+            logger.warning(json.dumps({
+                'blocked_ms': round(lag * 1000, 1),
+                'culprit': culprit,
+                'task': task_name,
+                'stack': stack,
+            }))
+
+        self.beat += 1
+        self.captured = None
+        self.last_beat = now
+        if not self.stopped.is_set():
+            self.loop.call_later(self.interval, self._heartbeat, now + self.interval)
+
+    def _watch(self):
+        while not self.stopped.wait(self.interval):
+            beat = self.beat
+            if time.monotonic() - self.last_beat - self.interval < self.threshold:
+                continue
+            if self.captured is not None and self.captured[0] == beat:
+                continue
+            frame = sys._current_frames().get(self.loop_thread_id)
+            if frame is None:
+                continue
+            self.captured = (beat, *self._describe(frame))
+
+    def _describe(self, frame):
+        stack = traceback.format_stack(frame, limit=MAX_STACK_FRAMES)
+        culprit = None
+        # Innermost frame in our own code, i.e. the handler that made the blocking call
+        for summary in reversed(traceback.extract_stack(frame, limit=MAX_STACK_FRAMES)):
+            if (summary.filename.startswith(APP_DIR) and 'site-packages' not in summary.filename
+                    and os.path.basename(summary.filename) not in INSTRUMENTATION_FILES):
+                culprit = f"{os.path.relpath(summary.filename, APP_DIR)}:{summary.lineno} {summary.name}"
+                break
+        task = asyncio.current_task(self.loop)
+        return [line.rstrip() for line in stack], culprit, task.get_name() if task else None
+
+
+watchdog = LoopWatchdog()
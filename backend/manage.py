@@ -0,0 +1,70 @@
+"""Operational commands, run from backend/.
+
+    python manage.py migrate        create indexes/tables and run data migrations
+    python manage.py ping           exit 0 when the configured storage is reachable
+    python manage.py check-plans    exit 1 when a hot query would scan or sort in memory
+    python manage.py advise-indexes [--input slow-queries.json]
+                                    compare observed query shapes with existing indexes
+"""
+import argparse
+import json
+import sys
+
+from storage import get_storage
+
+
+def migrate(args):
+    storage = get_storage()
+    print(f"Migrating '{storage.name}' storage...")
+    storage.migrate()
+    print("Done")
+
+
+def ping(args):
+    storage = get_storage()
+    if not storage.ping():
+        print(f"Storage '{storage.name}' is not reachable", file=sys.stderr)
+        sys.exit(1)
+    print(f"Storage '{storage.name}' is reachable")
+
+
+def check_plans(args):
+    warnings = get_storage().check_query_plans()
+    for warning in warnings:
+        print(warning, file=sys.stderr)
+    if warnings:
+        sys.exit(1)
+    print("All hot queries use an index for filtering and sorting")
+
+
+def advise_indexes(args):
+    import index_advisor
+    storage = get_storage()
+    try:
+        findings = index_advisor.run(storage.name, args.input, args.limit)
+    except RuntimeError as exc:
+        print(str(exc), file=sys.stderr)
+        sys.exit(1)
+    print(json.dumps(findings, indent=2) if args.json else index_advisor.render(findings))
+    if args.strict and any(finding['status'] != 'ok' for finding in findings):
+        sys.exit(2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('migrate', help='create indexes/tables and run data migrations').set_defaults(func=migrate)
+    commands.add_parser('ping', help='check the storage connection').set_defaults(func=ping)
+    commands.add_parser('check-plans', help='explain the hot queries').set_defaults(func=check_plans)
+    advisor = commands.add_parser('advise-indexes', help='compare observed query shapes with existing indexes')
+    advisor.add_argument('--input', help='saved GET /api/admin/slow-queries response (default: database statistics)')
+    advisor.add_argument('--limit', type=int, default=100, help='statements to read from database statistics')
+    advisor.add_argument('--json', action='store_true', help='print findings as JSON')
+    advisor.add_argument('--strict', action='store_true', help='exit 2 when any shape is not fully indexed')
+    advisor.set_defaults(func=advise_indexes)
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""Prometheus metrics exposed at ``/metrics``.
+
+Under gunicorn every worker is a separate process, so metrics use
+prometheus_client's multiprocess mode whenever ``PROMETHEUS_MULTIPROC_DIR``
+is set (gunicorn.conf.py sets it): each worker writes to mmap'd files in
+that directory and a scrape of any worker aggregates all of them. Without
+the variable (single uvicorn process, tests) the default registry is used.
+"""
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+)
+from prometheus_client import multiprocess
+from starlette.responses import Response
+
+import profiling
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'HTTP request latency by route template',
+    ['method', 'route', 'status'], buckets=LATENCY_BUCKETS
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    'http_requests_in_progress', 'HTTP requests currently being handled',
+    ['method'], multiprocess_mode='livesum'
+)
+DB_LATENCY = Histogram('db_command_duration_seconds', 'Database round trip latency', buckets=LATENCY_BUCKETS)
+DB_POOL_CHECKED_OUT = Gauge(
+    'db_pool_connections_checked_out', 'Connections currently checked out of the pool',
+    ['driver'], multiprocess_mode='livesum'
+)
+REDIS_LATENCY = Histogram('redis_command_duration_seconds', 'Redis command latency', buckets=LATENCY_BUCKETS)
+CACHE_REQUESTS = Counter('cache_requests_total', 'Cache lookups by cache and result', ['cache', 'result'])
+RATE_LIMIT_REJECTIONS = Counter('rate_limit_rejections_total', 'Requests rejected by the login rate limiter')
+EVENT_LOOP_LAG = Histogram(
+    'event_loop_lag_seconds', 'Delay between a scheduled wakeup and the loop running it',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+EVENT_LOOP_BLOCKS = Counter(
+    'event_loop_blocks_total', 'Stretches where the event loop was blocked past the threshold',
+    ['culprit']
+)
+EVENT_LOOP_BLOCKED_SECONDS = Histogram(
+    'event_loop_blocked_seconds', 'Length of event-loop blocking stretches',
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+)
+COLLAB_CONNECTIONS = Gauge(
+    'collab_connections', 'Editors connected to live pages (see collaboration.py)', multiprocess_mode='livesum'
+)
+COLLAB_MESSAGES = Counter('collab_messages_total', 'Messages received from live page editors', ['type'])
+COLLAB_DISCONNECTS = Counter(
+    'collab_disconnects_total', 'Live page editors disconnected by the server, by reason', ['reason']
+)
+PUBSUB_MESSAGES = Counter(
+    'pubsub_messages_total', 'Messages relayed between workers (see pubsub.py), by direction', ['direction']
+)
+
+_TIMING_HISTOGRAMS = {'db': DB_LATENCY, 'redis': REDIS_LATENCY}
+
+
+def _observe_timing(name: str, seconds: float):
+    histogram = _TIMING_HISTOGRAMS.get(name)
+    if histogram is not None:
+        histogram.observe(seconds)
+
+
+profiling.add_observer(_observe_timing)
+
+
+def cache_lookup(cache: str, hit: bool):
+    """Count a cache hit or miss; the hit ratio is derived in PromQL"""
+    CACHE_REQUESTS.labels(cache=cache, result='hit' if hit else 'miss').inc()
+
+
+def connection_checked_out(driver: str):
+    DB_POOL_CHECKED_OUT.labels(driver=driver).inc()
+
+
+def connection_checked_in(driver: str):
+    DB_POOL_CHECKED_OUT.labels(driver=driver).dec()
+
+
+def instrument_engine(engine):
+    """Track checkouts from `engine`'s pool (pymongo's are reported by database.py)"""
+    from sqlalchemy import event
+    event.listen(engine, "checkout", lambda *args: connection_checked_out('sqlalchemy'))
+    event.listen(engine, "checkin", lambda *args: connection_checked_in('sqlalchemy'))
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency and in-flight requests per route"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['path'] == '/metrics':
+            await self.app(scope, receive, send)
+            return
+
+        method = scope['method']
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+            await send(message)
+
+        started = time.perf_counter()
+        in_progress = REQUESTS_IN_PROGRESS.labels(method=method)
+        in_progress.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            in_progress.dec()
+            # The router stores the matched route in the scope; templates keep label cardinality bounded
+            route = scope.get('route')
+            REQUEST_LATENCY.labels(
+                method=method,
+                route=getattr(route, 'path', 'unmatched'),
+                status=str(status_code)
+            ).observe(time.perf_counter() - started)
+
+
+def metrics_response() -> Response:
+    """Render metrics, aggregated across worker processes when in multiprocess mode"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,116 @@
+"""Initial schema, as created by create_tables() before migrations existed
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import UUID
+
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'users',
+        sa.Column('id', UUID(as_uuid=True), primary_key=True),
+        sa.Column('name', sa.String(100), nullable=False),
+        sa.Column('email', sa.String(255), nullable=False, unique=True),
+        sa.Column('hashed_password', sa.String(255), nullable=False),
+        sa.Column('avatar', sa.String(500)),
+        sa.Column('color', sa.String(7)),
+        sa.Column('is_active', sa.Boolean),
+        sa.Column('is_verified', sa.Boolean),
+        sa.Column('mfa_enabled', sa.Boolean),
+        sa.Column('created_at', sa.DateTime),
+        sa.Column('updated_at', sa.DateTime),
+    )
+    op.create_table(
+        'mfa_backup_codes',
+        sa.Column('id', UUID(as_uuid=True), primary_key=True),
+        sa.Column('user_id', UUID(as_uuid=True), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('code', sa.String(10), nullable=False),
+        sa.Column('used', sa.Boolean),
+        sa.Column('created_at', sa.DateTime),
+        sa.Column('used_at', sa.DateTime),
+    )
+    op.create_table(
+        'login_attempts',
+        sa.Column('id', UUID(as_uuid=True), primary_key=True),
+        sa.Column('user_id', UUID(as_uuid=True), sa.ForeignKey('users.id'), nullable=True),
+        sa.Column('ip_address', sa.String(45), nullable=False),
+        sa.Column('user_email', sa.String(255)),
+        sa.Column('user_agent', sa.String(500)),
+        sa.Column('success', sa.Boolean),
+        sa.Column('attempted_at', sa.DateTime),
+    )
+    op.create_table(
+        'workspaces',
+        sa.Column('id', UUID(as_uuid=True), primary_key=True),
+        sa.Column('name', sa.String(100), nullable=False),
+        sa.Column('icon', sa.String(10)),
+        sa.Column('description', sa.Text),
+        sa.Column('owner_id', UUID(as_uuid=True), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('settings', sa.Text),
+        sa.Column('created_at', sa.DateTime),
+        sa.Column('updated_at', sa.DateTime),
+    )
+    op.create_table(
+        'workspace_members',
+        sa.Column('workspace_id', UUID(as_uuid=True), sa.ForeignKey('workspaces.id'), primary_key=True),
+        sa.Column('user_id', UUID(as_uuid=True), sa.ForeignKey('users.id'), primary_key=True),
+        sa.Column('role', sa.String(50)),
+    )
+    op.create_table(
+        'pages',
+        sa.Column('id', UUID(as_uuid=True), primary_key=True),
+        sa.Column('title', sa.String(200), nullable=False),
+        sa.Column('icon', sa.String(10)),
+        sa.Column('parent_id', UUID(as_uuid=True), sa.ForeignKey('pages.id'), nullable=True),
+        sa.Column('workspace_id', UUID(as_uuid=True), sa.ForeignKey('workspaces.id'), nullable=False),
+        sa.Column('content', sa.Text),
+        sa.Column('created_by', UUID(as_uuid=True), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('created_at', sa.DateTime),
+        sa.Column('updated_at', sa.DateTime),
+        sa.Column('is_deleted', sa.Boolean),
+        sa.Column('deleted_at', sa.DateTime, nullable=True),
+        sa.Column('deleted_by', UUID(as_uuid=True), sa.ForeignKey('users.id'), nullable=True),
+    )
+    op.create_table(
+        'page_permissions',
+        sa.Column('page_id', UUID(as_uuid=True), sa.ForeignKey('pages.id'), primary_key=True),
+        sa.Column('user_id', UUID(as_uuid=True), sa.ForeignKey('users.id'), primary_key=True),
+        sa.Column('permission', sa.String(50)),
+    )
+    op.create_table(
+        'databases',
+        sa.Column('id', UUID(as_uuid=True), primary_key=True),
+        sa.Column('name', sa.String(100), nullable=False),
+        sa.Column('workspace_id', UUID(as_uuid=True), sa.ForeignKey('workspaces.id'), nullable=False),
+        sa.Column('properties', sa.Text),
+        sa.Column('views', sa.Text),
+        sa.Column('created_by', UUID(as_uuid=True), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('created_at', sa.DateTime),
+        sa.Column('updated_at', sa.DateTime),
+        sa.Column('is_deleted', sa.Boolean),
+        sa.Column('deleted_at', sa.DateTime, nullable=True),
+        sa.Column('deleted_by', UUID(as_uuid=True), sa.ForeignKey('users.id'), nullable=True),
+    )
+    op.create_table(
+        'database_rows',
+        sa.Column('id', UUID(as_uuid=True), primary_key=True),
+        sa.Column('database_id', UUID(as_uuid=True), sa.ForeignKey('databases.id'), nullable=False),
+        sa.Column('properties', sa.Text),
+        sa.Column('created_at', sa.DateTime),
+        sa.Column('updated_at', sa.DateTime),
+    )
+
+
+def downgrade():
+    for table in ('database_rows', 'databases', 'page_permissions', 'pages', 'workspace_members',
+                  'workspaces', 'login_attempts', 'mfa_backup_codes', 'users'):
+        op.drop_table(table)
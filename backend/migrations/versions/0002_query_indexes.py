@@ -0,0 +1,50 @@
+"""Composite and partial indexes for the hot query paths
+
+Built with CREATE INDEX CONCURRENTLY so writes keep flowing while they
+build. That cannot run inside a transaction, hence the autocommit block.
+A concurrent build that fails leaves an INVALID index behind; drop it
+and rerun the migration.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+# (name, table, columns, partial index predicate)
+INDEXES = [
+    ('ix_pages_workspace_parent_live', 'pages', ['workspace_id', 'parent_id', 'created_at'], 'is_deleted = false'),
+    ('ix_pages_workspace_trash', 'pages', ['workspace_id'], 'is_deleted = true'),
+    ('ix_pages_parent_id', 'pages', ['parent_id'], 'parent_id IS NOT NULL'),
+    ('ix_databases_workspace_live', 'databases', ['workspace_id', 'created_at'], 'is_deleted = false'),
+    ('ix_databases_workspace_trash', 'databases', ['workspace_id'], 'is_deleted = true'),
+    ('ix_database_rows_database_created', 'database_rows', ['database_id', 'created_at'], None),
+    ('ix_workspaces_owner_id', 'workspaces', ['owner_id'], None),
+    ('ix_workspace_members_user_id', 'workspace_members', ['user_id'], None),
+    ('ix_page_permissions_user_id', 'page_permissions', ['user_id'], None),
+    ('ix_login_attempts_ip_attempted_at', 'login_attempts', ['ip_address', 'attempted_at'], None),
+    ('ix_mfa_backup_codes_user_id', 'mfa_backup_codes', ['user_id'], None),
+]
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in INDEXES:
+            op.create_index(
+                name, table, columns,
+                postgresql_concurrently=True,
+                postgresql_where=sa.text(where) if where else None,
+                if_not_exists=True,
+            )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,24 @@
+"""Cached formula values of database rows
+
+A nullable column, so adding it is a metadata-only change; rows without a
+cache have their formulas computed on read until they are next written.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('database_rows', sa.Column('computed', sa.Text, nullable=True))
+
+
+def downgrade():
+    op.drop_column('database_rows', 'computed')
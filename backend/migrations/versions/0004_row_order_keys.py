@@ -0,0 +1,51 @@
+"""Order keys of database rows
+
+Board columns page through rows by (order, id), and moving a card writes
+only its own key (see order_keys). Existing rows get keys in creation
+order, per database.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19
+"""
+from itertools import groupby
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import UUID
+
+import order_keys
+
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('database_rows', sa.Column('order', sa.String, nullable=True))
+    rows = sa.table(
+        'database_rows',
+        sa.column('id', UUID(as_uuid=True)), sa.column('database_id', UUID(as_uuid=True)),
+        sa.column('created_at', sa.DateTime), sa.column('order', sa.String)
+    )
+    connection = op.get_bind()
+    existing = connection.execute(
+        sa.select(rows.c.id, rows.c.database_id).order_by(rows.c.database_id, rows.c.created_at, rows.c.id)
+    ).all()
+    params = []
+    for _, database_rows in groupby(existing, key=lambda row: row.database_id):
+        database_rows = list(database_rows)
+        keys = order_keys.keys_after(None, len(database_rows))
+        params.extend({'row_id': row.id, 'row_order': key} for row, key in zip(database_rows, keys))
+    if params:
+        connection.execute(
+            rows.update().where(rows.c.id == sa.bindparam('row_id')).values(order=sa.bindparam('row_order')),
+            params
+        )
+    op.create_index('ix_database_rows_database_order', 'database_rows', ['database_id', 'order', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_database_rows_database_order', table_name='database_rows')
+    op.drop_column('database_rows', 'order')
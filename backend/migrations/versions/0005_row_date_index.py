@@ -0,0 +1,60 @@
+"""Date index of database rows
+
+Calendar views find rows by the intervals of their date values (see
+date_index), one row per (database row, property). Properties are a JSON
+text column, so the intervals are extracted into their own table rather
+than indexed in place. Existing rows are indexed here.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import UUID
+
+import date_index
+
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    dates = op.create_table(
+        'database_row_dates',
+        sa.Column('row_id', UUID(as_uuid=True), sa.ForeignKey('database_rows.id'), primary_key=True),
+        sa.Column('key', sa.String, primary_key=True),
+        sa.Column('database_id', UUID(as_uuid=True), sa.ForeignKey('databases.id'), nullable=False),
+        sa.Column('start', sa.DateTime, nullable=False),
+        sa.Column('end', sa.DateTime, nullable=False),
+        sa.Column('span', sa.BigInteger, nullable=False),
+    )
+    rows = sa.table(
+        'database_rows',
+        sa.column('id', UUID(as_uuid=True)), sa.column('database_id', UUID(as_uuid=True)),
+        sa.column('properties', sa.Text)
+    )
+    connection = op.get_bind()
+    result = connection.execution_options(stream_results=True).execute(
+        sa.select(rows.c.id, rows.c.database_id, rows.c.properties)
+    )
+    for batch in result.partitions(1000):
+        params = [
+            {'row_id': row.id, 'database_id': row.database_id, **entry}
+            for row in batch
+            for entry in date_index.entries(json.loads(row.properties) if row.properties else {})
+        ]
+        if params:
+            connection.execute(dates.insert(), params)
+    op.create_index('ix_database_row_dates_start', 'database_row_dates', ['database_id', 'key', 'start'])
+    op.create_index('ix_database_row_dates_span', 'database_row_dates', ['database_id', 'key', 'span'])
+
+
+def downgrade():
+    op.drop_index('ix_database_row_dates_span', table_name='database_row_dates')
+    op.drop_index('ix_database_row_dates_start', table_name='database_row_dates')
+    op.drop_table('database_row_dates')
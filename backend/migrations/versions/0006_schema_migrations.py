@@ -0,0 +1,26 @@
+"""Schema migrations of databases
+
+A database being migrated (see schema_migration) carries the migration's
+record, and its rows are walked in batches by id.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('databases', sa.Column('schema_migration', sa.Text, nullable=True))
+    op.create_index('ix_database_rows_database_id', 'database_rows', ['database_id', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_database_rows_database_id', table_name='database_rows')
+    op.drop_column('databases', 'schema_migration')
@@ -0,0 +1,34 @@
+"""Email of login attempts and description of workspaces
+
+Databases that create_tables() made before migrations existed lack these
+columns, yet are stamped at 0001, which creates them. So each is added
+only where it is missing.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+COLUMNS = (
+    ('login_attempts', sa.Column('user_email', sa.String(255))),
+    ('workspaces', sa.Column('description', sa.Text)),
+)
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    for table, column in COLUMNS:
+        if column.name not in {existing['name'] for existing in inspector.get_columns(table)}:
+            op.add_column(table, column)
+
+
+def downgrade():
+    for table, column in COLUMNS:
+        op.drop_column(table, column.name)
@@ -0,0 +1,248 @@
+"""Order keys: strings that sort in display order and always leave room between them.
+
+A key is an integer part (a head character giving its sign and length, then
+base-36 digits) and an optional base-36 fraction. Moving an item between two
+others gives it a key between theirs, so only the moved item is written;
+appending increments the integer part, which keeps keys short when items are
+added at the end. Keys use only 0-9 and a-z, which sort the same bytewise and
+under the usual text collations, so Mongo, PostgreSQL and SQLite order them
+alike.
+"""
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional, Tuple
+
+DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+# Heads of negative integers (longest first), then of positive ones (shortest first)
+NEGATIVE_HEADS = 'abcdefghijklm'
+POSITIVE_HEADS = 'nopqrstuvwxyz'
+ZERO = 'n0'
+# Keys longer than this are respaced in the background (see rebalance)
+REBALANCE_LENGTH = 24
+# Nothing sorts before this, so it is not a valid key on its own
+SMALLEST_INTEGER = NEGATIVE_HEADS[0] + DIGITS[0] * (len(NEGATIVE_HEADS) + 1)
+
+
+def _integer_length(head: str) -> int:
+    if len(head) == 1 and head in POSITIVE_HEADS:
+        return POSITIVE_HEADS.index(head) + 2
+    if len(head) == 1 and head in NEGATIVE_HEADS:
+        return len(NEGATIVE_HEADS) - NEGATIVE_HEADS.index(head) + 1
+    raise ValueError(f"Invalid order key head {head!r}")
+
+
+def _split(key: str) -> Tuple[str, str]:
+    """(integer part, fraction) of a key; raises ValueError when it isn't one"""
+    if not isinstance(key, str) or not key:
+        raise ValueError(f"Invalid order key {key!r}")
+    length = _integer_length(key[0])
+    integer, fraction = key[:length], key[length:]
+    if (len(integer) < length or any(char not in DIGITS for char in key[1:])
+            or fraction.endswith(DIGITS[0]) or key == SMALLEST_INTEGER):
+        raise ValueError(f"Invalid order key {key!r}")
+    return integer, fraction
+
+
+def is_valid(key) -> bool:
+    try:
+        _split(key)
+    except ValueError:
+        return False
+    return True
+
+
+def _midpoint(low: str, high: Optional[str]) -> str:
+    """A fraction between fractions `low` and `high` (None is 1), without trailing zeros"""
+    if high is not None:
+        common = 0
+        while common < len(high) and (low[common] if common < len(low) else DIGITS[0]) == high[common]:
+            common += 1
+        if common:
+            return high[:common] + _midpoint(low[common:], high[common:])
+    low_digit = DIGITS.index(low[0]) if low else 0
+    high_digit = DIGITS.index(high[0]) if high is not None else len(DIGITS)
+    if high_digit - low_digit > 1:
+        return DIGITS[(low_digit + high_digit + 1) // 2]
+    # Adjacent digits: go one digit deeper
+    if high is not None and len(high) > 1:
+        return high[0]
+    return DIGITS[low_digit] + _midpoint(low[1:], None)
+
+
+def _increment(integer: str) -> Optional[str]:
+    head, digits = integer[0], list(integer[1:])
+    for index in reversed(range(len(digits))):
+        digit = DIGITS.index(digits[index]) + 1
+        if digit < len(DIGITS):
+            digits[index] = DIGITS[digit]
+            return head + ''.join(digits)
+        digits[index] = DIGITS[0]
+    if head == NEGATIVE_HEADS[-1]:
+        return ZERO
+    if head == POSITIVE_HEADS[-1]:
+        return None
+    head = chr(ord(head) + 1)
+    # Positive integers get longer as they grow, negative ones shorter
+    if head > POSITIVE_HEADS[0]:
+        digits.append(DIGITS[0])
+    else:
+        digits.pop()
+    return head + ''.join(digits)
+
+
+def _decrement(integer: str) -> Optional[str]:
+    head, digits = integer[0], list(integer[1:])
+    for index in reversed(range(len(digits))):
+        digit = DIGITS.index(digits[index]) - 1
+        if digit >= 0:
+            digits[index] = DIGITS[digit]
+            return head + ''.join(digits)
+        digits[index] = DIGITS[-1]
+    if head == POSITIVE_HEADS[0]:
+        return NEGATIVE_HEADS[-1] + DIGITS[-1]
+    if head == NEGATIVE_HEADS[0]:
+        return None
+    head = chr(ord(head) - 1)
+    if head < NEGATIVE_HEADS[-1]:
+        digits.append(DIGITS[-1])
+    else:
+        digits.pop()
+    return head + ''.join(digits)
+
+
+def key_between(before: Optional[str], after: Optional[str]) -> str:
+    """A key sorting after `before` and before `after`; None stands for the start or end of the list"""
+    before_parts = _split(before) if before is not None else None
+    after_parts = _split(after) if after is not None else None
+    if before is not None and after is not None and before >= after:
+        raise ValueError(f"Order key {before!r} does not sort before {after!r}")
+    if before_parts is None:
+        if after_parts is None:
+            return ZERO
+        integer, fraction = after_parts
+        if integer == SMALLEST_INTEGER:
+            return integer + _midpoint('', fraction)
+        if fraction:
+            return integer
+        previous = _decrement(integer)
+        if previous is None:
+            raise ValueError(f"No order key sorts before {after!r}")
+        return previous
+    integer, fraction = before_parts
+    if after_parts is None:
+        following = _increment(integer)
+        return following if following is not None else integer + _midpoint(fraction, None)
+    if integer == after_parts[0]:
+        return integer + _midpoint(fraction, after_parts[1])
+    following = _increment(integer)
+    if following is not None and following < after:
+        return following
+    return integer + _midpoint(fraction, None)
+
+
+def keys_after(before: Optional[str], count: int) -> List[str]:
+    """`count` ascending keys after `before`"""
+    keys = []
+    for _ in range(count):
+        before = key_between(before, None)
+        keys.append(before)
+    return keys
+
+
+def keys_between(before: Optional[str], after: Optional[str], count: int) -> List[str]:
+    """`count` ascending keys between `before` and `after`, spread out so they stay short"""
+    if count <= 0:
+        return []
+    if after is None:
+        return keys_after(before, count)
+    middle = key_between(before, after)
+    half = (count - 1) // 2
+    return keys_between(before, middle, half) + [middle] + keys_between(middle, after, count - half - 1)
+
+
+def _kept(keys: List[Optional[str]]) -> List[bool]:
+    """Which keys to keep: the longest ascending run of valid ones"""
+    tails: List[str] = []
+    tail_indexes: List[int] = []
+    previous: Dict[int, Optional[int]] = {}
+    for index, key in enumerate(keys):
+        if not is_valid(key):
+            continue
+        position = bisect_left(tails, key)
+        if position == len(tails):
+            tails.append(key)
+            tail_indexes.append(index)
+        else:
+            tails[position] = key
+            tail_indexes[position] = index
+        previous[index] = tail_indexes[position - 1] if position else None
+    kept = [False] * len(keys)
+    index = tail_indexes[-1] if tail_indexes else None
+    while index is not None:
+        kept[index] = True
+        index = previous[index]
+    return kept
+
+
+def assign_keys(items: List[Dict[str, Any]], field: str = 'order') -> List[Dict[str, Any]]:
+    """Copies of `items` whose keys follow the list order, keeping as many of their keys as possible.
+
+    Items out of order, and those without a valid key, get new keys between
+    the kept ones around them.
+    """
+    keys: List[Optional[str]] = [item.get(field) for item in items]
+    kept = _kept(keys)
+    start = 0
+    while start < len(keys):
+        if kept[start]:
+            start += 1
+            continue
+        end = start
+        while end < len(keys) and not kept[end]:
+            end += 1
+        keys[start:end] = keys_between(
+            keys[start - 1] if start else None, keys[end] if end < len(keys) else None, end - start
+        )
+        start = end
+    return [item if item.get(field) == key else {**item, field: key} for item, key in zip(items, keys)]
+
+
+def rebalance(keys: List[str], max_length: int = REBALANCE_LENGTH) -> Dict[int, str]:
+    """New keys, by index, for the stretches of ascending `keys` longer than `max_length`.
+
+    Each stretch gets keys spread evenly between the shorter keys around it,
+    widened until they fit, so only the crowded part of the list is rewritten.
+    """
+    changes: Dict[int, str] = {}
+    index = 0
+    while index < len(keys):
+        if len(keys[index]) <= max_length:
+            index += 1
+            continue
+        start, end = index, index
+        while end < len(keys) and len(keys[end]) > max_length:
+            end += 1
+        while True:
+            spread = keys_between(keys[start - 1] if start else None, keys[end] if end < len(keys) else None, end - start)
+            if max(map(len, spread)) <= max_length or (start == 0 and end == len(keys)):
+                break
+            start, end = max(start - 1, 0), min(end + 1, len(keys))
+        changes.update((position, key) for position, key in zip(range(start, end), spread) if keys[position] != key)
+        index = end
+    return changes
+
+
+def needs_rebalance(key: Optional[str]) -> bool:
+    return key is not None and len(key) > REBALANCE_LENGTH
+
+
+def rebalanced(items: List[Dict[str, Any]], field: str = 'order') -> Dict[str, Tuple[Optional[str], str]]:
+    """(current key, new key) by id for the items, listed in display order, whose
+    keys are missing, out of order or too long; the argument of the storage
+    set_*_order(s) methods, which skip items whose key changed since"""
+    keys = [item[field] for item in assign_keys(items, field)]
+    for index, key in rebalance(keys).items():
+        keys[index] = key
+    return {
+        item['id']: (item.get(field), key)
+        for item, key in zip(items, keys) if item.get(field) != key
+    }
@@ -0,0 +1,195 @@
+"""Per-request profiling.
+
+Sampled requests record wall time, database round trips (pymongo command
+monitoring in database.py and SQLAlchemy cursor events), Redis calls, response
+serialization and any named spans (e.g. bcrypt). Results go out as a
+``Server-Timing`` header and one structured log line per request.
+
+Configured with ``PROFILE_SAMPLE_RATE`` (0.0-1.0, default 0 = off).
+"""
+import json
+import logging
+import os
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from starlette.responses import JSONResponse
+
+logger = logging.getLogger("profiling")
+
+
+@dataclass
+class Metric:
+    calls: int = 0
+    seconds: float = 0.0
+
+    def add(self, seconds: float):
+        self.calls += 1
+        self.seconds += seconds
+
+
+@dataclass
+class RequestProfile:
+    method: str
+    path: str
+    started: float = field(default_factory=time.perf_counter)
+    metrics: Dict[str, Metric] = field(default_factory=dict)
+
+    def add(self, name: str, seconds: float):
+        self.metrics.setdefault(name, Metric()).add(seconds)
+
+    def server_timing(self, total: float) -> str:
+        entries = [f"total;dur={total * 1000:.2f}"]
+        for name, metric in self.metrics.items():
+            entries.append(f'{name};desc="{metric.calls} calls";dur={metric.seconds * 1000:.2f}')
+        return ', '.join(entries)
+
+    def as_dict(self, total: float, status_code: Optional[int]) -> Dict[str, Any]:
+        record = {
+            'method': self.method,
+            'path': self.path,
+            'status': status_code,
+            'total_ms': round(total * 1000, 3),
+        }
+        for name, metric in self.metrics.items():
+            record[f"{name}_calls"] = metric.calls
+            record[f"{name}_ms"] = round(metric.seconds * 1000, 3)
+        return record
+
+
+_current: ContextVar[Optional[RequestProfile]] = ContextVar('request_profile', default=None)
+
+# Called with every (name, seconds) timing, sampled or not (see metrics.py)
+_observers: List[Callable[[str, float], None]] = []
+
+
+def current_profile() -> Optional[RequestProfile]:
+    return _current.get()
+
+
+def add_observer(observer: Callable[[str, float], None]):
+    _observers.append(observer)
+
+
+def record(name: str, seconds: float):
+    """Add a timing to the current request's profile, if it is sampled"""
+    profile = _current.get()
+    if profile is not None:
+        profile.add(name, seconds)
+    for observer in _observers:
+        observer(name, seconds)
+
+
+@contextmanager
+def span(name: str):
+    """Time a block of code under `name` in the current request's profile"""
+    if _current.get() is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - started)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('profiling_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['profiling_started'].pop()
+    record('db', time.perf_counter() - started)
+
+
+def instrument_engine(engine):
+    """Time SQL round trips on `engine` (Mongo commands are timed by database.py's listener)"""
+    from sqlalchemy import event
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def instrument_redis(client):
+    """Wrap a redis client's execute_command so calls are timed"""
+    if client is None:
+        return client
+    execute_command = client.execute_command
+
+    def timed_execute_command(*args, **options):
+        started = time.perf_counter()
+        try:
+            return execute_command(*args, **options)
+        finally:
+            record('redis', time.perf_counter() - started)
+
+    client.execute_command = timed_execute_command
+    return client
+
+
+def _instrument_serialize_response():
+    """Time FastAPI's response_model validation and jsonable_encoder pass"""
+    import fastapi.routing
+
+    serialize_response = fastapi.routing.serialize_response
+    if getattr(serialize_response, '_profiled', False):
+        return
+
+    async def timed_serialize_response(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await serialize_response(*args, **kwargs)
+        finally:
+            record('serialize', time.perf_counter() - started)
+
+    timed_serialize_response._profiled = True
+    fastapi.routing.serialize_response = timed_serialize_response
+
+
+_instrument_serialize_response()
+
+
+class ProfiledJSONResponse(JSONResponse):
+    """JSONResponse that counts json.dumps time as serialization"""
+
+    def render(self, content: Any) -> bytes:
+        with span('serialize'):
+            return super().render(content)
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles a sample of HTTP requests"""
+
+    def __init__(self, app, sample_rate: Optional[float] = None):
+        self.app = app
+        if sample_rate is None:
+            sample_rate = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+        self.sample_rate = sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(method=scope['method'], path=scope['path'])
+        token = _current.set(profile)
+        status_code = None
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+                total = time.perf_counter() - profile.started
+                headers = list(message.get('headers', []))
+                headers.append((b'server-timing', profile.server_timing(total).encode('latin-1')))
+                message = {**message, 'headers': headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            logger.info(json.dumps(profile.as_dict(time.perf_counter() - profile.started, status_code)))
@@ -0,0 +1,319 @@
+"""Publish/subscribe between the worker processes serving the app.
+
+Production runs several gunicorn workers, and the editors of one page, or
+the people watching one database or workspace, may be connected to any of
+them. Events are published on a channel (see page_channel,
+database_channel, workspace_channel) and reach every subscriber of the
+channel, whichever worker it is on.
+
+A broker delivers a message to the subscribers in its own process at once,
+then relays it to the other workers. With ``PUBSUB_BACKEND=redis`` (the
+default when ``RATE_LIMIT_REDIS_URL`` is set) the relay is Redis pub/sub;
+with ``local`` there is none, which is all a single worker or a test run
+needs.
+
+Relaying is batched: messages published within ``PUBSUB_BATCH_MS`` of each
+other, or until ``PUBSUB_BATCH_SIZE`` are waiting, go out as one PUBLISH per
+channel, in one round trip. A message published with a `coalesce` key
+replaces the one with the same key still waiting, so cursor positions cost
+one message per batch however fast they move. Subscriptions are reference
+counted per channel: a worker subscribes to a Redis channel when the first
+of its subscribers does and unsubscribes when the last one leaves.
+
+Messages published inside deferred() are held until the block exits and
+dropped if it raises; it wraps storage transactions, so nobody hears of
+writes that are rolled back.
+
+Brokers are used from the event loop; call start() and stop() from the
+app's lifespan.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import os
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from metrics import PUBSUB_MESSAGES
+
+logger = logging.getLogger("pubsub")
+
+BATCH_INTERVAL = float(os.environ.get('PUBSUB_BATCH_MS', '5')) / 1000
+BATCH_SIZE = int(os.environ.get('PUBSUB_BATCH_SIZE', '100'))
+# Redis channels are named PREFIX + channel, apart from other users of the server
+PREFIX = 'mindnotes:'
+# How long the Redis reader waits for a message before it looks at subscription changes
+LISTEN_POLL = 0.1
+# A subscriber waits this long for Redis at most; local messages reach it meanwhile
+SUBSCRIBE_TIMEOUT = 2.0
+MAX_RETRY_DELAY = 30.0
+
+Handler = Callable[[Dict[str, Any]], None]
+
+# (channel, message, coalesce) published inside deferred() in this context, in order
+_deferred: ContextVar[Optional[List[Tuple[str, Dict[str, Any], Optional[str]]]]] = ContextVar(
+    'pubsub_deferred', default=None
+)
+
+
+def page_channel(page_id: str) -> str:
+    return f"page:{page_id}"
+
+
+def database_channel(database_id: str) -> str:
+    return f"database:{database_id}"
+
+
+def workspace_channel(workspace_id: str) -> str:
+    return f"workspace:{workspace_id}"
+
+
+class Broker:
+    """Subscriptions of this process, and delivery to them"""
+
+    def __init__(self):
+        self._handlers: Dict[str, List[Handler]] = {}
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def subscribe(self, channel: str, handler: Handler) -> Callable[[], None]:
+        """Call `handler` with each message on `channel` until the returned function is called.
+
+        Returns once messages published anywhere from then on will arrive.
+        """
+        self._handlers.setdefault(channel, []).append(handler)
+        await self._listen(channel)
+
+        def unsubscribe():
+            if handler in self._handlers.get(channel, ()):
+                self._handlers[channel].remove(handler)
+                if not self._handlers[channel]:
+                    del self._handlers[channel]
+                    self._unlisten(channel)
+        return unsubscribe
+
+    def subscribers(self, channel: str) -> int:
+        return len(self._handlers.get(channel, ()))
+
+    def publish(self, channel: str, message: Dict[str, Any], coalesce: Optional[str] = None):
+        """Deliver a message to the channel's subscribers here, then to the other workers'"""
+        pending = _deferred.get()
+        if pending is not None:
+            pending.append((channel, message, coalesce))
+            return
+        self._deliver(channel, [message])
+        self._relay(channel, message, coalesce)
+
+    def _deliver(self, channel: str, messages: List[Dict[str, Any]]):
+        for handler in list(self._handlers.get(channel, ())):
+            for message in messages:
+                try:
+                    handler(message)
+                except Exception:
+                    logger.exception(f"Subscriber of {channel} failed")
+
+    async def _listen(self, channel: str):
+        """Wait until the other workers' messages on `channel` are received, which
+        the channel's first subscriber starts"""
+
+    def _unlisten(self, channel: str):
+        """Stop receiving the other workers' messages on `channel`, once its last subscriber left"""
+
+    def _relay(self, channel: str, message: Dict[str, Any], coalesce: Optional[str]):
+        """Send a message to the other workers"""
+
+
+class LocalBroker(Broker):
+    """Delivery within this process only, for a single worker and for tests"""
+
+
+class RedisBroker(Broker):
+    """Relays messages between workers over Redis pub/sub.
+
+    One connection subscribes to the channels this worker listens to, and a
+    reader task delivers what arrives; messages carry the id of the worker
+    that sent them, so a worker skips its own. The reader alone changes the
+    subscriptions, between reads, and resubscribes after reconnecting.
+    """
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis
+        super().__init__()
+        self._redis = redis
+        self.url = url
+        self.origin = uuid.uuid4().hex
+        self._client = None
+        self._reader: Optional[asyncio.Task] = None
+        self._flusher: Optional[asyncio.Task] = None
+        # Messages waiting to be relayed by channel, keyed by coalesce key or sequence number
+        self._outbox: Dict[str, Dict[Any, Dict[str, Any]]] = {}
+        self._waiting = 0
+        self._sequence = itertools.count()
+        # Channels subscribed on Redis, and futures of the subscribers waiting for theirs
+        self._listening: Set[str] = set()
+        self._ready: Dict[str, asyncio.Future] = {}
+        self._changed: Optional[asyncio.Event] = None
+
+    async def start(self):
+        self._client = self._redis.Redis.from_url(self.url)
+        self._changed = asyncio.Event()
+        self._reader = asyncio.create_task(self._read(), name='pubsub-reader')
+
+    async def stop(self):
+        if self._reader is not None:
+            self._reader.cancel()
+            await asyncio.gather(self._reader, return_exceptions=True)
+        if self._client is not None:
+            await self._flush()
+            await self._client.aclose()
+        self._client = self._reader = None
+
+    async def _listen(self, channel: str):
+        if self._reader is None or channel in self._listening:
+            return
+        ready = self._ready.get(channel)
+        if ready is None:
+            ready = self._ready[channel] = asyncio.get_running_loop().create_future()
+            self._changed.set()
+        try:
+            await asyncio.wait_for(asyncio.shield(ready), SUBSCRIBE_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(f"Subscribing to {channel} is taking a while; other workers' messages will follow")
+
+    def _unlisten(self, channel: str):
+        if self._changed is not None:
+            self._changed.set()
+
+    def _relay(self, channel: str, message: Dict[str, Any], coalesce: Optional[str]):
+        if self._client is None:
+            return
+        self._outbox.setdefault(channel, {})[coalesce if coalesce is not None else next(self._sequence)] = message
+        self._waiting += 1
+        if self._waiting >= BATCH_SIZE:
+            asyncio.get_running_loop().create_task(self._flush())
+        elif self._flusher is None:
+            self._flusher = asyncio.get_running_loop().create_task(self._flush_later())
+
+    async def _flush_later(self):
+        try:
+            await asyncio.sleep(BATCH_INTERVAL)
+            await self._flush()
+        finally:
+            self._flusher = None
+
+    async def _flush(self):
+        """Publish the waiting messages, one PUBLISH per channel in one round trip"""
+        outbox, self._outbox, self._waiting = self._outbox, {}, 0
+        if not outbox:
+            return
+        pipeline = self._client.pipeline(transaction=False)
+        count = 0
+        for channel, messages in outbox.items():
+            pipeline.publish(PREFIX + channel, json.dumps(
+                {'origin': self.origin, 'messages': list(messages.values())}, default=str
+            ))
+            count += len(messages)
+        try:
+            await pipeline.execute()
+            PUBSUB_MESSAGES.labels(direction='sent').inc(count)
+        except Exception as exc:
+            PUBSUB_MESSAGES.labels(direction='dropped').inc(count)
+            logger.warning(f"Could not relay {count} message(s) to other workers: {exc}")
+
+    async def _sync(self, pubsub):
+        """Bring the Redis subscriptions in line with the channels that have subscribers"""
+        self._changed.clear()
+        wanted = set(self._handlers)
+        added, removed = wanted - self._listening, self._listening - wanted
+        if added:
+            await pubsub.subscribe(*(PREFIX + channel for channel in added))
+        if removed:
+            await pubsub.unsubscribe(*(PREFIX + channel for channel in removed))
+        self._listening = wanted
+        for channel in list(self._ready):
+            if channel in wanted or channel not in self._handlers:
+                future = self._ready.pop(channel)
+                if not future.done():
+                    future.set_result(None)
+
+    def _receive(self, message: Dict[str, Any]):
+        if message.get('type') != 'message':
+            return
+        channel = message['channel'].decode() if isinstance(message['channel'], bytes) else message['channel']
+        data = json.loads(message['data'])
+        if data.get('origin') != self.origin:
+            PUBSUB_MESSAGES.labels(direction='received').inc(len(data['messages']))
+            self._deliver(channel[len(PREFIX):], data['messages'])
+
+    async def _read(self):
+        delay = 1.0
+        pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        while True:
+            try:
+                if self._changed.is_set():
+                    await self._sync(pubsub)
+                if not self._listening:
+                    await self._changed.wait()
+                    continue
+                message = await pubsub.get_message(timeout=LISTEN_POLL)
+                if message is not None:
+                    self._receive(message)
+                delay = 1.0
+            except asyncio.CancelledError:
+                await pubsub.aclose()
+                raise
+            except Exception as exc:
+                logger.warning(f"Pub/sub connection lost, resubscribing in {delay:.0f}s: {exc}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, MAX_RETRY_DELAY)
+                await pubsub.aclose()
+                pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+                self._listening = set()
+                self._changed.set()
+
+
+def create_broker(backend: Optional[str] = None) -> Broker:
+    if backend is None:
+        backend = os.environ.get('PUBSUB_BACKEND', 'redis' if os.environ.get('RATE_LIMIT_REDIS_URL') else 'local')
+    if backend == 'redis':
+        from rate_limiter import REDIS_URL
+        return RedisBroker(REDIS_URL)
+    if backend == 'local':
+        return LocalBroker()
+    raise ValueError(f"Unknown PUBSUB_BACKEND {backend!r}")
+
+
+_broker: Optional[Broker] = None
+
+
+def get_broker() -> Broker:
+    global _broker
+    if _broker is None:
+        _broker = create_broker()
+    return _broker
+
+
+@contextmanager
+def deferred() -> Iterator[None]:
+    """Hold the messages published inside the block, in this context, and
+    publish them in order once it exits; drop them if it raises. Nested
+    blocks join the outer one."""
+    if _deferred.get() is not None:
+        yield
+        return
+    pending: List[Tuple[str, Dict[str, Any], Optional[str]]] = []
+    token = _deferred.set(pending)
+    try:
+        yield
+    finally:
+        _deferred.reset(token)
+    broker = get_broker()
+    for channel, message, coalesce in pending:
+        broker.publish(channel, message, coalesce)
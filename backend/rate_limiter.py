@@ -1,17 +1,26 @@
 from datetime import datetime, timedelta
 from typing import Optional
 from fastapi import Request, HTTPException, status
-import redis
 import os
-from database import record_login_attempt, get_recent_login_attempts
+from storage import get_storage
+from profiling import instrument_redis
+from metrics import RATE_LIMIT_REJECTIONS
 
 # Redis configuration for rate limiting
 REDIS_URL = os.environ.get('RATE_LIMIT_REDIS_URL', 'redis://localhost:6379')
 
-try:
-    redis_client = redis.Redis.from_url(REDIS_URL, decode_responses=True)
-except Exception:
-    redis_client = None
+_redis_client = None
+
+def get_redis_client():
+    """Create the Redis client on first use; None when redis is unavailable"""
+    global _redis_client
+    if _redis_client is None:
+        try:
+            import redis
+            _redis_client = instrument_redis(redis.Redis.from_url(REDIS_URL, decode_responses=True))
+        except Exception:
+            return None
+    return _redis_client
 
 # Rate limiting configurations
 MAX_LOGIN_ATTEMPTS = 3
@@ -38,6 +47,7 @@ class RateLimiter:
         ip = self.get_client_ip(request)
         
         try:
+            redis_client = get_redis_client()
             if redis_client:
                 # Use Redis for rate limiting
                 key = self.get_redis_key(ip)
@@ -52,7 +62,7 @@ class RateLimiter:
             pass
         
         # Fallback to database
-        recent_attempts = get_recent_login_attempts(ip, self.lockout_duration)
+        recent_attempts = get_storage().get_recent_login_attempts(ip, self.lockout_duration)
         failed_attempts = [attempt for attempt in recent_attempts if not attempt['successful']]
         
         return len(failed_attempts) < self.max_attempts
@@ -62,10 +72,11 @@ class RateLimiter:
         ip = self.get_client_ip(request)
         
         # Record in database
-        record_login_attempt(ip, user_email, success)
+        get_storage().record_login_attempt(ip, user_email, success)
         
         # Update Redis counter
         try:
+            redis_client = get_redis_client()
             if redis_client:
                 key = self.get_redis_key(ip)
                 
@@ -85,6 +96,7 @@ class RateLimiter:
         ip = self.get_client_ip(request)
         
         try:
+            redis_client = get_redis_client()
             if redis_client:
                 key = self.get_redis_key(ip)
                 redis_client.delete(key)
@@ -97,6 +109,7 @@ class RateLimiter:
         ip = self.get_client_ip(request)
         
         try:
+            redis_client = get_redis_client()
             if redis_client:
                 key = self.get_redis_key(ip)
                 attempts = redis_client.get(key)
@@ -106,7 +119,7 @@ class RateLimiter:
             pass
         
         # Fallback to database
-        recent_attempts = get_recent_login_attempts(ip, self.lockout_duration)
+        recent_attempts = get_storage().get_recent_login_attempts(ip, self.lockout_duration)
         failed_attempts = [attempt for attempt in recent_attempts if not attempt['successful']]
         
         return self.max_attempts - len(failed_attempts)
@@ -117,6 +130,7 @@ rate_limiter = RateLimiter()
 def check_rate_limit_middleware(request: Request):
     """Middleware to check rate limiting"""
     if not rate_limiter.check_rate_limit(request):
+        RATE_LIMIT_REJECTIONS.inc()
         remaining_attempts = rate_limiter.get_remaining_attempts(request)
         raise HTTPException(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
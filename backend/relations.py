@@ -0,0 +1,336 @@
+"""Relation and rollup properties.
+
+A relation property ``{"type": "relation", "database_id": ..., "synced_property": ...}``
+links a row to rows of a database in the same workspace (possibly its own):
+its value is the list of their ids. The related database gets a synced
+relation property pointing back, whose values list the rows linking to each
+of its rows. Every write of a relation value updates the other side too, so
+the pair is a bidirectional index: either database reads its links from its
+own rows, with no lookup through the other.
+
+A rollup property ``{"type": "rollup", "relation": ..., "function": ...,
+"property": ...}`` summarises the rows a relation links to: count (rows, or
+non-empty values of `property`), distinct, sum, avg, min or max of
+`property`. Its value is stored on the row like any other property and
+recomputed only for the rows an edit affects: the rows whose links changed,
+and the rows linked to a row whose rolled-up property changed. Related rows
+are read in batches of ids, one query per relation and batch, never per row.
+
+Rollups read stored values only, so `property` can't be a formula, relation
+or rollup, and sum, avg, min and max need a number property.
+"""
+import uuid
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from storage.base import Storage
+
+RELATION = 'relation'
+ROLLUP = 'rollup'
+ROLLUP_FUNCTIONS = ('count', 'distinct', 'sum', 'avg', 'min', 'max')
+# Functions reading `property` as a number
+NUMBER_FUNCTIONS = ('sum', 'avg', 'min', 'max')
+# Property types a rollup can't read: their values aren't stored on rows
+UNROLLABLE_TYPES = ('formula', RELATION, ROLLUP)
+EMPTY_VALUES = (None, '', [])
+# Related rows are read this many ids at a time
+BATCH_SIZE = 1000
+
+# (workspace_id, properties) of a database by id, None when it doesn't exist
+SchemaLoader = Callable[[str], Optional[Tuple[str, Dict[str, Any]]]]
+
+
+def relations(properties: Optional[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    return {
+        key: prop for key, prop in (properties or {}).items()
+        if isinstance(prop, dict) and prop.get('type') == RELATION
+    }
+
+
+def rollups(properties: Optional[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    return {
+        key: prop for key, prop in (properties or {}).items()
+        if isinstance(prop, dict) and prop.get('type') == ROLLUP
+    }
+
+
+def has_links(properties: Optional[Dict[str, Any]]) -> bool:
+    return bool(relations(properties) or rollups(properties))
+
+
+def linked_ids(value: Any) -> List[str]:
+    """The row ids of a relation value, in order, without repeats"""
+    if isinstance(value, str):
+        value = [value] if value else []
+    if not isinstance(value, list):
+        return []
+    return list(dict.fromkeys(item for item in value if isinstance(item, str) and item))
+
+
+def _plain_key(key: str) -> bool:
+    """Whether a property key can be written on its own (Mongo paths split on dots)"""
+    return bool(key) and '.' not in key and not key.startswith('$')
+
+
+def _synced_name(name: str, properties: Dict[str, Any]) -> str:
+    names = {prop.get('name') for prop in properties.values() if isinstance(prop, dict)}
+    candidate, suffix = name, 2
+    while candidate in names:
+        candidate, suffix = f"{name} ({suffix})", suffix + 1
+    return candidate
+
+
+def plan_schema(database_id: str, name: str, workspace_id: str, old: Optional[Dict[str, Any]],
+                new: Dict[str, Any], load: SchemaLoader) -> Tuple[Dict[str, Any], Dict[str, Dict[str, Optional[dict]]]]:
+    """Check the relations and rollups of a schema change from `old` to `new`.
+
+    Returns `new` with each relation's synced property filled in, and the
+    synced properties to add (a dict) or remove (None) in each related
+    database; those in this database itself are already applied to `new`.
+    Raises ValueError for a relation or rollup that can't be kept.
+    """
+    old = old or {}
+    new = dict(new)
+    changes: Dict[str, Dict[str, Optional[dict]]] = {}
+    schemas: Dict[str, Dict[str, Any]] = {}
+
+    def schema(target_id: str) -> Dict[str, Any]:
+        if target_id == database_id:
+            return new
+        if target_id not in schemas:
+            loaded = load(target_id)
+            if loaded is None or loaded[0] != workspace_id:
+                raise ValueError(f"Related database {target_id} not found in this workspace")
+            schemas[target_id] = {**loaded[1], **{
+                key: prop for key, prop in changes.get(target_id, {}).items() if prop is not None
+            }}
+        return schemas[target_id]
+
+    def change(target_id: str, key: str, prop: Optional[dict]):
+        if target_id == database_id:
+            if prop is None:
+                new.pop(key, None)
+            else:
+                new[key] = prop
+        else:
+            changes.setdefault(target_id, {})[key] = prop
+            if target_id in schemas and prop is not None:
+                schemas[target_id][key] = prop
+
+    old_relations = relations(old)
+    for key, relation in relations(new).items():
+        target_id = relation.get('database_id')
+        if not isinstance(target_id, str) or not _plain_key(key):
+            raise ValueError(f'Relation "{relation.get("name", key)}" needs a database_id')
+        previous = old_relations.get(key)
+        if previous is not None and previous.get('database_id') == target_id and previous.get('synced_property'):
+            # A relation keeps its synced property for life
+            synced = previous['synced_property']
+        else:
+            synced = relation.get('synced_property') or f"rel_{uuid.uuid4().hex[:8]}"
+        if not _plain_key(synced) or (target_id == database_id and synced == key):
+            raise ValueError(f'Relation "{relation.get("name", key)}": invalid synced_property {synced!r}')
+        new[key] = {**relation, 'synced_property': synced}
+        target = schema(target_id)
+        existing = target.get(synced)
+        if existing is not None and (existing.get('type') != RELATION or existing.get('database_id') != database_id
+                                     or existing.get('synced_property', key) != key):
+            raise ValueError(f'Relation "{relation.get("name", key)}": {synced!r} is another property of the related database')
+        if existing is None or existing.get('synced_property') != key:
+            change(target_id, synced, {
+                'name': (existing or {}).get('name') or _synced_name(name, target),
+                'type': RELATION, 'database_id': database_id, 'synced_property': key
+            })
+    for key, relation in old_relations.items():
+        kept = new.get(key)
+        if kept is not None and kept.get('type') == RELATION and kept.get('database_id') == relation.get('database_id'):
+            continue
+        target_id, synced = relation.get('database_id'), relation.get('synced_property')
+        if not synced or (target_id != database_id and load(target_id) is None):
+            continue
+        back = schema(target_id).get(synced) if target_id != database_id else new.get(synced)
+        if back and back.get('type') == RELATION and back.get('synced_property') == key:
+            change(target_id, synced, None)
+
+    for key, rollup in rollups(new).items():
+        label = f'Rollup "{rollup.get("name", key)}"'
+        relation = new.get(rollup.get('relation'))
+        if not _plain_key(key) or not relation or relation.get('type') != RELATION:
+            raise ValueError(f"{label}: relation must be a relation property of this database")
+        function = rollup.get('function', 'count')
+        if function not in ROLLUP_FUNCTIONS:
+            raise ValueError(f"{label}: function must be one of {', '.join(ROLLUP_FUNCTIONS)}")
+        target_key = rollup.get('property')
+        if target_key is None:
+            if function != 'count':
+                raise ValueError(f"{label}: {function} needs a property")
+            continue
+        target_prop = schema(relation['database_id']).get(target_key)
+        if not isinstance(target_prop, dict) or target_prop.get('type') in UNROLLABLE_TYPES:
+            raise ValueError(f"{label}: property must be a stored property of the related database")
+        if function in NUMBER_FUNCTIONS and target_prop.get('type') != 'number':
+            raise ValueError(f"{label}: {function} needs a number property")
+    return new, changes
+
+
+def _number(value: Any) -> Optional[float]:
+    """A value as a number, the way formulas read it; None when empty or not a number"""
+    if value is None or value == '':
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if number == number and abs(number) != float('inf') else None
+
+
+def _json_number(value: float) -> Any:
+    return int(value) if value.is_integer() and abs(value) < 2 ** 53 else value
+
+
+def _hashable(value: Any) -> Any:
+    return repr(value) if isinstance(value, (list, dict)) else value
+
+
+def rollup_value(rollup: Dict[str, Any], rows: List[Dict[str, Any]]) -> Any:
+    """The value of `rollup` over the related `rows`"""
+    function, key = rollup.get('function', 'count'), rollup.get('property')
+    if key is None:
+        return len(rows)
+    values = [(row.get('properties') or {}).get(key) for row in rows]
+    values = [value for value in values if value not in EMPTY_VALUES]
+    if function == 'count':
+        return len(values)
+    if function == 'distinct':
+        return len({_hashable(item) for value in values for item in (value if isinstance(value, list) else [value])})
+    numbers = [number for number in map(_number, values) if number is not None]
+    if function == 'sum':
+        return _json_number(float(sum(numbers)))
+    if not numbers:
+        return None
+    if function == 'avg':
+        return _json_number(sum(numbers) / len(numbers))
+    return _json_number(min(numbers) if function == 'min' else max(numbers))
+
+
+def _rows_by_id(storage: Storage, database_id: str, row_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    row_ids = list(dict.fromkeys(row_ids))
+    rows = {}
+    for start in range(0, len(row_ids), BATCH_SIZE):
+        for row in storage.get_database_rows_by_id(database_id, row_ids[start:start + BATCH_SIZE]):
+            rows[row['id']] = row
+    return rows
+
+
+def _rollup_values(storage: Storage, properties: Dict[str, Any],
+                   rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """The rollup values of each of `rows`, reading each relation's rows in batches"""
+    all_rollups = rollups(properties)
+    related: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    for relation_key in {rollup.get('relation') for rollup in all_rollups.values()}:
+        relation = properties.get(relation_key)
+        if not isinstance(relation, dict) or relation.get('type') != RELATION:
+            continue
+        ids = [row_id for row in rows for row_id in linked_ids((row.get('properties') or {}).get(relation_key))]
+        related[relation_key] = _rows_by_id(storage, relation['database_id'], ids) if ids else {}
+    values = []
+    for row in rows:
+        row_values = {}
+        for key, rollup in all_rollups.items():
+            if rollup.get('relation') not in related:
+                row_values[key] = None
+                continue
+            linked = related[rollup['relation']]
+            row_ids = linked_ids((row.get('properties') or {}).get(rollup['relation']))
+            row_values[key] = rollup_value(rollup, [linked[row_id] for row_id in row_ids if row_id in linked])
+        values.append(row_values)
+    return values
+
+
+def prepare_row(storage: Storage, database: Dict[str, Any], properties: Dict[str, Any],
+                row: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """A row's properties as written: relation values as lists of ids, and
+    rollups computed, not taken from the client. Raises ValueError for links
+    to rows the related database doesn't have."""
+    schema = database.get('properties') or {}
+    if not has_links(schema):
+        return properties
+    properties = dict(properties)
+    before = (row or {}).get('properties') or {}
+    for key, relation in relations(schema).items():
+        if key not in properties:
+            continue
+        ids = linked_ids(properties[key])
+        added = set(ids) - set(linked_ids(before.get(key)))
+        if added:
+            found = _rows_by_id(storage, relation['database_id'], added)
+            missing = sorted(added - set(found))
+            if missing:
+                raise ValueError(f'Relation "{relation.get("name", key)}": no row {missing[0]} in the related database')
+        properties[key] = ids
+    properties.update(_rollup_values(storage, schema, [{'properties': properties}])[0])
+    return properties
+
+
+def refresh_rollups(storage: Storage, database_id: str, row_ids: Optional[Iterable[str]] = None,
+                    properties: Optional[Dict[str, Any]] = None) -> int:
+    """Recompute the rollups of `row_ids` (every row when None), storing those
+    that changed with the formula caches they affect; returns the rows updated"""
+    if properties is None:
+        database = storage.get_database_by_id(database_id, ['properties'])
+        properties = (database or {}).get('properties') or {}
+    if not rollups(properties):
+        return 0
+    if row_ids is None:
+        rows = storage.get_database_rows(database_id)
+    else:
+        rows = list(_rows_by_id(storage, database_id, row_ids).values())
+    updates: Dict[str, Dict[str, Any]] = {}
+    changed_rows = []
+    for row, values in zip(rows, _rollup_values(storage, properties, rows)):
+        current = row.get('properties') or {}
+        changed = {key: value for key, value in values.items() if current.get(key) != value}
+        if changed:
+            updates[row['id']] = changed
+            changed_rows.append(row)
+    if not updates:
+        return 0
+    computed = None
+    if any(isinstance(prop, dict) and prop.get('type') == 'formula' for prop in properties.values()):
+        import formulas
+        computed = {
+            row['id']: formulas.edit_row(properties, row, {**row['properties'], **updates[row['id']]}).computed
+            for row in changed_rows
+        }
+    return storage.set_database_rows_properties(database_id, updates, computed)
+
+
+def sync_row(storage: Storage, database: Dict[str, Any], row_id: str,
+             before: Optional[Dict[str, Any]], after: Optional[Dict[str, Any]]) -> None:
+    """Bring the related databases in line with a row written from `before` to
+    `after` (None when created or deleted): link or unlink the row on the
+    other side of each changed relation, then recompute the rollups there
+    that read a link or value that changed"""
+    schema = database.get('properties') or {}
+    before, after = before or {}, after or {}
+    changed: Set[str] = {key for key in set(before) | set(after) if before.get(key) != after.get(key)}
+    for key, relation in relations(schema).items():
+        target_id, synced = relation['database_id'], relation.get('synced_property')
+        if not synced:
+            continue
+        old, new = set(linked_ids(before.get(key))), set(linked_ids(after.get(key)))
+        if new - old:
+            storage.link_database_rows(target_id, synced, sorted(new - old), row_id, True)
+        if old - new:
+            storage.link_database_rows(target_id, synced, sorted(old - new), row_id, False)
+        target = schema if target_id == database['id'] else (
+            storage.get_database_by_id(target_id, ['properties']) or {}
+        ).get('properties') or {}
+        reading = [rollup for rollup in rollups(target).values() if rollup.get('relation') == synced]
+        if any(rollup.get('property') in changed for rollup in reading):
+            affected = old | new
+        elif reading:
+            affected = old ^ new
+        else:
+            continue
+        if affected:
+            refresh_rollups(storage, target_id, affected, target)
@@ -0,0 +1,44 @@
+from fastapi import APIRouter, Depends
+from typing import Any, List, Optional
+from pydantic import BaseModel
+
+from auth import get_current_admin_user
+from slow_queries import slow_query_log, SLOW_QUERY_MS, SLOW_QUERY_EXPLAIN
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+class SlowQueryEntry(BaseModel):
+    kind: str  # 'mongo' or 'sql'
+    shape: str
+    count: int
+    total_ms: float
+    mean_ms: float
+    max_ms: float
+    first_seen: str
+    last_seen: str
+    explain: Optional[Any] = None
+
+class SlowQueryResponse(BaseModel):
+    threshold_ms: float
+    explain_enabled: bool
+    queries: List[SlowQueryEntry]
+
+@router.get("/slow-queries", response_model=SlowQueryResponse)
+async def get_slow_queries(
+    kind: Optional[str] = None,
+    limit: int = 100,
+    current_user: dict = Depends(get_current_admin_user)
+):
+    """Slowest query shapes seen by this worker, by total time"""
+    queries = [entry for entry in slow_query_log.snapshot() if not kind or entry['kind'] == kind]
+    return SlowQueryResponse(
+        threshold_ms=SLOW_QUERY_MS,
+        explain_enabled=SLOW_QUERY_EXPLAIN,
+        queries=queries[:limit]
+    )
+
+@router.delete("/slow-queries")
+async def clear_slow_queries(current_user: dict = Depends(get_current_admin_user)):
+    """Reset the slow-query log"""
+    slow_query_log.clear()
+    return {"message": "Slow-query log cleared"}
@@ -1,13 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request
+from starlette.concurrency import run_in_threadpool
 from fastapi.security import HTTPBearer
 from datetime import timedelta
 from typing import Optional
 import uuid
 
-from database import (
-    get_user_by_email, get_user_by_id, create_user, update_user,
-    record_login_attempt, get_recent_login_attempts
-)
+from storage import Storage, get_storage
 from auth import (
     UserCreate, UserLogin, UserResponse, Token, MFASetupResponse, MFAVerifyRequest,
     get_password_hash, authenticate_user, create_access_token, get_current_active_user,
@@ -18,10 +16,10 @@ from rate_limiter import rate_limiter, check_rate_limit_middleware
 router = APIRouter(prefix="/auth", tags=["authentication"])
 
 @router.post("/register", response_model=UserResponse)
-async def register(user_data: UserCreate):
+async def register(user_data: UserCreate, storage: Storage = Depends(get_storage)):
     """Register a new user"""
     # Check if user already exists
-    existing_user = get_user_by_email(user_data.email)
+    existing_user = await run_in_threadpool(storage.get_user_by_email, user_data.email)
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -38,19 +36,19 @@ async def register(user_data: UserCreate):
         'is_verified': True  # For demo purposes
     }
     
-    db_user = create_user(user_doc)
+    db_user = await run_in_threadpool(storage.create_user, user_doc)
     
     return UserResponse.from_orm(db_user)
 
 @router.post("/login", response_model=Token)
-async def login(request: Request, user_data: UserLogin):
+async def login(request: Request, user_data: UserLogin, storage: Storage = Depends(get_storage)):
     """Login user and return access token"""
     
     # Get client IP
     client_ip = request.client.host
     
     # Check rate limiting
-    recent_attempts = get_recent_login_attempts(client_ip, 30)
+    recent_attempts = await run_in_threadpool(storage.get_recent_login_attempts, client_ip, 30)
     failed_attempts = [attempt for attempt in recent_attempts if not attempt['successful']]
     
     if len(failed_attempts) >= 3:
@@ -60,18 +58,18 @@ async def login(request: Request, user_data: UserLogin):
         )
     
     # Authenticate user
-    user = authenticate_user(user_data.email, user_data.password)
+    user = await run_in_threadpool(authenticate_user, user_data.email, user_data.password)
     
     if not user:
         # Record failed attempt
-        record_login_attempt(client_ip, user_data.email, successful=False)
+        await run_in_threadpool(storage.record_login_attempt, client_ip, user_data.email, successful=False)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password"
         )
     
     # Record successful attempt
-    record_login_attempt(client_ip, user_data.email, successful=True)
+    await run_in_threadpool(storage.record_login_attempt, client_ip, user_data.email, successful=True)
     
     # Create access token
     access_token = create_access_token(data={"sub": user['id']})
@@ -96,7 +94,7 @@ async def setup_mfa(current_user: dict = Depends(get_current_active_user)):
             detail="MFA is already enabled"
         )
     
-    backup_codes = enable_mfa_for_user(current_user['id'])
+    backup_codes = await run_in_threadpool(enable_mfa_for_user, current_user['id'])
     
     return MFASetupResponse(backup_codes=backup_codes)
 
@@ -112,7 +110,7 @@ async def verify_mfa(
             detail="MFA is not enabled"
         )
     
-    is_valid = verify_backup_code_for_user(current_user['id'], mfa_data.backup_code)
+    is_valid = await run_in_threadpool(verify_backup_code_for_user, current_user['id'], mfa_data.backup_code)
     
     if not is_valid:
         raise HTTPException(
@@ -131,15 +129,15 @@ async def disable_mfa(current_user: dict = Depends(get_current_active_user)):
             detail="MFA is not enabled"
         )
     
-    disable_mfa_for_user(current_user['id'])
+    await run_in_threadpool(disable_mfa_for_user, current_user['id'])
     
     return {"message": "MFA disabled successfully"}
 
 @router.get("/rate-limit-status")
-async def get_rate_limit_status(request: Request):
+async def get_rate_limit_status(request: Request, storage: Storage = Depends(get_storage)):
     """Get current rate limit status"""
     client_ip = request.client.host
-    recent_attempts = get_recent_login_attempts(client_ip, 30)
+    recent_attempts = await run_in_threadpool(storage.get_recent_login_attempts, client_ip, 30)
     failed_attempts = [attempt for attempt in recent_attempts if not attempt['successful']]
     
     remaining_attempts = max(0, 3 - len(failed_attempts))
@@ -0,0 +1,227 @@
+import asyncio
+import json
+import logging
+import os
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.security import HTTPAuthorizationCredentials
+from starlette.exceptions import HTTPException as StarletteHTTPException
+from typing import Any, Dict, List, Optional, Tuple
+from pydantic import BaseModel
+
+from pubsub import deferred
+from storage import Storage, get_storage
+from auth import get_current_active_user, authenticated_as, security
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/batch", tags=["batch"])
+
+API_PREFIX = "/api"
+MAX_BATCH_OPERATIONS = int(os.environ.get('BATCH_MAX_OPERATIONS', '50'))
+BATCH_METHODS = ('GET', 'POST', 'PUT', 'DELETE')
+# Batches can't nest, and bootstrap fans out over threads which a shared transaction can't follow
+EXCLUDED_PREFIXES = ('/batch', '/bootstrap')
+# Connection details sub-requests inherit from the batch request
+INHERITED_SCOPE_KEYS = (
+    'asgi', 'http_version', 'scheme', 'server', 'client', 'root_path', 'app', 'starlette.exception_handlers'
+)
+
+class BatchOperation(BaseModel):
+    """One sub-request; `path` is relative to /api, e.g. /databases/{id}/rows"""
+    id: Optional[str] = None
+    method: str
+    path: str
+    body: Optional[Any] = None
+    depends_on: List[str] = []
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation]
+    atomic: bool = False
+
+class BatchResult(BaseModel):
+    id: str
+    status: int
+    body: Any = None
+
+class BatchResponse(BaseModel):
+    results: List[BatchResult]
+    committed: bool
+
+def _validate(operations: List[BatchOperation]):
+    if not operations:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No operations given")
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_BATCH_OPERATIONS} operations per batch"
+        )
+    seen = set()
+    for index, operation in enumerate(operations):
+        if operation.id is None:
+            operation.id = str(index)
+        operation.method = operation.method.upper()
+        if operation.id in seen:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Duplicate operation id {operation.id}")
+        if operation.method not in BATCH_METHODS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Operation {operation.id}: method must be one of {', '.join(BATCH_METHODS)}"
+            )
+        path = operation.path.split('?', 1)[0]
+        if not path.startswith('/') or any(
+            path == prefix or path.startswith(prefix + '/') for prefix in EXCLUDED_PREFIXES
+        ):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Operation {operation.id}: {operation.path} can't be batched"
+            )
+        # Dependencies must come earlier in the list, which also rules out cycles
+        unknown = [dependency for dependency in operation.depends_on if dependency not in seen]
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Operation {operation.id} depends on unknown or later operations: {', '.join(unknown)}"
+            )
+        seen.add(operation.id)
+
+async def _dispatch(request: Request, operation: BatchOperation, authorization: str) -> Tuple[int, Any]:
+    """Run one sub-request through the app's router and return its status and decoded body"""
+    path, _, query = operation.path.partition('?')
+    path = request.scope.get('root_path', '') + API_PREFIX + path
+    body = b'' if operation.body is None else json.dumps(operation.body).encode()
+    scope = {key: request.scope[key] for key in INHERITED_SCOPE_KEYS if key in request.scope}
+    scope.update({
+        'type': 'http',
+        'method': operation.method,
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': query.encode(),
+        'headers': [
+            (b'authorization', authorization.encode()),
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+        ],
+    })
+
+    body_sent = False
+    async def receive():
+        nonlocal body_sent
+        if body_sent:
+            return {'type': 'http.disconnect'}
+        body_sent = True
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    response_status = 500
+    chunks: List[bytes] = []
+    async def send(message):
+        nonlocal response_status
+        if message['type'] == 'http.response.start':
+            response_status = message['status']
+        elif message['type'] == 'http.response.body':
+            chunks.append(message.get('body', b''))
+
+    try:
+        await request.app.router(scope, receive, send)
+    except StarletteHTTPException as exc:
+        # Raised by the router itself (no matching route), outside any route's handlers
+        return exc.status_code, {'detail': exc.detail}
+    except Exception:
+        logger.exception("Batch operation %s %s failed", operation.method, operation.path)
+        return 500, {'detail': 'Internal Server Error'}
+
+    content = b''.join(chunks)
+    if not content:
+        return response_status, None
+    try:
+        return response_status, json.loads(content)
+    except ValueError:
+        return response_status, content.decode(errors='replace')
+
+async def _run_concurrently(request: Request, operations: List[BatchOperation], authorization: str) -> Dict[str, BatchResult]:
+    results: Dict[str, BatchResult] = {}
+    tasks: Dict[str, asyncio.Future] = {}
+
+    async def run(operation: BatchOperation):
+        for dependency in operation.depends_on:
+            await tasks[dependency]
+        failed = [dependency for dependency in operation.depends_on if results[dependency].status >= 400]
+        if failed:
+            results[operation.id] = BatchResult(
+                id=operation.id, status=status.HTTP_424_FAILED_DEPENDENCY,
+                body={'detail': f"Not run: operation {failed[0]} failed"}
+            )
+            return
+        # Handlers run their storage calls on the threadpool, so independent operations overlap
+        code, body = await _dispatch(request, operation, authorization)
+        results[operation.id] = BatchResult(id=operation.id, status=code, body=body)
+
+    for operation in operations:
+        tasks[operation.id] = asyncio.ensure_future(run(operation))
+    await asyncio.gather(*tasks.values())
+    return results
+
+async def _run_atomically(request: Request, operations: List[BatchOperation], authorization: str,
+                          storage: Storage) -> Tuple[Dict[str, BatchResult], bool]:
+    """Run the operations in order in one transaction; the first failure rolls all of them back,
+    along with the events they published"""
+    results: Dict[str, BatchResult] = {}
+    failed: Optional[str] = None
+
+    class Rollback(Exception):
+        pass
+
+    try:
+        # Events go out once the transaction has committed, and not at all if it rolls back
+        with deferred(), storage.transaction():
+            for operation in operations:
+                code, body = await _dispatch(request, operation, authorization)
+                results[operation.id] = BatchResult(id=operation.id, status=code, body=body)
+                if code >= 400:
+                    failed = operation.id
+                    raise Rollback()
+    except Rollback:
+        for operation in operations:
+            if operation.id not in results:
+                results[operation.id] = BatchResult(
+                    id=operation.id, status=status.HTTP_424_FAILED_DEPENDENCY,
+                    body={'detail': f"Not run: operation {failed} failed and the batch was rolled back"}
+                )
+        return results, False
+    return results, True
+
+@router.post("/", response_model=BatchResponse)
+async def run_batch(
+    batch: BatchRequest,
+    request: Request,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    current_user: dict = Depends(get_current_active_user),
+    storage: Storage = Depends(get_storage)
+):
+    """Run many API calls in one request.
+
+    Sub-requests go through the regular routes with the caller's credentials,
+    which are checked once for the whole batch. Operations run concurrently
+    unless one lists others in `depends_on`; it then waits for them and is
+    skipped (424) if any failed. With `atomic`, operations run in order in a
+    single storage transaction and the first failure rolls back the batch.
+    Each result carries the operation's own status code and body.
+    """
+    _validate(batch.operations)
+    if batch.atomic and not storage.supports_transactions:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Atomic batches are not supported by the {storage.name} storage backend"
+        )
+
+    authorization = f"{credentials.scheme} {credentials.credentials}"
+    with authenticated_as(credentials.credentials, current_user):
+        if batch.atomic:
+            results, committed = await _run_atomically(request, batch.operations, authorization, storage)
+        else:
+            results = await _run_concurrently(request, batch.operations, authorization)
+            committed = True
+
+    return BatchResponse(
+        results=[results[operation.id] for operation in batch.operations],
+        committed=committed
+    )
@@ -0,0 +1,91 @@
+import asyncio
+from fastapi import APIRouter, Depends
+from starlette.concurrency import run_in_threadpool
+from typing import Any, Dict, List
+from pydantic import BaseModel
+
+from storage import Storage, get_storage
+from auth import get_current_active_user, UserResponse
+from profiling import ProfiledJSONResponse
+from routes.workspaces import WorkspaceResponse
+from routes.pages import PageListItem
+from routes.databases import DatabaseListItem
+
+router = APIRouter(prefix="/bootstrap", tags=["bootstrap"])
+
+# Enough to draw the sidebar; content and rows are loaded when a page or database is opened
+PAGE_TREE_FIELDS = ['title', 'icon', 'parent_id', 'workspace_id', 'created_at', 'updated_at']
+DATABASE_SUMMARY_FIELDS = ['name', 'workspace_id', 'created_at', 'updated_at']
+
+class BootstrapWorkspace(WorkspaceResponse):
+    pages: List[PageListItem] = []
+    databases: List[DatabaseListItem] = []
+
+class BootstrapResponse(BaseModel):
+    user: UserResponse
+    workspaces: List[BootstrapWorkspace]
+
+def _member_details(workspace: Dict[str, Any], users: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    members = []
+    for member in workspace.get('members', []):
+        user = users.get(member.get('user_id'))
+        if user:
+            members.append({
+                'id': user['id'],
+                'name': user['name'],
+                'email': user['email'],
+                'avatar': user.get('avatar'),
+                'color': user.get('color', '#3b82f6'),
+                'role': member.get('role', 'member')
+            })
+    return members
+
+@router.get("/", response_model=BootstrapResponse)
+async def get_bootstrap(
+    current_user: dict = Depends(get_current_active_user),
+    storage: Storage = Depends(get_storage)
+):
+    """Everything the app needs on load: the user, their workspaces with members,
+    the page tree (metadata only) and database summaries of each workspace"""
+    workspaces = await run_in_threadpool(storage.get_user_workspaces, current_user['id'])
+    member_ids = list({
+        member['user_id'] for ws in workspaces for member in ws.get('members', []) if member.get('user_id')
+    })
+
+    # Independent reads run concurrently on the threadpool; members are one query however many
+    member_users, *results = await asyncio.gather(
+        run_in_threadpool(storage.get_users_by_ids, member_ids),
+        *[run_in_threadpool(storage.get_workspace_page_tree, ws['id'], PAGE_TREE_FIELDS) for ws in workspaces],
+        *[run_in_threadpool(storage.get_workspace_databases, ws['id'], DATABASE_SUMMARY_FIELDS) for ws in workspaces]
+    )
+    users = {user['id']: user for user in member_users}
+    page_trees = results[:len(workspaces)]
+    database_lists = results[len(workspaces):]
+
+    content = {
+        'user': UserResponse.from_orm(current_user).model_dump(),
+        'workspaces': [
+            {
+                'id': ws['id'],
+                'name': ws['name'],
+                'icon': ws['icon'],
+                'description': ws.get('description'),
+                'owner_id': ws['owner_id'],
+                'members': _member_details(ws, users),
+                'settings': ws.get('settings', {}),
+                'created_at': ws['created_at'],
+                'updated_at': ws.get('updated_at'),
+                'pages': [
+                    {'id': page['id'], **{field: page.get(field) for field in PAGE_TREE_FIELDS}}
+                    for page in pages
+                ],
+                'databases': [
+                    {'id': db['id'], **{field: db.get(field) for field in DATABASE_SUMMARY_FIELDS}}
+                    for db in databases
+                ]
+            }
+            for ws, pages, databases in zip(workspaces, page_trees, database_lists)
+        ]
+    }
+    # Storage records are already JSON-ready, so skip response_model validation and encode once
+    return ProfiledJSONResponse(content)
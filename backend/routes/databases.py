@@ -1,14 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List, Optional
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, WebSocket, status
+from starlette.concurrency import run_in_threadpool
+from typing import Any, Dict, List, Optional, Tuple
 from pydantic import BaseModel
+import base64
+import json
 import uuid
-from datetime import datetime
 
-from database import (
-    get_user_workspaces, get_workspace_databases, get_database_by_id,
-    create_database, update_database, delete_database
-)
-from auth import get_current_active_user
+import collaboration
+import date_index
+import order_keys
+import relations
+import schema_migration
+from pubsub import database_channel, get_broker, workspace_channel
+from storage import RowAggregate, RowAggregation, RowCondition, Storage, get_storage
+from auth import WEBSOCKET_PROTOCOL, get_current_active_user, get_websocket_user
+from routes.projection import parse_fields
 
 router = APIRouter(prefix="/databases", tags=["databases"])
 
@@ -36,15 +42,144 @@ class DatabaseResponse(BaseModel):
     created_at: str
     updated_at: Optional[str] = None
 
-@router.get("/", response_model=List[DatabaseResponse])
+class DatabaseListItem(BaseModel):
+    """A DatabaseResponse reduced to the fields asked for with ?fields="""
+    id: str
+    name: Optional[str] = None
+    workspace_id: Optional[str] = None
+    created_by: Optional[str] = None
+    properties: Optional[dict] = None
+    views: Optional[List[dict]] = None
+    rows: Optional[List[dict]] = None
+    is_deleted: Optional[bool] = None
+    created_at: Optional[str] = None
+    updated_at: Optional[str] = None
+
+DATABASE_DEFAULTS = {'properties': {}, 'views': [], 'rows': [], 'is_deleted': False, 'updated_at': None}
+
+def _publish(database_id: str, message: dict):
+    """Tell the database's live feeds, on every worker, what changed"""
+    get_broker().publish(database_channel(database_id), message)
+
+def _has_formulas(properties: Optional[dict]) -> bool:
+    return any(isinstance(prop, dict) and prop.get('type') == 'formula' for prop in (properties or {}).values())
+
+# The formulas package (and NumPy) is imported on first use, by the first database with formulas
+
+def _validate_formulas(properties: Optional[dict]):
+    if not _has_formulas(properties):
+        return
+    import formulas
+    try:
+        formulas.validate(properties)
+    except formulas.FormulaError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+
+def _plan_links(storage: Storage, database_id: str, name: str, workspace_id: str,
+                old: Optional[dict], new: dict) -> Tuple[dict, Dict[str, Dict[str, Optional[dict]]]]:
+    """relations.plan_schema for a schema change, 400 when a relation or rollup can't be kept"""
+    if not relations.has_links(old) and not relations.has_links(new):
+        return new, {}
+
+    def load(target_id: str) -> Optional[Tuple[str, dict]]:
+        target = storage.get_database_by_id(target_id, ['workspace_id', 'properties', 'is_deleted'])
+        if not target or target.get('is_deleted'):
+            return None
+        return target['workspace_id'], target.get('properties') or {}
+
+    try:
+        return relations.plan_schema(database_id, name, workspace_id, old, new, load)
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+
+def _apply_links(storage: Storage, database_id: str, changes: Dict[str, Dict[str, Optional[dict]]]):
+    """Add and remove the synced relation properties planned in the related databases"""
+    for target_id, target_changes in changes.items():
+        target = storage.get_database_by_id(target_id, ['properties'])
+        if not target:
+            continue
+        properties = dict(target.get('properties') or {})
+        for key, prop in target_changes.items():
+            if prop is None:
+                properties.pop(key, None)
+            else:
+                properties[key] = {**prop, 'database_id': database_id}
+        storage.update_database(target_id, {'properties': properties})
+
+def _linked_row(storage: Storage, database: Dict[str, Any], properties: dict,
+                row: Optional[dict] = None) -> dict:
+    """relations.prepare_row, 400 for links to rows that don't exist"""
+    try:
+        return relations.prepare_row(storage, database, properties, row)
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+
+def _computed_rows(database: Dict[str, Any], filters: List[str] = (), sorts: List[str] = ()) -> List[dict]:
+    """The database's rows with formula values filled in, filtered and sorted"""
+    rows = schema_migration.upgrade_rows(database, database.get('rows', []))
+    if not filters and not sorts and not _has_formulas(database.get('properties')):
+        return rows
+    import formulas
+    try:
+        return formulas.query_rows(database.get('properties') or {}, rows, filters, sorts)
+    except formulas.FormulaError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+
+def _row_to_store(database: Dict[str, Any], properties: dict,
+                  row: Optional[dict] = None) -> Tuple[dict, Optional[dict], dict]:
+    """(properties, formula cache, formula values) of a new row, or of `row` edited to `properties`.
+
+    An edit recomputes only the formulas reading the properties that changed.
+    """
+    if not _has_formulas(database.get('properties')):
+        return properties, None, {}
+    import formulas
+    if row is None:
+        update = formulas.refresh_rows(database['properties'], [{'properties': properties}])[0]
+    else:
+        update = formulas.edit_row(database['properties'], row, properties)
+    return update.properties, update.computed, update.values
+
+def _rows_to_store(database: Dict[str, Any], rows: List[dict]) -> List[dict]:
+    """Rows written as a whole list, with their formula caches computed here rather than taken from the client"""
+    stored = []
+    for row in rows:
+        properties, computed, _ = _row_to_store(database, row.get('properties') or {})
+        row = {key: value for key, value in row.items() if key != 'computed'}
+        row['properties'] = properties
+        if computed:
+            row['computed'] = computed
+        stored.append(row)
+    return stored
+
+def _refresh_caches(storage: Storage, database: Dict[str, Any]):
+    """Recompute the formula caches a schema change made stale, storing them and updating `database`'s rows"""
+    rows = database.get('rows', [])
+    if _has_formulas(database.get('properties')):
+        import formulas
+        caches = [update.computed for update in formulas.refresh_rows(database['properties'], rows)]
+    else:
+        caches = [{} for _ in rows]
+    changed = {row['id']: cache for row, cache in zip(rows, caches) if cache != row.get('computed', {})}
+    if changed:
+        storage.set_database_rows_computed(database['id'], changed)
+    for row, cache in zip(rows, caches):
+        row.pop('computed', None)
+        if cache:
+            row['computed'] = cache
+
+@router.get("/", response_model=List[DatabaseListItem], response_model_exclude_unset=True)
 async def get_databases(
     workspace_id: Optional[str] = None,
-    current_user: dict = Depends(get_current_active_user)
+    fields: Optional[str] = None,
+    current_user: dict = Depends(get_current_active_user),
+    storage: Storage = Depends(get_storage)
 ):
-    """Get databases"""
+    """Get databases; `fields=id,name` skips the rows and schema"""
+    field_list = parse_fields(fields, DatabaseListItem.model_fields)
     if workspace_id:
         # Check if user has access to workspace
-        user_workspaces = get_user_workspaces(current_user['id'])
+        user_workspaces = await run_in_threadpool(storage.get_user_workspaces, current_user['id'])
         workspace_ids = [ws['id'] for ws in user_workspaces]
         
         if workspace_id not in workspace_ids:
@@ -53,10 +188,25 @@ async def get_databases(
                 detail="Access denied to workspace"
             )
         
-        databases = get_workspace_databases(workspace_id)
+        fetched = field_list
+        if field_list is not None and 'rows' in field_list:
+            # Rows are read as of a schema migration under way
+            fetched = [*field_list, 'schema_migration']
+        databases = await run_in_threadpool(storage.get_workspace_databases, workspace_id, fetched)
     else:
         databases = []
     
+    if field_list is not None:
+        if 'rows' in field_list:
+            for db in databases:
+                db['rows'] = await run_in_threadpool(_computed_rows, db)
+        return [
+            DatabaseListItem(id=db['id'], **{field: db.get(field, DATABASE_DEFAULTS.get(field)) for field in field_list})
+            for db in databases
+        ]
+    
+    for db in databases:
+        db['rows'] = await run_in_threadpool(_computed_rows, db)
     return [
         DatabaseResponse(
             id=db['id'],
@@ -65,7 +215,7 @@ async def get_databases(
             created_by=db['created_by'],
             properties=db.get('properties', {}),
             views=db.get('views', []),
-            rows=db.get('rows', []),
+            rows=db['rows'],
             is_deleted=db.get('is_deleted', False),
             created_at=db['created_at'],
             updated_at=db.get('updated_at')
@@ -76,10 +226,11 @@ async def get_databases(
 @router.get("/{database_id}", response_model=DatabaseResponse)
 async def get_database(
     database_id: str,
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(get_current_active_user),
+    storage: Storage = Depends(get_storage)
 ):
     """Get database by ID"""
-    database = get_database_by_id(database_id)
+    database = await run_in_threadpool(storage.get_database_by_id, database_id)
     if not database:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -87,7 +238,7 @@ async def get_database(
         )
     
     # Check if user has access to workspace
-    user_workspaces = get_user_workspaces(current_user['id'])
+    user_workspaces = await run_in_threadpool(storage.get_user_workspaces, current_user['id'])
     workspace_ids = [ws['id'] for ws in user_workspaces]
     
     if database['workspace_id'] not in workspace_ids:
@@ -103,7 +254,7 @@ async def get_database(
         created_by=database['created_by'],
         properties=database.get('properties', {}),
         views=database.get('views', []),
-        rows=database.get('rows', []),
+        rows=await run_in_threadpool(_computed_rows, database),
         is_deleted=database.get('is_deleted', False),
         created_at=database['created_at'],
         updated_at=database.get('updated_at')
@@ -112,11 +263,12 @@ async def get_database(
 @router.post("/", response_model=DatabaseResponse)
 async def create_database_endpoint(
     database_data: DatabaseCreate,
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(get_current_active_user),
+    storage: Storage = Depends(get_storage)
 ):
     """Create a new database"""
     # Check if user has access to workspace
-    user_workspaces = get_user_workspaces(current_user['id'])
+    user_workspaces = await run_in_threadpool(storage.get_user_workspaces, current_user['id'])
     workspace_ids = [ws['id'] for ws in user_workspaces]
     
     if database_data.workspace_id not in workspace_ids:
@@ -124,18 +276,27 @@ async def create_database_endpoint(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Access denied to workspace"
         )
+    _validate_formulas(database_data.properties)
+    # The new database has no id yet, so none of its relations can point to itself
+    properties, link_changes = await run_in_threadpool(
+        _plan_links, storage, '', database_data.name, database_data.workspace_id, None, database_data.properties or {}
+    )
     
     database_doc = {
         'name': database_data.name,
         'workspace_id': database_data.workspace_id,
         'created_by': current_user['id'],
-        'properties': database_data.properties or {},
+        'properties': properties,
         'views': database_data.views or [],
         'rows': [],
         'is_deleted': False
     }
     
-    database = create_database(database_doc)
+    database = await run_in_threadpool(storage.create_database, database_doc)
+    await run_in_threadpool(_apply_links, storage, database['id'], link_changes)
+    get_broker().publish(workspace_channel(database['workspace_id']), {
+        'type': 'database', 'action': 'created', 'database_id': database['id'], 'user_id': current_user['id']
+    })
     
     return DatabaseResponse(
         id=database['id'],
@@ -154,10 +315,11 @@ async def create_database_endpoint(
 async def update_database_endpoint(
     database_id: str,
     database_data: DatabaseUpdate,
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(get_current_active_user),
+    storage: Storage = Depends(get_storage)
 ):
     """Update database"""
-    database = get_database_by_id(database_id)
+    database = await run_in_threadpool(storage.get_database_by_id, database_id)
     if not database:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -165,7 +327,7 @@ async def update_database_endpoint(
         )
     
     # Check if user has access to workspace
-    user_workspaces = get_user_workspaces(current_user['id'])
+    user_workspaces = await run_in_threadpool(storage.get_user_workspaces, current_user['id'])
     workspace_ids = [ws['id'] for ws in user_workspaces]
     
     if database['workspace_id'] not in workspace_ids:
@@ -174,27 +336,57 @@ async def update_database_endpoint(
             detail="Access denied"
         )
     
+    if schema_migration.active(database) and (database_data.properties is not None or database_data.rows is not None):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A schema migration is under way"
+        )
+    
     # Prepare update data
     update_data = {}
+    link_changes = {}
     if database_data.name is not None:
         update_data['name'] = database_data.name
     if database_data.properties is not None:
-        update_data['properties'] = database_data.properties
+        _validate_formulas(database_data.properties)
+        update_data['properties'], link_changes = await run_in_threadpool(
+            _plan_links, storage, database_id, database_data.name or database['name'], database['workspace_id'],
+            database.get('properties'), database_data.properties
+        )
     if database_data.views is not None:
         update_data['views'] = database_data.views
     if database_data.rows is not None:
-        update_data['rows'] = database_data.rows
+        # Formula caches are computed here, never taken from the client
+        schema = {**database, 'properties': update_data.get('properties', database.get('properties'))}
+        update_data['rows'] = await run_in_threadpool(_rows_to_store, schema, database_data.rows)
     
     # Update database
-    success = update_database(database_id, update_data)
+    fields = sorted(update_data)
+    success = await run_in_threadpool(storage.update_database, database_id, update_data)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Failed to update database"
         )
     
+    await run_in_threadpool(_apply_links, storage, database_id, link_changes)
+    _publish(database_id, {'type': 'database', 'action': 'updated', 'fields': fields, 'user_id': current_user['id']})
+    if 'name' in fields:
+        get_broker().publish(workspace_channel(database['workspace_id']), {
+            'type': 'database', 'action': 'updated', 'database_id': database_id, 'user_id': current_user['id']
+        })
+    # Rollups are recomputed when their definitions change, and for a new list
+    # of rows; its relation values aren't synced to the related databases
+    new_properties = update_data.get('properties', database.get('properties'))
+    if 'rows' in update_data or (
+            'properties' in update_data
+            and relations.rollups(new_properties) != relations.rollups(database.get('properties'))):
+        await run_in_threadpool(relations.refresh_rollups, storage, database_id, None, new_properties)
+    
     # Return updated database
-    updated_database = get_database_by_id(database_id)
+    updated_database = await run_in_threadpool(storage.get_database_by_id, database_id)
+    if 'properties' in update_data and 'rows' not in update_data:
+        await run_in_threadpool(_refresh_caches, storage, updated_database)
     
     return DatabaseResponse(
         id=updated_database['id'],
@@ -203,7 +395,7 @@ async def update_database_endpoint(
         created_by=updated_database['created_by'],
         properties=updated_database.get('properties', {}),
         views=updated_database.get('views', []),
-        rows=updated_database.get('rows', []),
+        rows=await run_in_threadpool(_computed_rows, updated_database),
         is_deleted=updated_database.get('is_deleted', False),
         created_at=updated_database['created_at'],
         updated_at=updated_database.get('updated_at')
@@ -212,10 +404,11 @@ async def update_database_endpoint(
 @router.delete("/{database_id}")
 async def delete_database_endpoint(
     database_id: str,
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(get_current_active_user),
+    storage: Storage = Depends(get_storage)
 ):
     """Delete database (soft delete)"""
-    database = get_database_by_id(database_id)
+    database = await run_in_threadpool(storage.get_database_by_id, database_id)
     if not database:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -223,7 +416,7 @@ async def delete_database_endpoint(
         )
     
     # Check if user has access to workspace
-    user_workspaces = get_user_workspaces(current_user['id'])
+    user_workspaces = await run_in_threadpool(storage.get_user_workspaces, current_user['id'])
     workspace_ids = [ws['id'] for ws in user_workspaces]
     
     if database['workspace_id'] not in workspace_ids:
@@ -233,15 +426,144 @@ async def delete_database_endpoint(
         )
     
     # Delete database
-    success = delete_database(database_id, current_user['id'])
+    success = await run_in_threadpool(storage.delete_database, database_id, current_user['id'])
     if not success:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Failed to delete database"
         )
+    _publish(database_id, {'type': 'database', 'action': 'deleted', 'user_id': current_user['id']})
+    get_broker().publish(workspace_channel(database['workspace_id']), {
+        'type': 'database', 'action': 'deleted', 'database_id': database_id, 'user_id': current_user['id']
+    })
     
     return {"message": "Database deleted successfully"}
 
+class SchemaMigrationCreate(BaseModel):
+    operations: List[dict]
+
+class SchemaMigrationResponse(BaseModel):
+    id: str
+    status: str
+    operations: List[dict]
+    processed: int = 0
+    rewritten: int = 0
+    total: Optional[int] = None
+    error: Optional[str] = None
+    started_at: str
+    updated_at: Optional[str] = None
+    finished_at: Optional[str] = None
+
+def _migration_response(migration: dict) -> SchemaMigrationResponse:
+    return SchemaMigrationResponse(**{
+        field: migration.get(field) for field in SchemaMigrationResponse.model_fields if field in migration
+    })
+
+def _migrating_database(storage: Storage, database_id: str, user_id: str) -> dict:
+    database = storage.get_database_by_id(database_id, ['name', 'workspace_id', 'properties', 'schema_migration'])
+    if not database:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Database not found"
+        )
+    
+    # Check if user has access to workspace
+    user_workspaces = storage.get_user_workspaces(user_id)
+    workspace_ids = [ws['id'] for ws in user_workspaces]
+    
+    if database['workspace_id'] not in workspace_ids:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied"
+        )
+    return database
+
+@router.post("/{database_id}/schema-migration", response_model=SchemaMigrationResponse,
+             status_code=status.HTTP_202_ACCEPTED)
+async def start_schema_migration(
+    database_id: str,
+    migration_data: SchemaMigrationCreate,
+    current_user: dict = Depends(get_current_active_user),
+    storage: Storage = Depends(get_storage)
+):
+    """Rename, delete or retype properties, rows included (see schema_migration).
+
+    The new schema applies at once and reads show rows converted to it; the
+    rows themselves are rewritten in the background. 409 while another
+    migration of the database is under way.
+    """
+    database = await run_in_threadpool(_migrating_database, storage, database_id, current_user['id'])
+    current = database.get('schema_migration') or {}
+    if schema_migration.active(database):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A schema migration is under way"
+        )
+    try:
+        properties, operations = schema_migration.plan(database.get('properties') or {}, migration_data.operations)
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+    _validate_formulas(properties)
+    properties, link_changes = await run_in_threadpool(
+        _plan_links, storage, database_id, database['name'], database['workspace_id'],
+        database.get('properties'), properties
+    )
+    
+    total = await run_in_threadpool(schema_migration.row_count, storage, database_id)
+    migration = schema_migration.new_record(operations, total)
+    if not await run_in_threadpool(
+            storage.set_database_schema_migration, database_id, migration, current.get('lease'), properties):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A schema migration is under way"
+        )
+    await run_in_threadpool(_apply_links, storage, database_id, link_changes)
+    schema_migration.start(storage, database_id)
+    _publish(database_id, {
+        'type': 'database', 'action': 'updated', 'fields': ['properties', 'schema_migration'], 'user_id': current_user['id']
+    })
+    return _migration_response(migration)
+
+@router.get("/{database_id}/schema-migration", response_model=SchemaMigrationResponse)
+async def get_schema_migration(
+    database_id: str,
+    current_user: dict = Depends(get_current_active_user),
+    storage: Storage = Depends(get_storage)
+):
+    """Progress of the database's latest schema migration"""
+    database = await run_in_threadpool(_migrating_database, storage, database_id, current_user['id'])
+    if not database.get('schema_migration'):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No schema migration"
+        )
+    return _migration_response(database['schema_migration'])
+
+@router.post("/{database_id}/schema-migration/resume", response_model=SchemaMigrationResponse)
+async def resume_schema_migration(
+    database_id: str,
+    current_user: dict = Depends(get_current_active_user),
+    storage: Storage = Depends(get_storage)
+):
+    """Carry on with a failed migration, or one whose worker stopped, from its cursor"""
+    database = await run_in_threadpool(_migrating_database, storage, database_id, current_user['id'])
+    migration = schema_migration.active(database)
+    if migration is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="No schema migration to resume"
+        )
+    if migration['status'] == 'failed':
+        resumed = {**migration, 'status': 'running', 'error': None, 'lease': None}
+        if not await run_in_threadpool(storage.set_database_schema_migration, database_id, resumed, migration.get('lease')):
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="The schema migration changed; reload it"
+            )
+        migration = resumed
+    schema_migration.start(storage, database_id)
+    return _migration_response(migration)
+
 # Database Row endpoints
 class DatabaseRowCreate(BaseModel):
     database_id: str
@@ -254,16 +576,26 @@ class DatabaseRowResponse(BaseModel):
     id: str
     database_id: str
     properties: dict = {}
+    order: Optional[str] = None
     created_at: str
     updated_at: Optional[str] = None
 
 @router.get("/{database_id}/rows", response_model=List[DatabaseRowResponse])
 async def get_database_rows(
     database_id: str,
-    current_user: dict = Depends(get_current_active_user)
+    filters: List[str] = Query([], alias="filter"),
+    sorts: List[str] = Query([], alias="sort"),
+    current_user: dict = Depends(get_current_active_user),
+    storage: Storage = Depends(get_storage)
 ):
-    """Get database rows"""
-    database = get_database_by_id(database_id)
+    """Get database rows, formula properties computed.
+
+    `?filter=property:op:value` (repeatable; ops eq, ne, gt, gte, lt, lte,
+    contains, not_contains, or `property:empty` / `property:not_empty`) and
+    `?sort=property` / `?sort=-property` (repeatable, most significant
+    first) work on any property, formulas included; property is a key or name.
+    """
+    database = await run_in_threadpool(storage.get_database_by_id, database_id)
     if not database:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -271,7 +603,7 @@ async def get_database_rows(
         )
     
     # Check if user has access to workspace
-    user_workspaces = get_user_workspaces(current_user['id'])
+    user_workspaces = await run_in_threadpool(storage.get_user_workspaces, current_user['id'])
     workspace_ids = [ws['id'] for ws in user_workspaces]
     
     if database['workspace_id'] not in workspace_ids:
@@ -280,26 +612,617 @@ async def get_database_rows(
             detail="Access denied"
         )
     
-    rows = database.get('rows', [])
+    rows = await run_in_threadpool(_computed_rows, database, filters, sorts)
     return [
         DatabaseRowResponse(
             id=row.get('id', str(uuid.uuid4())),
             database_id=database_id,
             properties=row.get('properties', {}),
+            order=row.get('order'),
+            created_at=row.get('created_at', ''),
+            updated_at=row.get('updated_at')
+        )
+        for row in rows
+    ]
+
+class AggregateGroup(BaseModel):
+    value: Any = None
+    # Option name of select and status groups
+    label: Optional[str] = None
+    count: int
+    aggregates: Dict[str, Any] = {}
+
+class AggregateTotal(BaseModel):
+    count: int
+    aggregates: Dict[str, Any] = {}
+
+class AggregateResponse(BaseModel):
+    group_by: Optional[str] = None
+    groups: List[AggregateGroup] = []
+    total: AggregateTotal
+
+# Property types the storage backends can read as text or as a number in the database
+PUSHDOWN_TEXT_TYPES = ('title', 'text', 'select', 'status', 'person', 'url', 'email', 'phone_number')
+PUSHDOWN_NUMBER_TYPES = ('number', 'rollup')
+PUSHDOWN_FILTER_OPERATORS = {
+    'number': ('eq', 'ne', 'gt', 'gte', 'lt', 'lte', 'empty', 'not_empty'),
+    'text': ('eq', 'ne', 'empty', 'not_empty'),
+}
+
+def _pushdown_kind(program, key: str) -> Optional[str]:
+    """How the database reads a plain property, None when it can't (formulas, dates, lists...)"""
+    prop_type = program.properties[key].type
+    if prop_type in PUSHDOWN_NUMBER_TYPES:
+        return 'number'
+    if prop_type in PUSHDOWN_TEXT_TYPES:
+        return 'text'
+    return None
+
+def _aggregation_plan(program, aggregation) -> Optional[RowAggregation]:
+    """`aggregation` as a RowAggregation for the storage backend, None when it needs the formula engine"""
+    group_kind = None
+    if aggregation.group_by is not None:
+        group_kind = _pushdown_kind(program, aggregation.group_by)
+        if group_kind is None:
+            return None
+    aggregates = []
+    for aggregate in aggregation.aggregates:
+        kind = _pushdown_kind(program, aggregate.key) if aggregate.key is not None else 'text'
+        if kind is None:
+            return None
+        aggregates.append(RowAggregate(aggregate.name, aggregate.op, aggregate.key, kind))
+    conditions = []
+    for row_filter in aggregation.filters:
+        kind = _pushdown_kind(program, row_filter.key)
+        if kind is None or row_filter.op not in PUSHDOWN_FILTER_OPERATORS[kind]:
+            return None
+        if kind == 'number' or row_filter.op in ('empty', 'not_empty'):
+            value = float(row_filter.value) if row_filter.value is not None else None
+            conditions.append(RowCondition(row_filter.key, kind, row_filter.op, value))
+            continue
+        # Rows hold option ids but filters name options; an id that isn't an option reads as itself
+        options = program.properties[row_filter.key].options
+        matches = {option_id for option_id, name in options if name == row_filter.value}
+        if row_filter.value not in dict(options):
+            matches.add(row_filter.value)
+        op = 'in' if row_filter.op == 'eq' else 'not_in'
+        conditions.append(RowCondition(row_filter.key, kind, op, tuple(sorted(matches))))
+    return RowAggregation(aggregation.group_by, group_kind, tuple(aggregates), tuple(conditions))
+
+def _json_number(value: Any) -> Any:
+    if value is None:
+        return None
+    value = float(value)
+    return int(value) if value.is_integer() and abs(value) < 2 ** 53 else value
+
+@router.get("/{database_id}/aggregate", response_model=AggregateResponse)
+async def aggregate_database(
+    database_id: str,
+    group_by: Optional[str] = None,
+    aggregates: List[str] = Query([], alias="aggregate"),
+    filters: List[str] = Query([], alias="filter"),
+    current_user: dict = Depends(get_current_active_user),
+    storage: Storage = Depends(get_storage)
+):
+    """Group rows and summarise each group, without returning the rows.
+
+    `?group_by=property` (optional), `?aggregate=count` (rows) and
+    `?aggregate=op:property` (repeatable; count of non-empty values,
+    distinct, sum, avg, min, max), and the `?filter=` syntax of the rows
+    endpoint. Plain properties are aggregated by the database; formulas and
+    filters it can't express are aggregated here, from the rows.
+    """
+    database = await run_in_threadpool(
+        storage.get_database_by_id, database_id, ['workspace_id', 'properties', 'schema_migration']
+    )
+    if not database:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Database not found"
+        )
+    
+    # Check if user has access to workspace
+    user_workspaces = await run_in_threadpool(storage.get_user_workspaces, current_user['id'])
+    workspace_ids = [ws['id'] for ws in user_workspaces]
+    
+    if database['workspace_id'] not in workspace_ids:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied"
+        )
+    
+    import formulas
+    program = formulas.program_for(database.get('properties') or {})
+    try:
+        aggregation = formulas.parse_aggregation(program, group_by, aggregates or ['count'], filters)
+    except formulas.FormulaError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+    
+    # Rows not yet migrated are converted here, so nothing is pushed down meanwhile
+    plan = _aggregation_plan(program, aggregation) if not schema_migration.active(database) else None
+    result = await run_in_threadpool(storage.aggregate_database_rows, database_id, plan) if plan is not None else None
+    if result is None:
+        rows = await run_in_threadpool(storage.get_database_rows, database_id)
+        rows = await run_in_threadpool(schema_migration.upgrade_rows, database, rows)
+        result = await run_in_threadpool(formulas.aggregate_rows, program, rows, aggregation)
+    
+    # Select and status groups follow the option order, then other values, then empty
+    options = program.properties[aggregation.group_by].options if aggregation.group_by else ()
+    labels = dict(options)
+    order = {option_id: index for index, (option_id, _) in enumerate(options)}
+    groups = sorted(result['groups'], key=lambda group: (
+        group['value'] is None, order.get(group['value'], len(order)), str(group['value'])
+    ))
+    return AggregateResponse(
+        group_by=aggregation.group_by,
+        groups=[
+            AggregateGroup(
+                value=_json_number(group['value']) if isinstance(group['value'], float) else group['value'],
+                label=labels.get(group['value']) if isinstance(group['value'], str) else None,
+                count=group['count'],
+                aggregates={name: _json_number(value) for name, value in group['aggregates'].items()}
+            )
+            for group in groups
+        ],
+        total=AggregateTotal(
+            count=result['total']['count'],
+            aggregates={name: _json_number(value) for name, value in result['total']['aggregates'].items()}
+        )
+    )
+
+class BoardGroup(BaseModel):
+    # Option id, None for the cards without one
+    value: Optional[str] = None
+    label: Optional[str] = None
+    count: int
+    cards: List[DatabaseRowResponse] = []
+    # ?cursor= for the group's next cards, None after the last
+    cursor: Optional[str] = None
+
+class BoardResponse(BaseModel):
+    group_by: str
+    groups: List[BoardGroup] = []
+
+class BoardMove(BaseModel):
+    # The board's group property (key or name) and the option id to move to, None for no value;
+    # without group_by the row only moves in the table's order
+    group_by: Optional[str] = None
+    group: Optional[str] = None
+    # The cards it was dropped between: no after_id at the top of the group,
+    # and without before_id it goes right after after_id
+    after_id: Optional[str] = None
+    before_id: Optional[str] = None
+
+BOARD_GROUP_TYPES = ('select', 'status')
+BOARD_PAGE_LIMIT = 200
+
+def _board_property(program, name: str) -> str:
+    import formulas
+    try:
+        key = formulas.property_key(program, name)
+    except formulas.FormulaError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+    if program.properties[key].type not in BOARD_GROUP_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Boards group by a select or status property"
+        )
+    return key
+
+def _group_value(row: dict, key: str) -> Optional[str]:
+    """A row's group, read like the storage backends read text properties"""
+    value = (row.get('properties') or {}).get(key)
+    if isinstance(value, str):
+        return value or None
+    if isinstance(value, (bool, int, float)):
+        return json.dumps(value)
+    return None
+
+def _group_condition(key: str, value: Optional[str]) -> RowCondition:
+    if value is None:
+        return RowCondition(key, 'text', 'empty')
+    return RowCondition(key, 'text', 'in', (value,))
+
+def _card_key(row: dict) -> Tuple[str, str]:
+    return (row.get('order') or '', row['id'])
+
+def _board_cursor(value: Optional[str], row: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps([value, *_card_key(row)]).encode()).decode()
+
+def _parse_board_cursor(cursor: str) -> Tuple[Optional[str], Tuple[str, str]]:
+    """(group value, (order, id) of the last card sent)"""
+    try:
+        value, order, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if not (value is None or isinstance(value, str)) or not isinstance(order, str) or not isinstance(row_id, str):
+            raise ValueError(cursor)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    return value, (order, row_id)
+
+def _board_values(options, counts: Dict[Optional[str], int]) -> List[Optional[str]]:
+    """Group values in board order: every option, then other values, then no value"""
+    option_ids = [option_id for option_id, _ in options]
+    others = sorted(value for value in counts if value is not None and value not in option_ids)
+    return option_ids + others + ([None] if counts.get(None) else [])
+
+def _column(rows: List[dict], key: str, value: Optional[str], after: Optional[Tuple[str, str]],
+            limit: int) -> List[dict]:
+    """A group's cards after `after` from a list of rows, for backends that can't page them"""
+    cards = sorted((row for row in rows if _group_value(row, key) == value), key=_card_key)
+    if after is not None:
+        cards = [row for row in cards if _card_key(row) > after]
+    return cards[:limit]
+
+def _scan_calendar(database: Dict[str, Any], rows: List[dict], key: str, window: date_index.Interval) -> List[dict]:
+    """The rows whose `key` value overlaps `window`, by (start of that value, order, id), for backends without a date index"""
+    found = []
+    for row in schema_migration.upgrade_rows(database, rows):
+        entry = date_index.interval((row.get('properties') or {}).get(key))
+        if date_index.overlaps(entry, window):
+            found.append(((entry[0], *_card_key(row)), row))
+    return [row for _, row in sorted(found, key=lambda item: item[0])]
+
+def _stored_board(storage: Storage, database_id: str, program, plan: RowAggregation,
+                  page: Optional[tuple], limit: int) -> Optional[List[tuple]]:
+    """(value, count, cards) of each group, counted and paged in the database; None when it can't"""
+    result = storage.aggregate_database_rows(database_id, plan)
+    if result is None:
+        return None
+    counts = {group['value']: group['count'] for group in result['groups']}
+    values = [page[0]] if page else _board_values(program.properties[plan.group_by].options, counts)
+    groups = []
+    for value in values:
+        cards = storage.get_database_rows_page(
+            database_id, (*plan.conditions, _group_condition(plan.group_by, value)), page[1] if page else None, limit
+        )
+        if cards is None:
+            return None
+        groups.append((value, counts.get(value, 0), cards))
+    return groups
+
+def _next_card(storage: Storage, database_id: str, key: Optional[str], value: Optional[str],
+               after: Optional[dict], row_id: str) -> Optional[dict]:
+    """The card after `after` (the first card when None) in a group, or in the
+    whole table when `key` is None, other than `row_id`"""
+    after_key = _card_key(after) if after is not None else None
+    conditions = (_group_condition(key, value),) if key is not None else ()
+    cards = storage.get_database_rows_page(database_id, conditions, after_key, 2)
+    if cards is None:
+        rows = storage.get_database_rows(database_id)
+        if key is not None:
+            cards = _column(rows, key, value, after_key, 2)
+        else:
+            cards = [row for row in rows if after_key is None or _card_key(row) > after_key][:2]
+    return next((card for card in cards if card['id'] != row_id), None)
+
+def _table_neighbours(storage: Storage, database_id: str, after: Optional[dict], before: Optional[dict],
+                      row_id: str) -> Tuple[Optional[dict], Optional[dict]]:
+    """The two rows, next to each other in the whole table, that a row placed
+    right after `after` (right before `before` when `after` is None) gets a
+    key between, other than `row_id`.
+
+    A group's cards are spread through the table, so a key between two cards
+    can equal that of a row from another group in between them.
+    """
+    if after is None and before is not None:
+        # The key right before `before` is free unless the first row at or after it has it
+        probe = {'order': order_keys.key_between(None, before.get('order')), 'id': ''}
+        after = _next_card(storage, database_id, None, None, probe, row_id)
+        if after is None or after.get('order') != probe['order']:
+            return None, before
+    if after is None:
+        return None, _next_card(storage, database_id, None, None, None, row_id)
+    return after, _next_card(storage, database_id, None, None, after, row_id)
+
+def _rebalance_rows(storage: Storage, database_id: str):
+    """Respace the database's order keys once moves into one spot have made them long"""
+    rows = storage.get_database_rows(database_id)
+    storage.set_database_rows_order(database_id, order_keys.rebalanced(rows))
+
+@router.get("/{database_id}/board", response_model=BoardResponse)
+async def get_database_board(
+    database_id: str,
+    group_by: str,
+    limit: int = Query(50, ge=1, le=BOARD_PAGE_LIMIT),
+    cursor: Optional[str] = None,
+    filters: List[str] = Query([], alias="filter"),
+    current_user: dict = Depends(get_current_active_user),
+    storage: Storage = Depends(get_storage)
+):
+    """Rows grouped into the columns of a board by a select or status property.
+
+    Each group (every option in order, then other values, then no value)
+    has its count and first `limit` cards in order-key order; its `cursor`,
+    passed back as `?cursor=`, returns that group alone with its next cards.
+    `?filter=` as for the rows endpoint. The database counts and pages the
+    groups when it can read the filters; otherwise the rows are grouped here.
+    """
+    database = await run_in_threadpool(
+        storage.get_database_by_id, database_id, ['workspace_id', 'properties', 'schema_migration']
+    )
+    if not database:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Database not found"
+        )
+    
+    # Check if user has access to workspace
+    user_workspaces = await run_in_threadpool(storage.get_user_workspaces, current_user['id'])
+    workspace_ids = [ws['id'] for ws in user_workspaces]
+    
+    if database['workspace_id'] not in workspace_ids:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied"
+        )
+    
+    import formulas
+    program = formulas.program_for(database.get('properties') or {})
+    key = _board_property(program, group_by)
+    page = _parse_board_cursor(cursor) if cursor else None
+    try:
+        aggregation = formulas.parse_aggregation(program, key, ['count'], filters)
+    except formulas.FormulaError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+    
+    # One more card than asked for tells whether a group has more
+    plan = _aggregation_plan(program, aggregation) if not schema_migration.active(database) else None
+    groups = None
+    if plan is not None:
+        groups = await run_in_threadpool(_stored_board, storage, database_id, program, plan, page, limit + 1)
+    if groups is None:
+        rows = await run_in_threadpool(storage.get_database_rows, database_id)
+        rows = await run_in_threadpool(_computed_rows, {**database, 'rows': rows}, filters)
+        counts: Dict[Optional[str], int] = {}
+        for row in rows:
+            value = _group_value(row, key)
+            counts[value] = counts.get(value, 0) + 1
+        values = [page[0]] if page else _board_values(program.properties[key].options, counts)
+        groups = [
+            (value, counts.get(value, 0), _column(rows, key, value, page[1] if page else None, limit + 1))
+            for value in values
+        ]
+    else:
+        # Formula values of the cards sent, from their caches
+        cards = await run_in_threadpool(
+            _computed_rows, {**database, 'rows': [card for _, _, cards in groups for card in cards]}
+        )
+        by_id = {card['id']: card for card in cards}
+        groups = [(value, count, [by_id[card['id']] for card in cards]) for value, count, cards in groups]
+    
+    labels = dict(program.properties[key].options)
+    return BoardResponse(
+        group_by=key,
+        groups=[
+            BoardGroup(
+                value=value,
+                label=labels.get(value),
+                count=count,
+                cards=[
+                    DatabaseRowResponse(
+                        id=card['id'],
+                        database_id=database_id,
+                        properties=card.get('properties', {}),
+                        order=card.get('order'),
+                        created_at=card.get('created_at', ''),
+                        updated_at=card.get('updated_at')
+                    )
+                    for card in cards[:limit]
+                ],
+                cursor=_board_cursor(value, cards[limit - 1]) if len(cards) > limit else None
+            )
+            for value, count, cards in groups
+        ]
+    )
+
+CALENDAR_TYPES = ('date',)
+
+@router.get("/{database_id}/calendar", response_model=List[DatabaseRowResponse])
+async def get_database_calendar(
+    database_id: str,
+    date_by: str,
+    start: str,
+    end: str,
+    filters: List[str] = Query([], alias="filter"),
+    current_user: dict = Depends(get_current_active_user),
+    storage: Storage = Depends(get_storage)
+):
+    """Rows whose date property `date_by` overlaps the window from `start` to
+    `end`, both included, earliest first.
+
+    `start` and `end` are ISO dates or datetimes; a date covers its whole
+    day, as do date values without a time, and a date range overlaps when any
+    part of it does. The rows are found through the backend's date index
+    (see date_index) when it has one; `?filter=` as for the rows endpoint
+    then applies to them.
+    """
+    database = await run_in_threadpool(
+        storage.get_database_by_id, database_id, ['workspace_id', 'properties', 'schema_migration']
+    )
+    if not database:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Database not found"
+        )
+    
+    # Check if user has access to workspace
+    user_workspaces = await run_in_threadpool(storage.get_user_workspaces, current_user['id'])
+    workspace_ids = [ws['id'] for ws in user_workspaces]
+    
+    if database['workspace_id'] not in workspace_ids:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied"
+        )
+    
+    import formulas
+    program = formulas.program_for(database.get('properties') or {})
+    try:
+        key = formulas.property_key(program, date_by)
+        window = date_index.window(start, end)
+    except (formulas.FormulaError, ValueError) as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+    if program.properties[key].type not in CALENDAR_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Calendars show a date property"
+        )
+    
+    # The date index lags behind a schema migration, so rows are scanned meanwhile
+    migrating = schema_migration.active(database)
+    rows = await run_in_threadpool(storage.get_database_rows_in_range, database_id, key, *window) if not migrating else None
+    if rows is None:
+        # No date index: scan the rows
+        rows = await run_in_threadpool(storage.get_database_rows, database_id)
+        rows = await run_in_threadpool(_scan_calendar, database, rows, key, window)
+    rows = await run_in_threadpool(_computed_rows, {**database, 'rows': rows}, filters)
+    return [
+        DatabaseRowResponse(
+            id=row['id'],
+            database_id=database_id,
+            properties=row.get('properties', {}),
+            order=row.get('order'),
             created_at=row.get('created_at', ''),
             updated_at=row.get('updated_at')
         )
         for row in rows
     ]
 
+@router.post("/{database_id}/rows/{row_id}/move", response_model=DatabaseRowResponse)
+async def move_database_row(
+    database_id: str,
+    row_id: str,
+    move: BoardMove,
+    background_tasks: BackgroundTasks,
+    current_user: dict = Depends(get_current_active_user),
+    storage: Storage = Depends(get_storage)
+):
+    """Move a board card to a group and a position in it, or, without
+    group_by, a row to a position in the table.
+
+    The group property and the row's order key change in one write, and
+    only the moved row is written. The key falls between the row's
+    neighbours in the whole table, so no other row has it. 409 when the cards it was dropped
+    between are no longer next to each other in that group. Once repeated
+    moves into one spot make keys long, they are respaced after the response.
+    """
+    database = await run_in_threadpool(
+        storage.get_database_by_id, database_id, ['workspace_id', 'properties', 'schema_migration']
+    )
+    if not database:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Database not found"
+        )
+    
+    # Check if user has access to workspace
+    user_workspaces = await run_in_threadpool(storage.get_user_workspaces, current_user['id'])
+    workspace_ids = [ws['id'] for ws in user_workspaces]
+    
+    if database['workspace_id'] not in workspace_ids:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied"
+        )
+    
+    import formulas
+    program = formulas.program_for(database.get('properties') or {})
+    key = _board_property(program, move.group_by) if move.group_by is not None else None
+    if key is None and move.group is not None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="group needs group_by"
+        )
+    if key is not None and move.group is not None and move.group not in dict(program.properties[key].options):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown option {move.group!r}"
+        )
+    if row_id in (move.after_id, move.before_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="A card can't be placed next to itself"
+        )
+    
+    card_ids = [card_id for card_id in (move.after_id, move.before_id) if card_id]
+    rows = await run_in_threadpool(storage.get_database_rows_by_id, database_id, [row_id, *card_ids])
+    rows = {row['id']: row for row in schema_migration.upgrade_rows(database, rows)}
+    if row_id not in rows:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Row not found"
+        )
+    for card_id in card_ids:
+        if card_id not in rows:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Card {card_id} not found"
+            )
+        if key is not None and _group_value(rows[card_id], key) != move.group:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Card {card_id} is no longer in that group"
+            )
+    row = rows[row_id]
+    after = rows.get(move.after_id)
+    before = rows.get(move.before_id)
+    if after is not None and before is not None and _card_key(after) >= _card_key(before):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="The cards around the drop position have moved; reload the board"
+        )
+    if after is None and before is None:
+        before = await run_in_threadpool(_next_card, storage, database_id, key, move.group, None, row_id)
+    low = high = None
+    try:
+        low, high = await run_in_threadpool(_table_neighbours, storage, database_id, after, before, row_id)
+        order = order_keys.key_between(low.get('order') if low else None, high.get('order') if high else None)
+    except ValueError:
+        if low is not None and high is not None and low.get('order') == high.get('order'):
+            # Rows that earlier moves left sharing a key: respace them so a retry fits
+            await run_in_threadpool(_rebalance_rows, storage, database_id)
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="The cards around the drop position have moved; reload the board"
+        )
+    
+    new_properties = {name: value for name, value in row.get('properties', {}).items() if name != key}
+    if move.group is not None:
+        new_properties[key] = move.group
+    properties, computed, values = await run_in_threadpool(_row_to_store, database, new_properties, row)
+    updated_row = await run_in_threadpool(storage.update_database_row, database_id, row_id, properties, computed, order)
+    if not updated_row:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Row not found"
+        )
+    await run_in_threadpool(
+        relations.sync_row, storage, {**database, 'id': database_id}, row_id, row['properties'], updated_row['properties']
+    )
+    if order_keys.needs_rebalance(order):
+        background_tasks.add_task(_rebalance_rows, storage, database_id)
+    _publish(database_id, {'type': 'row', 'action': 'moved', 'row_id': row_id, 'user_id': current_user['id']})
+    
+    return DatabaseRowResponse(
+        id=updated_row['id'],
+        database_id=database_id,
+        properties={**updated_row['properties'], **values},
+        order=updated_row.get('order'),
+        created_at=updated_row['created_at'],
+        updated_at=updated_row['updated_at']
+    )
+
 @router.post("/{database_id}/rows", response_model=DatabaseRowResponse)
 async def create_database_row(
     database_id: str,
     row_data: DatabaseRowCreate,
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(get_current_active_user),
+    storage: Storage = Depends(get_storage)
 ):
     """Create a new database row"""
-    database = get_database_by_id(database_id)
+    database = await run_in_threadpool(
+        storage.get_database_by_id, database_id, ['workspace_id', 'properties', 'schema_migration']
+    )
     if not database:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -307,7 +1230,7 @@ async def create_database_row(
         )
     
     # Check if user has access to workspace
-    user_workspaces = get_user_workspaces(current_user['id'])
+    user_workspaces = await run_in_threadpool(storage.get_user_workspaces, current_user['id'])
     workspace_ids = [ws['id'] for ws in user_workspaces]
     
     if database['workspace_id'] not in workspace_ids:
@@ -316,30 +1239,26 @@ async def create_database_row(
             detail="Access denied"
         )
     
-    # Create new row
-    new_row = {
-        'id': str(uuid.uuid4()),
-        'properties': row_data.properties,
-        'created_at': datetime.utcnow().isoformat(),
-        'updated_at': None
-    }
-    
-    # Add row to database
-    current_rows = database.get('rows', [])
-    current_rows.append(new_row)
-    
-    # Update database with new row
-    success = update_database(database_id, {'rows': current_rows})
-    if not success:
+    # Append new row, then link it from the rows it relates to
+    properties = schema_migration.upgrade(database, row_data.properties)
+    properties = await run_in_threadpool(_linked_row, storage, database, properties)
+    properties, computed, values = await run_in_threadpool(_row_to_store, database, properties)
+    new_row = await run_in_threadpool(
+        storage.create_database_row, database_id, {'properties': properties, 'computed': computed}
+    )
+    if not new_row:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Failed to create row"
         )
+    await run_in_threadpool(relations.sync_row, storage, database, new_row['id'], None, new_row['properties'])
+    _publish(database_id, {'type': 'row', 'action': 'created', 'row_id': new_row['id'], 'user_id': current_user['id']})
     
     return DatabaseRowResponse(
         id=new_row['id'],
         database_id=database_id,
-        properties=new_row['properties'],
+        properties={**new_row['properties'], **values},
+        order=new_row.get('order'),
         created_at=new_row['created_at'],
         updated_at=new_row['updated_at']
     )
@@ -349,10 +1268,13 @@ async def update_database_row(
     database_id: str,
     row_id: str,
     row_data: DatabaseRowUpdate,
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(get_current_active_user),
+    storage: Storage = Depends(get_storage)
 ):
     """Update database row"""
-    database = get_database_by_id(database_id)
+    database = await run_in_threadpool(
+        storage.get_database_by_id, database_id, ['workspace_id', 'properties', 'schema_migration']
+    )
     if not database:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -360,7 +1282,7 @@ async def update_database_row(
         )
     
     # Check if user has access to workspace
-    user_workspaces = get_user_workspaces(current_user['id'])
+    user_workspaces = await run_in_threadpool(storage.get_user_workspaces, current_user['id'])
     workspace_ids = [ws['id'] for ws in user_workspaces]
     
     if database['workspace_id'] not in workspace_ids:
@@ -369,37 +1291,33 @@ async def update_database_row(
             detail="Access denied"
         )
     
-    # Find and update row
-    current_rows = database.get('rows', [])
-    row_found = False
-    
-    for i, row in enumerate(current_rows):
-        if row.get('id') == row_id:
-            current_rows[i]['properties'] = row_data.properties
-            current_rows[i]['updated_at'] = datetime.utcnow().isoformat()
-            row_found = True
-            break
-    
-    if not row_found:
+    rows = await run_in_threadpool(storage.get_database_rows_by_id, database_id, [row_id])
+    if not rows:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Row not found"
         )
     
-    # Update database with modified rows
-    success = update_database(database_id, {'rows': current_rows})
-    if not success:
+    # Update row in place, recomputing only the formulas that read changed
+    # properties, then the related rows' links and rollups
+    row = schema_migration.upgrade_rows(database, rows)[0]
+    properties = schema_migration.upgrade(database, row_data.properties)
+    properties = await run_in_threadpool(_linked_row, storage, database, properties, row)
+    properties, computed, values = await run_in_threadpool(_row_to_store, database, properties, row)
+    updated_row = await run_in_threadpool(storage.update_database_row, database_id, row_id, properties, computed)
+    if not updated_row:
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Failed to update row"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Row not found"
         )
+    await run_in_threadpool(relations.sync_row, storage, database, row_id, row['properties'], updated_row['properties'])
+    _publish(database_id, {'type': 'row', 'action': 'updated', 'row_id': row_id, 'user_id': current_user['id']})
     
-    # Return updated row
-    updated_row = next(row for row in current_rows if row.get('id') == row_id)
     return DatabaseRowResponse(
         id=updated_row['id'],
         database_id=database_id,
-        properties=updated_row['properties'],
+        properties={**updated_row['properties'], **values},
+        order=updated_row.get('order'),
         created_at=updated_row['created_at'],
         updated_at=updated_row['updated_at']
     )
@@ -408,10 +1326,13 @@ async def update_database_row(
 async def delete_database_row(
     database_id: str,
     row_id: str,
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(get_current_active_user),
+    storage: Storage = Depends(get_storage)
 ):
     """Delete database row"""
-    database = get_database_by_id(database_id)
+    database = await run_in_threadpool(
+        storage.get_database_by_id, database_id, ['workspace_id', 'properties', 'schema_migration']
+    )
     if not database:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -419,7 +1340,7 @@ async def delete_database_row(
         )
     
     # Check if user has access to workspace
-    user_workspaces = get_user_workspaces(current_user['id'])
+    user_workspaces = await run_in_threadpool(storage.get_user_workspaces, current_user['id'])
     workspace_ids = [ws['id'] for ws in user_workspaces]
     
     if database['workspace_id'] not in workspace_ids:
@@ -428,22 +1349,44 @@ async def delete_database_row(
             detail="Access denied"
         )
     
-    # Remove row from database
-    current_rows = database.get('rows', [])
-    updated_rows = [row for row in current_rows if row.get('id') != row_id]
-    
-    if len(updated_rows) == len(current_rows):
+    # Remove row from database, and from the rows it relates to
+    linked = relations.relations(database.get('properties'))
+    rows = await run_in_threadpool(storage.get_database_rows_by_id, database_id, [row_id]) if linked else []
+    success = await run_in_threadpool(storage.delete_database_row, database_id, row_id)
+    if not success:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Row not found"
         )
+    if rows:
+        await run_in_threadpool(relations.sync_row, storage, database, row_id, rows[0]['properties'], None)
+    _publish(database_id, {'type': 'row', 'action': 'deleted', 'row_id': row_id, 'user_id': current_user['id']})
     
-    # Update database with remaining rows
-    success = update_database(database_id, {'rows': updated_rows})
-    if not success:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Failed to delete row"
-        )
+    return {"message": "Row deleted successfully"}
+
+@router.websocket("/{database_id}/live")
+async def database_live(
+    websocket: WebSocket,
+    database_id: str,
+    storage: Storage = Depends(get_storage)
+):
+    """Rows and schema of the database changing (see collaboration); ends when
+    it is deleted, and is closed once the user loses access to its workspace"""
+    user = await run_in_threadpool(get_websocket_user, websocket, storage)
+    database = await run_in_threadpool(storage.get_database_by_id, database_id, ['workspace_id']) if user else None
+    workspace_ids = [ws['id'] for ws in await run_in_threadpool(storage.get_user_workspaces, user['id'])] if database else []
+    if not database or database['workspace_id'] not in workspace_ids:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
     
-    return {"message": "Row deleted successfully"}
\ No newline at end of file
+    await websocket.accept(subprotocol=WEBSOCKET_PROTOCOL)
+    connection = collaboration.Connection(websocket, user)
+    unsubscribe = await collaboration.close_when(
+        workspace_channel(database['workspace_id']), connection, collaboration.loses_access(user['id'])
+    )
+    try:
+        await collaboration.follow(database_channel(database_id), connection, ends=lambda message: (
+            message['type'] == 'database' and message['action'] == 'deleted'
+        ))
+    finally:
+        unsubscribe()
\ No newline at end of file
@@ -1,13 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, WebSocket, status
+from starlette.concurrency import run_in_threadpool
 from typing import List, Optional
 from pydantic import BaseModel
 import uuid
 
-from database import (
-    get_user_workspaces, get_workspace_pages, get_page_by_id,
-    create_page, update_page, delete_page
-)
-from auth import get_current_active_user, UserResponse
+import collaboration
+import order_keys
+from pubsub import get_broker, workspace_channel
+from storage import Storage, get_storage
+from auth import WEBSOCKET_PROTOCOL, get_current_active_user, get_websocket_user, UserResponse
+from routes.projection import parse_fields
 
 router = APIRouter(prefix="/pages", tags=["pages"])
 
@@ -34,16 +36,45 @@ class PageResponse(BaseModel):
     created_at: str
     updated_at: Optional[str] = None
 
-@router.get("/", response_model=List[PageResponse])
+class PageListItem(BaseModel):
+    """A PageResponse reduced to the fields asked for with ?fields="""
+    id: str
+    title: Optional[str] = None
+    icon: Optional[str] = None
+    workspace_id: Optional[str] = None
+    parent_id: Optional[str] = None
+    created_by: Optional[str] = None
+    content: Optional[List[dict]] = None
+    is_deleted: Optional[bool] = None
+    created_at: Optional[str] = None
+    updated_at: Optional[str] = None
+
+class BlockMove(BaseModel):
+    # The blocks it was dropped between: no after_id at the top of the page,
+    # and without before_id it goes right after after_id
+    after_id: Optional[str] = None
+    before_id: Optional[str] = None
+
+class BlockOrder(BaseModel):
+    id: str
+    order: str
+
+PAGE_DEFAULTS = {'parent_id': None, 'content': [], 'is_deleted': False, 'updated_at': None}
+
+@router.get("/", response_model=List[PageListItem], response_model_exclude_unset=True)
 async def get_pages(
     workspace_id: Optional[str] = None,
     parent_id: Optional[str] = None,
-    current_user: dict = Depends(get_current_active_user)
+    fields: Optional[str] = None,
+    current_user: dict = Depends(get_current_active_user),
+    storage: Storage = Depends(get_storage)
 ):
-    """Get pages"""
+    """Get pages; `fields=id,title,icon,parent_id` returns only those fields
+    (the sidebar needs no content)"""
+    field_list = parse_fields(fields, PageListItem.model_fields)
     if workspace_id:
         # Check if user has access to workspace
-        user_workspaces = get_user_workspaces(current_user['id'])
+        user_workspaces = await run_in_threadpool(storage.get_user_workspaces, current_user['id'])
         workspace_ids = [ws['id'] for ws in user_workspaces]
         
         if workspace_id not in workspace_ids:
@@ -52,10 +83,16 @@ async def get_pages(
                 detail="Access denied to workspace"
             )
         
-        pages = get_workspace_pages(workspace_id, parent_id)
+        pages = await run_in_threadpool(storage.get_workspace_pages, workspace_id, parent_id, field_list)
     else:
         pages = []
     
+    if field_list is not None:
+        return [
+            PageListItem(id=page['id'], **{field: page.get(field, PAGE_DEFAULTS.get(field)) for field in field_list})
+            for page in pages
+        ]
+    
     return [
         PageResponse(
             id=page['id'],
@@ -75,10 +112,11 @@ async def get_pages(
 @router.get("/{page_id}", response_model=PageResponse)
 async def get_page(
     page_id: str,
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(get_current_active_user),
+    storage: Storage = Depends(get_storage)
 ):
     """Get page by ID"""
-    page = get_page_by_id(page_id)
+    page = await run_in_threadpool(storage.get_page_by_id, page_id)
     if not page:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -86,7 +124,7 @@ async def get_page(
         )
     
     # Check if user has access to workspace
-    user_workspaces = get_user_workspaces(current_user['id'])
+    user_workspaces = await run_in_threadpool(storage.get_user_workspaces, current_user['id'])
     workspace_ids = [ws['id'] for ws in user_workspaces]
     
     if page['workspace_id'] not in workspace_ids:
@@ -111,11 +149,12 @@ async def get_page(
 @router.post("/", response_model=PageResponse)
 async def create_page_endpoint(
     page_data: PageCreate,
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(get_current_active_user),
+    storage: Storage = Depends(get_storage)
 ):
     """Create a new page"""
     # Check if user has access to workspace
-    user_workspaces = get_user_workspaces(current_user['id'])
+    user_workspaces = await run_in_threadpool(storage.get_user_workspaces, current_user['id'])
     workspace_ids = [ws['id'] for ws in user_workspaces]
     
     if page_data.workspace_id not in workspace_ids:
@@ -135,7 +174,10 @@ async def create_page_endpoint(
         'is_deleted': False
     }
     
-    page = create_page(page_doc)
+    page = await run_in_threadpool(storage.create_page, page_doc)
+    get_broker().publish(workspace_channel(page['workspace_id']), {
+        'type': 'page', 'action': 'created', 'page_id': page['id'], 'user_id': current_user['id']
+    })
     
     return PageResponse(
         id=page['id'],
@@ -154,10 +196,11 @@ async def create_page_endpoint(
 async def update_page_endpoint(
     page_id: str,
     page_data: PageUpdate,
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(get_current_active_user),
+    storage: Storage = Depends(get_storage)
 ):
     """Update page"""
-    page = get_page_by_id(page_id)
+    page = await run_in_threadpool(storage.get_page_by_id, page_id)
     if not page:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -165,7 +208,7 @@ async def update_page_endpoint(
         )
     
     # Check if user has access to workspace
-    user_workspaces = get_user_workspaces(current_user['id'])
+    user_workspaces = await run_in_threadpool(storage.get_user_workspaces, current_user['id'])
     workspace_ids = [ws['id'] for ws in user_workspaces]
     
     if page['workspace_id'] not in workspace_ids:
@@ -184,7 +227,8 @@ async def update_page_endpoint(
         update_data['content'] = page_data.content
     
     # Update page
-    success = update_page(page_id, update_data)
+    fields = sorted(update_data)
+    success = await run_in_threadpool(storage.update_page, page_id, update_data)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -192,7 +236,15 @@ async def update_page_endpoint(
         )
     
     # Return updated page
-    updated_page = get_page_by_id(page_id)
+    updated_page = await run_in_threadpool(storage.get_page_by_id, page_id)
+    collaboration.hub.publish(page_id, {
+        'type': 'saved', 'user_id': current_user['id'], 'fields': fields,
+        'updated_at': updated_page.get('updated_at')
+    })
+    if 'title' in fields or 'icon' in fields:
+        get_broker().publish(workspace_channel(page['workspace_id']), {
+            'type': 'page', 'action': 'updated', 'page_id': page_id, 'user_id': current_user['id']
+        })
     
     return PageResponse(
         id=updated_page['id'],
@@ -207,13 +259,132 @@ async def update_page_endpoint(
         updated_at=updated_page.get('updated_at')
     )
 
+def _keyed(content: List[dict]) -> bool:
+    """Whether every block has a valid key, in content order"""
+    keys = [block.get('order') for block in content]
+    return all(order_keys.is_valid(key) for key in keys) and all(a < b for a, b in zip(keys, keys[1:]))
+
+def _rebalance_blocks(storage: Storage, page_id: str):
+    """Respace a page's block keys once moves into one spot have made them long"""
+    page = storage.get_page_by_id(page_id)
+    if page:
+        storage.set_page_block_orders(page_id, order_keys.rebalanced(page.get('content', [])))
+
+@router.post("/{page_id}/blocks/{block_id}/move", response_model=BlockOrder)
+async def move_block(
+    page_id: str,
+    block_id: str,
+    move: BlockMove,
+    background_tasks: BackgroundTasks,
+    current_user: dict = Depends(get_current_active_user),
+    storage: Storage = Depends(get_storage)
+):
+    """Move a block between two others by giving it an order key between theirs.
+
+    Only the block's key is written, so moves by different people don't
+    overwrite each other's content. 409 when the block or the blocks it was
+    dropped between have moved since the page was read. Pages saved before
+    blocks had keys get them on their first move.
+    """
+    page = await run_in_threadpool(storage.get_page_by_id, page_id)
+    if not page:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Page not found"
+        )
+    
+    # Check if user has access to workspace
+    user_workspaces = await run_in_threadpool(storage.get_user_workspaces, current_user['id'])
+    workspace_ids = [ws['id'] for ws in user_workspaces]
+    
+    if page['workspace_id'] not in workspace_ids:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied"
+        )
+    
+    if block_id in (move.after_id, move.before_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="A block can't be placed next to itself"
+        )
+    content = page.get('content', [])
+    if not _keyed(content):
+        await run_in_threadpool(storage.update_page, page_id, {'content': content})
+        content = (await run_in_threadpool(storage.get_page_by_id, page_id)).get('content', [])
+    blocks = {block.get('id'): block for block in content if block.get('id') is not None}
+    for moved_id in (block_id, move.after_id, move.before_id):
+        if moved_id is not None and moved_id not in blocks:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Block {moved_id} not found"
+            )
+    block = blocks[block_id]
+    after = blocks.get(move.after_id)
+    before = blocks.get(move.before_id)
+    if move.before_id is None:
+        # The block after `after`, or the first one, other than the one moving
+        following = [b for b in content if b.get('id') != block_id and (after is None or b['order'] > after['order'])]
+        before = following[0] if following else None
+    try:
+        order = order_keys.key_between(
+            after['order'] if after else None, before['order'] if before else None
+        )
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="The blocks around the drop position have moved; reload the page"
+        )
+    
+    if not await run_in_threadpool(storage.set_page_block_orders, page_id, {block_id: (block['order'], order)}):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="The block has moved since the page was read; reload the page"
+        )
+    if order_keys.needs_rebalance(order):
+        background_tasks.add_task(_rebalance_blocks, storage, page_id)
+    collaboration.hub.publish(page_id, {
+        'type': 'op', 'user_id': current_user['id'], 'op': {'type': 'move', 'block_id': block_id, 'order': order}
+    })
+    
+    return BlockOrder(id=block_id, order=order)
+
+@router.websocket("/{page_id}/live")
+async def page_live(
+    websocket: WebSocket,
+    page_id: str,
+    storage: Storage = Depends(get_storage)
+):
+    """Block operations, cursors and presence of the page's editors (see collaboration).
+
+    Connections without access to the page are refused, and closed once
+    the user loses access to its workspace. They end when the page is deleted.
+    """
+    user = await run_in_threadpool(get_websocket_user, websocket, storage)
+    page = await run_in_threadpool(storage.get_page_by_id, page_id) if user else None
+    workspace_ids = [ws['id'] for ws in await run_in_threadpool(storage.get_user_workspaces, user['id'])] if page else []
+    if not page or page['workspace_id'] not in workspace_ids:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    await websocket.accept(subprotocol=WEBSOCKET_PROTOCOL)
+    connection = collaboration.Connection(websocket, user)
+    unsubscribe = await collaboration.close_when(
+        workspace_channel(page['workspace_id']), connection, collaboration.loses_access(user['id'])
+    )
+    try:
+        await collaboration.hub.serve(page_id, connection)
+    finally:
+        unsubscribe()
+
 @router.delete("/{page_id}")
 async def delete_page_endpoint(
     page_id: str,
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(get_current_active_user),
+    storage: Storage = Depends(get_storage)
 ):
     """Delete page (soft delete)"""
-    page = get_page_by_id(page_id)
+    page = await run_in_threadpool(storage.get_page_by_id, page_id)
     if not page:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -221,7 +392,7 @@ async def delete_page_endpoint(
         )
     
     # Check if user has access to workspace
-    user_workspaces = get_user_workspaces(current_user['id'])
+    user_workspaces = await run_in_threadpool(storage.get_user_workspaces, current_user['id'])
     workspace_ids = [ws['id'] for ws in user_workspaces]
     
     if page['workspace_id'] not in workspace_ids:
@@ -231,11 +402,91 @@ async def delete_page_endpoint(
         )
     
     # Delete page
-    success = delete_page(page_id, current_user['id'])
+    success = await run_in_threadpool(storage.delete_page, page_id, current_user['id'])
     if not success:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Failed to delete page"
         )
+    collaboration.hub.publish(page_id, {'type': 'deleted', 'user_id': current_user['id']})
+    get_broker().publish(workspace_channel(page['workspace_id']), {
+        'type': 'page', 'action': 'deleted', 'page_id': page_id, 'user_id': current_user['id']
+    })
+    
+    return {"message": "Page deleted successfully"}
+@router.post("/{page_id}/permissions/{user_id}")
+async def grant_page_permission(
+    page_id: str,
+    user_id: str,
+    permission: str,
+    current_user: dict = Depends(get_current_active_user),
+    storage: Storage = Depends(get_storage)
+):
+    """Grant page permission to user"""
+    page = await run_in_threadpool(storage.get_page_by_id, page_id)
+    if not page:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Page not found"
+        )
+    
+    # Only the page creator can grant permissions
+    if page['created_by'] != current_user['id']:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only page owner can grant permissions"
+        )
+    
+    # Check if user exists
+    if not await run_in_threadpool(storage.get_user_by_id, user_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+    
+    # Replace any existing permission for the user
+    permissions = [p for p in page.get('permissions', []) if p.get('user_id') != user_id]
+    permissions.append({'user_id': user_id, 'permission': permission})
+    await run_in_threadpool(storage.update_page, page_id, {'permissions': permissions})
+    
+    return {"message": "Permission granted successfully"}
+
+@router.delete("/{page_id}/permissions/{user_id}")
+async def revoke_page_permission(
+    page_id: str,
+    user_id: str,
+    current_user: dict = Depends(get_current_active_user),
+    storage: Storage = Depends(get_storage)
+):
+    """Revoke page permission from user"""
+    page = await run_in_threadpool(storage.get_page_by_id, page_id)
+    if not page:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Page not found"
+        )
+    
+    # Only the page creator can revoke permissions
+    if page['created_by'] != current_user['id']:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only page owner can revoke permissions"
+        )
+    
+    if user_id == page['created_by']:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cannot revoke owner permission"
+        )
+    
+    permissions = page.get('permissions', [])
+    remaining = [p for p in permissions if p.get('user_id') != user_id]
+    if len(remaining) == len(permissions):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Permission not found"
+        )
+    
+    await run_in_threadpool(storage.update_page, page_id, {'permissions': remaining})
     
-    return {"message": "Page deleted successfully"}
\ No newline at end of file
+    return {"message": "Permission revoked successfully"}
@@ -0,0 +1,20 @@
+from fastapi import HTTPException, status
+from typing import Iterable, List, Optional
+
+
+def parse_fields(fields: Optional[str], allowed: Iterable[str]) -> Optional[List[str]]:
+    """Parse a `?fields=a,b,c` projection; None means every field.
+
+    'id' is always returned, so it need not be listed.
+    """
+    if fields is None:
+        return None
+    allowed = list(allowed)
+    requested = [field.strip() for field in fields.split(',') if field.strip()]
+    unknown = [field for field in requested if field not in allowed]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(allowed)}"
+        )
+    return [field for field in dict.fromkeys(requested) if field != 'id']
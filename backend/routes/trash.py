@@ -1,13 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from starlette.concurrency import run_in_threadpool
 from typing import List, Optional
 from pydantic import BaseModel
 from datetime import datetime
 import uuid
 
-from database import (
-    get_user_workspaces, get_workspace_by_id, get_user_by_id,
-    get_trash_items as db_get_trash_items, restore_item, permanently_delete_item, empty_trash
-)
+from storage import Storage, get_storage
 from auth import get_current_active_user, UserResponse
 
 router = APIRouter(prefix="/trash", tags=["trash"])
@@ -32,12 +30,13 @@ class TrashResponse(BaseModel):
 @router.get("/", response_model=TrashResponse)
 async def get_trash_items(
     workspace_id: Optional[str] = None,
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(get_current_active_user),
+    storage: Storage = Depends(get_storage)
 ):
     """Get all trash items for current user's workspaces"""
     
     # Get user's workspaces
-    user_workspaces = get_user_workspaces(current_user['id'])
+    user_workspaces = await run_in_threadpool(storage.get_user_workspaces, current_user['id'])
     
     workspace_ids = [ws['id'] for ws in user_workspaces]
     
@@ -48,17 +47,19 @@ async def get_trash_items(
         workspace_ids = [workspace_id]
     
     # Get trash items
-    trash_items_raw = db_get_trash_items(workspace_ids)
+    trash_items_raw = await run_in_threadpool(storage.get_trash_items, workspace_ids)
     
     # Convert to response format
     trash_items = []
     for item in trash_items_raw:
         # Get workspace name
-        workspace = get_workspace_by_id(item['workspace_id'])
+        workspace = await run_in_threadpool(storage.get_workspace_by_id, item['workspace_id'])
         workspace_name = workspace['name'] if workspace else "Unknown Workspace"
         
         # Get deleted by user
-        deleted_by_user = get_user_by_id(item['deleted_by']) if item.get('deleted_by') else None
+        deleted_by_user = None
+        if item.get('deleted_by'):
+            deleted_by_user = await run_in_threadpool(storage.get_user_by_id, item['deleted_by'])
         
         # Determine title based on type
         if item['type'] == 'page':
@@ -88,23 +89,24 @@ async def get_trash_items(
 async def restore_item_endpoint(
     item_id: str,
     item_type: str,  # 'page' or 'database'
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(get_current_active_user),
+    storage: Storage = Depends(get_storage)
 ):
     """Restore an item from trash"""
     
     # Get user's workspaces
-    user_workspaces = get_user_workspaces(current_user['id'])
+    user_workspaces = await run_in_threadpool(storage.get_user_workspaces, current_user['id'])
     workspace_ids = [ws['id'] for ws in user_workspaces]
     
     # Get the item to check workspace access
-    trash_items_raw = db_get_trash_items(workspace_ids)
+    trash_items_raw = await run_in_threadpool(storage.get_trash_items, workspace_ids)
     item = next((item for item in trash_items_raw if item['id'] == item_id and item['type'] == item_type), None)
     
     if not item:
         raise HTTPException(status_code=404, detail="Item not found in trash")
     
     # Restore the item
-    success = restore_item(item_id, item_type)
+    success = await run_in_threadpool(storage.restore_item, item_id, item_type)
     
     if not success:
         raise HTTPException(status_code=400, detail="Failed to restore item")
@@ -115,28 +117,29 @@ async def restore_item_endpoint(
 async def permanently_delete_item_endpoint(
     item_id: str,
     item_type: str,  # 'page' or 'database'
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(get_current_active_user),
+    storage: Storage = Depends(get_storage)
 ):
     """Permanently delete an item from trash"""
     
     # Get user's workspaces
-    user_workspaces = get_user_workspaces(current_user['id'])
+    user_workspaces = await run_in_threadpool(storage.get_user_workspaces, current_user['id'])
     workspace_ids = [ws['id'] for ws in user_workspaces]
     
     # Get the item to check workspace access
-    trash_items_raw = db_get_trash_items(workspace_ids)
+    trash_items_raw = await run_in_threadpool(storage.get_trash_items, workspace_ids)
     item = next((item for item in trash_items_raw if item['id'] == item_id and item['type'] == item_type), None)
     
     if not item:
         raise HTTPException(status_code=404, detail="Item not found in trash")
     
     # Check if user has permission to delete
-    workspace = get_workspace_by_id(item['workspace_id'])
+    workspace = await run_in_threadpool(storage.get_workspace_by_id, item['workspace_id'])
     if workspace['owner_id'] != current_user['id'] and item['created_by'] != current_user['id']:
         raise HTTPException(status_code=403, detail="Permission denied")
     
     # Permanently delete the item
-    success = permanently_delete_item(item_id, item_type)
+    success = await run_in_threadpool(storage.permanently_delete_item, item_id, item_type)
     
     if not success:
         raise HTTPException(status_code=400, detail="Failed to delete item")
@@ -146,12 +149,13 @@ async def permanently_delete_item_endpoint(
 @router.post("/empty")
 async def empty_trash_endpoint(
     workspace_id: Optional[str] = None,
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(get_current_active_user),
+    storage: Storage = Depends(get_storage)
 ):
     """Empty trash (permanently delete all items)"""
     
     # Get user's workspaces
-    user_workspaces = get_user_workspaces(current_user['id'])
+    user_workspaces = await run_in_threadpool(storage.get_user_workspaces, current_user['id'])
     workspace_ids = [ws['id'] for ws in user_workspaces]
     
     # Filter by specific workspace if provided
@@ -161,6 +165,6 @@ async def empty_trash_endpoint(
         workspace_ids = [workspace_id]
     
     # Empty trash
-    total_deleted = empty_trash(workspace_ids)
+    total_deleted = await run_in_threadpool(storage.empty_trash, workspace_ids)
     
     return {"message": f"Trash emptied successfully. {total_deleted} items permanently deleted."}
\ No newline at end of file
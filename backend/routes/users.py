@@ -1,9 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from starlette.concurrency import run_in_threadpool
 from typing import List, Optional
 from pydantic import BaseModel
 import uuid
 
-from database import get_user_by_id, update_user
+from storage import Storage, get_storage
 from auth import get_current_active_user, UserResponse, get_password_hash, verify_password
 
 router = APIRouter(prefix="/users", tags=["users"])
@@ -30,10 +31,11 @@ async def get_users(
 @router.get("/{user_id}", response_model=UserResponse)
 async def get_user(
     user_id: str,
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(get_current_active_user),
+    storage: Storage = Depends(get_storage)
 ):
     """Get user by ID"""
-    user = get_user_by_id(user_id)
+    user = await run_in_threadpool(storage.get_user_by_id, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -44,7 +46,8 @@ async def get_user(
 @router.put("/me", response_model=UserResponse)
 async def update_current_user(
     user_update: UserUpdate,
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(get_current_active_user),
+    storage: Storage = Depends(get_storage)
 ):
     """Update current user profile"""
     update_data = {}
@@ -57,7 +60,7 @@ async def update_current_user(
         update_data['color'] = user_update.color
     
     if update_data:
-        success = update_user(current_user['id'], update_data)
+        success = await run_in_threadpool(storage.update_user, current_user['id'], update_data)
         if not success:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -65,13 +68,14 @@ async def update_current_user(
             )
     
     # Return updated user
-    updated_user = get_user_by_id(current_user['id'])
+    updated_user = await run_in_threadpool(storage.get_user_by_id, current_user['id'])
     return UserResponse.from_orm(updated_user)
 
 @router.post("/change-password")
 async def change_password(
     password_change: PasswordChange,
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(get_current_active_user),
+    storage: Storage = Depends(get_storage)
 ):
     """Change user password"""
     # Verify current password
@@ -83,7 +87,7 @@ async def change_password(
     
     # Update password
     new_hashed_password = get_password_hash(password_change.new_password)
-    success = update_user(current_user['id'], {'hashed_password': new_hashed_password})
+    success = await run_in_threadpool(storage.update_user, current_user['id'], {'hashed_password': new_hashed_password})
     
     if not success:
         raise HTTPException(
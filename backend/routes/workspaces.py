@@ -1,13 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, WebSocket, status
+from starlette.concurrency import run_in_threadpool
 from typing import List, Optional
 from pydantic import BaseModel
 import uuid
 
-from database import (
-    get_user_workspaces, get_workspace_by_id, create_workspace,
-    update_workspace, delete_workspace, get_user_by_id
-)
-from auth import get_current_active_user, UserResponse
+import collaboration
+from pubsub import get_broker, workspace_channel
+from storage import Storage, get_storage
+from auth import WEBSOCKET_PROTOCOL, get_current_active_user, get_websocket_user, UserResponse
 
 router = APIRouter(prefix="/workspaces", tags=["workspaces"])
 
@@ -33,17 +33,24 @@ class WorkspaceResponse(BaseModel):
     created_at: str
     updated_at: Optional[str] = None
 
+def _publish(workspace_id: str, message: dict):
+    """Tell the workspace's live feeds, on every worker, what changed"""
+    get_broker().publish(workspace_channel(workspace_id), message)
+
 @router.get("/", response_model=List[WorkspaceResponse])
-async def get_workspaces(current_user: dict = Depends(get_current_active_user)):
+async def get_workspaces(
+    current_user: dict = Depends(get_current_active_user),
+    storage: Storage = Depends(get_storage)
+):
     """Get current user's workspaces"""
-    workspaces = get_user_workspaces(current_user['id'])
+    workspaces = await run_in_threadpool(storage.get_user_workspaces, current_user['id'])
     
     result = []
     for ws in workspaces:
         # Get member details
         members = []
         for member in ws.get('members', []):
-            user = get_user_by_id(member.get('user_id'))
+            user = await run_in_threadpool(storage.get_user_by_id, member.get('user_id'))
             if user:
                 members.append({
                     'id': user['id'],
@@ -71,10 +78,11 @@ async def get_workspaces(current_user: dict = Depends(get_current_active_user)):
 @router.get("/{workspace_id}", response_model=WorkspaceResponse)
 async def get_workspace(
     workspace_id: str,
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(get_current_active_user),
+    storage: Storage = Depends(get_storage)
 ):
     """Get workspace by ID"""
-    workspace = get_workspace_by_id(workspace_id)
+    workspace = await run_in_threadpool(storage.get_workspace_by_id, workspace_id)
     if not workspace:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -82,7 +90,7 @@ async def get_workspace(
         )
     
     # Check if user has access
-    user_workspaces = get_user_workspaces(current_user['id'])
+    user_workspaces = await run_in_threadpool(storage.get_user_workspaces, current_user['id'])
     workspace_ids = [ws['id'] for ws in user_workspaces]
     
     if workspace_id not in workspace_ids:
@@ -94,7 +102,7 @@ async def get_workspace(
     # Get member details
     members = []
     for member in workspace.get('members', []):
-        user = get_user_by_id(member.get('user_id'))
+        user = await run_in_threadpool(storage.get_user_by_id, member.get('user_id'))
         if user:
             members.append({
                 'id': user['id'],
@@ -120,7 +128,8 @@ async def get_workspace(
 @router.post("/", response_model=WorkspaceResponse)
 async def create_workspace_endpoint(
     workspace_data: WorkspaceCreate,
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(get_current_active_user),
+    storage: Storage = Depends(get_storage)
 ):
     """Create a new workspace"""
     workspace_doc = {
@@ -132,7 +141,7 @@ async def create_workspace_endpoint(
         'settings': {}
     }
     
-    workspace = create_workspace(workspace_doc)
+    workspace = await run_in_threadpool(storage.create_workspace, workspace_doc)
     
     return WorkspaceResponse(
         id=workspace['id'],
@@ -157,10 +166,11 @@ async def create_workspace_endpoint(
 async def update_workspace_endpoint(
     workspace_id: str,
     workspace_data: WorkspaceUpdate,
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(get_current_active_user),
+    storage: Storage = Depends(get_storage)
 ):
     """Update workspace"""
-    workspace = get_workspace_by_id(workspace_id)
+    workspace = await run_in_threadpool(storage.get_workspace_by_id, workspace_id)
     if not workspace:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -186,20 +196,22 @@ async def update_workspace_endpoint(
         update_data['settings'] = workspace_data.settings
     
     # Update workspace
-    success = update_workspace(workspace_id, update_data)
+    success = await run_in_threadpool(storage.update_workspace, workspace_id, update_data)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Failed to update workspace"
         )
     
+    _publish(workspace_id, {'type': 'workspace', 'action': 'updated', 'user_id': current_user['id']})
+    
     # Return updated workspace
-    updated_workspace = get_workspace_by_id(workspace_id)
+    updated_workspace = await run_in_threadpool(storage.get_workspace_by_id, workspace_id)
     
     # Get member details
     members = []
     for member in updated_workspace.get('members', []):
-        user = get_user_by_id(member.get('user_id'))
+        user = await run_in_threadpool(storage.get_user_by_id, member.get('user_id'))
         if user:
             members.append({
                 'id': user['id'],
@@ -225,10 +237,11 @@ async def update_workspace_endpoint(
 @router.delete("/{workspace_id}")
 async def delete_workspace_endpoint(
     workspace_id: str,
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(get_current_active_user),
+    storage: Storage = Depends(get_storage)
 ):
     """Delete workspace"""
-    workspace = get_workspace_by_id(workspace_id)
+    workspace = await run_in_threadpool(storage.get_workspace_by_id, workspace_id)
     if not workspace:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -243,11 +256,118 @@ async def delete_workspace_endpoint(
         )
     
     # Delete workspace
-    success = delete_workspace(workspace_id)
+    success = await run_in_threadpool(storage.delete_workspace, workspace_id)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Failed to delete workspace"
         )
+    _publish(workspace_id, {'type': 'workspace', 'action': 'deleted', 'user_id': current_user['id']})
     
-    return {"message": "Workspace deleted successfully"}
\ No newline at end of file
+    return {"message": "Workspace deleted successfully"}
+@router.post("/{workspace_id}/members/{user_id}")
+async def add_member(
+    workspace_id: str,
+    user_id: str,
+    current_user: dict = Depends(get_current_active_user),
+    storage: Storage = Depends(get_storage)
+):
+    """Add member to workspace"""
+    workspace = await run_in_threadpool(storage.get_workspace_by_id, workspace_id)
+    if not workspace:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Workspace not found"
+        )
+    
+    # Check if user is owner
+    if workspace['owner_id'] != current_user['id']:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only workspace owner can add members"
+        )
+    
+    # Check if user exists
+    user = await run_in_threadpool(storage.get_user_by_id, user_id)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+    
+    # Check if user is already a member
+    members = workspace.get('members', [])
+    if any(member.get('user_id') == user_id for member in members):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="User is already a member"
+        )
+    
+    members.append({'user_id': user_id, 'role': 'member'})
+    await run_in_threadpool(storage.update_workspace, workspace_id, {'members': members})
+    _publish(workspace_id, {'type': 'member', 'action': 'added', 'member_id': user_id, 'user_id': current_user['id']})
+    
+    return {"message": "Member added successfully"}
+
+@router.delete("/{workspace_id}/members/{user_id}")
+async def remove_member(
+    workspace_id: str,
+    user_id: str,
+    current_user: dict = Depends(get_current_active_user),
+    storage: Storage = Depends(get_storage)
+):
+    """Remove member from workspace"""
+    workspace = await run_in_threadpool(storage.get_workspace_by_id, workspace_id)
+    if not workspace:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Workspace not found"
+        )
+    
+    # Check if user is owner
+    if workspace['owner_id'] != current_user['id']:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only workspace owner can remove members"
+        )
+    
+    # Can't remove owner
+    if user_id == workspace['owner_id']:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cannot remove workspace owner"
+        )
+    
+    members = workspace.get('members', [])
+    remaining = [member for member in members if member.get('user_id') != user_id]
+    if len(remaining) == len(members):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Member not found"
+        )
+    
+    await run_in_threadpool(storage.update_workspace, workspace_id, {'members': remaining})
+    _publish(workspace_id, {'type': 'member', 'action': 'removed', 'member_id': user_id, 'user_id': current_user['id']})
+    
+    return {"message": "Member removed successfully"}
+
+@router.websocket("/{workspace_id}/live")
+async def workspace_live(
+    websocket: WebSocket,
+    workspace_id: str,
+    storage: Storage = Depends(get_storage)
+):
+    """Pages, databases and members of the workspace changing (see collaboration).
+
+    The feed ends when the workspace is deleted or the user is removed from it.
+    """
+    user = await run_in_threadpool(get_websocket_user, websocket, storage)
+    workspace_ids = [ws['id'] for ws in await run_in_threadpool(storage.get_user_workspaces, user['id'])] if user else []
+    if workspace_id not in workspace_ids:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    await websocket.accept(subprotocol=WEBSOCKET_PROTOCOL)
+    await collaboration.follow(
+        workspace_channel(workspace_id), collaboration.Connection(websocket, user), ends=collaboration.loses_access(user['id'])
+    )
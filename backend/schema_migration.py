@@ -0,0 +1,392 @@
+"""Schema changes applied to every row of a database, in the background.
+
+``PUT /databases/{id}`` replaces the schema and leaves the rows as they are;
+a schema migration changes both. It is a list of operations, applied in
+order, each naming a property by its key at that point:
+
+- ``{"op": "rename", "property": key, "to": new key, "name": new name}``,
+  with `to`, `name` or both; the prop() references of formulas reading
+  the property follow it
+- ``{"op": "delete", "property": key}``
+- ``{"op": "change_type", "property": key, "type": new type, "options": [...]}``;
+  values are converted, and those that don't convert (text that isn't a
+  number, an option name that isn't among the new options) are cleared
+
+Starting one writes the new schema and the database's `schema_migration`
+record together. A worker thread then rewrites the rows in batches by id,
+pausing between batches, and saves its cursor and progress after each one.
+The record holds a lease that every batch renews. If a worker stops, the
+next one started carries on from the cursor, whether that happens when a
+process starts or on ``/schema-migration/resume``. Rows written since a
+batch read them are skipped, because writes already store the new shape.
+
+Until the migration is done, reads convert the rows they return with the
+same operations. Converting a converted row changes nothing, so every
+reader sees the new schema whichever rows are done.
+"""
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import date_index
+import relations
+from storage import RowAggregation, RowRewrite, Storage
+
+logger = logging.getLogger("schema_migration")
+
+BATCH_SIZE = int(os.environ.get('SCHEMA_MIGRATION_BATCH_SIZE', '200'))
+BATCH_PAUSE = float(os.environ.get('SCHEMA_MIGRATION_PAUSE_MS', '50')) / 1000
+# A worker that hasn't saved a batch for this long is taken to have stopped
+LEASE_SECONDS = 30
+
+OPERATIONS = ('rename', 'delete', 'change_type')
+TEXT_TYPES = ('text', 'url', 'email', 'phone_number')
+OPTION_TYPES = ('select', 'status', 'multi_select')
+# Types values can be converted to and from
+CONVERTIBLE_TYPES = (*TEXT_TYPES, 'number', 'checkbox', 'select', 'status', 'multi_select', 'date')
+TRUE_TEXT = ('true', 'yes', 'y', '1', 'on', 'checked', 'x')
+EMPTY_VALUES = (None, '', [])
+
+
+def _options(prop: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [option for option in (prop or {}).get('options') or [] if isinstance(option, dict) and 'id' in option]
+
+
+def _text(value: Any, previous: Dict[str, Any]) -> Any:
+    if value in EMPTY_VALUES:
+        return None
+    names = {option['id']: option.get('name', option['id']) for option in _options(previous)}
+    if isinstance(value, list):
+        return ', '.join(str(names.get(item, item)) for item in value if item not in EMPTY_VALUES)
+    if isinstance(value, bool):
+        return 'Yes' if value else 'No'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, dict):
+        start, end = value.get('start'), value.get('end')
+        return f"{start} → {end}" if end else start
+    return names.get(value, value) if isinstance(value, str) else str(value)
+
+
+def _number(value: Any, previous: Dict[str, Any]) -> Any:
+    if isinstance(value, bool):
+        return int(value)
+    text = _text(value, previous)
+    try:
+        number = float(text) if text is not None else None
+    except ValueError:
+        return None
+    if number is None or number != number or abs(number) == float('inf'):
+        return None
+    return int(number) if number.is_integer() and abs(number) < 2 ** 53 else number
+
+
+def _checkbox(value: Any, previous: Dict[str, Any]) -> bool:
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return value != 0
+    text = _text(value, previous)
+    return isinstance(text, str) and text.strip().lower() in TRUE_TEXT
+
+
+def _option_ids(value: Any, previous: Dict[str, Any], new: Dict[str, Any]) -> List[str]:
+    """Ids of the new options matching a value, by id or by name"""
+    options = _options(new)
+    ids = {option['id'] for option in options}
+    by_name = {str(option.get('name', '')).strip().lower(): option['id'] for option in options}
+    names = {option['id']: option.get('name') for option in _options(previous)}
+    if isinstance(value, list):
+        items = value
+    elif isinstance(value, str) and value not in ids and new.get('type') == 'multi_select':
+        items = value.split(',')
+    else:
+        items = [value]
+    found = []
+    for item in items:
+        if item in EMPTY_VALUES:
+            continue
+        if item in ids:
+            found.append(item)
+            continue
+        name = _text(names.get(item, item), {})
+        option_id = by_name.get(name.strip().lower()) if isinstance(name, str) else None
+        if option_id is not None:
+            found.append(option_id)
+    return list(dict.fromkeys(found))
+
+
+def _date(value: Any) -> Any:
+    if isinstance(value, dict):
+        return value if date_index.interval(value) is not None else None
+    if isinstance(value, str) and date_index.interval(value.strip()) is not None:
+        return value.strip()
+    return None
+
+
+def convert(value: Any, previous: Dict[str, Any], new: Dict[str, Any]) -> Any:
+    """A value of property `previous` as a value of `new`; values already of `new`'s type are kept"""
+    new_type = new.get('type')
+    if new_type in TEXT_TYPES:
+        return _text(value, previous)
+    if new_type == 'number':
+        return _number(value, previous)
+    if new_type == 'checkbox':
+        return _checkbox(value, previous)
+    if new_type == 'multi_select':
+        return _option_ids(value, previous, new)
+    if new_type in OPTION_TYPES:
+        ids = _option_ids(value, previous, new)
+        return ids[0] if ids else None
+    if new_type == 'date':
+        return _date(value)
+    return value
+
+
+def upgrade_properties(operations: List[Dict[str, Any]], properties: Dict[str, Any]) -> Dict[str, Any]:
+    """A row's properties with the operations applied"""
+    properties = dict(properties or {})
+    for operation in operations:
+        key = operation['property']
+        if operation['op'] == 'rename':
+            if operation.get('to') and key in properties:
+                properties[operation['to']] = properties.pop(key)
+        elif operation['op'] == 'delete':
+            properties.pop(key, None)
+        elif key in properties:
+            properties[key] = convert(properties[key], operation['previous'], operation['new'])
+    return properties
+
+
+def active(database: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """The database's schema migration while it isn't done, running or failed"""
+    migration = (database or {}).get('schema_migration')
+    return migration if migration and migration.get('status') != 'done' else None
+
+
+def upgrade(database: Dict[str, Any], properties: Dict[str, Any]) -> Dict[str, Any]:
+    """Row properties as of the new schema while the database is being migrated"""
+    migration = active(database)
+    return upgrade_properties(migration['operations'], properties) if migration else properties
+
+
+def upgrade_rows(database: Dict[str, Any], rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """`rows` as of the new schema while the database is being migrated"""
+    migration = active(database)
+    if migration is None:
+        return rows
+    return [{**row, 'properties': upgrade_properties(migration['operations'], row.get('properties'))} for row in rows]
+
+
+def _has_formulas(schema: Dict[str, Any]) -> bool:
+    return any(isinstance(prop, dict) and prop.get('type') == 'formula' for prop in schema.values())
+
+
+def plan(properties: Dict[str, Any], requested: List[Dict[str, Any]]) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """(new schema, operations as recorded) for requested operations; raises ValueError.
+
+    Keys a migration renames or deletes can't be reused by it, since the
+    operations must give the same result when applied twice. A rename
+    rewrites the prop() references of the formulas reading the property.
+    """
+    schema = dict(properties)
+    retired: Set[str] = set()
+    operations = []
+    for index, request in enumerate(requested):
+        label = f"Operation {index + 1}"
+        op, key = request.get('op'), request.get('property')
+        if op not in OPERATIONS:
+            raise ValueError(f"{label}: op must be one of {', '.join(OPERATIONS)}")
+        prop = schema.get(key) if isinstance(key, str) else None
+        if not isinstance(prop, dict):
+            raise ValueError(f"{label}: no property {key!r}")
+        linked = prop.get('type') in (relations.RELATION, relations.ROLLUP)
+        if op == 'rename':
+            previous = dict(schema)
+            to, name = request.get('to'), request.get('name')
+            if to is None and name is None:
+                raise ValueError(f"{label}: rename needs to, name or both")
+            if to is not None and to != key:
+                if not isinstance(to, str) or not to or '.' in to or to.startswith('$'):
+                    raise ValueError(f"{label}: invalid key {to!r}")
+                if to in schema or to in retired or to in properties:
+                    raise ValueError(f"{label}: {to!r} is already used")
+                if linked:
+                    raise ValueError(f"{label}: relation and rollup keys can't change")
+                retired.add(key)
+                schema = {(to if existing == key else existing): value for existing, value in schema.items()}
+            else:
+                to = None
+            if name is not None:
+                schema[to or key] = {**prop, 'name': name}
+            if _has_formulas(schema):
+                import formulas
+                try:
+                    schema = formulas.rename_references(previous, schema, key, to or key)
+                except formulas.FormulaError as exc:
+                    raise ValueError(f"{label}: {exc}")
+            operations.append({'op': 'rename', 'property': key, 'to': to, 'name': name})
+        elif op == 'delete':
+            retired.add(key)
+            del schema[key]
+            operations.append({'op': 'delete', 'property': key})
+        else:
+            new_type = request.get('type')
+            if prop.get('type') not in CONVERTIBLE_TYPES or new_type not in CONVERTIBLE_TYPES:
+                raise ValueError(f"{label}: types can change between {', '.join(CONVERTIBLE_TYPES)}")
+            new = {field: value for field, value in prop.items() if field != 'options'}
+            new['type'] = new_type
+            if new_type in OPTION_TYPES:
+                options = request.get('options')
+                if options is None and prop.get('type') in OPTION_TYPES:
+                    options = prop.get('options')
+                new['options'] = [option for option in options or [] if isinstance(option, dict) and 'id' in option]
+            schema[key] = new
+            operations.append({'op': 'change_type', 'property': key, 'previous': prop, 'new': new})
+    if not operations:
+        raise ValueError("A schema migration needs at least one operation")
+    return schema, operations
+
+
+def new_record(operations: List[Dict[str, Any]], total: Optional[int]) -> Dict[str, Any]:
+    now = datetime.utcnow().isoformat()
+    return {
+        'id': str(uuid.uuid4()),
+        'operations': operations,
+        'status': 'running',
+        'cursor': None,
+        'processed': 0,
+        'rewritten': 0,
+        'total': total,
+        'lease': None,
+        'heartbeat': None,
+        'error': None,
+        'started_at': now,
+        'updated_at': now,
+        'finished_at': None,
+    }
+
+
+def row_count(storage: Storage, database_id: str) -> int:
+    result = storage.aggregate_database_rows(database_id, RowAggregation(None, 'text', ()))
+    if result is not None:
+        return result['total']['count']
+    return len(storage.get_database_rows(database_id))
+
+
+def _stale(migration: Dict[str, Any]) -> bool:
+    heartbeat = migration.get('heartbeat')
+    return heartbeat is None or datetime.fromisoformat(heartbeat) < datetime.utcnow() - timedelta(seconds=LEASE_SECONDS)
+
+
+def _claim(storage: Storage, database_id: str, lease: str) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    """(migration, schema) once this worker holds the lease; None when there
+    is nothing to run or another worker is running it"""
+    database = storage.get_database_by_id(database_id, ['properties', 'schema_migration'])
+    migration = (database or {}).get('schema_migration')
+    if not migration or migration.get('status') != 'running':
+        return None
+    if migration.get('lease') is not None and not _stale(migration):
+        return None
+    claimed = {**migration, 'lease': lease, 'heartbeat': datetime.utcnow().isoformat()}
+    if not storage.set_database_schema_migration(database_id, claimed, migration.get('lease')):
+        return None
+    return claimed, database.get('properties') or {}
+
+
+def _refresh_caches(storage: Storage, database_id: str, schema: Dict[str, Any], row_ids: List[str]):
+    """Bring the formula caches of rewritten rows up to date with the new schema"""
+    import formulas
+    rows = storage.get_database_rows_by_id(database_id, row_ids)
+    updates = formulas.refresh_rows(schema, rows)
+    changed = {
+        row['id']: update.computed for row, update in zip(rows, updates) if update.computed != row.get('computed', {})
+    }
+    if changed:
+        storage.set_database_rows_computed(database_id, changed)
+
+
+def run(storage: Storage, database_id: str):
+    """Carry a database's schema migration through to the end, unless another worker holds it"""
+    lease = uuid.uuid4().hex
+    claimed = _claim(storage, database_id, lease)
+    if claimed is None:
+        return
+    migration, schema = claimed
+    has_formulas = _has_formulas(schema)
+    logger.info(f"Schema migration {migration['id']} of database {database_id}: resuming at {migration['cursor']}")
+    try:
+        while True:
+            rows = storage.get_database_rows_batch(database_id, migration['cursor'], BATCH_SIZE)
+            rewrites = {}
+            for row in rows:
+                before = row.get('properties') or {}
+                after = upgrade_properties(migration['operations'], before)
+                if after != before:
+                    rewrites[row['id']] = RowRewrite(
+                        row.get('updated_at'),
+                        {key: value for key, value in after.items() if key not in before or before[key] != value},
+                        tuple(key for key in before if key not in after)
+                    )
+            rewritten = storage.rewrite_database_rows(database_id, rewrites) if rewrites else 0
+            if rewrites and has_formulas:
+                _refresh_caches(storage, database_id, schema, list(rewrites))
+            now = datetime.utcnow().isoformat()
+            migration = {
+                **migration,
+                'cursor': rows[-1]['id'] if rows else migration['cursor'],
+                'processed': migration['processed'] + len(rows),
+                'rewritten': migration['rewritten'] + rewritten,
+                'heartbeat': now,
+                'updated_at': now,
+            }
+            done = len(rows) < BATCH_SIZE
+            if done:
+                migration.update(status='done', lease=None, finished_at=now)
+            if not storage.set_database_schema_migration(database_id, migration, lease):
+                logger.warning(f"Schema migration {migration['id']} of database {database_id}: lease lost")
+                return
+            if done:
+                logger.info(f"Schema migration {migration['id']} of database {database_id}: done, "
+                            f"{migration['rewritten']} of {migration['processed']} rows rewritten")
+                return
+            time.sleep(BATCH_PAUSE)
+    except Exception as exc:
+        logger.exception(f"Schema migration {migration['id']} of database {database_id} failed: {exc}")
+        storage.set_database_schema_migration(database_id, {
+            **migration, 'status': 'failed', 'error': str(exc), 'lease': None,
+            'updated_at': datetime.utcnow().isoformat()
+        }, lease)
+
+
+_workers: Set[str] = set()
+_workers_lock = threading.Lock()
+
+
+def start(storage: Storage, database_id: str):
+    """Run a database's schema migration in a worker thread, unless this process runs it already"""
+    with _workers_lock:
+        if database_id in _workers:
+            return
+        _workers.add(database_id)
+
+    def work():
+        try:
+            run(storage, database_id)
+        finally:
+            with _workers_lock:
+                _workers.discard(database_id)
+
+    threading.Thread(target=work, name=f"schema-migration-{database_id}", daemon=True).start()
+
+
+def resume_all(storage: Storage) -> int:
+    """Start workers for the migrations left running by stopped workers; returns how many"""
+    database_ids = storage.get_migrating_database_ids()
+    for database_id in database_ids:
+        start(storage, database_id)
+    return len(database_ids)
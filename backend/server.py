@@ -1,4 +1,5 @@
 from fastapi import FastAPI, APIRouter
+from fastapi.responses import JSONResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 import os
@@ -10,13 +11,21 @@ import uuid
 from datetime import datetime
 
 # Import routes
-from routes import auth, users, workspaces, pages, databases, trash
+from routes import auth, users, workspaces, pages, databases, trash, admin, bootstrap, batch
+from profiling import ProfilingMiddleware, ProfiledJSONResponse
+from metrics import MetricsMiddleware, metrics_response
+from lifecycle import lifespan, readiness
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # Create the main app without a prefix
-app = FastAPI(title="MindNotes API", version="1.0.0")
+app = FastAPI(
+    title="MindNotes API",
+    version="1.0.0",
+    default_response_class=ProfiledJSONResponse,
+    lifespan=lifespan
+)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -26,6 +35,11 @@ api_router = APIRouter(prefix="/api")
 async def health_check():
     return {"status": "healthy", "timestamp": datetime.utcnow().isoformat()}
 
+# Readiness: 503 until this worker's storage pools are warm (see lifecycle.py)
+@api_router.get("/ready")
+async def readiness_check():
+    return JSONResponse(readiness.as_dict(), status_code=200 if readiness.ready else 503)
+
 # Include all route modules
 api_router.include_router(auth.router)
 api_router.include_router(users.router)
@@ -33,6 +47,9 @@ api_router.include_router(workspaces.router)
 api_router.include_router(pages.router)
 api_router.include_router(databases.router)
 api_router.include_router(trash.router)
+api_router.include_router(admin.router)
+api_router.include_router(bootstrap.router)
+api_router.include_router(batch.router)
 
 # Test endpoint for backward compatibility - AFTER other routers
 @api_router.get("/")
@@ -47,6 +64,11 @@ async def test_endpoint():
 # Include the router in the main app
 app.include_router(api_router)
 
+# Prometheus scrape endpoint (aggregates all gunicorn workers, see metrics.py)
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return metrics_response()
+
 # Production CORS configuration
 allowed_origins = [
     "http://localhost:3000",  # Development
@@ -67,6 +89,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-request profiling (Server-Timing header + log line), sampled by PROFILE_SAMPLE_RATE
+app.add_middleware(ProfilingMiddleware)
+
+# Prometheus request metrics
+app.add_middleware(MetricsMiddleware)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
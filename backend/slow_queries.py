@@ -0,0 +1,226 @@
+"""Slow-query log.
+
+Mongo commands (via the pymongo CommandListener in database.py) and SQL
+statements (via SQLAlchemy cursor events) slower than ``SLOW_QUERY_MS`` are logged with a
+normalized shape: literal values replaced by ``?``, so the same query with
+different ids groups together. Per-shape stats are kept in memory and, with
+``SLOW_QUERY_EXPLAIN=true``, the query plan of the first slow occurrence of
+each shape is captured in a background thread. Both are served by
+``/api/admin/slow-queries``. Stats are per worker process.
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List
+
+import profiling
+
+logger = logging.getLogger("slow_queries")
+
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '100'))
+SLOW_QUERY_EXPLAIN = os.environ.get('SLOW_QUERY_EXPLAIN', 'false').lower() == 'true'
+MAX_SHAPES = 500
+
+# Commands worth recording; the collection name is the value of the command's first key
+MONGO_COMMANDS = {'find', 'aggregate', 'count', 'distinct', 'update', 'delete', 'insert', 'findAndModify'}
+MONGO_EXPLAINABLE = {'find', 'aggregate', 'count', 'distinct', 'update', 'delete', 'findAndModify'}
+MONGO_SHAPE_FIELDS = ('filter', 'query', 'q', 'pipeline', 'projection', 'updates', 'deletes', 'key')
+# Session/driver fields that must not be forwarded into an explain command
+MONGO_INTERNAL_FIELDS = {'lsid', '$db', '$clusterTime', 'txnNumber', '$readPreference', 'readConcern'}
+
+
+class SlowQueryLog:
+    """Thread-safe per-shape stats, bounded to the most recently seen shapes"""
+
+    def __init__(self, max_shapes: int = MAX_SHAPES):
+        self.max_shapes = max_shapes
+        self.lock = threading.Lock()
+        self.entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def add(self, kind: str, shape: str, duration_ms: float) -> bool:
+        """Record an occurrence; True when it is the first one for this shape"""
+        key = f"{kind}:{shape}"
+        now = datetime.utcnow().isoformat()
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            first = entry is None
+            if first:
+                entry = {
+                    'kind': kind, 'shape': shape, 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                    'first_seen': now, 'explain': None
+                }
+            entry['count'] += 1
+            entry['total_ms'] += duration_ms
+            entry['max_ms'] = max(entry['max_ms'], duration_ms)
+            entry['last_seen'] = now
+            self.entries[key] = entry
+            while len(self.entries) > self.max_shapes:
+                self.entries.popitem(last=False)
+        return first
+
+    def set_explain(self, kind: str, shape: str, plan: Any):
+        with self.lock:
+            entry = self.entries.get(f"{kind}:{shape}")
+            if entry is not None:
+                entry['explain'] = plan
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        with self.lock:
+            entries = [dict(entry) for entry in self.entries.values()]
+        for entry in entries:
+            entry['total_ms'] = round(entry['total_ms'], 3)
+            entry['max_ms'] = round(entry['max_ms'], 3)
+            entry['mean_ms'] = round(entry['total_ms'] / entry['count'], 3)
+        return sorted(entries, key=lambda entry: entry['total_ms'], reverse=True)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+slow_query_log = SlowQueryLog()
+_explain_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='slow-query-explain')
+
+
+def _report(kind: str, shape: str, duration_ms: float) -> bool:
+    first = slow_query_log.add(kind, shape, duration_ms)
+    profile = profiling.current_profile()
+    logger.warning(json.dumps({
+        'kind': kind,
+        'shape': shape,
+        'duration_ms': round(duration_ms, 3),
+        'path': profile.path if profile else None,
+    }))
+    return first
+
+
+# Mongo
+
+def normalize_mongo(value: Any) -> Any:
+    """Replace literals with '?' keeping keys and operators.
+
+    Booleans and null stay: `is_deleted: true` and `false` are different
+    queries that can use different (partial) indexes.
+    """
+    if value is True or value is False or value is None:
+        return value
+    if isinstance(value, dict):
+        return {key: normalize_mongo(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        # Shapes of $in lists etc. shouldn't depend on their length
+        shapes = []
+        for item in value:
+            shape = normalize_mongo(item)
+            if shape not in shapes:
+                shapes.append(shape)
+        return shapes
+    return '?'
+
+
+def mongo_shape(command_name: str, command: Dict[str, Any]) -> str:
+    shape = {'op': command_name, 'collection': command.get(command_name)}
+    for field_name in MONGO_SHAPE_FIELDS:
+        if field_name in command:
+            shape[field_name] = normalize_mongo(command[field_name])
+    if 'sort' in command:
+        # Sort direction is part of the shape, not a literal
+        shape['sort'] = command['sort']
+    return json.dumps(shape, sort_keys=True, default=str)
+
+
+def _explain_mongo(database_name: str, command: Dict[str, Any], shape: str):
+    try:
+        import database
+        explainable = {key: value for key, value in command.items() if key not in MONGO_INTERNAL_FIELDS}
+        plan = database.client[database_name].command(
+            {'explain': explainable, 'verbosity': 'queryPlanner'}
+        )
+        slow_query_log.set_explain('mongo', shape, json.loads(json.dumps(plan.get('queryPlanner', plan), default=str)))
+    except Exception as exc:
+        slow_query_log.set_explain('mongo', shape, {'error': str(exc)})
+
+
+class MongoCommandTracker:
+    """Pairs command started/finished events and records the slow ones"""
+
+    def __init__(self):
+        self.pending: Dict[Any, Any] = {}
+        self.lock = threading.Lock()
+
+    def started(self, event):
+        if event.command_name in MONGO_COMMANDS:
+            with self.lock:
+                self.pending[(event.connection_id, event.request_id)] = (event.database_name, event.command)
+
+    def finished(self, event):
+        with self.lock:
+            started = self.pending.pop((event.connection_id, event.request_id), None)
+        if started is None:
+            return
+        duration_ms = event.duration_micros / 1000
+        if duration_ms < SLOW_QUERY_MS:
+            return
+        database_name, command = started
+        shape = mongo_shape(event.command_name, command)
+        if _report('mongo', shape, duration_ms) and SLOW_QUERY_EXPLAIN and event.command_name in MONGO_EXPLAINABLE:
+            # Issuing commands from inside a listener can deadlock the pool
+            _explain_executor.submit(_explain_mongo, database_name, dict(command), shape)
+
+
+mongo_command_tracker = MongoCommandTracker()
+
+
+# SQL
+
+_WHITESPACE = re.compile(r'\s+')
+_IN_LIST = re.compile(r'\bIN\s*\((?:[^()]|\([^()]*\))*\)', re.IGNORECASE)
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+
+
+def normalize_sql(statement: str) -> str:
+    """Collapse whitespace, literals and IN lists so equivalent statements group together"""
+    shape = _WHITESPACE.sub(' ', statement).strip()
+    shape = _STRING_LITERAL.sub('?', shape)
+    shape = _NUMBER_LITERAL.sub('?', shape)
+    return _IN_LIST.sub('IN (...)', shape)
+
+
+def _explain_sql(engine, statement: str, parameters: Any, shape: str):
+    try:
+        if engine.dialect.name == 'postgresql':
+            explain = f"EXPLAIN (FORMAT JSON) {statement}"
+        else:
+            explain = f"EXPLAIN QUERY PLAN {statement}"
+        with engine.connect() as conn:
+            rows = conn.exec_driver_sql(explain, parameters).fetchall()
+        plan = rows[0][0] if engine.dialect.name == 'postgresql' else [list(row) for row in rows]
+        slow_query_log.set_explain('sql', shape, plan)
+    except Exception as exc:
+        slow_query_log.set_explain('sql', shape, {'error': str(exc)})
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('slow_query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration_ms = (time.perf_counter() - conn.info['slow_query_started'].pop()) * 1000
+    if duration_ms < SLOW_QUERY_MS or statement.lstrip().upper().startswith('EXPLAIN'):
+        return
+    shape = normalize_sql(statement)
+    first = _report('sql', shape, duration_ms)
+    if first and SLOW_QUERY_EXPLAIN and not executemany and statement.lstrip().upper().startswith('SELECT'):
+        _explain_executor.submit(_explain_sql, conn.engine, statement, parameters, shape)
+
+
+def instrument_engine(engine):
+    from sqlalchemy import event
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
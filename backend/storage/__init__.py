@@ -0,0 +1,49 @@
+"""Pluggable storage backends.
+
+The backend is chosen with the ``STORAGE_BACKEND`` environment variable
+(``mongo``, ``postgres`` or ``memory``). Routes depend on ``get_storage``
+and never import a driver directly, so the same handlers serve every
+backend.
+"""
+import os
+from pathlib import Path
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from .base import RowAggregate, RowAggregation, RowCondition, RowRewrite, Storage
+
+ROOT_DIR = Path(__file__).parent.parent
+load_dotenv(ROOT_DIR / '.env')
+
+STORAGE_BACKENDS = ('mongo', 'postgres', 'memory')
+
+_storage: Optional[Storage] = None
+
+
+def create_storage(backend: str) -> Storage:
+    """Instantiate a storage backend by name"""
+    if backend == 'mongo':
+        from .mongo import MongoStorage
+        return MongoStorage()
+    if backend == 'postgres':
+        from .postgres import PostgresStorage
+        return PostgresStorage()
+    if backend == 'memory':
+        from .memory import MemoryStorage
+        return MemoryStorage()
+    raise ValueError(f"Unknown storage backend '{backend}', expected one of {', '.join(STORAGE_BACKENDS)}")
+
+
+def get_storage() -> Storage:
+    """Return the configured storage, creating it on first use"""
+    global _storage
+    if _storage is None:
+        _storage = create_storage(os.environ.get('STORAGE_BACKEND', 'mongo'))
+    return _storage
+
+
+def set_storage(storage: Optional[Storage]) -> None:
+    """Swap the active storage (benchmarks and tests); None resets to the configured one"""
+    global _storage
+    _storage = storage
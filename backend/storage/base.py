@@ -0,0 +1,331 @@
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Optional, List, Dict, Any, Iterator, NamedTuple, Tuple
+
+
+class RowCondition(NamedTuple):
+    """A filter on one row property, read as a number or as text (see RowAggregation)"""
+    key: str
+    kind: str
+    # number: eq, ne, gt, gte, lt, lte; text: in, not_in; either: empty, not_empty
+    op: str
+    # A float, or a tuple of strings for in/not_in
+    value: Any = None
+
+
+class RowAggregate(NamedTuple):
+    # Key of the result in each group's `aggregates`
+    name: str
+    # count (rows when key is None, else non-empty values), distinct, sum, avg, min, max
+    op: str
+    key: Optional[str] = None
+    kind: str = 'text'
+
+
+class RowAggregation(NamedTuple):
+    """A grouped summary of a database's rows, for backends to compute in the database.
+
+    Property values are read as `kind`: 'number' converts numbers, numeric
+    strings and booleans and is empty otherwise; 'text' takes scalars as
+    they are and is empty for missing, null, '' and []. Empty values group
+    under None and are skipped by every aggregate but the row count.
+    """
+    group_by: Optional[str]
+    group_kind: str
+    aggregates: Tuple[RowAggregate, ...]
+    conditions: Tuple[RowCondition, ...] = ()
+
+
+class RowRewrite(NamedTuple):
+    """Property changes to one row from a schema migration (see schema_migration)"""
+    # updated_at of the row as read; a row written since is left alone
+    updated_at: Optional[str]
+    # Values to set and keys to remove; other properties are left alone
+    values: Dict[str, Any]
+    removed: Tuple[str, ...] = ()
+
+
+class Storage(ABC):
+    """Repository interface shared by every storage backend.
+
+    Records are exchanged as plain dicts shaped like the serialized Mongo
+    documents the routes have always worked with: string ids, ISO 8601
+    timestamps and nested lists/dicts for members, content and rows.
+    """
+
+    name = "base"
+    # Whether transaction() is available
+    supports_transactions = False
+
+    # Lifecycle; backends without connections keep these no-ops
+    def connect(self, warm_connections: int = 4) -> None:
+        """Open and warm connection pools"""
+
+    def ping(self) -> bool:
+        """True when the backend is reachable"""
+        return True
+
+    def close(self) -> None:
+        """Release connections"""
+
+    def migrate(self) -> None:
+        """Create indexes/tables and run data migrations (idempotent)"""
+
+    def check_query_plans(self) -> List[str]:
+        """Warnings for hot queries that would scan a whole table or sort in memory"""
+        return []
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """Make the storage calls inside the block, in this context, all-or-nothing.
+
+        Writes become visible when the block exits and are discarded if it
+        raises. Nested blocks join the outer transaction.
+        """
+        raise NotImplementedError(f"The {self.name} storage backend does not support transactions")
+        yield
+
+    # Users
+    @abstractmethod
+    def get_user_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+        """Get user by email"""
+
+    @abstractmethod
+    def get_user_by_id(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Get user by ID"""
+
+    @abstractmethod
+    def get_users_by_ids(self, user_ids: List[str]) -> List[Dict[str, Any]]:
+        """Get the users with these IDs in one query; unknown IDs are skipped"""
+
+    @abstractmethod
+    def create_user(self, user_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Create a new user"""
+
+    @abstractmethod
+    def update_user(self, user_id: str, update_data: Dict[str, Any]) -> bool:
+        """Update user data"""
+
+    # Workspaces
+    @abstractmethod
+    def get_user_workspaces(self, user_id: str) -> List[Dict[str, Any]]:
+        """Get workspaces where user is owner or member"""
+
+    @abstractmethod
+    def get_workspace_by_id(self, workspace_id: str) -> Optional[Dict[str, Any]]:
+        """Get workspace by ID"""
+
+    @abstractmethod
+    def create_workspace(self, workspace_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Create a new workspace"""
+
+    @abstractmethod
+    def update_workspace(self, workspace_id: str, update_data: Dict[str, Any]) -> bool:
+        """Update workspace data (a `members` list replaces the member set)"""
+
+    @abstractmethod
+    def delete_workspace(self, workspace_id: str) -> bool:
+        """Delete workspace"""
+
+    # Pages
+    @abstractmethod
+    def get_workspace_pages(self, workspace_id: str, parent_id: Optional[str] = None,
+                            fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Get non-deleted pages under parent_id (root pages when None).
+
+        With `fields`, records hold only those keys plus 'id', and the
+        backend reads only those columns.
+        """
+
+    @abstractmethod
+    def get_workspace_page_tree(self, workspace_id: str, fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Get every non-deleted page in workspace, at any depth, grouped by parent"""
+
+    # Content blocks carry an `order` key like rows: a `content` list keeps
+    # the keys that follow its order, and blocks are returned by key
+    @abstractmethod
+    def get_page_by_id(self, page_id: str) -> Optional[Dict[str, Any]]:
+        """Get page by ID"""
+
+    @abstractmethod
+    def create_page(self, page_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Create a new page"""
+
+    @abstractmethod
+    def update_page(self, page_id: str, update_data: Dict[str, Any]) -> bool:
+        """Update page data"""
+
+    @abstractmethod
+    def set_page_block_orders(self, page_id: str, orders: Dict[str, Tuple[Optional[str], str]]) -> int:
+        """Set blocks' order keys by block id, each from (expected key, new key): a block
+        whose key is no longer the expected one is left alone. Returns the number set"""
+
+    @abstractmethod
+    def delete_page(self, page_id: str, user_id: str) -> bool:
+        """Soft delete a page"""
+
+    # Databases
+    @abstractmethod
+    def get_workspace_databases(self, workspace_id: str, fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Get non-deleted databases in workspace; `fields` projects as for pages
+        (rows are only loaded when 'rows' is requested)"""
+
+    @abstractmethod
+    def get_database_by_id(self, database_id: str, fields: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        """Get database by ID, including its rows; `fields` projects as for get_workspace_databases"""
+
+    @abstractmethod
+    def create_database(self, database_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Create a new database"""
+
+    @abstractmethod
+    def update_database(self, database_id: str, update_data: Dict[str, Any]) -> bool:
+        """Update database data (a `rows` list replaces all rows)"""
+
+    # A database's `schema_migration` record (see schema_migration) is
+    # written with a compare-and-set on its `lease`, since several workers
+    # may try to carry on with one
+    @abstractmethod
+    def set_database_schema_migration(self, database_id: str, migration: Dict[str, Any],
+                                      expected_lease: Optional[str],
+                                      properties: Optional[Dict[str, Any]] = None) -> bool:
+        """Replace the schema migration record, and the properties with it when
+        given, if the record's lease is still `expected_lease` (None when there
+        is no lease or no record); updated_at changes only with the properties"""
+
+    @abstractmethod
+    def get_migrating_database_ids(self) -> List[str]:
+        """Ids of the databases whose schema migration is running"""
+
+    @abstractmethod
+    def delete_database(self, database_id: str, user_id: str) -> bool:
+        """Soft delete a database"""
+
+    # Database rows
+    @abstractmethod
+    def get_database_rows(self, database_id: str) -> List[Dict[str, Any]]:
+        """Get rows of a database in display order"""
+
+    @abstractmethod
+    def get_database_rows_by_id(self, database_id: str, row_ids: List[str]) -> List[Dict[str, Any]]:
+        """Get the rows of a database with these ids, in any order"""
+
+    @abstractmethod
+    def get_database_rows_batch(self, database_id: str, after_id: Optional[str], limit: int) -> List[Dict[str, Any]]:
+        """Up to `limit` rows by id, after `after_id`; ids never change, so
+        batches walk every row once while rows are added, written and moved"""
+
+    def get_database_rows_page(self, database_id: str, conditions: Tuple[RowCondition, ...],
+                               after: Optional[Tuple[str, str]], limit: int) -> Optional[List[Dict[str, Any]]]:
+        """Up to `limit` rows matching `conditions`, by (order, id), after the
+        (order, id) `after` when given; read in the database, without loading
+        the other rows. None when the backend can't, and the caller pages the
+        rows itself."""
+        return None
+
+    def get_database_rows_in_range(self, database_id: str, key: str,
+                                   start: datetime, end: datetime) -> Optional[List[Dict[str, Any]]]:
+        """Rows whose `key` value overlaps [start, end] (see date_index), by
+        (start of that value, order, id), found through the backend's date
+        index. None when the backend has none, and the caller scans the rows."""
+        return None
+
+    # Rows carry their cached formula values in `computed` (see formulas.cache),
+    # left out of row dicts when empty, and an `order` key (see order_keys):
+    # new rows go after the last one, and a `rows` list keeps the keys that
+    # follow its order. Backends with a date index update it on every write
+    # of properties
+    @abstractmethod
+    def create_database_row(self, database_id: str, row_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Append a row to a database, None if the database does not exist"""
+
+    @abstractmethod
+    def update_database_row(self, database_id: str, row_id: str, properties: Dict[str, Any],
+                            computed: Optional[Dict[str, Any]] = None,
+                            order: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Replace a row's properties and cached formula values (cleared when `computed`
+        is None), and its order key when given, in one write; None if the row does not exist"""
+
+    @abstractmethod
+    def set_database_rows_computed(self, database_id: str, computed: Dict[str, Dict[str, Any]]) -> int:
+        """Replace the cached formula values of rows by row id, leaving properties and
+        updated_at alone; returns the number of rows updated"""
+
+    @abstractmethod
+    def set_database_rows_order(self, database_id: str, orders: Dict[str, Tuple[Optional[str], str]]) -> int:
+        """Set rows' order keys by row id, each from (expected key, new key) as for
+        set_page_block_orders; returns the number set"""
+
+    # Relation values are lists of row ids, kept in step on both sides by
+    # `relations`; rollup values are written by it alone (see relations)
+    @abstractmethod
+    def link_database_rows(self, database_id: str, key: str, row_ids: List[str],
+                           linked_id: str, linked: bool) -> int:
+        """Add `linked_id` to (or, when not `linked`, remove it from) the relation
+        value `key` of rows by row id, atomically per row, a value that isn't a
+        list counting as empty; returns the number of rows found"""
+
+    @abstractmethod
+    def set_database_rows_properties(self, database_id: str, values: Dict[str, Dict[str, Any]],
+                                     computed: Optional[Dict[str, Dict[str, Any]]] = None) -> int:
+        """Set some property values of rows by row id, leaving their other properties
+        alone, and replace their cached formula values when `computed` has them;
+        returns the number of rows updated. The values aren't dates, so date
+        indexes are left as they are"""
+
+    @abstractmethod
+    def rewrite_database_rows(self, database_id: str, rewrites: Dict[str, RowRewrite]) -> int:
+        """Apply RowRewrites by row id, each only if the row's updated_at is
+        still the one read, updating the date index but not updated_at;
+        returns the number of rows rewritten"""
+
+    @abstractmethod
+    def delete_database_row(self, database_id: str, row_id: str) -> bool:
+        """Delete a row"""
+
+    def aggregate_database_rows(self, database_id: str, aggregation: RowAggregation) -> Optional[Dict[str, Any]]:
+        """Compute `aggregation` in the database, without loading rows:
+        ``{'groups': [{'value', 'count', 'aggregates'}], 'total': {'count', 'aggregates'}}``
+        (groups empty without group_by). None when the backend can't, and the
+        caller aggregates the rows itself."""
+        return None
+
+    # Trash
+    @abstractmethod
+    def get_trash_items(self, workspace_ids: List[str]) -> List[Dict[str, Any]]:
+        """Get deleted pages and databases, tagged with `type`"""
+
+    @abstractmethod
+    def restore_item(self, item_id: str, item_type: str) -> bool:
+        """Restore an item from trash"""
+
+    @abstractmethod
+    def permanently_delete_item(self, item_id: str, item_type: str) -> bool:
+        """Permanently delete an item"""
+
+    @abstractmethod
+    def empty_trash(self, workspace_ids: List[str]) -> int:
+        """Empty trash for workspaces"""
+
+    # MFA backup codes
+    @abstractmethod
+    def get_user_backup_codes(self, user_id: str) -> List[Dict[str, Any]]:
+        """Get user's MFA backup codes"""
+
+    @abstractmethod
+    def create_backup_codes(self, user_id: str, codes: List[str]) -> List[Dict[str, Any]]:
+        """Replace user's MFA backup codes"""
+
+    @abstractmethod
+    def verify_backup_code(self, user_id: str, code: str) -> bool:
+        """Verify and mark backup code as used"""
+
+    # Auth attempts
+    @abstractmethod
+    def record_login_attempt(self, ip_address: str, user_email: Optional[str] = None, successful: bool = False) -> Dict[str, Any]:
+        """Record a login attempt"""
+
+    @abstractmethod
+    def get_recent_login_attempts(self, ip_address: str, minutes: int = 30) -> List[Dict[str, Any]]:
+        """Get recent login attempts from IP"""
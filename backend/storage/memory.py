@@ -0,0 +1,494 @@
+import copy
+import threading
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from typing import Optional, List, Dict, Any, Iterator, Tuple
+
+import order_keys
+from .base import RowRewrite, Storage
+
+
+# Tables restored when a transaction fails
+_TABLES = ('users', 'workspaces', 'pages', 'databases', 'backup_codes', 'login_attempts')
+_in_transaction: ContextVar[bool] = ContextVar('memory_transaction', default=False)
+
+
+def _project(record: Dict[str, Any], fields: Optional[List[str]]) -> Dict[str, Any]:
+    """Serialize a record, or only 'id' and `fields` of it"""
+    if fields is None:
+        return _serialize(record)
+    return {key: _serialize(record[key]) for key in ['id', *fields] if key in record}
+
+
+def _serialize(value):
+    """Deep copy a record, rendering datetimes as ISO strings like serialize_doc"""
+    if isinstance(value, dict):
+        return {key: _serialize(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_serialize(item) for item in value]
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _by_order_key(item: Dict[str, Any]):
+    return item.get('order') or '', item.get('id') or ''
+
+
+def _set_orders(items: List[Dict[str, Any]], orders: Dict[str, Tuple[Optional[str], str]]) -> int:
+    """Compare-and-set order keys of items by id, keeping the list sorted by them"""
+    updated = 0
+    for item in items:
+        expected, order = orders.get(item.get('id'), (None, None))
+        if order is not None and item.get('order') == expected:
+            item['order'] = order
+            updated += 1
+    if updated:
+        items.sort(key=_by_order_key)
+    return updated
+
+
+def _set_computed(row: Dict[str, Any], computed: Optional[Dict[str, Any]]):
+    if computed:
+        row['computed'] = copy.deepcopy(computed)
+    else:
+        row.pop('computed', None)
+
+
+class MemoryStorage(Storage):
+    """Process-local storage for tests, benchmarks and single-node demos"""
+
+    name = "memory"
+    supports_transactions = True
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.users: Dict[str, Dict[str, Any]] = {}
+        self.workspaces: Dict[str, Dict[str, Any]] = {}
+        self.pages: Dict[str, Dict[str, Any]] = {}
+        self.databases: Dict[str, Dict[str, Any]] = {}
+        self.backup_codes: Dict[str, List[Dict[str, Any]]] = {}
+        self.login_attempts: List[Dict[str, Any]] = []
+
+    def _insert(self, table: Dict[str, Dict[str, Any]], data: Dict[str, Any]) -> Dict[str, Any]:
+        data['id'] = str(uuid.uuid4())
+        data['created_at'] = datetime.utcnow()
+        with self._lock:
+            table[data['id']] = copy.deepcopy(data)
+        return _serialize(data)
+
+    def _update(self, table: Dict[str, Dict[str, Any]], record_id: str, update_data: Dict[str, Any]) -> bool:
+        update_data['updated_at'] = datetime.utcnow()
+        with self._lock:
+            record = table.get(record_id)
+            if record is None:
+                return False
+            record.update(copy.deepcopy(update_data))
+        return True
+
+    def _soft_delete(self, table: Dict[str, Dict[str, Any]], record_id: str, user_id: str) -> bool:
+        return self._update(table, record_id, {
+            'is_deleted': True,
+            'deleted_at': datetime.utcnow(),
+            'deleted_by': user_id
+        })
+
+    def _trash_table(self, item_type: str) -> Dict[str, Dict[str, Any]]:
+        return self.pages if item_type == 'page' else self.databases
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        # Rollback restores a snapshot; there is no isolation, so a failed
+        # transaction also discards writes other requests made meanwhile
+        if _in_transaction.get():
+            yield
+            return
+        with self._lock:
+            snapshot = {table: copy.deepcopy(getattr(self, table)) for table in _TABLES}
+        token = _in_transaction.set(True)
+        try:
+            yield
+        except BaseException:
+            with self._lock:
+                for table, data in snapshot.items():
+                    setattr(self, table, data)
+            raise
+        finally:
+            _in_transaction.reset(token)
+
+    # Users
+    def get_user_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            user = next((u for u in self.users.values() if u['email'] == email), None)
+            return _serialize(user)
+
+    def get_user_by_id(self, user_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return _serialize(self.users.get(user_id))
+
+    def get_users_by_ids(self, user_ids: List[str]) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [_serialize(self.users[user_id]) for user_id in set(user_ids) if user_id in self.users]
+
+    def create_user(self, user_data: Dict[str, Any]) -> Dict[str, Any]:
+        return self._insert(self.users, user_data)
+
+    def update_user(self, user_id: str, update_data: Dict[str, Any]) -> bool:
+        return self._update(self.users, user_id, update_data)
+
+    # Workspaces
+    def get_user_workspaces(self, user_id: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [
+                _serialize(ws) for ws in self.workspaces.values()
+                if ws['owner_id'] == user_id
+                or any(m.get('user_id') == user_id for m in ws.get('members', []))
+            ]
+
+    def get_workspace_by_id(self, workspace_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return _serialize(self.workspaces.get(workspace_id))
+
+    def create_workspace(self, workspace_data: Dict[str, Any]) -> Dict[str, Any]:
+        return self._insert(self.workspaces, workspace_data)
+
+    def update_workspace(self, workspace_id: str, update_data: Dict[str, Any]) -> bool:
+        return self._update(self.workspaces, workspace_id, update_data)
+
+    def delete_workspace(self, workspace_id: str) -> bool:
+        with self._lock:
+            return self.workspaces.pop(workspace_id, None) is not None
+
+    # Pages
+    def get_workspace_pages(self, workspace_id: str, parent_id: Optional[str] = None,
+                            fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [
+                _project(page, fields) for page in self.pages.values()
+                if page['workspace_id'] == workspace_id
+                and not page.get('is_deleted', False)
+                and page.get('parent_id') == (parent_id or None)
+            ]
+
+    def get_workspace_page_tree(self, workspace_id: str, fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            pages = [
+                page for page in self.pages.values()
+                if page['workspace_id'] == workspace_id and not page.get('is_deleted', False)
+            ]
+            # Stable sort keeps creation order within each parent
+            pages.sort(key=lambda page: page.get('parent_id') or '')
+            return [_project(page, fields) for page in pages]
+
+    def get_page_by_id(self, page_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return _serialize(self.pages.get(page_id))
+
+    def create_page(self, page_data: Dict[str, Any]) -> Dict[str, Any]:
+        page_data['content'] = order_keys.assign_keys(page_data.get('content') or [])
+        return self._insert(self.pages, page_data)
+
+    def update_page(self, page_id: str, update_data: Dict[str, Any]) -> bool:
+        if update_data.get('content') is not None:
+            update_data['content'] = order_keys.assign_keys(update_data['content'])
+        return self._update(self.pages, page_id, update_data)
+
+    def set_page_block_orders(self, page_id: str, orders: Dict[str, Tuple[Optional[str], str]]) -> int:
+        with self._lock:
+            page = self.pages.get(page_id)
+            if page is None:
+                return 0
+            updated = _set_orders(page.setdefault('content', []), orders)
+            if updated:
+                page['updated_at'] = datetime.utcnow()
+            return updated
+
+    def delete_page(self, page_id: str, user_id: str) -> bool:
+        return self._soft_delete(self.pages, page_id, user_id)
+
+    # Databases
+    def get_workspace_databases(self, workspace_id: str, fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [
+                _project(database, fields) for database in self.databases.values()
+                if database['workspace_id'] == workspace_id
+                and not database.get('is_deleted', False)
+            ]
+
+    def get_database_by_id(self, database_id: str, fields: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            database = self.databases.get(database_id)
+            return _project(database, fields) if database is not None else None
+
+    def create_database(self, database_data: Dict[str, Any]) -> Dict[str, Any]:
+        database_data['rows'] = order_keys.assign_keys(database_data.get('rows') or [])
+        return self._insert(self.databases, database_data)
+
+    def update_database(self, database_id: str, update_data: Dict[str, Any]) -> bool:
+        if update_data.get('rows') is not None:
+            update_data['rows'] = order_keys.assign_keys(update_data['rows'])
+        return self._update(self.databases, database_id, update_data)
+
+    def set_database_schema_migration(self, database_id: str, migration: Dict[str, Any],
+                                      expected_lease: Optional[str],
+                                      properties: Optional[Dict[str, Any]] = None) -> bool:
+        with self._lock:
+            database = self.databases.get(database_id)
+            if database is None or (database.get('schema_migration') or {}).get('lease') != expected_lease:
+                return False
+            database['schema_migration'] = copy.deepcopy(migration)
+            if properties is not None:
+                database['properties'] = copy.deepcopy(properties)
+                database['updated_at'] = datetime.utcnow()
+            return True
+
+    def get_migrating_database_ids(self) -> List[str]:
+        with self._lock:
+            return [
+                database_id for database_id, database in self.databases.items()
+                if (database.get('schema_migration') or {}).get('status') == 'running'
+            ]
+
+    def delete_database(self, database_id: str, user_id: str) -> bool:
+        return self._soft_delete(self.databases, database_id, user_id)
+
+    # Database rows
+    def get_database_rows(self, database_id: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            database = self.databases.get(database_id)
+            return _serialize(database.get('rows', [])) if database else []
+
+    def get_database_rows_by_id(self, database_id: str, row_ids: List[str]) -> List[Dict[str, Any]]:
+        with self._lock:
+            database = self.databases.get(database_id)
+            rows = database.get('rows', []) if database else []
+            return [_serialize(row) for row in rows if row.get('id') in row_ids]
+
+    def get_database_rows_batch(self, database_id: str, after_id: Optional[str], limit: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            database = self.databases.get(database_id)
+            rows = sorted(
+                (row for row in (database or {}).get('rows', []) if after_id is None or row['id'] > after_id),
+                key=lambda row: row['id']
+            )
+            return _serialize(rows[:limit])
+
+    def create_database_row(self, database_id: str, row_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        row = {
+            'id': row_data.get('id') or str(uuid.uuid4()),
+            'properties': copy.deepcopy(row_data.get('properties', {})),
+            'order': row_data.get('order'),
+            'created_at': datetime.utcnow().isoformat(),
+            'updated_at': None
+        }
+        if row_data.get('computed'):
+            row['computed'] = copy.deepcopy(row_data['computed'])
+        with self._lock:
+            database = self.databases.get(database_id)
+            if database is None:
+                return None
+            if not order_keys.is_valid(row_data.get('order')):
+                last = max((r['order'] for r in database.get('rows', []) if r.get('order')), default=None)
+                row['order'] = order_keys.key_between(last, None)
+            rows = database.setdefault('rows', [])
+            rows.append(row)
+            if len(rows) > 1 and _by_order_key(rows[-2]) > _by_order_key(row):
+                rows.sort(key=_by_order_key)
+            database['updated_at'] = datetime.utcnow()
+            return _serialize(row)
+
+    def update_database_row(self, database_id: str, row_id: str, properties: Dict[str, Any],
+                            computed: Optional[Dict[str, Any]] = None,
+                            order: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            database = self.databases.get(database_id)
+            if database is None:
+                return None
+            row = next((r for r in database.get('rows', []) if r.get('id') == row_id), None)
+            if row is None:
+                return None
+            row['properties'] = copy.deepcopy(properties)
+            _set_computed(row, computed)
+            if order is not None:
+                row['order'] = order
+                database['rows'].sort(key=_by_order_key)
+            row['updated_at'] = datetime.utcnow().isoformat()
+            database['updated_at'] = datetime.utcnow()
+            return _serialize(row)
+
+    def set_database_rows_computed(self, database_id: str, computed: Dict[str, Dict[str, Any]]) -> int:
+        with self._lock:
+            database = self.databases.get(database_id)
+            if database is None:
+                return 0
+            updated = 0
+            for row in database.get('rows', []):
+                if row.get('id') in computed:
+                    _set_computed(row, computed[row['id']])
+                    updated += 1
+            return updated
+
+    def set_database_rows_order(self, database_id: str, orders: Dict[str, Tuple[Optional[str], str]]) -> int:
+        with self._lock:
+            database = self.databases.get(database_id)
+            if database is None:
+                return 0
+            return _set_orders(database.setdefault('rows', []), orders)
+
+    def link_database_rows(self, database_id: str, key: str, row_ids: List[str],
+                           linked_id: str, linked: bool) -> int:
+        with self._lock:
+            database = self.databases.get(database_id)
+            rows = [row for row in (database or {}).get('rows', []) if row.get('id') in row_ids]
+            for row in rows:
+                value = row['properties'].get(key)
+                value = list(value) if isinstance(value, list) else []
+                if not linked:
+                    value = [item for item in value if item != linked_id]
+                elif linked_id not in value:
+                    value.append(linked_id)
+                row['properties'][key] = value
+            return len(rows)
+
+    def set_database_rows_properties(self, database_id: str, values: Dict[str, Dict[str, Any]],
+                                     computed: Optional[Dict[str, Dict[str, Any]]] = None) -> int:
+        with self._lock:
+            database = self.databases.get(database_id)
+            if database is None:
+                return 0
+            updated = 0
+            for row in database.get('rows', []):
+                if row.get('id') in values:
+                    row['properties'].update(copy.deepcopy(values[row['id']]))
+                    if computed is not None and row['id'] in computed:
+                        _set_computed(row, computed[row['id']])
+                    updated += 1
+            return updated
+
+    def rewrite_database_rows(self, database_id: str, rewrites: Dict[str, RowRewrite]) -> int:
+        with self._lock:
+            database = self.databases.get(database_id)
+            if database is None:
+                return 0
+            rewritten = 0
+            for row in database.get('rows', []):
+                rewrite = rewrites.get(row.get('id'))
+                if rewrite is None or row.get('updated_at') != rewrite.updated_at:
+                    continue
+                for key in rewrite.removed:
+                    row['properties'].pop(key, None)
+                row['properties'].update(copy.deepcopy(rewrite.values))
+                rewritten += 1
+            return rewritten
+
+    def delete_database_row(self, database_id: str, row_id: str) -> bool:
+        with self._lock:
+            database = self.databases.get(database_id)
+            if database is None:
+                return False
+            rows = database.get('rows', [])
+            remaining = [r for r in rows if r.get('id') != row_id]
+            if len(remaining) == len(rows):
+                return False
+            database['rows'] = remaining
+            database['updated_at'] = datetime.utcnow()
+            return True
+
+    # Trash
+    def get_trash_items(self, workspace_ids: List[str]) -> List[Dict[str, Any]]:
+        trash_items = []
+        with self._lock:
+            for item_type, table in (('page', self.pages), ('database', self.databases)):
+                for item in table.values():
+                    if item['workspace_id'] in workspace_ids and item.get('is_deleted', False):
+                        item_data = _serialize(item)
+                        item_data['type'] = item_type
+                        trash_items.append(item_data)
+        return trash_items
+
+    def restore_item(self, item_id: str, item_type: str) -> bool:
+        table = self._trash_table(item_type)
+        with self._lock:
+            item = table.get(item_id)
+            if item is None or not item.get('is_deleted', False):
+                return False
+            return self._update(table, item_id, {
+                'is_deleted': False,
+                'deleted_at': None,
+                'deleted_by': None
+            })
+
+    def permanently_delete_item(self, item_id: str, item_type: str) -> bool:
+        table = self._trash_table(item_type)
+        with self._lock:
+            item = table.get(item_id)
+            if item is None or not item.get('is_deleted', False):
+                return False
+            del table[item_id]
+            return True
+
+    def empty_trash(self, workspace_ids: List[str]) -> int:
+        deleted_count = 0
+        with self._lock:
+            for table in (self.pages, self.databases):
+                doomed = [
+                    item_id for item_id, item in table.items()
+                    if item['workspace_id'] in workspace_ids and item.get('is_deleted', False)
+                ]
+                for item_id in doomed:
+                    del table[item_id]
+                deleted_count += len(doomed)
+        return deleted_count
+
+    # MFA backup codes
+    def get_user_backup_codes(self, user_id: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            return _serialize(self.backup_codes.get(user_id, []))
+
+    def create_backup_codes(self, user_id: str, codes: List[str]) -> List[Dict[str, Any]]:
+        backup_codes = [
+            {
+                'id': str(uuid.uuid4()),
+                'user_id': user_id,
+                'code': code,
+                'used': False,
+                'created_at': datetime.utcnow()
+            }
+            for code in codes
+        ]
+        with self._lock:
+            self.backup_codes[user_id] = backup_codes
+        return _serialize(backup_codes)
+
+    def verify_backup_code(self, user_id: str, code: str) -> bool:
+        with self._lock:
+            for backup_code in self.backup_codes.get(user_id, []):
+                if backup_code['code'] == code and not backup_code['used']:
+                    backup_code['used'] = True
+                    backup_code['used_at'] = datetime.utcnow()
+                    return True
+        return False
+
+    # Auth attempts
+    def record_login_attempt(self, ip_address: str, user_email: Optional[str] = None, successful: bool = False) -> Dict[str, Any]:
+        attempt_data = {
+            'id': str(uuid.uuid4()),
+            'ip_address': ip_address,
+            'user_email': user_email,
+            'successful': successful,
+            'attempted_at': datetime.utcnow(),
+            'created_at': datetime.utcnow()
+        }
+        with self._lock:
+            self.login_attempts.append(attempt_data)
+        return _serialize(attempt_data)
+
+    def get_recent_login_attempts(self, ip_address: str, minutes: int = 30) -> List[Dict[str, Any]]:
+        cutoff_time = datetime.utcnow() - timedelta(minutes=minutes)
+        with self._lock:
+            return [
+                _serialize(attempt) for attempt in self.login_attempts
+                if attempt['ip_address'] == ip_address and attempt['attempted_at'] >= cutoff_time
+            ]
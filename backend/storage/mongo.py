@@ -0,0 +1,185 @@
+from datetime import datetime
+from typing import Optional, List, Dict, Any, Tuple
+
+import database
+from .base import RowAggregation, RowCondition, RowRewrite, Storage
+
+
+class MongoStorage(Storage):
+    """Storage backed by the MongoDB helpers in database.py"""
+
+    name = "mongo"
+
+    # Lifecycle
+    def connect(self, warm_connections: int = 4) -> None:
+        database.connect(warm_connections)
+
+    def ping(self) -> bool:
+        return database.ping()
+
+    def close(self) -> None:
+        database.close()
+
+    def migrate(self) -> None:
+        database.migrate()
+
+    def check_query_plans(self) -> List[str]:
+        return database.check_query_plans()
+
+    # Users
+    def get_user_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+        return database.get_user_by_email(email)
+
+    def get_user_by_id(self, user_id: str) -> Optional[Dict[str, Any]]:
+        return database.get_user_by_id(user_id)
+
+    def get_users_by_ids(self, user_ids: List[str]) -> List[Dict[str, Any]]:
+        return database.get_users_by_ids(user_ids)
+
+    def create_user(self, user_data: Dict[str, Any]) -> Dict[str, Any]:
+        return database.create_user(user_data)
+
+    def update_user(self, user_id: str, update_data: Dict[str, Any]) -> bool:
+        return database.update_user(user_id, update_data)
+
+    # Workspaces
+    def get_user_workspaces(self, user_id: str) -> List[Dict[str, Any]]:
+        return database.get_user_workspaces(user_id)
+
+    def get_workspace_by_id(self, workspace_id: str) -> Optional[Dict[str, Any]]:
+        return database.get_workspace_by_id(workspace_id)
+
+    def create_workspace(self, workspace_data: Dict[str, Any]) -> Dict[str, Any]:
+        return database.create_workspace(workspace_data)
+
+    def update_workspace(self, workspace_id: str, update_data: Dict[str, Any]) -> bool:
+        return database.update_workspace(workspace_id, update_data)
+
+    def delete_workspace(self, workspace_id: str) -> bool:
+        return database.delete_workspace(workspace_id)
+
+    # Pages
+    def get_workspace_pages(self, workspace_id: str, parent_id: Optional[str] = None,
+                            fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        return database.get_workspace_pages(workspace_id, parent_id, fields)
+
+    def get_workspace_page_tree(self, workspace_id: str, fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        return database.get_workspace_page_tree(workspace_id, fields)
+
+    def get_page_by_id(self, page_id: str) -> Optional[Dict[str, Any]]:
+        return database.get_page_by_id(page_id)
+
+    def create_page(self, page_data: Dict[str, Any]) -> Dict[str, Any]:
+        return database.create_page(page_data)
+
+    def update_page(self, page_id: str, update_data: Dict[str, Any]) -> bool:
+        return database.update_page(page_id, update_data)
+
+    def set_page_block_orders(self, page_id: str, orders: Dict[str, Tuple[Optional[str], str]]) -> int:
+        return database.set_page_block_orders(page_id, orders)
+
+    def delete_page(self, page_id: str, user_id: str) -> bool:
+        return database.delete_page(page_id, user_id)
+
+    # Databases
+    def get_workspace_databases(self, workspace_id: str, fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        return database.get_workspace_databases(workspace_id, fields)
+
+    def get_database_by_id(self, database_id: str, fields: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        return database.get_database_by_id(database_id, fields)
+
+    def create_database(self, database_data: Dict[str, Any]) -> Dict[str, Any]:
+        return database.create_database(database_data)
+
+    def update_database(self, database_id: str, update_data: Dict[str, Any]) -> bool:
+        return database.update_database(database_id, update_data)
+
+    def set_database_schema_migration(self, database_id: str, migration: Dict[str, Any],
+                                      expected_lease: Optional[str],
+                                      properties: Optional[Dict[str, Any]] = None) -> bool:
+        return database.set_database_schema_migration(database_id, migration, expected_lease, properties)
+
+    def get_migrating_database_ids(self) -> List[str]:
+        return database.get_migrating_database_ids()
+
+    def delete_database(self, database_id: str, user_id: str) -> bool:
+        return database.delete_database(database_id, user_id)
+
+    # Database rows
+    def get_database_rows(self, database_id: str) -> List[Dict[str, Any]]:
+        return database.get_database_rows(database_id)
+
+    def get_database_rows_by_id(self, database_id: str, row_ids: List[str]) -> List[Dict[str, Any]]:
+        return database.get_database_rows_by_id(database_id, row_ids)
+
+    def get_database_rows_batch(self, database_id: str, after_id: Optional[str], limit: int) -> List[Dict[str, Any]]:
+        return database.get_database_rows_batch(database_id, after_id, limit)
+
+    def get_database_rows_page(self, database_id: str, conditions: Tuple[RowCondition, ...],
+                               after: Optional[Tuple[str, str]], limit: int) -> Optional[List[Dict[str, Any]]]:
+        return database.get_database_rows_page(database_id, conditions, after, limit)
+
+    def get_database_rows_in_range(self, database_id: str, key: str,
+                                   start: datetime, end: datetime) -> Optional[List[Dict[str, Any]]]:
+        return database.get_database_rows_in_range(database_id, key, start, end)
+
+    def create_database_row(self, database_id: str, row_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        return database.create_database_row(database_id, row_data)
+
+    def update_database_row(self, database_id: str, row_id: str, properties: Dict[str, Any],
+                            computed: Optional[Dict[str, Any]] = None,
+                            order: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        return database.update_database_row(database_id, row_id, properties, computed, order)
+
+    def set_database_rows_computed(self, database_id: str, computed: Dict[str, Dict[str, Any]]) -> int:
+        return database.set_database_rows_computed(database_id, computed)
+
+    def set_database_rows_order(self, database_id: str, orders: Dict[str, Tuple[Optional[str], str]]) -> int:
+        return database.set_database_rows_order(database_id, orders)
+
+    def link_database_rows(self, database_id: str, key: str, row_ids: List[str],
+                           linked_id: str, linked: bool) -> int:
+        return database.link_database_rows(database_id, key, row_ids, linked_id, linked)
+
+    def set_database_rows_properties(self, database_id: str, values: Dict[str, Dict[str, Any]],
+                                     computed: Optional[Dict[str, Dict[str, Any]]] = None) -> int:
+        return database.set_database_rows_properties(database_id, values, computed)
+
+    def rewrite_database_rows(self, database_id: str, rewrites: Dict[str, RowRewrite]) -> int:
+        return database.rewrite_database_rows(database_id, rewrites)
+
+    def delete_database_row(self, database_id: str, row_id: str) -> bool:
+        return database.delete_database_row(database_id, row_id)
+
+    def aggregate_database_rows(self, database_id: str, aggregation: RowAggregation) -> Optional[Dict[str, Any]]:
+        return database.aggregate_database_rows(database_id, aggregation)
+
+    # Trash
+    def get_trash_items(self, workspace_ids: List[str]) -> List[Dict[str, Any]]:
+        return database.get_trash_items(workspace_ids)
+
+    def restore_item(self, item_id: str, item_type: str) -> bool:
+        return database.restore_item(item_id, item_type)
+
+    def permanently_delete_item(self, item_id: str, item_type: str) -> bool:
+        return database.permanently_delete_item(item_id, item_type)
+
+    def empty_trash(self, workspace_ids: List[str]) -> int:
+        return database.empty_trash(workspace_ids)
+
+    # MFA backup codes
+    def get_user_backup_codes(self, user_id: str) -> List[Dict[str, Any]]:
+        return database.get_user_backup_codes(user_id)
+
+    def create_backup_codes(self, user_id: str, codes: List[str]) -> List[Dict[str, Any]]:
+        return database.create_backup_codes(user_id, codes)
+
+    def verify_backup_code(self, user_id: str, code: str) -> bool:
+        return database.verify_backup_code(user_id, code)
+
+    # Auth attempts
+    def record_login_attempt(self, ip_address: str, user_email: Optional[str] = None, successful: bool = False) -> Dict[str, Any]:
+        return database.record_login_attempt(ip_address, user_email, successful)
+
+    def get_recent_login_attempts(self, ip_address: str, minutes: int = 30) -> List[Dict[str, Any]]:
+        return database.get_recent_login_attempts(ip_address, minutes)
@@ -0,0 +1,1138 @@
+import json
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from typing import Optional, List, Dict, Any, Callable, Iterable, Iterator, Tuple
+
+from sqlalchemy import Float, and_, bindparam, case, cast, func, or_, select, delete, insert, update
+from sqlalchemy.dialects.postgresql import JSONB
+
+import database_postgres
+import date_index
+import order_keys
+from database_postgres import (
+    SessionLocal, User, MFABackupCode, LoginAttempt, Workspace, Page,
+    Database, DatabaseRow, DatabaseRowDate, workspace_members, page_permissions
+)
+from .base import RowAggregate, RowAggregation, RowCondition, RowRewrite, Storage
+
+
+def _uuid(value) -> Optional[uuid.UUID]:
+    """Parse an id, returning None for anything that is not a UUID"""
+    if value is None or isinstance(value, uuid.UUID):
+        return value
+    try:
+        return uuid.UUID(str(value))
+    except ValueError:
+        return None
+
+
+def _str(value) -> Optional[str]:
+    return str(value) if value is not None else None
+
+
+def _iso(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+def _loads(value: Optional[str], default):
+    return json.loads(value) if value else default
+
+
+# Fields stored as JSON text and as UUID columns, per model
+JSON_FIELDS = {
+    User: (),
+    Workspace: ('settings',),
+    Page: ('content',),
+    Database: ('properties', 'views', 'schema_migration'),
+}
+UUID_FIELDS = {
+    User: (),
+    Workspace: ('owner_id',),
+    Page: ('workspace_id', 'parent_id', 'created_by', 'deleted_by'),
+    Database: ('workspace_id', 'created_by', 'deleted_by'),
+}
+
+
+# Empty value of each JSON column, matching the *_dict helpers below
+JSON_EMPTY = {'settings': dict, 'content': list, 'properties': dict, 'views': list, 'schema_migration': lambda: None}
+
+
+def _decode(model, key: str, value):
+    """A column value as it appears in record dicts"""
+    if key in JSON_FIELDS[model]:
+        return _loads(value, JSON_EMPTY[key]())
+    if key == 'id' or key in UUID_FIELDS[model]:
+        return _str(value)
+    if isinstance(value, datetime):
+        return _iso(value)
+    if key == 'is_deleted':
+        return bool(value)
+    return value
+
+
+def _apply(record, data: Dict[str, Any]):
+    """Copy dict fields onto an ORM record, encoding JSON and UUID columns"""
+    model = type(record)
+    columns = model.__table__.columns.keys()
+    for key, value in data.items():
+        if key in ('id', 'created_at') or key not in columns:
+            continue
+        if key in JSON_FIELDS[model]:
+            value = json.dumps(value) if value is not None else None
+        elif key in UUID_FIELDS[model]:
+            value = _uuid(value)
+        setattr(record, key, value)
+
+
+def _user_dict(user: User) -> Dict[str, Any]:
+    return {
+        'id': str(user.id),
+        'name': user.name,
+        'email': user.email,
+        'hashed_password': user.hashed_password,
+        'avatar': user.avatar,
+        'color': user.color,
+        'is_active': user.is_active,
+        'is_verified': user.is_verified,
+        'mfa_enabled': user.mfa_enabled,
+        'created_at': _iso(user.created_at),
+        'updated_at': _iso(user.updated_at)
+    }
+
+
+def _workspace_dict(workspace: Workspace, members: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {
+        'id': str(workspace.id),
+        'name': workspace.name,
+        'icon': workspace.icon,
+        'description': workspace.description,
+        'owner_id': str(workspace.owner_id),
+        'members': members,
+        'settings': _loads(workspace.settings, {}),
+        'created_at': _iso(workspace.created_at),
+        'updated_at': _iso(workspace.updated_at)
+    }
+
+
+def _page_dict(page: Page, permissions: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {
+        'id': str(page.id),
+        'title': page.title,
+        'icon': page.icon,
+        'content': _loads(page.content, []),
+        'workspace_id': str(page.workspace_id),
+        'parent_id': _str(page.parent_id),
+        'created_by': str(page.created_by),
+        'permissions': permissions,
+        'is_deleted': bool(page.is_deleted),
+        'deleted_at': _iso(page.deleted_at),
+        'deleted_by': _str(page.deleted_by),
+        'created_at': _iso(page.created_at),
+        'updated_at': _iso(page.updated_at)
+    }
+
+
+def _database_dict(database: Database, rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {
+        'id': str(database.id),
+        'name': database.name,
+        'workspace_id': str(database.workspace_id),
+        'created_by': str(database.created_by),
+        'properties': _loads(database.properties, {}),
+        'views': _loads(database.views, []),
+        'schema_migration': _loads(database.schema_migration, None),
+        'rows': rows,
+        'is_deleted': bool(database.is_deleted),
+        'deleted_at': _iso(database.deleted_at),
+        'deleted_by': _str(database.deleted_by),
+        'created_at': _iso(database.created_at),
+        'updated_at': _iso(database.updated_at)
+    }
+
+
+def _row_dict(row: DatabaseRow) -> Dict[str, Any]:
+    data = {
+        'id': str(row.id),
+        'properties': _loads(row.properties, {}),
+        'order': row.order,
+        'created_at': _iso(row.created_at),
+        'updated_at': _iso(row.updated_at)
+    }
+    if row.computed:
+        data['computed'] = _loads(row.computed, {})
+    return data
+
+
+def _row_dates(row: DatabaseRow, properties: Dict[str, Any]) -> List[DatabaseRowDate]:
+    return [
+        DatabaseRowDate(row_id=row.id, database_id=row.database_id, **entry)
+        for entry in date_index.entries(properties)
+    ]
+
+
+def _computed_json(computed: Optional[Dict[str, Any]]) -> Optional[str]:
+    return json.dumps(computed) if computed else None
+
+
+# Strings float() reads as numbers, as a PostgreSQL regular expression
+NUMERIC_TEXT = r'^\s*[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?\s*$'
+# Dialects _PropertyValues writes SQL for; SQLite is the development database
+AGGREGATION_DIALECTS = ('postgresql', 'sqlite')
+
+
+class _PropertyValues:
+    """SQL reading row properties out of the JSON text column as RowAggregation kinds"""
+
+    def __init__(self, dialect: str):
+        self.dialect = dialect
+
+    def value(self, key: str, kind: str):
+        """The property as a number or text, NULL when empty"""
+        column = DatabaseRow.__table__.c.properties
+        if self.dialect == 'postgresql':
+            document = cast(column, JSONB)
+            json_type = func.jsonb_typeof(document.op('->')(key))
+            text = document.op('->>')(key)
+            if kind == 'number':
+                return case(
+                    (json_type == 'number', cast(text, Float)),
+                    (json_type == 'boolean', case((text == 'true', 1.0), else_=0.0)),
+                    (and_(json_type == 'string', text.op('~')(NUMERIC_TEXT)), cast(func.trim(text), Float)),
+                )
+            return case(
+                (json_type == 'string', func.nullif(text, '')),
+                (json_type.in_(('number', 'boolean')), text),
+            )
+        path = f'$."{key}"'
+        json_type = func.json_type(column, path)
+        value = func.json_extract(column, path)
+        if kind == 'number':
+            trimmed = func.trim(value)
+            return case(
+                (json_type.in_(('integer', 'real')), cast(value, Float)),
+                (json_type == 'true', 1.0),
+                (json_type == 'false', 0.0),
+                (and_(json_type == 'text', trimmed != '', trimmed.op('NOT GLOB')('*[^0-9.eE+-]*')), cast(trimmed, Float)),
+            )
+        return case(
+            (json_type == 'text', func.nullif(value, '')),
+            (json_type.in_(('integer', 'real')), value),
+            (json_type == 'true', 'true'),
+            (json_type == 'false', 'false'),
+        )
+
+    def condition(self, condition: RowCondition):
+        value = self.value(condition.key, condition.kind)
+        if condition.op == 'empty':
+            return value.is_(None)
+        if condition.op == 'not_empty':
+            return value.is_not(None)
+        if condition.op == 'in':
+            return value.in_(condition.value)
+        if condition.op == 'not_in':
+            return or_(value.is_(None), value.not_in(condition.value))
+        if condition.op == 'ne':
+            return or_(value.is_(None), value != condition.value)
+        return {
+            'eq': value.__eq__, 'gt': value.__gt__, 'gte': value.__ge__, 'lt': value.__lt__, 'lte': value.__le__,
+        }[condition.op](condition.value)
+
+
+def _aggregate(aggregate: RowAggregate, column):
+    if aggregate.op == 'count':
+        return func.count() if column is None else func.count(column)
+    if aggregate.op == 'distinct':
+        return func.count(column.distinct())
+    if aggregate.op == 'sum':
+        return func.coalesce(func.sum(column), 0)
+    return {'avg': func.avg, 'min': func.min, 'max': func.max}[aggregate.op](column)
+
+
+def _summary(aggregates, row) -> Dict[str, Any]:
+    count, *values = row
+    return {
+        'count': count,
+        'aggregates': {
+            aggregate.name: float(value) if value is not None else None
+            for aggregate, value in zip(aggregates, values)
+        }
+    }
+
+
+class _TransactionSession:
+    """The session of an open transaction, handed to storage methods in its place.
+
+    Methods use their session as a context manager and commit at the end;
+    inside a transaction those commits only flush, and leaving the block
+    must not close the shared session.
+    """
+
+    def __init__(self, session):
+        self._session = session
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def commit(self):
+        self._session.flush()
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+
+_transaction_session: ContextVar[Optional[_TransactionSession]] = ContextVar('postgres_transaction', default=None)
+
+
+class PostgresStorage(Storage):
+    """Storage backed by the SQLAlchemy models in database_postgres.py"""
+
+    name = "postgres"
+    supports_transactions = True
+
+    def __init__(self, session_factory=SessionLocal):
+        # Builds the engine object only; no connection is made until connect() or first query
+        database_postgres.get_engine()
+        self.session_factory = session_factory
+
+    # Lifecycle
+    def connect(self, warm_connections: int = 4) -> None:
+        database_postgres.connect(warm_connections)
+
+    def ping(self) -> bool:
+        return database_postgres.ping()
+
+    def close(self) -> None:
+        database_postgres.close()
+
+    def migrate(self) -> None:
+        database_postgres.run_migrations()
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        if _transaction_session.get() is not None:
+            yield
+            return
+        with self.session_factory() as session:
+            token = _transaction_session.set(_TransactionSession(session))
+            try:
+                yield
+                session.commit()
+            except BaseException:
+                session.rollback()
+                raise
+            finally:
+                _transaction_session.reset(token)
+
+    def _session(self):
+        """A new session, or the open transaction's"""
+        return _transaction_session.get() or self.session_factory()
+
+    # Association helpers
+    def _members(self, session, workspace_ids: Iterable[uuid.UUID]) -> Dict[str, List[Dict[str, Any]]]:
+        members: Dict[str, List[Dict[str, Any]]] = {}
+        rows = session.execute(
+            select(workspace_members).where(workspace_members.c.workspace_id.in_(list(workspace_ids)))
+        )
+        for row in rows:
+            members.setdefault(str(row.workspace_id), []).append(
+                {'user_id': str(row.user_id), 'role': row.role}
+            )
+        return members
+
+    def _set_members(self, session, workspace_id: uuid.UUID, members: List[Dict[str, Any]]):
+        session.execute(delete(workspace_members).where(workspace_members.c.workspace_id == workspace_id))
+        values = [
+            {'workspace_id': workspace_id, 'user_id': _uuid(m.get('user_id')), 'role': m.get('role', 'member')}
+            for m in members if _uuid(m.get('user_id'))
+        ]
+        if values:
+            session.execute(insert(workspace_members), values)
+
+    def _permissions(self, session, page_ids: Iterable[uuid.UUID]) -> Dict[str, List[Dict[str, Any]]]:
+        permissions: Dict[str, List[Dict[str, Any]]] = {}
+        rows = session.execute(
+            select(page_permissions).where(page_permissions.c.page_id.in_(list(page_ids)))
+        )
+        for row in rows:
+            permissions.setdefault(str(row.page_id), []).append(
+                {'user_id': str(row.user_id), 'permission': row.permission}
+            )
+        return permissions
+
+    def _set_permissions(self, session, page_id: uuid.UUID, permissions: List[Dict[str, Any]]):
+        session.execute(delete(page_permissions).where(page_permissions.c.page_id == page_id))
+        values = [
+            {'page_id': page_id, 'user_id': _uuid(p.get('user_id')), 'permission': p.get('permission', 'viewer')}
+            for p in permissions if _uuid(p.get('user_id'))
+        ]
+        if values:
+            session.execute(insert(page_permissions), values)
+
+    def _rows(self, session, database_ids: Iterable[uuid.UUID]) -> Dict[str, List[Dict[str, Any]]]:
+        rows: Dict[str, List[Dict[str, Any]]] = {}
+        query = session.query(DatabaseRow).filter(
+            DatabaseRow.database_id.in_(list(database_ids))
+        ).order_by(DatabaseRow.order, DatabaseRow.id)
+        for row in query:
+            rows.setdefault(str(row.database_id), []).append(_row_dict(row))
+        return rows
+
+    def _set_rows(self, session, database_id: uuid.UUID, rows: List[Dict[str, Any]]):
+        session.query(DatabaseRowDate).filter(DatabaseRowDate.database_id == database_id).delete()
+        session.query(DatabaseRow).filter(DatabaseRow.database_id == database_id).delete()
+        for row in order_keys.assign_keys(rows):
+            record = DatabaseRow(
+                id=_uuid(row.get('id')) or uuid.uuid4(),
+                database_id=database_id,
+                properties=json.dumps(row.get('properties', {})),
+                computed=_computed_json(row.get('computed')),
+                order=row['order']
+            )
+            session.add(record)
+            session.add_all(_row_dates(record, row.get('properties')))
+
+    def _pages_with_permissions(self, session, pages: List[Page]) -> List[Dict[str, Any]]:
+        permissions = self._permissions(session, [page.id for page in pages])
+        return [_page_dict(page, permissions.get(str(page.id), [])) for page in pages]
+
+    def _databases_with_rows(self, session, databases: List[Database]) -> List[Dict[str, Any]]:
+        rows = self._rows(session, [database.id for database in databases])
+        return [_database_dict(database, rows.get(str(database.id), [])) for database in databases]
+
+    def _attach_permissions(self, session, pages: List[Dict[str, Any]]):
+        permissions = self._permissions(session, [_uuid(page['id']) for page in pages])
+        for page in pages:
+            page['permissions'] = permissions.get(page['id'], [])
+
+    def _select_fields(self, session, model, fields: List[str], conditions, *order_by) -> List[Dict[str, Any]]:
+        """Records with only 'id' and the requested columns, read with a narrow SELECT"""
+        table_columns = model.__table__.columns
+        names = ['id'] + [field for field in fields if field != 'id' and field in table_columns]
+        result = session.execute(
+            select(*[table_columns[name] for name in names]).where(*conditions).order_by(*order_by)
+        )
+        return [
+            {name: _decode(model, name, value) for name, value in zip(names, row)}
+            for row in result
+        ]
+
+    # Users
+    def get_user_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+        with self._session() as session:
+            user = session.query(User).filter(User.email == email).first()
+            return _user_dict(user) if user else None
+
+    def get_user_by_id(self, user_id: str) -> Optional[Dict[str, Any]]:
+        if not _uuid(user_id):
+            return None
+        with self._session() as session:
+            user = session.get(User, _uuid(user_id))
+            return _user_dict(user) if user else None
+
+    def get_users_by_ids(self, user_ids: List[str]) -> List[Dict[str, Any]]:
+        ids = list({_uuid(user_id) for user_id in user_ids} - {None})
+        if not ids:
+            return []
+        with self._session() as session:
+            return [_user_dict(user) for user in session.query(User).filter(User.id.in_(ids))]
+
+    def create_user(self, user_data: Dict[str, Any]) -> Dict[str, Any]:
+        with self._session() as session:
+            user = User(id=uuid.uuid4())
+            _apply(user, user_data)
+            session.add(user)
+            session.commit()
+            return _user_dict(user)
+
+    def update_user(self, user_id: str, update_data: Dict[str, Any]) -> bool:
+        if not _uuid(user_id):
+            return False
+        with self._session() as session:
+            user = session.get(User, _uuid(user_id))
+            if not user:
+                return False
+            _apply(user, update_data)
+            user.updated_at = datetime.utcnow()
+            session.commit()
+            return True
+
+    # Workspaces
+    def get_user_workspaces(self, user_id: str) -> List[Dict[str, Any]]:
+        if not _uuid(user_id):
+            return []
+        with self._session() as session:
+            member_of = select(workspace_members.c.workspace_id).where(
+                workspace_members.c.user_id == _uuid(user_id)
+            )
+            workspaces = session.query(Workspace).filter(or_(
+                Workspace.owner_id == _uuid(user_id),
+                Workspace.id.in_(member_of)
+            )).order_by(Workspace.created_at).all()
+            members = self._members(session, [ws.id for ws in workspaces])
+            return [_workspace_dict(ws, members.get(str(ws.id), [])) for ws in workspaces]
+
+    def get_workspace_by_id(self, workspace_id: str) -> Optional[Dict[str, Any]]:
+        if not _uuid(workspace_id):
+            return None
+        with self._session() as session:
+            workspace = session.get(Workspace, _uuid(workspace_id))
+            if not workspace:
+                return None
+            members = self._members(session, [workspace.id])
+            return _workspace_dict(workspace, members.get(str(workspace.id), []))
+
+    def create_workspace(self, workspace_data: Dict[str, Any]) -> Dict[str, Any]:
+        with self._session() as session:
+            workspace = Workspace(id=uuid.uuid4())
+            _apply(workspace, workspace_data)
+            session.add(workspace)
+            session.flush()
+            self._set_members(session, workspace.id, workspace_data.get('members', []))
+            session.commit()
+            return _workspace_dict(workspace, workspace_data.get('members', []))
+
+    def update_workspace(self, workspace_id: str, update_data: Dict[str, Any]) -> bool:
+        if not _uuid(workspace_id):
+            return False
+        with self._session() as session:
+            workspace = session.get(Workspace, _uuid(workspace_id))
+            if not workspace:
+                return False
+            _apply(workspace, update_data)
+            if 'members' in update_data:
+                self._set_members(session, workspace.id, update_data['members'])
+            workspace.updated_at = datetime.utcnow()
+            session.commit()
+            return True
+
+    def delete_workspace(self, workspace_id: str) -> bool:
+        if not _uuid(workspace_id):
+            return False
+        with self._session() as session:
+            workspace = session.get(Workspace, _uuid(workspace_id))
+            if not workspace:
+                return False
+            # Foreign keys require removing everything the workspace owns first
+            page_ids = select(Page.id).where(Page.workspace_id == workspace.id)
+            database_ids = select(Database.id).where(Database.workspace_id == workspace.id)
+            session.execute(delete(page_permissions).where(page_permissions.c.page_id.in_(page_ids)))
+            session.execute(delete(DatabaseRowDate).where(DatabaseRowDate.database_id.in_(database_ids)))
+            session.execute(delete(DatabaseRow).where(DatabaseRow.database_id.in_(database_ids)))
+            session.execute(delete(Page).where(Page.workspace_id == workspace.id))
+            session.execute(delete(Database).where(Database.workspace_id == workspace.id))
+            session.execute(delete(workspace_members).where(workspace_members.c.workspace_id == workspace.id))
+            session.delete(workspace)
+            session.commit()
+            return True
+
+    # Pages
+    def get_workspace_pages(self, workspace_id: str, parent_id: Optional[str] = None,
+                            fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        if not _uuid(workspace_id):
+            return []
+        conditions = [
+            Page.workspace_id == _uuid(workspace_id),
+            Page.is_deleted == False,
+            Page.parent_id == _uuid(parent_id) if parent_id else Page.parent_id.is_(None)
+        ]
+        with self._session() as session:
+            if fields is None:
+                pages = session.query(Page).filter(*conditions).order_by(Page.created_at).all()
+                return self._pages_with_permissions(session, pages)
+            pages = self._select_fields(session, Page, fields, conditions, Page.created_at)
+            if 'permissions' in fields:
+                self._attach_permissions(session, pages)
+            return pages
+
+    def get_workspace_page_tree(self, workspace_id: str, fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        if not _uuid(workspace_id):
+            return []
+        conditions = [Page.workspace_id == _uuid(workspace_id), Page.is_deleted == False]
+        # Same order as ix_pages_workspace_parent_live, so no sort step
+        order_by = (Page.parent_id, Page.created_at)
+        with self._session() as session:
+            if fields is None:
+                pages = session.query(Page).filter(*conditions).order_by(*order_by).all()
+                return self._pages_with_permissions(session, pages)
+            pages = self._select_fields(session, Page, fields, conditions, *order_by)
+            if 'permissions' in fields:
+                self._attach_permissions(session, pages)
+            return pages
+
+    def get_page_by_id(self, page_id: str) -> Optional[Dict[str, Any]]:
+        if not _uuid(page_id):
+            return None
+        with self._session() as session:
+            page = session.get(Page, _uuid(page_id))
+            return self._pages_with_permissions(session, [page])[0] if page else None
+
+    def create_page(self, page_data: Dict[str, Any]) -> Dict[str, Any]:
+        page_data['content'] = order_keys.assign_keys(page_data.get('content') or [])
+        with self._session() as session:
+            page = Page(id=uuid.uuid4())
+            _apply(page, page_data)
+            session.add(page)
+            session.flush()
+            self._set_permissions(session, page.id, page_data.get('permissions', []))
+            session.commit()
+            return _page_dict(page, page_data.get('permissions', []))
+
+    def update_page(self, page_id: str, update_data: Dict[str, Any]) -> bool:
+        if not _uuid(page_id):
+            return False
+        if update_data.get('content') is not None:
+            update_data['content'] = order_keys.assign_keys(update_data['content'])
+        with self._session() as session:
+            page = session.get(Page, _uuid(page_id))
+            if not page:
+                return False
+            _apply(page, update_data)
+            if 'permissions' in update_data:
+                self._set_permissions(session, page.id, update_data['permissions'])
+            page.updated_at = datetime.utcnow()
+            session.commit()
+            return True
+
+    def set_page_block_orders(self, page_id: str, orders: Dict[str, Tuple[Optional[str], str]]) -> int:
+        if not _uuid(page_id) or not orders:
+            return 0
+        with self._session() as session:
+            # Content is one JSON column: lock the row for the read-modify-write
+            page = session.query(Page).filter(Page.id == _uuid(page_id)).with_for_update().first()
+            if not page:
+                return 0
+            content = _loads(page.content, [])
+            updated = 0
+            for block in content:
+                expected, order = orders.get(block.get('id'), (None, None))
+                if order is not None and block.get('order') == expected:
+                    block['order'] = order
+                    updated += 1
+            if updated:
+                content.sort(key=lambda block: (block.get('order') or '', block.get('id') or ''))
+                page.content = json.dumps(content)
+                page.updated_at = datetime.utcnow()
+            session.commit()
+            return updated
+
+    def delete_page(self, page_id: str, user_id: str) -> bool:
+        return self.update_page(page_id, {
+            'is_deleted': True,
+            'deleted_at': datetime.utcnow(),
+            'deleted_by': user_id
+        })
+
+    # Databases
+    def get_workspace_databases(self, workspace_id: str, fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        if not _uuid(workspace_id):
+            return []
+        conditions = [Database.workspace_id == _uuid(workspace_id), Database.is_deleted == False]
+        with self._session() as session:
+            if fields is None:
+                databases = session.query(Database).filter(*conditions).order_by(Database.created_at).all()
+                return self._databases_with_rows(session, databases)
+            databases = self._select_fields(session, Database, fields, conditions, Database.created_at)
+            if 'rows' in fields:
+                rows = self._rows(session, [_uuid(database['id']) for database in databases])
+                for database in databases:
+                    database['rows'] = rows.get(database['id'], [])
+            return databases
+
+    def get_database_by_id(self, database_id: str, fields: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        if not _uuid(database_id):
+            return None
+        with self._session() as session:
+            if fields is None:
+                database = session.get(Database, _uuid(database_id))
+                return self._databases_with_rows(session, [database])[0] if database else None
+            databases = self._select_fields(session, Database, fields, [Database.id == _uuid(database_id)])
+            if databases and 'rows' in fields:
+                databases[0]['rows'] = self._rows(session, [_uuid(database_id)]).get(databases[0]['id'], [])
+            return databases[0] if databases else None
+
+    def create_database(self, database_data: Dict[str, Any]) -> Dict[str, Any]:
+        with self._session() as session:
+            database = Database(id=uuid.uuid4())
+            _apply(database, database_data)
+            session.add(database)
+            session.flush()
+            self._set_rows(session, database.id, database_data.get('rows', []))
+            session.commit()
+            return self._databases_with_rows(session, [database])[0]
+
+    def update_database(self, database_id: str, update_data: Dict[str, Any]) -> bool:
+        if not _uuid(database_id):
+            return False
+        with self._session() as session:
+            database = session.get(Database, _uuid(database_id))
+            if not database:
+                return False
+            _apply(database, update_data)
+            if 'rows' in update_data:
+                self._set_rows(session, database.id, update_data['rows'])
+            database.updated_at = datetime.utcnow()
+            session.commit()
+            return True
+
+    def set_database_schema_migration(self, database_id: str, migration: Dict[str, Any],
+                                      expected_lease: Optional[str],
+                                      properties: Optional[Dict[str, Any]] = None) -> bool:
+        if not _uuid(database_id):
+            return False
+        table = Database.__table__
+        with self._session() as session:
+            current = session.execute(
+                select(table.c.schema_migration).where(table.c.id == _uuid(database_id)).with_for_update()
+            ).first()
+            if current is None or (_loads(current.schema_migration, None) or {}).get('lease') != expected_lease:
+                return False
+            values: Dict[str, Any] = {'schema_migration': json.dumps(migration), 'updated_at': table.c.updated_at}
+            if properties is not None:
+                values.update(properties=json.dumps(properties), updated_at=datetime.utcnow())
+            session.execute(update(table).where(table.c.id == _uuid(database_id)).values(**values))
+            session.commit()
+            return True
+
+    def get_migrating_database_ids(self) -> List[str]:
+        # Records are JSON text, so they are read and filtered here; there are few
+        with self._session() as session:
+            records = session.execute(
+                select(Database.id, Database.schema_migration).where(Database.schema_migration.is_not(None))
+            ).all()
+            return [
+                str(record.id) for record in records
+                if (_loads(record.schema_migration, None) or {}).get('status') == 'running'
+            ]
+
+    def delete_database(self, database_id: str, user_id: str) -> bool:
+        return self.update_database(database_id, {
+            'is_deleted': True,
+            'deleted_at': datetime.utcnow(),
+            'deleted_by': user_id
+        })
+
+    # Database rows
+    def get_database_rows(self, database_id: str) -> List[Dict[str, Any]]:
+        if not _uuid(database_id):
+            return []
+        with self._session() as session:
+            return self._rows(session, [_uuid(database_id)]).get(str(_uuid(database_id)), [])
+
+    def get_database_rows_by_id(self, database_id: str, row_ids: List[str]) -> List[Dict[str, Any]]:
+        ids = [_uuid(row_id) for row_id in row_ids if _uuid(row_id)]
+        if not _uuid(database_id) or not ids:
+            return []
+        with self._session() as session:
+            rows = session.query(DatabaseRow).filter(
+                DatabaseRow.database_id == _uuid(database_id),
+                DatabaseRow.id.in_(ids)
+            )
+            return [_row_dict(row) for row in rows]
+
+    def get_database_rows_batch(self, database_id: str, after_id: Optional[str], limit: int) -> List[Dict[str, Any]]:
+        if not _uuid(database_id):
+            return []
+        query = [DatabaseRow.database_id == _uuid(database_id)]
+        if after_id is not None:
+            query.append(DatabaseRow.id > _uuid(after_id))
+        with self._session() as session:
+            rows = session.query(DatabaseRow).filter(*query).order_by(DatabaseRow.id).limit(limit)
+            return [_row_dict(row) for row in rows]
+
+    def get_database_rows_page(self, database_id: str, conditions: Tuple[RowCondition, ...],
+                               after: Optional[Tuple[str, str]], limit: int) -> Optional[List[Dict[str, Any]]]:
+        dialect = database_postgres.get_engine().dialect.name
+        if not _uuid(database_id) or dialect not in AGGREGATION_DIALECTS or any('"' in c.key for c in conditions):
+            return None
+        values = _PropertyValues(dialect)
+        query = [DatabaseRow.database_id == _uuid(database_id), *[values.condition(c) for c in conditions]]
+        if after is not None:
+            order, row_id = after
+            if not _uuid(row_id):
+                return None
+            query.append(or_(
+                DatabaseRow.order > order,
+                and_(DatabaseRow.order == order, DatabaseRow.id > _uuid(row_id))
+            ))
+        with self._session() as session:
+            rows = session.query(DatabaseRow).filter(*query).order_by(
+                DatabaseRow.order, DatabaseRow.id
+            ).limit(limit)
+            return [_row_dict(row) for row in rows]
+
+    def get_database_rows_in_range(self, database_id: str, key: str,
+                                   start: datetime, end: datetime) -> Optional[List[Dict[str, Any]]]:
+        if not _uuid(database_id):
+            return []
+        in_property = (DatabaseRowDate.database_id == _uuid(database_id), DatabaseRowDate.key == key)
+        with self._session() as session:
+            longest = session.execute(
+                select(DatabaseRowDate.span).where(*in_property).order_by(DatabaseRowDate.span.desc()).limit(1)
+            ).scalar()
+            if longest is None:
+                return []
+            rows = session.query(DatabaseRow).join(DatabaseRowDate, DatabaseRowDate.row_id == DatabaseRow.id).filter(
+                *in_property,
+                DatabaseRowDate.start >= start - timedelta(milliseconds=longest),
+                DatabaseRowDate.start <= end,
+                DatabaseRowDate.end >= start
+            ).order_by(DatabaseRowDate.start, DatabaseRow.order, DatabaseRow.id)
+            return [_row_dict(row) for row in rows]
+
+    def create_database_row(self, database_id: str, row_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if not _uuid(database_id):
+            return None
+        with self._session() as session:
+            database = session.get(Database, _uuid(database_id))
+            if not database:
+                return None
+            order = row_data.get('order')
+            if not order_keys.is_valid(order):
+                last = session.execute(
+                    select(func.max(DatabaseRow.order)).where(DatabaseRow.database_id == database.id)
+                ).scalar()
+                order = order_keys.key_between(last, None)
+            row = DatabaseRow(
+                id=_uuid(row_data.get('id')) or uuid.uuid4(),
+                database_id=database.id,
+                properties=json.dumps(row_data.get('properties', {})),
+                computed=_computed_json(row_data.get('computed')),
+                order=order
+            )
+            session.add(row)
+            session.add_all(_row_dates(row, row_data.get('properties')))
+            database.updated_at = datetime.utcnow()
+            session.commit()
+            return _row_dict(row)
+
+    def update_database_row(self, database_id: str, row_id: str, properties: Dict[str, Any],
+                            computed: Optional[Dict[str, Any]] = None,
+                            order: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        if not _uuid(database_id) or not _uuid(row_id):
+            return None
+        with self._session() as session:
+            row = session.query(DatabaseRow).filter(
+                DatabaseRow.id == _uuid(row_id),
+                DatabaseRow.database_id == _uuid(database_id)
+            ).first()
+            if not row:
+                return None
+            row.properties = json.dumps(properties)
+            row.computed = _computed_json(computed)
+            session.query(DatabaseRowDate).filter(DatabaseRowDate.row_id == row.id).delete()
+            session.add_all(_row_dates(row, properties))
+            if order is not None:
+                row.order = order
+            row.updated_at = datetime.utcnow()
+            session.commit()
+            return _row_dict(row)
+
+    def set_database_rows_computed(self, database_id: str, computed: Dict[str, Dict[str, Any]]) -> int:
+        params = [
+            {'row_id': _uuid(row_id), 'row_computed': _computed_json(values)}
+            for row_id, values in computed.items() if _uuid(row_id)
+        ]
+        if not _uuid(database_id) or not params:
+            return 0
+        table = DatabaseRow.__table__
+        # One executemany; updated_at is set to itself so onupdate leaves it alone
+        statement = update(table).where(
+            table.c.id == bindparam('row_id'),
+            table.c.database_id == _uuid(database_id)
+        ).values(computed=bindparam('row_computed'), updated_at=table.c.updated_at)
+        with self._session() as session:
+            result = session.execute(statement, params)
+            session.commit()
+            return result.rowcount
+
+    def set_database_rows_order(self, database_id: str, orders: Dict[str, Tuple[Optional[str], str]]) -> int:
+        params = [
+            {'row_id': _uuid(row_id), 'expected': expected, 'row_order': order}
+            for row_id, (expected, order) in orders.items() if _uuid(row_id)
+        ]
+        if not _uuid(database_id) or not params:
+            return 0
+        table = DatabaseRow.__table__
+        statement = update(table).where(
+            table.c.id == bindparam('row_id'),
+            table.c.database_id == _uuid(database_id),
+            table.c.order.is_not_distinct_from(bindparam('expected'))
+        ).values(order=bindparam('row_order'), updated_at=table.c.updated_at)
+        with self._session() as session:
+            result = session.execute(statement, params)
+            session.commit()
+            return result.rowcount
+
+    def _set_row_properties(self, database_id: str, row_ids: Iterable[str],
+                            edit: Callable[[str, Dict[str, Any]], Dict[str, Any]],
+                            computed: Optional[Dict[str, Dict[str, Any]]] = None) -> int:
+        """Read rows' properties under a row lock and write back edit(row id, properties), in one executemany"""
+        ids = [_uuid(row_id) for row_id in row_ids if _uuid(row_id)]
+        if not _uuid(database_id) or not ids:
+            return 0
+        table = DatabaseRow.__table__
+        with self._session() as session:
+            rows = session.execute(
+                select(table.c.id, table.c.properties, table.c.computed).where(
+                    table.c.database_id == _uuid(database_id), table.c.id.in_(ids)
+                ).order_by(table.c.id).with_for_update()
+            ).all()
+            if not rows:
+                return 0
+            params = []
+            for row in rows:
+                row_id = str(row.id)
+                params.append({
+                    'row_id': row.id,
+                    'row_properties': json.dumps(edit(row_id, _loads(row.properties, {}))),
+                    'row_computed': _computed_json(computed[row_id]) if computed and row_id in computed else row.computed
+                })
+            # updated_at is set to itself so onupdate leaves it alone
+            session.execute(update(table).where(table.c.id == bindparam('row_id')).values(
+                properties=bindparam('row_properties'), computed=bindparam('row_computed'),
+                updated_at=table.c.updated_at
+            ), params)
+            session.commit()
+            return len(rows)
+
+    def link_database_rows(self, database_id: str, key: str, row_ids: List[str],
+                           linked_id: str, linked: bool) -> int:
+        def edit(row_id: str, properties: Dict[str, Any]) -> Dict[str, Any]:
+            value = properties.get(key)
+            value = list(value) if isinstance(value, list) else []
+            if not linked:
+                value = [item for item in value if item != linked_id]
+            elif linked_id not in value:
+                value.append(linked_id)
+            return {**properties, key: value}
+        return self._set_row_properties(database_id, row_ids, edit)
+
+    def set_database_rows_properties(self, database_id: str, values: Dict[str, Dict[str, Any]],
+                                     computed: Optional[Dict[str, Dict[str, Any]]] = None) -> int:
+        return self._set_row_properties(
+            database_id, values, lambda row_id, properties: {**properties, **values[row_id]}, computed
+        )
+
+    def rewrite_database_rows(self, database_id: str, rewrites: Dict[str, RowRewrite]) -> int:
+        ids = [_uuid(row_id) for row_id in rewrites if _uuid(row_id)]
+        if not _uuid(database_id) or not ids:
+            return 0
+        table = DatabaseRow.__table__
+        with self._session() as session:
+            rows = session.execute(
+                select(table.c.id, table.c.properties, table.c.updated_at).where(
+                    table.c.database_id == _uuid(database_id), table.c.id.in_(ids)
+                ).order_by(table.c.id).with_for_update()
+            ).all()
+            rewritten = {}
+            for row in rows:
+                rewrite = rewrites[str(row.id)]
+                if _iso(row.updated_at) != rewrite.updated_at:
+                    continue
+                properties = _loads(row.properties, {})
+                for key in rewrite.removed:
+                    properties.pop(key, None)
+                properties.update(rewrite.values)
+                rewritten[row.id] = properties
+            if not rewritten:
+                return 0
+            session.execute(update(table).where(table.c.id == bindparam('row_id')).values(
+                properties=bindparam('row_properties'), updated_at=table.c.updated_at
+            ), [{'row_id': row_id, 'row_properties': json.dumps(properties)} for row_id, properties in rewritten.items()])
+            # Date entries of every key changed in the batch are replaced from the new properties
+            keys = {key for rewrite in rewrites.values() for key in (*rewrite.values, *rewrite.removed)}
+            session.execute(delete(DatabaseRowDate).where(
+                DatabaseRowDate.row_id.in_(list(rewritten)), DatabaseRowDate.key.in_(keys)
+            ))
+            dates = [
+                {'row_id': row_id, 'database_id': _uuid(database_id), **entry}
+                for row_id, properties in rewritten.items()
+                for entry in date_index.entries({key: properties[key] for key in keys if key in properties})
+            ]
+            if dates:
+                session.execute(insert(DatabaseRowDate), dates)
+            session.commit()
+            return len(rewritten)
+
+    def delete_database_row(self, database_id: str, row_id: str) -> bool:
+        if not _uuid(database_id) or not _uuid(row_id):
+            return False
+        with self._session() as session:
+            session.execute(delete(DatabaseRowDate).where(
+                DatabaseRowDate.row_id == _uuid(row_id),
+                DatabaseRowDate.database_id == _uuid(database_id)
+            ))
+            result = session.execute(delete(DatabaseRow).where(
+                DatabaseRow.id == _uuid(row_id),
+                DatabaseRow.database_id == _uuid(database_id)
+            ))
+            session.commit()
+            return result.rowcount > 0
+
+    def aggregate_database_rows(self, database_id: str, aggregation: RowAggregation) -> Optional[Dict[str, Any]]:
+        dialect = database_postgres.get_engine().dialect.name
+        keys = [aggregation.group_by, *(a.key for a in aggregation.aggregates), *(c.key for c in aggregation.conditions)]
+        if not _uuid(database_id) or dialect not in AGGREGATION_DIALECTS or any(key and '"' in key for key in keys):
+            return None
+        values = _PropertyValues(dialect)
+        # Property values are read once in a subquery that the outer query groups
+        columns = [
+            values.value(aggregate.key, aggregate.kind).label(f'a{index}')
+            for index, aggregate in enumerate(aggregation.aggregates) if aggregate.key is not None
+        ]
+        if aggregation.group_by is not None:
+            columns.append(values.value(aggregation.group_by, aggregation.group_kind).label('group_value'))
+        rows = select(DatabaseRow.__table__.c.id, *columns).where(
+            DatabaseRow.__table__.c.database_id == _uuid(database_id),
+            *[values.condition(condition) for condition in aggregation.conditions]
+        ).subquery()
+        summaries = [func.count()] + [
+            _aggregate(aggregate, rows.c[f'a{index}'] if aggregate.key is not None else None)
+            for index, aggregate in enumerate(aggregation.aggregates)
+        ]
+        with self._session() as session:
+            total = session.execute(select(*summaries).select_from(rows)).one()
+            groups = []
+            if aggregation.group_by is not None:
+                result = session.execute(
+                    select(rows.c.group_value, *summaries).group_by(rows.c.group_value)
+                )
+                groups = [{'value': row[0], **_summary(aggregation.aggregates, row[1:])} for row in result]
+        return {'groups': groups, 'total': _summary(aggregation.aggregates, total)}
+
+    # Trash
+    def get_trash_items(self, workspace_ids: List[str]) -> List[Dict[str, Any]]:
+        ids = [_uuid(ws_id) for ws_id in workspace_ids if _uuid(ws_id)]
+        trash_items = []
+        with self._session() as session:
+            pages = session.query(Page).filter(Page.workspace_id.in_(ids), Page.is_deleted == True).all()
+            for page_data in self._pages_with_permissions(session, pages):
+                page_data['type'] = 'page'
+                trash_items.append(page_data)
+            databases = session.query(Database).filter(Database.workspace_id.in_(ids), Database.is_deleted == True).all()
+            for db_data in self._databases_with_rows(session, databases):
+                db_data['type'] = 'database'
+                trash_items.append(db_data)
+        return trash_items
+
+    def restore_item(self, item_id: str, item_type: str) -> bool:
+        model = Page if item_type == 'page' else Database
+        if not _uuid(item_id):
+            return False
+        with self._session() as session:
+            item = session.query(model).filter(model.id == _uuid(item_id), model.is_deleted == True).first()
+            if not item:
+                return False
+            item.is_deleted = False
+            item.deleted_at = None
+            item.deleted_by = None
+            item.updated_at = datetime.utcnow()
+            session.commit()
+            return True
+
+    def _purge(self, session, model, condition) -> int:
+        ids = select(model.id).where(condition)
+        if model is Page:
+            session.execute(delete(page_permissions).where(page_permissions.c.page_id.in_(ids)))
+        else:
+            session.execute(delete(DatabaseRowDate).where(DatabaseRowDate.database_id.in_(ids)))
+            session.execute(delete(DatabaseRow).where(DatabaseRow.database_id.in_(ids)))
+        return session.execute(delete(model).where(condition)).rowcount
+
+    def permanently_delete_item(self, item_id: str, item_type: str) -> bool:
+        model = Page if item_type == 'page' else Database
+        if not _uuid(item_id):
+            return False
+        with self._session() as session:
+            deleted = self._purge(session, model, (model.id == _uuid(item_id)) & (model.is_deleted == True))
+            session.commit()
+            return deleted > 0
+
+    def empty_trash(self, workspace_ids: List[str]) -> int:
+        ids = [_uuid(ws_id) for ws_id in workspace_ids if _uuid(ws_id)]
+        with self._session() as session:
+            deleted_count = 0
+            for model in (Page, Database):
+                deleted_count += self._purge(session, model, model.workspace_id.in_(ids) & (model.is_deleted == True))
+            session.commit()
+            return deleted_count
+
+    # MFA backup codes
+    def get_user_backup_codes(self, user_id: str) -> List[Dict[str, Any]]:
+        if not _uuid(user_id):
+            return []
+        with self._session() as session:
+            codes = session.query(MFABackupCode).filter(MFABackupCode.user_id == _uuid(user_id)).all()
+            return [
+                {
+                    'id': str(code.id),
+                    'user_id': str(code.user_id),
+                    'code': code.code,
+                    'used': code.used,
+                    'used_at': _iso(code.used_at),
+                    'created_at': _iso(code.created_at)
+                }
+                for code in codes
+            ]
+
+    def create_backup_codes(self, user_id: str, codes: List[str]) -> List[Dict[str, Any]]:
+        with self._session() as session:
+            session.query(MFABackupCode).filter(MFABackupCode.user_id == _uuid(user_id)).delete()
+            for code in codes:
+                session.add(MFABackupCode(user_id=_uuid(user_id), code=code))
+            session.commit()
+        return self.get_user_backup_codes(user_id)
+
+    def verify_backup_code(self, user_id: str, code: str) -> bool:
+        if not _uuid(user_id):
+            return False
+        with self._session() as session:
+            backup_code = session.query(MFABackupCode).filter(
+                MFABackupCode.user_id == _uuid(user_id),
+                MFABackupCode.code == code,
+                MFABackupCode.used == False
+            ).with_for_update().first()
+            if not backup_code:
+                return False
+            backup_code.used = True
+            backup_code.used_at = datetime.utcnow()
+            session.commit()
+            return True
+
+    # Auth attempts
+    def _attempt_dict(self, attempt: LoginAttempt) -> Dict[str, Any]:
+        return {
+            'id': str(attempt.id),
+            'ip_address': attempt.ip_address,
+            'user_email': attempt.user_email,
+            'successful': attempt.success,
+            'attempted_at': _iso(attempt.attempted_at),
+            'created_at': _iso(attempt.attempted_at)
+        }
+
+    def record_login_attempt(self, ip_address: str, user_email: Optional[str] = None, successful: bool = False) -> Dict[str, Any]:
+        with self._session() as session:
+            attempt = LoginAttempt(
+                id=uuid.uuid4(),
+                ip_address=ip_address,
+                user_email=user_email,
+                success=successful,
+                attempted_at=datetime.utcnow()
+            )
+            session.add(attempt)
+            session.commit()
+            return self._attempt_dict(attempt)
+
+    def get_recent_login_attempts(self, ip_address: str, minutes: int = 30) -> List[Dict[str, Any]]:
+        cutoff_time = datetime.utcnow() - timedelta(minutes=minutes)
+        with self._session() as session:
+            attempts = session.query(LoginAttempt).filter(
+                LoginAttempt.ip_address == ip_address,
+                LoginAttempt.attempted_at >= cutoff_time
+            ).all()
+            return [self._attempt_dict(attempt) for attempt in attempts]
@@ -86,10 +86,10 @@ const DatabaseView = () => {
   const processedRows = database.rows.map(row => {
     const processedRow = { ...row };
     
-    // Calculate formula values
+    // Calculate formula values the server didn't send
     Object.keys(database.properties).forEach(key => {
       const prop = database.properties[key];
-      if (prop.type === 'formula') {
+      if (prop.type === 'formula' && !(key in row.properties)) {
         processedRow.properties[key] = executeFormula(prop.formula, row.properties);
       }
     });
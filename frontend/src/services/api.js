@@ -165,12 +165,14 @@ export const workspacesAPI = {
 
 // Pages API
 export const pagesAPI = {
-  getPages: async (workspaceId = null, parentId = null) => {
+  // fields: optional list of page fields to return, e.g. ['title', 'icon', 'parent_id'] for the sidebar
+  getPages: async (workspaceId = null, parentId = null, fields = null) => {
     let url = '/pages/';
     const params = new URLSearchParams();
     
     if (workspaceId) params.append('workspace_id', workspaceId);
     if (parentId) params.append('parent_id', parentId);
+    if (fields) params.append('fields', fields.join(','));
     
     if (params.toString()) {
       url += '?' + params.toString();
@@ -195,6 +197,14 @@ export const pagesAPI = {
     return response.data;
   },
 
+  moveBlock: async (pageId, blockId, { afterId, beforeId } = {}) => {
+    const response = await api.post(`/pages/${pageId}/blocks/${blockId}/move`, {
+      after_id: afterId,
+      before_id: beforeId
+    });
+    return response.data;
+  },
+
   deletePage: async (pageId) => {
     const response = await api.delete(`/pages/${pageId}`);
     return response.data;
@@ -213,10 +223,16 @@ export const pagesAPI = {
 
 // Databases API
 export const databasesAPI = {
-  getDatabases: async (workspaceId = null) => {
+  // fields: optional list of database fields to return; rows are only sent when listed
+  getDatabases: async (workspaceId = null, fields = null) => {
     let url = '/databases/';
-    if (workspaceId) {
-      url += `?workspace_id=${workspaceId}`;
+    const params = new URLSearchParams();
+    
+    if (workspaceId) params.append('workspace_id', workspaceId);
+    if (fields) params.append('fields', fields.join(','));
+    
+    if (params.toString()) {
+      url += '?' + params.toString();
     }
     
     const response = await api.get(url);
@@ -243,9 +259,62 @@ export const databasesAPI = {
     return response.data;
   },
 
-  // Database rows
-  getDatabaseRows: async (databaseId) => {
-    const response = await api.get(`/databases/${databaseId}/rows`);
+  // Database rows, formulas computed by the server. filter: ['Progress:gte:50', ...],
+  // sort: ['-Due Date', ...]; both work on any property, formulas included
+  getDatabaseRows: async (databaseId, { filter, sort } = {}) => {
+    const response = await api.get(`/databases/${databaseId}/rows`, {
+      params: { filter, sort },
+      paramsSerializer: { indexes: null },
+    });
+    return response.data;
+  },
+
+  aggregateDatabase: async (databaseId, { groupBy, aggregate, filter } = {}) => {
+    const response = await api.get(`/databases/${databaseId}/aggregate`, {
+      params: { group_by: groupBy, aggregate, filter },
+      paramsSerializer: { indexes: null },
+    });
+    return response.data;
+  },
+
+  getDatabaseBoard: async (databaseId, { groupBy, limit, cursor, filter } = {}) => {
+    const response = await api.get(`/databases/${databaseId}/board`, {
+      params: { group_by: groupBy, limit, cursor, filter },
+      paramsSerializer: { indexes: null },
+    });
+    return response.data;
+  },
+
+  getDatabaseCalendar: async (databaseId, { dateBy, start, end, filter } = {}) => {
+    const response = await api.get(`/databases/${databaseId}/calendar`, {
+      params: { date_by: dateBy, start, end, filter },
+      paramsSerializer: { indexes: null },
+    });
+    return response.data;
+  },
+
+  startSchemaMigration: async (databaseId, operations) => {
+    const response = await api.post(`/databases/${databaseId}/schema-migration`, { operations });
+    return response.data;
+  },
+
+  getSchemaMigration: async (databaseId) => {
+    const response = await api.get(`/databases/${databaseId}/schema-migration`);
+    return response.data;
+  },
+
+  resumeSchemaMigration: async (databaseId) => {
+    const response = await api.post(`/databases/${databaseId}/schema-migration/resume`);
+    return response.data;
+  },
+
+  moveDatabaseRow: async (databaseId, rowId, { groupBy, group, afterId, beforeId } = {}) => {
+    const response = await api.post(`/databases/${databaseId}/rows/${rowId}/move`, {
+      group_by: groupBy,
+      group,
+      after_id: afterId,
+      before_id: beforeId
+    });
     return response.data;
   },
 
@@ -303,6 +372,65 @@ export const trashAPI = {
   },
 };
 
+// App start: user, workspaces with members, page tree and database summaries in one request
+export const bootstrapAPI = {
+  get: async () => {
+    const response = await api.get('/bootstrap/');
+    return response.data;
+  },
+};
+
+// Many calls in one request. operations: [{ id, method, path, body, depends_on }], with
+// paths relative to /api; atomic runs them in order in one transaction (not on Mongo)
+export const batchAPI = {
+  run: async (operations, { atomic = false } = {}) => {
+    const response = await api.post('/batch/', { operations, atomic });
+    return response.data;
+  },
+};
+
+// Live editing of a page over a WebSocket. Each server frame is a list of messages
+// (presence, join, leave, op, cursors, saved); send ops and cursor moves with the returned
+// helpers. A close with code 1013 means the client fell behind: reload the page, then reconnect
+// The token goes in as a subprotocol, after 'bearer': in the URL it would end up in access logs
+const openLiveSocket = (path, { onMessages, onClose } = {}) => {
+  const token = localStorage.getItem('authToken');
+  const url = `${HTTPS_API_BASE_URL.replace(/^https:/, 'wss:')}/api${path}/live`;
+  const socket = new WebSocket(url, token ? ['bearer', token] : ['bearer']);
+  socket.onmessage = (event) => onMessages && onMessages(JSON.parse(event.data));
+  socket.onclose = (event) => onClose && onClose(event);
+  return socket;
+};
+
+export const livePageAPI = {
+  connect: (pageId, handlers) => {
+    const socket = openLiveSocket(`/pages/${pageId}`, handlers);
+    const send = (message) => {
+      if (socket.readyState === WebSocket.OPEN) {
+        socket.send(JSON.stringify(message));
+      }
+    };
+    return {
+      socket,
+      sendOperation: (op) => send({ type: 'op', op }),
+      moveCursor: (blockId, position) => send({ type: 'cursor', block_id: blockId, position }),
+      close: () => socket.close(),
+    };
+  },
+};
+
+// Feeds of database and workspace changes; they end when it is deleted or access is removed
+export const liveFeedAPI = {
+  database: (databaseId, handlers) => {
+    const socket = openLiveSocket(`/databases/${databaseId}`, handlers);
+    return { socket, close: () => socket.close() };
+  },
+  workspace: (workspaceId, handlers) => {
+    const socket = openLiveSocket(`/workspaces/${workspaceId}`, handlers);
+    return { socket, close: () => socket.close() };
+  },
+};
+
 // Health check
 export const healthAPI = {
   check: async () => {
@@ -0,0 +1,40 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+
+from formulas.parser import BinaryOp, Call, FormulaError, Literal, Prop, UnaryOp, parse  # noqa: E402
+
+
+@pytest.mark.parametrize('expression, operator', [
+    ('prop("A") and prop("B")', 'and'),
+    ('prop("A") && prop("B")', 'and'),
+    ('prop("A") or prop("B")', 'or'),
+    ('prop("A") || prop("B")', 'or'),
+])
+def test_operator_spelling(expression, operator):
+    assert parse(expression) == BinaryOp(operator, Prop('A'), Prop('B'))
+
+
+@pytest.mark.parametrize('name', ['and', 'or'])
+def test_function_spelling(name):
+    assert parse(f'{name}(prop("A"), prop("B"), true)') == Call(name, (Prop('A'), Prop('B'), Literal(True)))
+
+
+def test_function_spelling_inside_expressions():
+    assert parse('not and(true, or(false, true)) or false') == BinaryOp(
+        'or',
+        UnaryOp('not', Call('and', (Literal(True), Call('or', (Literal(False), Literal(True)))))),
+        Literal(False)
+    )
+
+
+def test_parenthesised_operand_stays_an_operator():
+    assert parse('true and (false)') == BinaryOp('and', Literal(True), Literal(False))
+
+
+def test_bare_operator_is_an_error():
+    with pytest.raises(FormulaError):
+        parse('and')